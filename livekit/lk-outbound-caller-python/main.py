@@ -1,3 +1,5 @@
+import os
+
 from dotenv import load_dotenv
 
 from livekit import api
@@ -52,7 +54,7 @@ async def entrypoint(ctx: agents.JobContext):
                     room_name=ctx.room.name,
                     # This is the outbound trunk ID to use (i.e. which phone number the call will come from)
                     # You can get this from LiveKit CLI with `lk sip outbound list`
-                    sip_trunk_id="ST_8tLXJQjgewzt",
+                    sip_trunk_id=os.getenv("SIP_OUTBOUND_TRUNK_ID", "ST_8tLXJQjgewzt"),
                     # The outbound phone number to dial and identity to use
                     sip_call_to=phone_number,
                     participant_identity=sip_participant_identity,
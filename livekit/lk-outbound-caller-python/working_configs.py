@@ -1,53 +1,39 @@
 """
 Simple storage for working configurations.
+
+Each entry is a provider spec: `provider` plus the plugin's keyword arguments.
+The t0-livekit-agent serves these as pipeline profiles (see
+t0-livekit-agent/config/pipelines.toml), selected per campaign with the
+`pipeline` key in the job metadata.
 """
 
 # ElevenLabs configurations that worked
 ELEVENLABS_CONFIGS = {
-    """
-    tts=elevenlabs.TTS(
-        voice_settings=VoiceSettings(
-            stability=0.5,
-            similarity_boost=0.5,
-            style=0.5,
-            use_speaker_boost=True,
-            speed=0.9,
-        ),
-    ), 
-    """
+    "expressive": {
+        "provider": "elevenlabs",
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.5,
+            "style": 0.5,
+            "use_speaker_boost": True,
+            "speed": 0.9,
+        },
+    },
 }
 
 # Cartesia TTS
-CARTESIA_CONFIG = """
-tts=cartesia.TTS()
-"""
+CARTESIA_CONFIG = {"provider": "cartesia"}
 
 # OpenAI TTS configurations
 OPENAI_TTS_CONFIGS = {
-    "alloy": """
-    tts=openai.TTS(
-        voice="alloy",
-        model="tts-1",
-    )
-    """,
-    
-    "hd": """
-    tts=openai.TTS(
-        voice="nova",
-        model="tts-1-hd",
-    )
-    """
+    "alloy": {"provider": "openai", "voice": "alloy", "model": "tts-1"},
+    "hd": {"provider": "openai", "voice": "nova", "model": "tts-1-hd"},
 }
 
-
-current outbound ai config:
-session = AgentSession(
-            stt=deepgram.STT(model="nova-3", language="multi"),
-            llm=openai.LLM(model="gpt-4o-mini"),
-            tts=openai.TTS(
-                voice="alloy",  # Options: alloy, echo, fable, onyx, nova, shimmer
-                model="tts-1-hd",  # "tts-1-hd" for higher quality
-            ),
-            vad=silero.VAD.load(),
-            turn_detection=MultilingualModel(),
-        ) 
+# Current outbound AI config (agent.py); VAD is silero and turn detection the multilingual model
+CURRENT_OUTBOUND_CONFIG = {
+    "stt": {"provider": "deepgram", "model": "nova-3", "language": "multi"},
+    "llm": {"provider": "openai", "model": "gpt-4o-mini"},
+    # voice options: alloy, echo, fable, onyx, nova, shimmer; "tts-1-hd" for higher quality
+    "tts": {"provider": "openai", "voice": "alloy", "model": "tts-1-hd"},
+}
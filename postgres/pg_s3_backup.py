@@ -0,0 +1,505 @@
+"""
+Streaming PostgreSQL backups to S3.
+`pg_dump` output is cut into chunks that are gzip-compressed on all cores and
+uploaded as parts of one S3 multipart upload while the dump is still running,
+so no local copy of the dump is written. Every part is checked by S3 against
+its Content-MD5; a manifest next to the backup records the SHA-256 of the dump and of
+the compressed object, and where each gzip member starts, so a restore can
+download and decompress in parallel and verify both.
+
+The object is a plain multi-member gzip file: `gunzip` and `aws s3 cp` still
+work on it, and backups made by the old shell script restore as well.
+
+    python pg_s3_backup.py backup 's3://my-backups/daily-backups/backup_mydb_{date}.sql.gz' -- -U app -h localhost mydb
+    pg_dump mydb | python pg_s3_backup.py backup s3://my-backups/adhoc/mydb.sql.gz
+    python pg_s3_backup.py restore s3://my-backups/daily-backups/backup_mydb_20250101_235200.sql.gz -- -U app -d test_db
+    python pg_s3_backup.py restore s3://my-backups/adhoc/mydb.sql.gz --output mydb.sql
+
+Against MinIO or moto, pass `--endpoint-url http://localhost:9000` (or set
+AWS_ENDPOINT_URL). Needs boto3.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Callable, Deque, List, Optional, Tuple
+
+logger = logging.getLogger("pg_s3_backup")
+
+MB = 1024 * 1024
+# S3 rejects parts under 5 MiB (except the last) and uploads over 10,000 parts
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10_000
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+class BackupError(Exception):
+    pass
+
+
+def parse_url(url: str) -> Tuple[str, str]:
+    if not url.startswith("s3://") or "/" not in url[5:]:
+        raise BackupError(f"Expected s3://bucket/key, got {url!r}")
+    bucket, key = url[5:].split("/", 1)
+    return bucket, key
+
+
+def s3_client(endpoint_url: Optional[str] = None):
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint_url or os.getenv("AWS_ENDPOINT_URL") or None,
+        config=Config(retries={"max_attempts": 10, "mode": "adaptive"}, max_pool_connections=32),
+    )
+
+
+def _read_full(source: BinaryIO, size: int) -> bytes:
+    """Up to `size` bytes; short only at the end of the stream (pipes return partial reads)"""
+    data = source.read(size)
+    if not data or len(data) == size:
+        return data or b""
+    parts = [data]
+    received = len(data)
+    while received < size:
+        more = source.read(size - received)
+        if not more:
+            break
+        parts.append(more)
+        received += len(more)
+    return b"".join(parts)
+
+
+def _compress(chunk: bytes, level: int) -> bytes:
+    # zlib releases the GIL, so chunks compress in parallel on the pool's threads
+    return gzip.compress(chunk, compresslevel=level, mtime=0)
+
+
+def _throughput(size: int, seconds: float) -> str:
+    return f"{size / MB / seconds:.1f} MB/s" if seconds > 0 else "-"
+
+
+class _Window:
+    """Futures completed in submission order, with at most `limit` outstanding"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.futures: Deque[Future] = deque()
+
+    def add(self, future: Future) -> list:
+        self.futures.append(future)
+        return self.drain(blocking=len(self.futures) > self.limit)
+
+    def drain(self, blocking: bool = False) -> list:
+        done = []
+        while self.futures and (self.futures[0].done() or blocking):
+            done.append(self.futures.popleft().result())
+            blocking = blocking and len(self.futures) > self.limit
+        return done
+
+    def finish(self) -> list:
+        done = []
+        while self.futures:
+            done.append(self.futures.popleft().result())
+        return done
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+        self.futures.clear()
+
+
+class Backup:
+    """
+    One streaming backup: source stream -> parallel gzip -> concurrent multipart upload
+
+    Memory stays bounded at about `workers + 2` chunks being compressed plus
+    `upload_workers + 1` parts in flight (~300 MB with the defaults).
+    """
+
+    def __init__(
+        self,
+        s3,
+        bucket: str,
+        key: str,
+        chunk_size: int = 8 * MB,
+        part_size: int = 32 * MB,
+        workers: Optional[int] = None,
+        upload_workers: int = 8,
+        level: int = 6,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise BackupError(f"Part size must be at least {MIN_PART_SIZE // MB} MiB")
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.chunk_size = chunk_size
+        self.part_size = part_size
+        self.workers = workers or os.cpu_count() or 1
+        self.upload_workers = upload_workers
+        self.level = level
+
+        self.raw_hash = hashlib.sha256()
+        self.object_hash = hashlib.sha256()
+        self.raw_size = 0
+        self.object_size = 0
+        # (object offset, compressed length, raw length) per gzip member
+        self.members: List[Tuple[int, int, int]] = []
+        self.parts: List[dict] = []
+        self._part_md5s: List[bytes] = []
+        # ETags are MD5s unless the bucket encrypts with SSE-KMS or SSE-C
+        self._md5_etags = True
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+
+    def run(self, source: BinaryIO, before_complete: Optional[Callable[[], None]] = None) -> dict:
+        """
+        Stream `source` to S3; `before_complete` can still fail the backup
+
+        Nothing is visible under the key unless every step succeeded: on any
+        error the multipart upload is aborted and its parts deleted.
+        """
+        started = time.perf_counter()
+        self._upload_id = self.s3.create_multipart_upload(
+            Bucket=self.bucket, Key=self.key, ContentType="application/gzip",
+        )["UploadId"]
+        compressing = _Window(self.workers + 2)
+        uploading = _Window(self.upload_workers + 1)
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="gzip") as compressor, \
+                    ThreadPoolExecutor(self.upload_workers, thread_name_prefix="upload") as uploader:
+                first = True
+                while True:
+                    chunk = _read_full(source, self.chunk_size)
+                    if not chunk and not first:
+                        break
+                    first = False
+                    self.raw_hash.update(chunk)
+                    self.raw_size += len(chunk)
+                    for raw_length, member in compressing.add(compressor.submit(self._compress, chunk)):
+                        self._append(member, raw_length, uploader, uploading)
+                    if len(chunk) < self.chunk_size:
+                        break
+                for raw_length, member in compressing.finish():
+                    self._append(member, raw_length, uploader, uploading)
+                if self._buffer:
+                    self.parts += uploading.add(self._submit_part(uploader))
+                self.parts += uploading.finish()
+
+            if before_complete is not None:
+                before_complete()
+            response = self.s3.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+            self._upload_id = None
+            self._verify_etag(response["ETag"])
+        except BaseException:
+            compressing.cancel()
+            uploading.cancel()
+            self._abort()
+            raise
+
+        seconds = time.perf_counter() - started
+        manifest = self.manifest(seconds)
+        self.s3.put_object(
+            Bucket=self.bucket, Key=self.key + MANIFEST_SUFFIX,
+            Body=json.dumps(manifest).encode(), ContentType="application/json",
+        )
+        logger.info(
+            f"✅ Backup uploaded | s3://{self.bucket}/{self.key} | Dump: {self.raw_size / MB:,.1f} MB | "
+            f"Object: {self.object_size / MB:,.1f} MB ({manifest['ratio']:.2f}x) | Parts: {len(self.parts)} | "
+            f"Time: {seconds:.1f}s | Throughput: {_throughput(self.raw_size, seconds)}"
+        )
+        return manifest
+
+    def _compress(self, chunk: bytes) -> Tuple[int, bytes]:
+        return len(chunk), _compress(chunk, self.level)
+
+    def _append(self, member: bytes, raw_length: int, uploader: ThreadPoolExecutor, uploading: _Window):
+        self.members.append((self.object_size, len(member), raw_length))
+        self.object_hash.update(member)
+        self.object_size += len(member)
+        self._buffer += member
+        if len(self._buffer) >= self.part_size:
+            self.parts += uploading.add(self._submit_part(uploader))
+
+    def _submit_part(self, uploader: ThreadPoolExecutor) -> Future:
+        number = len(self._part_md5s) + 1
+        if number > MAX_PARTS:
+            raise BackupError(f"Backup needs more than {MAX_PARTS} parts; raise --part-mb")
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        digest = hashlib.md5(data).digest()
+        self._part_md5s.append(digest)
+        return uploader.submit(self._upload_part, number, data, digest)
+
+    def _upload_part(self, number: int, data: bytes, digest: bytes) -> dict:
+        # S3 recomputes the MD5 and rejects the part if the body was altered on the way
+        response = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number,
+            Body=data, ContentMD5=base64.b64encode(digest).decode(),
+        )
+        if self._md5_etags and response["ETag"].strip('"') != digest.hex():
+            self._md5_etags = False
+            logger.debug(f"Part {number} ETag isn't its MD5 (encrypted bucket); relying on Content-MD5 alone")
+        logger.debug(f"⬆️ Part {number} uploaded | {len(data) / MB:.1f} MB")
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def _verify_etag(self, etag: str):
+        """Check the assembled object against its parts, where ETags are MD5s"""
+        if not self._md5_etags:
+            return
+        expected = f"{hashlib.md5(b''.join(self._part_md5s)).hexdigest()}-{len(self._part_md5s)}"
+        if etag.strip('"') != expected:
+            self.s3.delete_object(Bucket=self.bucket, Key=self.key)
+            raise BackupError(f"Uploaded object ETag {etag} does not match its parts ({expected})")
+
+    def _abort(self):
+        if self._upload_id is None:
+            return
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            logger.warning(f"🗑️ Multipart upload aborted | s3://{self.bucket}/{self.key}")
+        except Exception as e:
+            logger.error(f"❌ Could not abort multipart upload {self._upload_id}: {e}")
+
+    def manifest(self, seconds: float) -> dict:
+        return {
+            "version": 1,
+            "key": self.key,
+            "created": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "raw_size": self.raw_size,
+            "raw_sha256": self.raw_hash.hexdigest(),
+            "object_size": self.object_size,
+            "object_sha256": self.object_hash.hexdigest(),
+            "ratio": round(self.raw_size / self.object_size, 3) if self.object_size else 0.0,
+            "chunk_size": self.chunk_size,
+            "part_size": self.part_size,
+            "parts": len(self.parts),
+            "seconds": round(seconds, 3),
+            "members": self.members,
+        }
+
+
+def run_pg_dump(pg_dump_args: List[str], backup: Backup) -> dict:
+    """Back up the output of `pg_dump <args>`; a failed dump aborts the upload"""
+    command = [os.getenv("PG_DUMP", "pg_dump"), *pg_dump_args]
+    logger.info(f"🐘 Running {' '.join(command)}")
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+
+    def check_dump():
+        if process.wait() != 0:
+            raise BackupError(f"pg_dump exited with status {process.returncode}; backup not completed")
+
+    try:
+        return backup.run(process.stdout, before_complete=check_dump)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+class Restore:
+    """
+    Stream a backup out of S3: concurrent ranged downloads, parallel gunzip, ordered writes
+
+    Uses the manifest to split the object on gzip member boundaries and checks
+    both SHA-256 sums. Objects without a manifest (single-stream gzip from the
+    old script) are downloaded and decompressed sequentially, unverified.
+    """
+
+    def __init__(self, s3, bucket: str, key: str, workers: Optional[int] = None, range_size: int = 32 * MB):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.workers = workers or os.cpu_count() or 1
+        self.range_size = range_size
+
+    def manifest(self) -> Optional[dict]:
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=self.key + MANIFEST_SUFFIX)["Body"].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(body)
+
+    def run(self, sink: BinaryIO) -> dict:
+        started = time.perf_counter()
+        manifest = self.manifest()
+        if manifest is None:
+            logger.warning("⚠️ No manifest for this backup; restoring sequentially without checksums")
+            raw_size, object_size = self._sequential(sink)
+        else:
+            raw_size, object_size = self._parallel(manifest, sink)
+        seconds = time.perf_counter() - started
+        logger.info(
+            f"✅ Backup restored | s3://{self.bucket}/{self.key} | Dump: {raw_size / MB:,.1f} MB | "
+            f"Object: {object_size / MB:,.1f} MB | Time: {seconds:.1f}s | Throughput: {_throughput(raw_size, seconds)}"
+        )
+        return {"raw_size": raw_size, "object_size": object_size, "seconds": round(seconds, 3), "verified": manifest is not None}
+
+    def _ranges(self, members: List[list]) -> List[List[list]]:
+        groups, group, size = [], [], 0
+        for member in members:
+            group.append(member)
+            size += member[1]
+            if size >= self.range_size:
+                groups.append(group)
+                group, size = [], 0
+        if group:
+            groups.append(group)
+        return groups
+
+    def _fetch(self, group: List[list]) -> Tuple[bytes, bytes]:
+        start = group[0][0]
+        end = group[-1][0] + group[-1][1] - 1
+        data = self.s3.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")["Body"].read()
+        if len(data) != end - start + 1:
+            raise BackupError(f"Short read for bytes {start}-{end}: {len(data)} bytes")
+        view = memoryview(data)
+        raw = b"".join(gzip.decompress(view[offset - start:offset - start + length]) for offset, length, _ in group)
+        expected = sum(raw_length for _, _, raw_length in group)
+        if len(raw) != expected:
+            raise BackupError(f"Bytes {start}-{end} decompressed to {len(raw)} bytes, expected {expected}")
+        return data, raw
+
+    def _parallel(self, manifest: dict, sink: BinaryIO) -> Tuple[int, int]:
+        raw_hash, object_hash = hashlib.sha256(), hashlib.sha256()
+        raw_size = object_size = 0
+        window = _Window(self.workers + 2)
+
+        def write(results):
+            nonlocal raw_size, object_size
+            for data, raw in results:
+                object_hash.update(data)
+                raw_hash.update(raw)
+                object_size += len(data)
+                raw_size += len(raw)
+                sink.write(raw)
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="restore") as pool:
+            try:
+                for group in self._ranges(manifest["members"]):
+                    write(window.add(pool.submit(self._fetch, group)))
+                write(window.finish())
+            except BaseException:
+                window.cancel()
+                raise
+
+        if object_hash.hexdigest() != manifest["object_sha256"]:
+            raise BackupError("Downloaded object does not match the SHA-256 in its manifest")
+        if raw_hash.hexdigest() != manifest["raw_sha256"]:
+            raise BackupError("Restored dump does not match the SHA-256 in its manifest")
+        return raw_size, object_size
+
+    def _sequential(self, sink: BinaryIO) -> Tuple[int, int]:
+        body = self.s3.get_object(Bucket=self.bucket, Key=self.key)["Body"]
+        decompressor = zlib.decompressobj(wbits=31)
+        raw_size = object_size = 0
+        for data in body.iter_chunks(chunk_size=MB):
+            object_size += len(data)
+            while data:
+                raw = decompressor.decompress(data)
+                raw_size += len(raw)
+                sink.write(raw)
+                # Concatenated gzip members: start over on what follows the member that ended
+                data = decompressor.unused_data if decompressor.eof else b""
+                if decompressor.eof:
+                    decompressor = zlib.decompressobj(wbits=31)
+        raw = decompressor.flush()
+        raw_size += len(raw)
+        sink.write(raw)
+        return raw_size, object_size
+
+
+def run_psql(psql_args: List[str], restore: Restore) -> dict:
+    """Restore straight into `psql <args>`"""
+    command = [os.getenv("PSQL", "psql"), *psql_args]
+    logger.info(f"🐘 Running {' '.join(command)}")
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        stats = restore.run(process.stdin)
+    finally:
+        process.stdin.close()
+    if process.wait() != 0:
+        raise BackupError(f"psql exited with status {process.returncode}")
+    return stats
+
+
+def _split_command(argv: List[str]) -> Tuple[List[str], Optional[List[str]]]:
+    """Arguments after `--` belong to pg_dump/psql"""
+    if "--" in argv:
+        i = argv.index("--")
+        return argv[:i], argv[i + 1:]
+    return argv, None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    own_args, command_args = _split_command(sys.argv[1:])
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint-url", help="S3 endpoint (MinIO, moto); default AWS_ENDPOINT_URL or AWS")
+    parser.add_argument("--workers", type=int, help="Compression/decompression threads (default: all cores)")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup_parser = commands.add_parser("backup", help="Dump to S3 (pg_dump arguments after --, else stdin)")
+    backup_parser.add_argument("url", help="s3://bucket/key; {date} becomes YYYYmmdd_HHMMSS")
+    backup_parser.add_argument("--chunk-mb", type=int, default=8, help="Dump bytes per gzip member")
+    backup_parser.add_argument("--part-mb", type=int, default=32, help="Multipart upload part size")
+    backup_parser.add_argument("--upload-workers", type=int, default=8, help="Concurrent part uploads")
+    backup_parser.add_argument("--level", type=int, default=6, help="gzip level")
+    restore_parser = commands.add_parser("restore", help="Restore from S3 (psql arguments after --, else --output)")
+    restore_parser.add_argument("url", help="s3://bucket/key of the .sql.gz")
+    restore_parser.add_argument("-o", "--output", help="Write the dump here (- for stdout)")
+    args = parser.parse_args(own_args)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+        stream=sys.stderr,
+    )
+    logging.getLogger("botocore").setLevel(logging.WARNING)
+
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    try:
+        bucket, key = parse_url(args.url)
+        s3 = s3_client(args.endpoint_url)
+        if args.command == "backup":
+            key = key.replace("{date}", datetime.now().strftime("%Y%m%d_%H%M%S"))
+            backup = Backup(
+                s3, bucket, key, chunk_size=args.chunk_mb * MB, part_size=args.part_mb * MB,
+                workers=args.workers, upload_workers=args.upload_workers, level=args.level,
+            )
+            if command_args is not None:
+                run_pg_dump(command_args, backup)
+            else:
+                backup.run(sys.stdin.buffer)
+        else:
+            restore = Restore(s3, bucket, key, workers=args.workers)
+            if command_args is not None:
+                run_psql(command_args, restore)
+            elif args.output in (None, "-"):
+                restore.run(sys.stdout.buffer)
+            else:
+                staging = f"{args.output}.partial"
+                with open(staging, "wb") as f:
+                    restore.run(f)
+                shutil.move(staging, args.output)
+    except (BackupError, BotoCoreError, ClientError, OSError) as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,484 @@
+"""
+Offline fakes for load testing the outbound AI agent.
+
+Local stand-ins for the STT, LLM and TTS plugins, the SIP API, the room and the
+job context, with configurable latency distributions. A FakeCallee scripts the
+person on the other end: it answers, optionally speaks first, says a few
+utterances and waits for the agent's reply to finish playing between them.
+Nothing here opens a network connection.
+"""
+
+import asyncio
+import itertools
+import math
+import random
+import time
+import uuid
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from livekit import api, rtc
+from livekit.agents import AgentSession, APIConnectOptions, llm, stt, tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN
+from livekit.agents.voice import io
+
+_WORDS = (
+    "yes that works for me thanks sure what time would be good I think tomorrow morning is fine "
+    "could you tell me a bit more about it I am not sure I have the account number with me right now"
+).split()
+
+_REPLIES = (
+    "Thanks for letting me know.",
+    "I can help you with that right away.",
+    "Let me check the details on your account.",
+    "Would tomorrow at ten in the morning work for you?",
+    "Great, I have updated that for you.",
+    "Is there anything else I can help you with today?",
+)
+
+
+class LatencyModel:
+    """
+    Log-normal latency distribution described by its median and p95, in seconds
+
+    A spec string is "median" for a fixed value or "median,p95".
+    """
+
+    def __init__(self, median: float, p95: Optional[float] = None, rng: Optional[random.Random] = None):
+        self.median = median
+        self.p95 = p95 if p95 is not None else median
+        self.rng = rng or random.Random()
+        self._mu = math.log(median) if median > 0 else 0.0
+        self._sigma = math.log(self.p95 / median) / 1.645 if median > 0 and self.p95 > median else 0.0
+
+    @classmethod
+    def parse(cls, spec: str, rng: Optional[random.Random] = None) -> "LatencyModel":
+        parts = [float(p) for p in spec.split(",")]
+        return cls(parts[0], parts[1] if len(parts) > 1 else None, rng=rng)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if not self._sigma:
+            return self.median
+        return self.rng.lognormvariate(self._mu, self._sigma)
+
+    def __repr__(self) -> str:
+        return f"{self.median},{self.p95}"
+
+
+class FakeCallee:
+    """
+    Scripted callee for one synthetic call.
+
+    Speaks first with probability `speak_first_rate`, otherwise waits for the
+    agent's greeting. Each utterance is followed by a wait for the agent's reply
+    to play out, then `think` seconds of silence. Hangs up after `turns`
+    utterances. The delay from the end of each utterance to the first reply
+    audio is kept in `response_latencies`.
+    """
+
+    def __init__(
+        self,
+        turns: int = 4,
+        speak_first_rate: float = 0.5,
+        think: Optional[LatencyModel] = None,
+        words_per_second: float = 2.5,
+        reply_timeout: float = 15.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self.turns = turns
+        self.speak_first_rate = speak_first_rate
+        self.rng = rng or random.Random()
+        self.think = think or LatencyModel(0.6, 1.5, rng=self.rng)
+        self.words_per_second = words_per_second
+        self.reply_timeout = reply_timeout
+        self.hangup = asyncio.Event()
+        self.response_latencies: List[float] = []
+        self.missed_replies = 0
+        self._speech_ended_at: Optional[float] = None
+        self._playouts = 0
+        self._playout_changed = asyncio.Event()
+
+    def utterance(self) -> str:
+        return " ".join(self.rng.choice(_WORDS) for _ in range(self.rng.randint(3, 12)))
+
+    def on_agent_audio(self):
+        """First frame of an agent reply reached the callee"""
+        if self._speech_ended_at is not None:
+            self.response_latencies.append(time.monotonic() - self._speech_ended_at)
+            self._speech_ended_at = None
+
+    def on_playout_finished(self):
+        self._playouts += 1
+        self._playout_changed.set()
+
+    async def _wait_for_reply(self, after: int) -> bool:
+        deadline = time.monotonic() + self.reply_timeout
+        while self._playouts <= after:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.missed_replies += 1
+                return False
+            self._playout_changed.clear()
+            try:
+                await asyncio.wait_for(self._playout_changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    async def speech_events(self, stt_latency: LatencyModel) -> AsyncIterator[stt.SpeechEvent]:
+        """Speech events as the STT would report them for this callee"""
+        try:
+            if self.rng.random() < self.speak_first_rate:
+                await asyncio.sleep(self.think.sample())
+            else:
+                await self._wait_for_reply(self._playouts)
+
+            for turn in range(self.turns):
+                text = self.utterance()
+                duration = len(text.split()) / self.words_per_second
+                request_id = uuid.uuid4().hex[:12]
+
+                yield stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH, request_id=request_id)
+                await asyncio.sleep(duration / 2)
+                partial = " ".join(text.split()[: max(1, len(text.split()) // 2)])
+                yield stt.SpeechEvent(
+                    type=stt.SpeechEventType.INTERIM_TRANSCRIPT,
+                    request_id=request_id,
+                    alternatives=[stt.SpeechData(language="en", text=partial)],
+                )
+                await asyncio.sleep(duration / 2)
+
+                playouts = self._playouts
+                self._speech_ended_at = time.monotonic()
+                await asyncio.sleep(stt_latency.sample())
+                yield stt.SpeechEvent(
+                    type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                    request_id=request_id,
+                    alternatives=[stt.SpeechData(language="en", text=text, confidence=0.95)],
+                )
+                yield stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH, request_id=request_id)
+
+                if not await self._wait_for_reply(playouts):
+                    break
+                if turn < self.turns - 1:
+                    await asyncio.sleep(self.think.sample())
+        finally:
+            self.hangup.set()
+
+
+class FakeSTT(stt.STT):
+    """Streaming STT that reports the current callee's speech after `latency`"""
+
+    def __init__(self, latency: LatencyModel):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self.latency = latency
+        self.callee: Optional[FakeCallee] = None
+
+    @property
+    def model(self) -> str:
+        return "fake-stt"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    async def _recognize_impl(self, buffer, *, language=NOT_GIVEN, conn_options: APIConnectOptions):
+        raise NotImplementedError("FakeSTT only supports streaming")
+
+    def stream(self, *, language=NOT_GIVEN, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "FakeSTTStream":
+        return FakeSTTStream(stt=self, callee=self.callee, conn_options=conn_options)
+
+
+class FakeSTTStream(stt.RecognizeStream):
+    def __init__(self, *, stt: FakeSTT, callee: Optional[FakeCallee], conn_options: APIConnectOptions):
+        super().__init__(stt=stt, conn_options=conn_options)
+        self._fake_stt = stt
+        self._callee = callee
+
+    async def _drain_input(self):
+        # Audio is consumed like a real STT would, but its content is ignored
+        async for _ in self._input_ch:
+            pass
+
+    async def _run(self):
+        drain = asyncio.create_task(self._drain_input())
+        try:
+            if self._callee is not None:
+                async for event in self._callee.speech_events(self._fake_stt.latency):
+                    self._event_ch.send_nowait(event)
+            await drain
+        finally:
+            drain.cancel()
+
+
+class FakeLLM(llm.LLM):
+    """LLM that streams a canned reply after `ttft`, at `tokens_per_second`"""
+
+    def __init__(self, ttft: LatencyModel, tokens_per_second: float = 80.0, reply_sentences: int = 2, rng=None):
+        super().__init__()
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.reply_sentences = reply_sentences
+        self.rng = rng or random.Random()
+
+    @property
+    def model(self) -> str:
+        return "fake-llm"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def chat(self, *, chat_ctx, tools=None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS, **kwargs) -> "FakeLLMStream":
+        return FakeLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self):
+        fake_llm: FakeLLM = self._llm
+        reply = " ".join(fake_llm.rng.choice(_REPLIES) for _ in range(fake_llm.reply_sentences))
+        request_id = uuid.uuid4().hex[:12]
+        prompt_tokens = sum(len(str(item.content)) for item in self._chat_ctx.items if hasattr(item, "content")) // 4
+
+        await asyncio.sleep(fake_llm.ttft.sample())
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / fake_llm.tokens_per_second)
+            self._event_ch.send_nowait(
+                llm.ChatChunk(
+                    id=request_id,
+                    delta=llm.ChoiceDelta(role="assistant", content=word if i == 0 else f" {word}"),
+                )
+            )
+        self._event_ch.send_nowait(
+            llm.ChatChunk(
+                id=request_id,
+                usage=llm.CompletionUsage(
+                    completion_tokens=len(words),
+                    prompt_tokens=prompt_tokens,
+                    total_tokens=prompt_tokens + len(words),
+                ),
+            )
+        )
+
+
+class FakeTTS(tts.TTS):
+    """
+    Non-streaming TTS returning silence after `ttfb`
+
+    Audio length follows the text at `chars_per_second` and is delivered
+    `speedup` times faster than real time, like a provider streaming a clip.
+    """
+
+    def __init__(self, ttfb: LatencyModel, sample_rate: int = 24000, chars_per_second: float = 15.0, speedup: float = 4.0):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=sample_rate,
+            num_channels=1,
+        )
+        self.ttfb = ttfb
+        self.chars_per_second = chars_per_second
+        self.speedup = speedup
+
+    @property
+    def model(self) -> str:
+        return "fake-tts"
+
+    @property
+    def provider(self) -> str:
+        return "fake"
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "FakeChunkedStream":
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter):
+        fake_tts: FakeTTS = self._tts
+        output_emitter.initialize(
+            request_id=uuid.uuid4().hex[:12],
+            sample_rate=fake_tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        await asyncio.sleep(fake_tts.ttfb.sample())
+
+        seconds = max(0.2, len(self.input_text) / fake_tts.chars_per_second)
+        chunk_seconds = 0.1
+        chunk = b"\x00\x00" * int(fake_tts.sample_rate * chunk_seconds)
+        for i in range(math.ceil(seconds / chunk_seconds)):
+            if i:
+                await asyncio.sleep(chunk_seconds / fake_tts.speedup)
+            output_emitter.push(chunk)
+        output_emitter.flush()
+
+
+class FakeAudioInput(io.AudioInput):
+    """Real-time paced 20ms frames of silence from the callee"""
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20):
+        super().__init__(label="fake-callee")
+        self.sample_rate = sample_rate
+        self.frame_seconds = frame_ms / 1000
+        self.samples = sample_rate * frame_ms // 1000
+        self._next = None
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        now = time.monotonic()
+        self._next = now if self._next is None else self._next + self.frame_seconds
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+        return rtc.AudioFrame(
+            data=b"\x00\x00" * self.samples,
+            sample_rate=self.sample_rate,
+            num_channels=1,
+            samples_per_channel=self.samples,
+        )
+
+
+class FakeAudioOutput(io.AudioOutput):
+    """Plays agent audio out to the callee in real time and reports playback as a room would"""
+
+    def __init__(self, callee: Optional[FakeCallee] = None):
+        super().__init__(label="fake-callee", next_in_chain=None, sample_rate=None)
+        self.callee = callee
+        self._capturing_since: Optional[float] = None
+        self._pushed = 0.0
+        self._play_end = 0.0
+        self._playouts: List[asyncio.Task] = []
+
+    async def capture_frame(self, frame: rtc.AudioFrame):
+        await super().capture_frame(frame)
+        if self._capturing_since is None:
+            self._capturing_since = time.monotonic()
+            self._pushed = 0.0
+            if self.callee and self._capturing_since >= self._play_end:
+                self.callee.on_agent_audio()
+        self._pushed += frame.duration
+
+    def flush(self):
+        super().flush()
+        if self._capturing_since is None:
+            return
+        # Segments play back to back, each starting when its first frame arrived
+        start = max(self._capturing_since, self._play_end)
+        self._play_end = start + self._pushed
+        self._capturing_since = None
+        self._playouts.append(asyncio.create_task(self._finish(self._play_end, self._pushed)))
+
+    async def _finish(self, end: float, pushed: float):
+        await asyncio.sleep(max(0.0, end - time.monotonic()))
+        self._playouts.remove(asyncio.current_task())
+        self.on_playback_finished(playback_position=pushed, interrupted=False)
+        if self.callee:
+            self.callee.on_playout_finished()
+
+    def clear_buffer(self):
+        interrupted = len(self._playouts) + (self._capturing_since is not None)
+        for task in self._playouts:
+            task.cancel()
+        self._playouts = []
+        self._capturing_since = None
+        self._play_end = time.monotonic()
+        for _ in range(interrupted):
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+            if self.callee:
+                self.callee.on_playout_finished()
+
+
+class OfflineAgentSession(AgentSession):
+    """AgentSession wired to the fake callee instead of a LiveKit room"""
+
+    def __init__(self, *, callee: FakeCallee, **kwargs):
+        super().__init__(**kwargs)
+        self.callee = callee
+
+    async def start(self, agent, *, room=None, room_input_options=None, room_output_options=None):
+        self.input.audio = FakeAudioInput()
+        self.output.audio = FakeAudioOutput(self.callee)
+        await super().start(agent)
+
+
+class FakeSIP:
+    """
+    Stand-in for `ctx.api.sip`: answers after `answer` seconds, or fails
+
+    Failures are drawn from (sip_status_code, sip_status) pairs in `failures`,
+    so both callee outcomes (busy, no answer) and trunk faults can be simulated.
+    """
+
+    DEFAULT_FAILURES = (("486", "Busy Here"), ("480", "Temporarily Unavailable"), ("503", "Service Unavailable"))
+
+    def __init__(self, answer: LatencyModel, failure_rate: float = 0.0, failures=DEFAULT_FAILURES, rng=None):
+        self.answer = answer
+        self.failure_rate = failure_rate
+        self.failures = failures
+        self.rng = rng or random.Random()
+        self.dialed = 0
+
+    async def create_sip_participant(self, request: api.CreateSIPParticipantRequest):
+        self.dialed += 1
+        await asyncio.sleep(self.answer.sample())
+        if self.rng.random() < self.failure_rate:
+            code, status = self.rng.choice(self.failures)
+            raise api.TwirpError(
+                "unavailable",
+                f"call to {request.sip_call_to} failed",
+                status=503,
+                metadata={"sip_status_code": code, "sip_status": status},
+            )
+        return SimpleNamespace(participant_identity=request.participant_identity, room_name=request.room_name)
+
+
+class FakeRoomService:
+    """Stand-in for `ctx.api.room`: keeps the metadata the agent leaves for the dialer"""
+
+    def __init__(self):
+        self.metadata: Dict[str, str] = {}
+
+    async def update_room_metadata(self, request: api.UpdateRoomMetadataRequest):
+        self.metadata[request.room] = request.metadata
+
+
+class FakeRoom(rtc.EventEmitter):
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+
+    def isconnected(self) -> bool:
+        return True
+
+
+_job_ids = itertools.count()
+
+
+class FakeJobContext:
+    """The subset of JobContext the entrypoint uses"""
+
+    def __init__(self, userdata: dict, metadata: str, sip: FakeSIP, connect_latency: Optional[LatencyModel] = None):
+        job_id = next(_job_ids)
+        self.proc = SimpleNamespace(userdata=userdata)
+        self.job = SimpleNamespace(id=f"AJ_fake_{job_id}", metadata=metadata, agent_name="load-test")
+        self.room = FakeRoom(f"load-test-{uuid.uuid4().hex[:8]}")
+        self.api = SimpleNamespace(sip=sip, room=FakeRoomService())
+        self.connect_latency = connect_latency or LatencyModel(0.05)
+        self.shutdown_callbacks: List[Callable] = []
+        self.shutdown_requested = asyncio.Event()
+
+    async def connect(self):
+        await asyncio.sleep(self.connect_latency.sample())
+
+    def add_shutdown_callback(self, callback: Callable):
+        self.shutdown_callbacks.append(callback)
+
+    def shutdown(self, reason: str = ""):
+        self.shutdown_requested.set()
+
+    async def run_shutdown_callbacks(self):
+        for callback in self.shutdown_callbacks:
+            result = callback()
+            if asyncio.iscoroutine(result):
+                await result
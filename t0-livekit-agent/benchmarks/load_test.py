@@ -0,0 +1,396 @@
+"""
+Offline load test for the outbound AI agent.
+
+Runs the real `entrypoint` and AgentSession against the local fakes in
+fake_providers.py. Each worker process stands in for one LiveKit job process
+and handles one call at a time, back to back; processes are started evenly
+over the ramp, so `--calls` is the peak number of concurrent calls. Results go
+to a JSON file that can be diffed across releases with `--baseline`.
+
+The parent samples the worker load function (worker_load.py) over its process
+tree the way a LiveKit worker would, so the report shows the calibrated
+per-call CPU cost and at how many concurrent calls the worker would stop
+accepting jobs.
+
+    python benchmarks/load_test.py --calls 20 --ramp 30 --duration 120
+    python benchmarks/load_test.py --calls 40 --llm-ttft 0.4,1.2 --baseline results/v1.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the agent offline and quiet; set before main.py reads its settings
+_OFFLINE_ENV = {
+    "LOG_LEVEL": "WARNING",
+    "LATENCY_METRICS_PORT": "0",
+    "TTS_CACHE_DIR": "",
+    "WEBHOOK_URL": "",
+    "GREETING_STATS_PATH": "",
+    "CALL_STORE_DIR": "",
+    "SIP_OUTBOUND_TRUNKS": "",
+}
+
+
+def _histogram_state(histogram) -> dict:
+    return {"counts": histogram.counts, "count": histogram.count, "total": histogram.total, "max": histogram.max}
+
+
+def _load_histogram(state: dict):
+    from latency_tracker import LatencyHistogram
+
+    histogram = LatencyHistogram()
+    histogram.counts = state["counts"]
+    histogram.count = state["count"]
+    histogram.total = state["total"]
+    histogram.max = state["max"]
+    return histogram
+
+
+async def _run_call(main, args, userdata: dict, sip, rng: random.Random, index: int) -> dict:
+    from fake_providers import FakeCallee, FakeJobContext, LatencyModel, OfflineAgentSession
+
+    callee = FakeCallee(
+        turns=args.turns,
+        speak_first_rate=args.speak_first_rate,
+        think=LatencyModel.parse(args.think, rng=rng),
+        rng=rng,
+    )
+    userdata["stt"].callee = callee
+    metadata = json.dumps({
+        "phone_number": f"+1555{os.getpid() % 1000:03d}{index:04d}",
+        "prompt": "You are calling to confirm an appointment. Be brief and friendly.",
+    })
+    ctx = FakeJobContext(userdata, metadata, sip, connect_latency=LatencyModel.parse(args.connect, rng=rng))
+
+    sessions = []
+
+    def session_factory(**kwargs):
+        session = OfflineAgentSession(callee=callee, **kwargs)
+        sessions.append(session)
+        return session
+
+    main.AgentSession = session_factory
+    started = time.monotonic()
+    outcome = "completed"
+    try:
+        entry = asyncio.create_task(main.entrypoint(ctx))
+        shutdown = asyncio.create_task(ctx.shutdown_requested.wait())
+        await asyncio.wait({entry, shutdown}, timeout=args.call_timeout, return_when=asyncio.FIRST_COMPLETED)
+        if shutdown.done():
+            # The entrypoint asked to end the job (failed dial); a real worker would stop it here
+            entry.cancel()
+            outcome = "failed"
+        elif entry.done():
+            entry.result()
+            remaining = args.call_timeout - (time.monotonic() - started)
+            try:
+                await asyncio.wait_for(callee.hangup.wait(), timeout=max(0.0, remaining))
+            except asyncio.TimeoutError:
+                outcome = "timed_out"
+        else:
+            entry.cancel()
+            outcome = "timed_out"
+        shutdown.cancel()
+
+        if outcome != "failed":
+            ctx.room.emit("participant_disconnected", _Participant(json.loads(metadata)["phone_number"]))
+    except Exception as e:
+        outcome = f"error: {type(e).__name__}: {e}"
+    finally:
+        for session in sessions:
+            await session.aclose()
+        await ctx.run_shutdown_callbacks()
+
+    return {
+        "outcome": outcome,
+        "duration": time.monotonic() - started,
+        "response_latencies": callee.response_latencies,
+        "missed_replies": callee.missed_replies,
+    }
+
+
+class _Participant:
+    def __init__(self, identity: str):
+        self.identity = identity
+
+
+async def _worker_main(worker_id: int, args, start_delay: float, deadline: float) -> dict:
+    import psutil
+
+    import main
+    from fake_providers import FakeLLM, FakeSIP, FakeSTT, FakeTTS, LatencyModel
+    from latency_tracker import LatencyHistogram, worker_stats
+
+    rng = random.Random(args.seed * 1000 + worker_id)
+    userdata = {
+        "vad": None,
+        "stt": FakeSTT(LatencyModel.parse(args.stt_latency, rng=rng)),
+        "llm": FakeLLM(LatencyModel.parse(args.llm_ttft, rng=rng), tokens_per_second=args.llm_tps, rng=rng),
+        "tts": FakeTTS(LatencyModel.parse(args.tts_ttfb, rng=rng)),
+        # Turns end on the fake STT's end-of-speech; the turn detector model isn't exercised
+        "turn_detection": "stt",
+        "prewarm_time": 0.0,
+    }
+    sip = FakeSIP(LatencyModel.parse(args.answer, rng=rng), failure_rate=args.failure_rate, rng=rng)
+
+    loop_lag = LatencyHistogram()
+    response = LatencyHistogram()
+    process = psutil.Process()
+    rss_peak = 0
+    done = asyncio.Event()
+
+    async def probe():
+        nonlocal rss_peak
+        loop = asyncio.get_running_loop()
+        last_rss = 0.0
+        while not done.is_set():
+            expected = loop.time() + args.tick
+            await asyncio.sleep(args.tick)
+            loop_lag.record(max(0.0, loop.time() - expected))
+            if loop.time() - last_rss >= 1.0:
+                rss_peak = max(rss_peak, process.memory_info().rss)
+                last_rss = loop.time()
+
+    await asyncio.sleep(start_delay)
+    probe_task = asyncio.create_task(probe())
+    cpu_start = process.cpu_times()
+    active_start = time.time()
+    outcomes = {}
+    missed_replies = 0
+    calls = 0
+
+    while time.time() < deadline:
+        result = await _run_call(main, args, userdata, sip, rng, calls)
+        calls += 1
+        outcome = result["outcome"] if not result["outcome"].startswith("error") else "error"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome == "error" and args.verbose:
+            print(f"worker {worker_id}: {result['outcome']}", file=sys.stderr)
+        missed_replies += result["missed_replies"]
+        for latency in result["response_latencies"]:
+            response.record(latency)
+
+    done.set()
+    await probe_task
+    cpu_end = process.cpu_times()
+    rss_peak = max(rss_peak, process.memory_info().rss)
+
+    return {
+        "worker": worker_id,
+        "pid": os.getpid(),
+        "calls": calls,
+        "outcomes": outcomes,
+        "missed_replies": missed_replies,
+        "active_start": active_start,
+        "active_end": time.time(),
+        "cpu_seconds": (cpu_end.user + cpu_end.system) - (cpu_start.user + cpu_start.system),
+        "rss_peak_bytes": rss_peak,
+        "histograms": {
+            "response": _histogram_state(response),
+            "loop_lag": _histogram_state(loop_lag),
+            **{f"turn_{stage}": _histogram_state(h) for stage, h in worker_stats.histograms.items()},
+        },
+    }
+
+
+def _worker(worker_id: int, args, start_delay: float, deadline: float, results):
+    os.environ.update({k: v for k, v in _OFFLINE_ENV.items() if k not in os.environ})
+    sys.path.insert(0, AGENT_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        results.put(asyncio.run(_worker_main(worker_id, args, start_delay, deadline)))
+    except BaseException as e:
+        results.put({"worker": worker_id, "error": f"{type(e).__name__}: {e}"})
+        raise
+
+
+def _sample_load(args, starts: list, deadline: float, stop: threading.Event, samples: list, load_state: dict):
+    """Sample the worker load function every `--load-interval`, counting started processes as active jobs"""
+    sys.path.insert(0, AGENT_DIR)
+    from worker_load import WorkerLoad
+
+    load = WorkerLoad()
+    while not stop.wait(args.load_interval):
+        now = time.time()
+        active = sum(1 for started in starts if started <= now < deadline)
+        value = load.sample(active)
+        samples.append({"t": round(now - starts[0], 2), "active": active, "load": round(value, 4), "loop_lag_ms": round(load.loop_lag * 1000, 2)})
+    load_state.update(load.stats())
+
+
+def _load_summary(samples: list, load_state: dict) -> dict:
+    if not samples:
+        return {}
+    loads = sorted(s["load"] for s in samples)
+    threshold = load_state.get("threshold", 1.0)
+    full = [s["active"] for s in samples if s["load"] >= threshold]
+    return {
+        "max": loads[-1],
+        "p95": loads[int(0.95 * (len(loads) - 1))],
+        "full_at_calls": min(full) if full else None,
+        "loop_lag_ms_max": max(s["loop_lag_ms"] for s in samples),
+        **{k: load_state[k] for k in ("threshold", "cores", "idle_cores", "job_cores", "capacity") if k in load_state},
+    }
+
+
+def _summarize(args, workers: list, wall_seconds: float, load_samples: list = (), load_state: dict = None) -> dict:
+    sys.path.insert(0, AGENT_DIR)
+    from latency_tracker import LatencyHistogram
+
+    merged = {}
+    for worker in workers:
+        for name, state in worker.get("histograms", {}).items():
+            merged.setdefault(name, LatencyHistogram()).merge(_load_histogram(state))
+
+    ok = [w for w in workers if "error" not in w]
+    calls = sum(w["calls"] for w in ok)
+    outcomes = {}
+    for w in ok:
+        for outcome, count in w["outcomes"].items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    cpu_seconds = sum(w["cpu_seconds"] for w in ok)
+    # Throughput over the window calls were running, not process startup
+    window = max(w["active_end"] for w in ok) - min(w["active_start"] for w in ok) if ok else 0.0
+    rss_mb = sorted(w["rss_peak_bytes"] / 2**20 for w in ok)
+
+    return {
+        "run": {
+            "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "wall_seconds": round(wall_seconds, 3),
+            "active_seconds": round(window, 3),
+        },
+        "config": {k: v for k, v in sorted(vars(args).items()) if k not in ("output", "baseline", "verbose")},
+        "calls": {
+            "total": calls,
+            **outcomes,
+            "missed_replies": sum(w["missed_replies"] for w in ok),
+            "worker_errors": [w["error"] for w in workers if "error" in w],
+        },
+        "jobs_per_second": round(calls / window, 4) if window else 0.0,
+        "response_latency": merged["response"].summary() if "response" in merged else {},
+        "turn_latency": {
+            name[len("turn_"):]: h.summary() for name, h in sorted(merged.items()) if name.startswith("turn_") and h.count
+        },
+        "loop_lag": merged["loop_lag"].summary() if "loop_lag" in merged else {},
+        "cpu": {
+            "seconds_per_call": round(cpu_seconds / calls, 4) if calls else 0.0,
+            "total_seconds": round(cpu_seconds, 3),
+            "host_cores_used": round(cpu_seconds / window, 3) if window else 0.0,
+        },
+        "rss_per_process_mb": {
+            "p50": round(rss_mb[len(rss_mb) // 2], 1) if rss_mb else 0.0,
+            "max": round(rss_mb[-1], 1) if rss_mb else 0.0,
+        },
+        "worker_load": _load_summary(list(load_samples), load_state or {}),
+    }
+
+
+# Lower is better for every compared metric except throughput
+_COMPARED = (
+    ("jobs_per_second",),
+    ("response_latency", "p50"),
+    ("response_latency", "p95"),
+    ("turn_latency", "e2e", "p95"),
+    ("loop_lag", "p99"),
+    ("cpu", "seconds_per_call"),
+    ("rss_per_process_mb", "max"),
+    ("worker_load", "job_cores"),
+)
+
+
+def _lookup(result: dict, path: tuple):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def print_comparison(result: dict, baseline: dict):
+    for path in _COMPARED:
+        new, old = _lookup(result, path), _lookup(baseline, path)
+        if new is None or old is None:
+            continue
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"{'.'.join(path):32} {old:>10} -> {new:<10} {change}")
+
+
+def run(args) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start = time.time()
+    # Every process gets the same end time, so the last ones started still run a few calls
+    deadline = start + args.ramp + args.duration
+    processes = []
+    starts = []
+    for worker_id in range(args.calls):
+        delay = args.ramp * worker_id / args.calls
+        process = context.Process(target=_worker, args=(worker_id, args, delay, deadline, results), daemon=True)
+        process.start()
+        processes.append(process)
+        starts.append(start + delay)
+
+    stop = threading.Event()
+    load_samples, load_state = [], {}
+    sampler = threading.Thread(target=_sample_load, args=(args, starts, deadline, stop, load_samples, load_state), daemon=True)
+    sampler.start()
+
+    workers = []
+    try:
+        for _ in processes:
+            workers.append(results.get(timeout=args.ramp + args.duration + args.call_timeout + 120))
+    finally:
+        stop.set()
+        sampler.join(timeout=10)
+    for process in processes:
+        process.join(timeout=10)
+    return _summarize(args, workers, time.time() - start, load_samples, load_state)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=10, help="Peak concurrent calls, one job process each")
+    parser.add_argument("--ramp", type=float, default=10.0, help="Seconds over which processes are started")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run at peak after the ramp")
+    parser.add_argument("--turns", type=int, default=4, help="Callee utterances per call")
+    parser.add_argument("--speak-first-rate", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="Share of dials that fail")
+    parser.add_argument("--answer", default="2.0,6.0", help="Dial to answer latency: median[,p95] seconds")
+    parser.add_argument("--connect", default="0.05,0.2", help="Room connect latency")
+    parser.add_argument("--stt-latency", default="0.15,0.35", help="End of speech to final transcript")
+    parser.add_argument("--llm-ttft", default="0.35,0.9", help="LLM time to first token")
+    parser.add_argument("--llm-tps", type=float, default=80.0, help="LLM tokens per second")
+    parser.add_argument("--tts-ttfb", default="0.2,0.5", help="TTS time to first byte")
+    parser.add_argument("--think", default="0.6,1.5", help="Callee pause before speaking")
+    parser.add_argument("--call-timeout", type=float, default=120.0)
+    parser.add_argument("--tick", type=float, default=0.01, help="Loop lag probe interval")
+    parser.add_argument("--load-interval", type=float, default=0.5, help="Worker load sampling interval")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    result = run(args)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+    print(json.dumps({k: result[k] for k in ("calls", "jobs_per_second", "response_latency", "cpu")}, indent=2))
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            print_comparison(result, json.load(f))
@@ -0,0 +1,106 @@
+"""
+Event-loop stall microbenchmark for logger.py.
+
+Simulates N concurrent calls, each logging call/cost events and DEBUG chatter
+on the event loop, while a ticker measures how late the loop wakes up. The
+console stream can be slowed down to mimic a blocked pipe or busy terminal.
+
+    python benchmarks/logging_bench.py --calls 50 --slow-io-ms 0.5
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logger as agent_logger  # noqa: E402
+
+
+class SlowStream:
+    """Text stream whose writes take `delay` seconds, like a slow pipe"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+async def _call(log: logging.Logger, call_id: int, events: int, interval: float):
+    room = f"room-{call_id}"
+    for i in range(events):
+        agent_logger.log_call_event("CALL ANSWERED", phone_number=f"+1555{call_id:07d}", room_name=room)
+        agent_logger.log_cost_event("COST UPDATE", total_cost=i * 1.25, room_name=room)
+        log.debug("frame %d for %s", i, room)
+        await asyncio.sleep(interval)
+
+
+async def _measure(calls: int, events: int, interval: float, tick: float):
+    log = agent_logger.get_logger("bench")
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + tick
+            await asyncio.sleep(tick)
+            lags.append(max(0.0, loop.time() - expected))
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(_call(log, c, events, interval) for c in range(calls)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+    return lags, elapsed
+
+
+def run(mode: str, args) -> dict:
+    stream = SlowStream(args.slow_io_ms / 1000)
+    agent_logger.setup_logging(
+        level="DEBUG",
+        environment="production",
+        use_queue=(mode == "queue"),
+        log_format=args.format,
+        stream=stream,
+    )
+    lags, elapsed = asyncio.run(_measure(args.calls, args.events, args.interval, args.tick))
+    agent_logger._stop_listener()
+
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    return {
+        "mode": mode,
+        "elapsed_s": round(elapsed, 3),
+        "lag_p50_ms": round(statistics.median(lags_ms), 3),
+        "lag_p99_ms": round(lags_ms[int(len(lags_ms) * 0.99) - 1], 3),
+        "lag_max_ms": round(lags_ms[-1], 3),
+        "writes": stream.writes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--events", type=int, default=100, help="Events per call")
+    parser.add_argument("--interval", type=float, default=0.01, help="Seconds between a call's events")
+    parser.add_argument("--tick", type=float, default=0.005, help="Loop lag probe interval")
+    parser.add_argument("--slow-io-ms", type=float, default=0.2, help="Simulated cost of each console write")
+    parser.add_argument("--format", choices=["text", "json"], default="json")
+    args = parser.parse_args()
+
+    for mode in ("sync", "queue"):
+        result = run(mode, args)
+        print(" | ".join(f"{k}={v}" for k, v in result.items()))
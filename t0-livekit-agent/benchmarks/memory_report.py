@@ -0,0 +1,108 @@
+"""
+Memory footprint of idle prewarmed job processes.
+
+Starts `--processes` job-like processes per mode, each loading the VAD the way
+`prewarm` does (plus any `--imports`), waits until all are idle and reports
+per-process unique (USS), shared and proportional (PSS) memory. `private`
+loads weights into each process; `mapped` memory-maps the host-shared copy
+from MODEL_CACHE_DIR. Processes per GB is estimated from PSS.
+
+    python benchmarks/memory_report.py --processes 8
+    python benchmarks/memory_report.py --processes 8 --imports livekit.agents,torch --output results/memory.json
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VAD_OPTIONS = {"min_speech_duration": 0.03, "min_silence_duration": 0.2, "prefix_padding_duration": 0.3}
+
+
+def _idle_process(mode: str, imports: list, cache_dir: str, ready, done):
+    sys.path.insert(0, AGENT_DIR)
+    os.environ["LOG_LEVEL"] = "WARNING"
+    os.environ["MODEL_CACHE_DIR"] = cache_dir if mode == "mapped" else ""
+
+    import numpy as np
+
+    for name in imports:
+        importlib.import_module(name)
+
+    import model_store
+    from livekit.plugins import silero
+
+    vad = model_store.load_mapped_vad(**VAD_OPTIONS) if mode == "mapped" else silero.VAD.load(**VAD_OPTIONS)
+    # One inference, as after the first call, so lazily allocated buffers are counted
+    from livekit.plugins.silero import onnx_model
+
+    onnx_model.OnnxModel(onnx_session=vad._onnx_session, sample_rate=16000)(np.zeros(512, dtype=np.float32))
+    ready.release()
+    done.wait()
+
+
+def measure(mode: str, processes: int, imports: list, cache_dir: str) -> dict:
+    sys.path.insert(0, AGENT_DIR)
+    from model_store import process_memory
+
+    ctx = multiprocessing.get_context("spawn")
+    ready, done = ctx.Semaphore(0), ctx.Event()
+    workers = [ctx.Process(target=_idle_process, args=(mode, imports, cache_dir, ready, done)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for _ in workers:
+            ready.acquire()
+        samples = [process_memory(str(worker.pid)) for worker in workers]
+    finally:
+        done.set()
+        for worker in workers:
+            worker.join()
+
+    def mean(key: str) -> float:
+        return sum(s[key] for s in samples) / len(samples) / 1024 / 1024
+
+    pss = mean("proportional")
+    return {
+        "mode": mode,
+        "processes": processes,
+        "rss_mb": round(mean("rss"), 2),
+        "unique_mb": round(mean("unique"), 2),
+        "shared_mb": round(mean("shared"), 2),
+        "pss_mb": round(pss, 2),
+        "processes_per_gb": round(1024 / pss, 1) if pss else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--modes", default="private,mapped")
+    parser.add_argument("--imports", default="", help="Comma separated modules every process imports first, e.g. torch")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    imports = [name for name in args.imports.split(",") if name]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="model-cache-") as cache_dir:
+        # On a live host the first prewarm exports once; don't measure the export itself
+        sys.path.insert(0, AGENT_DIR)
+        import model_store
+
+        model_store.export_mapped_model(model_store.silero_model_path(), "silero_vad", cache_dir)
+        for mode in args.modes.split(","):
+            results.append(measure(mode, args.processes, imports, cache_dir))
+
+    print(f"{'mode':<10}{'RSS':>10}{'unique':>10}{'shared':>10}{'PSS':>10}{'procs/GB':>10}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['rss_mb']:>10.1f}{r['unique_mb']:>10.1f}{r['shared_mb']:>10.1f}{r['pss_mb']:>10.1f}{r['processes_per_gb']:>10.1f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"imports": imports, "results": results}, f, indent=2)
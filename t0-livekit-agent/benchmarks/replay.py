@@ -0,0 +1,518 @@
+"""
+Replay recorded call traces offline on a virtual clock.
+
+A trace recorded with CALL_TRACE_DIR is played back through the real
+`entrypoint` and AgentSession: the callee's audio and STT events arrive at their
+recorded times, and the LLM and TTS answer with their recorded token and chunk
+timings. Time is virtual, so a 10 minute call replays in seconds and the same
+trace always produces the same timings; only the pipeline settings change.
+
+The trace is replayed once with its recorded session options and once with the
+`--set` overrides, and response latency is compared turn by turn:
+
+    python benchmarks/replay.py traces/room-abc.ctr --set min_endpointing_delay=0.5
+    python benchmarks/replay.py traces/room-abc.ctr --set preemptive_generation=false --output cmp.json
+    python benchmarks/replay.py traces/room-abc.ctr --info --start 120 --end 130
+
+Turn detection follows the recorded STT end-of-speech events (or the Silero VAD
+on the recorded audio with `--vad`); the multilingual turn detector needs the
+worker's inference process and is not replayed. The speculative greeting calls
+the LLM and TTS outside the traced pipeline nodes, so it replays with median
+recorded timings.
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("LATENCY_METRICS_PORT", "0")
+os.environ.setdefault("TTS_CACHE_DIR", "")
+os.environ.setdefault("WEBHOOK_URL", "")
+
+from livekit import rtc  # noqa: E402
+from livekit.agents import APIConnectOptions, AgentSession, llm, stt, tts  # noqa: E402
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN  # noqa: E402
+from livekit.agents.voice import io  # noqa: E402
+
+from call_trace import RecordKind, TraceReader, turn_latencies  # noqa: E402
+from core import settings  # noqa: E402
+from fake_providers import FakeAudioOutput, FakeJobContext, FakeSIP, LatencyModel  # noqa: E402
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop whose clock only moves when nothing is runnable
+
+    When no callbacks are ready and no executor work is outstanding, time jumps
+    straight to the next timer, so sleeps cost nothing and CPU work takes zero
+    virtual time. Relies on CPython's BaseEventLoop internals.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._virtual_now = 0.0
+        self._executor_pending = 0
+
+    def time(self) -> float:
+        return self._virtual_now
+
+    def run_in_executor(self, executor, func, *args):
+        self._executor_pending += 1
+        future = super().run_in_executor(executor, func, *args)
+
+        def done(_):
+            self._executor_pending -= 1
+
+        future.add_done_callback(done)
+        return future
+
+    def _run_once(self):
+        if not self._ready and not self._executor_pending:
+            while self._scheduled and self._scheduled[0]._cancelled:
+                handle = heapq.heappop(self._scheduled)
+                handle._scheduled = False
+                self._timer_cancelled_count -= 1
+            if self._scheduled:
+                self._virtual_now = max(self._virtual_now, self._scheduled[0]._when)
+        super()._run_once()
+
+
+class _VirtualTime:
+    """Point time.time/monotonic/perf_counter at the loop's virtual clock while replaying"""
+
+    _PATCHED = ("time", "monotonic", "perf_counter")
+
+    def __init__(self, loop: VirtualClockLoop, wall_start: float):
+        self.loop = loop
+        self.wall_start = wall_start
+        self._saved = {}
+
+    def __enter__(self):
+        self._saved = {name: getattr(time, name) for name in self._PATCHED}
+        time.time = lambda: self.wall_start + self.loop.time()
+        time.monotonic = self.loop.time
+        time.perf_counter = self.loop.time
+        return self
+
+    def __exit__(self, *exc):
+        for name, fn in self._saved.items():
+            setattr(time, name, fn)
+
+
+class ReplayScript:
+    """Everything the replay providers need from one trace, on the trace's timeline"""
+
+    def __init__(self, reader: TraceReader):
+        self.reader = reader
+        self.stt_events: List[tuple] = []
+        self.llm: List[dict] = []
+        self.tts: List[dict] = []
+        self.sip: List[tuple] = []
+        self.has_audio = False
+        self.origin = 0.0
+
+        llm_by_id: Dict[str, dict] = {}
+        tts_by_id: Dict[str, dict] = {}
+        for record in reader.records():
+            if record.kind == RecordKind.AUDIO_IN:
+                self.has_audio = True
+                continue
+            data = record.json()
+            if record.kind == RecordKind.STT:
+                self.stt_events.append((record.ts, data))
+            elif record.kind == RecordKind.LLM_REQUEST:
+                llm_by_id[data["id"]] = {"user_text": data.get("user_text"), "ts": record.ts, "tokens": [], "used": False}
+                self.llm.append(llm_by_id[data["id"]])
+            elif record.kind == RecordKind.LLM_TOKEN and data["id"] in llm_by_id:
+                request = llm_by_id[data["id"]]
+                request["tokens"].append((record.ts - request["ts"], data["content"]))
+            elif record.kind == RecordKind.TTS_START:
+                tts_by_id[data["id"]] = {"ts": record.ts, "chunks": [], "text": ""}
+                self.tts.append(tts_by_id[data["id"]])
+            elif record.kind == RecordKind.TTS_CHUNK and data["id"] in tts_by_id:
+                synthesis = tts_by_id[data["id"]]
+                synthesis["chunks"].append((record.ts - synthesis["ts"], data["duration"]))
+            elif record.kind == RecordKind.TTS_DONE and data["id"] in tts_by_id:
+                tts_by_id[data["id"]]["text"] = data["text"]
+            elif record.kind == RecordKind.SIP:
+                self.sip.append((record.ts, data))
+
+        ttfts = [r["tokens"][0][0] for r in self.llm if r["tokens"]]
+        ttfbs = [s["chunks"][0][0] for s in self.tts if s["chunks"]]
+        self.median_ttft = statistics.median(ttfts) if ttfts else 0.5
+        self.median_ttfb = statistics.median(ttfbs) if ttfbs else 0.3
+
+    def answer_latency(self) -> float:
+        dialing = next((ts for ts, d in self.sip if d.get("status") == "dialing"), None)
+        answered = next((ts for ts, d in self.sip if d.get("status") == "answered"), None)
+        if dialing is None or answered is None:
+            return 0.0
+        return answered - dialing
+
+    async def sleep_until(self, ts: float):
+        loop = asyncio.get_running_loop()
+        delay = self.origin + ts - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def find_llm(self, user_text: Optional[str]) -> Optional[dict]:
+        unused = [r for r in self.llm if not r["used"]]
+        match = next((r for r in unused if r["user_text"] == user_text), None)
+        if match is None and user_text is not None:
+            match = next((r for r in unused if r["user_text"] is not None), None)
+        if match is not None:
+            match["used"] = True
+        return match
+
+    def find_tts(self, text: str) -> Optional[dict]:
+        normalized = " ".join(text.split())
+        return next((s for s in self.tts if normalized and normalized in " ".join(s["text"].split())), None)
+
+
+class ReplaySTT(stt.STT):
+    def __init__(self, script: ReplayScript):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self.script = script
+
+    @property
+    def model(self) -> str:
+        return "replay"
+
+    @property
+    def provider(self) -> str:
+        return "replay"
+
+    async def _recognize_impl(self, buffer, *, language=NOT_GIVEN, conn_options: APIConnectOptions):
+        raise NotImplementedError("ReplaySTT only supports streaming")
+
+    def stream(self, *, language=NOT_GIVEN, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return ReplaySTTStream(stt=self, conn_options=conn_options)
+
+
+class ReplaySTTStream(stt.RecognizeStream):
+    async def _drain_input(self):
+        async for _ in self._input_ch:
+            pass
+
+    async def _run(self):
+        script: ReplayScript = self._stt.script
+        drain = asyncio.create_task(self._drain_input())
+        try:
+            loop = asyncio.get_running_loop()
+            for ts, data in script.stt_events:
+                # Events from before this stream existed were heard by an earlier stream
+                if script.origin + ts < loop.time() - 0.001:
+                    continue
+                await script.sleep_until(ts)
+                alternatives = []
+                if data.get("text"):
+                    alternatives = [stt.SpeechData(language="en", text=data["text"], confidence=data.get("confidence", 0.0))]
+                self._event_ch.send_nowait(
+                    stt.SpeechEvent(
+                        type=stt.SpeechEventType(data["type"]),
+                        request_id=data.get("request_id", ""),
+                        alternatives=alternatives,
+                    )
+                )
+            await drain
+        finally:
+            drain.cancel()
+
+
+class ReplayLLM(llm.LLM):
+    def __init__(self, script: ReplayScript):
+        super().__init__()
+        self.script = script
+
+    @property
+    def model(self) -> str:
+        return "replay"
+
+    @property
+    def provider(self) -> str:
+        return "replay"
+
+    def chat(self, *, chat_ctx, tools=None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS, **kwargs):
+        return ReplayLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class ReplayLLMStream(llm.LLMStream):
+    async def _run(self):
+        script: ReplayScript = self._llm.script
+        user_text = next(
+            (item.text_content for item in reversed(self._chat_ctx.items) if getattr(item, "role", None) == "user"),
+            None,
+        )
+        recorded = script.find_llm(user_text)
+        tokens = recorded["tokens"] if recorded and recorded["tokens"] else [(script.median_ttft, "Hello, how are you?")]
+
+        request_id = uuid.uuid4().hex[:12]
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for offset, content in tokens:
+            delay = started + offset - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=content)))
+
+
+class ReplayTTS(tts.TTS):
+    """Non-streaming TTS that answers each sentence with its recorded synthesis timing"""
+
+    def __init__(self, script: ReplayScript, sample_rate: int = 24000, chars_per_second: float = 15.0):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=sample_rate, num_channels=1)
+        self.script = script
+        self.chars_per_second = chars_per_second
+
+    @property
+    def model(self) -> str:
+        return "replay"
+
+    @property
+    def provider(self) -> str:
+        return "replay"
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return ReplayChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class ReplayChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter):
+        replay_tts: ReplayTTS = self._tts
+        text = self.input_text
+        recorded = replay_tts.script.find_tts(text)
+        if recorded and recorded["chunks"]:
+            ttfb = recorded["chunks"][0][0]
+            share = len(text) / max(1, len(recorded["text"]))
+            seconds = sum(duration for _, duration in recorded["chunks"]) * share
+            span = (recorded["chunks"][-1][0] - ttfb) * share
+        else:
+            ttfb = replay_tts.script.median_ttfb
+            seconds = len(text) / replay_tts.chars_per_second
+            span = seconds / 4
+
+        output_emitter.initialize(
+            request_id=uuid.uuid4().hex[:12],
+            sample_rate=replay_tts.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        await asyncio.sleep(ttfb)
+        chunk_seconds = 0.1
+        chunks = max(1, int(seconds / chunk_seconds))
+        chunk = b"\x00\x00" * int(replay_tts.sample_rate * chunk_seconds)
+        for i in range(chunks):
+            if i:
+                await asyncio.sleep(span / chunks)
+            output_emitter.push(chunk)
+        output_emitter.flush()
+
+
+class ReplayAudioInput(io.AudioInput):
+    """The callee's recorded audio at its recorded times, or paced silence if none was kept"""
+
+    def __init__(self, script: ReplayScript):
+        super().__init__(label="replay")
+        self.script = script
+        self._records = None
+        self._next_silence = None
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        if self.script.has_audio:
+            if self._records is None:
+                start = max(0.0, asyncio.get_running_loop().time() - self.script.origin)
+                self._records = self.script.reader.records(start=start, kinds={RecordKind.AUDIO_IN})
+            record = next(self._records, None)
+            if record is None:
+                raise StopAsyncIteration
+            await self.script.sleep_until(record.ts)
+            return record.audio_frame()
+
+        loop = asyncio.get_running_loop()
+        self._next_silence = loop.time() if self._next_silence is None else self._next_silence + 0.02
+        if self._next_silence > loop.time():
+            await asyncio.sleep(self._next_silence - loop.time())
+        return rtc.AudioFrame(data=b"\x00\x00" * 320, sample_rate=16000, num_channels=1, samples_per_channel=320)
+
+
+class ReplaySession(AgentSession):
+    def __init__(self, *, script: ReplayScript, **kwargs):
+        super().__init__(**kwargs)
+        self.script = script
+
+    async def start(self, agent, *, room=None, room_input_options=None, room_output_options=None):
+        self.input.audio = ReplayAudioInput(self.script)
+        self.output.audio = FakeAudioOutput()
+        await super().start(agent)
+
+
+def _parse_value(value: str):
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+async def _replay(main, path: str, session_options: dict, use_vad: bool, tail: float) -> str:
+    reader = TraceReader(path)
+    script = ReplayScript(reader)
+    userdata = {
+        "vad": None,
+        "stt": ReplaySTT(script),
+        "llm": ReplayLLM(script),
+        "tts": ReplayTTS(script),
+        "turn_detection": "stt",
+        "prewarm_time": 0.0,
+    }
+    if use_vad:
+        from livekit.plugins import silero
+
+        userdata["vad"] = silero.VAD.load(min_speech_duration=0.03, min_silence_duration=0.2, prefix_padding_duration=0.3)
+        userdata["turn_detection"] = "vad"
+
+    sessions = []
+
+    def session_factory(**kwargs):
+        session = ReplaySession(script=script, **kwargs)
+        sessions.append(session)
+        return session
+
+    main.AgentSession = session_factory
+    main.SESSION_OPTIONS = session_options
+    meta = reader.meta
+    metadata = json.dumps({k: meta.get(k) for k in ("phone_number", "prompt", "call_context") if meta.get(k) is not None})
+    sip = FakeSIP(LatencyModel(script.answer_latency()))
+    ctx = FakeJobContext(userdata, metadata, sip, connect_latency=LatencyModel(0.0))
+
+    script.origin = asyncio.get_running_loop().time()
+    try:
+        await main.entrypoint(ctx)
+        await script.sleep_until(reader.duration + tail)
+        ctx.room.emit("participant_disconnected", type("Participant", (), {"identity": meta.get("phone_number")})())
+    finally:
+        for session in sessions:
+            await session.aclose()
+        await ctx.run_shutdown_callbacks()
+        reader.close()
+    return os.path.join(settings.CALL_TRACE_DIR, f"{ctx.room.name}.ctr")
+
+
+def replay(path: str, session_options: dict, use_vad: bool = False, tail: float = 2.0) -> List[dict]:
+    """Replay one trace with `session_options` and return its per-turn latencies"""
+    import main
+
+    loop = VirtualClockLoop()
+    wall_start = TraceReader(path).started_at
+    try:
+        with _VirtualTime(loop, wall_start):
+            replayed = loop.run_until_complete(_replay(main, path, session_options, use_vad, tail))
+    finally:
+        loop.close()
+    reader = TraceReader(replayed)
+    try:
+        return turn_latencies(reader)
+    finally:
+        reader.close()
+
+
+def compare(recorded: List[dict], baseline: List[dict], variant: List[dict]) -> List[dict]:
+    rows = []
+    for i in range(max(len(recorded), len(baseline), len(variant))):
+        def latency(turns):
+            return turns[i]["response_latency"] if i < len(turns) else None
+
+        row = {
+            "turn": i + 1,
+            "text": next((t[i]["text"] for t in (recorded, baseline, variant) if i < len(t)), ""),
+            "recorded": latency(recorded),
+            "baseline": latency(baseline),
+            "variant": latency(variant),
+        }
+        if row["baseline"] is not None and row["variant"] is not None:
+            row["delta"] = round(row["variant"] - row["baseline"], 4)
+        rows.append(row)
+    return rows
+
+
+def print_info(path: str, start: float, end: Optional[float]):
+    reader = TraceReader(path)
+    counts = {}
+    for record in reader.records(start=start, end=end):
+        counts[record.kind.name] = counts.get(record.kind.name, 0) + 1
+    print(json.dumps({
+        "meta": reader.meta,
+        "duration": round(reader.duration, 3),
+        "chunks": len(reader.chunks),
+        "window": [start, end],
+        "records": counts,
+        "turns": turn_latencies(reader),
+    }, indent=2))
+    reader.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="Trace file recorded with CALL_TRACE_DIR")
+    parser.add_argument("--set", action="append", default=[], metavar="OPTION=VALUE", help="AgentSession option for the variant run")
+    parser.add_argument("--vad", action="store_true", help="Run the Silero VAD on the recorded audio")
+    parser.add_argument("--tail", type=float, default=2.0, help="Seconds to keep replaying after the trace ends")
+    parser.add_argument("--output", help="Write the turn-by-turn comparison as JSON")
+    parser.add_argument("--info", action="store_true", help="Print trace metadata, record counts and recorded turns")
+    parser.add_argument("--start", type=float, default=0.0, help="With --info, start of the window in seconds")
+    parser.add_argument("--end", type=float, help="With --info, end of the window in seconds")
+    args = parser.parse_args()
+
+    if args.info:
+        print_info(args.trace, args.start, args.end)
+        sys.exit(0)
+
+    reader = TraceReader(args.trace)
+    recorded = turn_latencies(reader)
+    recorded_options = reader.meta.get("session_options") or {}
+    reader.close()
+
+    variant_options = dict(recorded_options)
+    for assignment in args.set:
+        key, _, value = assignment.partition("=")
+        variant_options[key] = _parse_value(value)
+
+    # Replays write their own traces, without audio, outside the recording directory
+    settings.CALL_TRACE_DIR = tempfile.mkdtemp(prefix="replay-")
+    settings.CALL_TRACE_AUDIO = False
+    baseline = replay(args.trace, recorded_options, use_vad=args.vad, tail=args.tail)
+    variant = replay(args.trace, variant_options, use_vad=args.vad, tail=args.tail)
+    rows = compare(recorded, baseline, variant)
+
+    print(f"{'turn':>4}  {'recorded':>9}  {'baseline':>9}  {'variant':>9}  {'delta':>8}  text")
+    for row in rows:
+        cells = [f"{row[k]:9.3f}" if row[k] is not None else f"{'-':>9}" for k in ("recorded", "baseline", "variant")]
+        delta = f"{row['delta']:+8.3f}" if "delta" in row else f"{'-':>8}"
+        print(f"{row['turn']:>4}  {'  '.join(cells)}  {delta}  {row['text'][:40]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "trace": args.trace,
+                "baseline_options": recorded_options,
+                "variant_options": variant_options,
+                "turns": rows,
+            }, f, indent=2)
@@ -0,0 +1,122 @@
+"""
+Job process startup time for the outbound AI agent.
+
+Spawns fresh interpreters the way the worker spawns job processes and times
+each one from spawn to ready-for-job: interpreter up, main.py imported,
+provider plugins imported and prewarm finished. `--preload` imports extra
+modules first to measure what eager imports cost (e.g. the plugins the
+deployment doesn't use).
+
+    python benchmarks/startup_bench.py --runs 10
+    python benchmarks/startup_bench.py --runs 10 --preload livekit.plugins.google,livekit.plugins.cartesia,torch
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Provider constructors only check that a key is set; nothing here goes over the network
+_BENCH_ENV = {
+    "LOG_LEVEL": "WARNING",
+    "LATENCY_METRICS_PORT": "0",
+    "DEEPGRAM_API_KEY": "bench",
+    "ELEVEN_API_KEY": "bench",
+    "OPENAI_API_KEY": "bench",
+    "CARTESIA_API_KEY": "bench",
+}
+
+_CHILD = """
+import json, sys, time
+marks = {"interpreter": time.time()}
+for name in sys.argv[1].split(","):
+    if name:
+        __import__(name)
+marks["preloaded"] = time.time()
+import main
+marks["imported"] = time.time()
+main.providers.import_plugins()
+marks["plugins"] = time.time()
+
+class _Proc:
+    userdata = {}
+
+main.prewarm(_Proc())
+marks["ready"] = time.time()
+print("STARTUP " + json.dumps({"marks": marks, "prewarm": _Proc.userdata.get("prewarm_timings", {})}), flush=True)
+"""
+
+PHASES = ["interpreter", "preloaded", "imported", "plugins", "ready"]
+
+
+def run_once(preload: str, env: dict) -> dict:
+    spawned = time.time()
+    result = subprocess.run([sys.executable, "-c", _CHILD, preload], cwd=AGENT_DIR, env=env, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            report = json.loads(line[len("STARTUP "):])
+            break
+    else:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr[-2000:]}")
+
+    # Seconds from spawn to each mark, and the length of each phase
+    marks = report["marks"]
+    since_spawn = {phase: marks[phase] - spawned for phase in PHASES}
+    phases, previous = {}, spawned
+    for phase in PHASES:
+        phases[phase] = marks[phase] - previous
+        previous = marks[phase]
+    return {"since_spawn": since_spawn, "phases": phases, "prewarm": report["prewarm"]}
+
+
+def _percentiles(values: list) -> dict:
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    return {"median": round(statistics.median(values), 4), "p95": round(p95, 4), "max": round(values[-1], 4)}
+
+
+def summarize(runs: list) -> dict:
+    summary = {
+        "ready": _percentiles([r["since_spawn"]["ready"] for r in runs]),
+        "phases": {phase: _percentiles([r["phases"][phase] for r in runs]) for phase in PHASES},
+    }
+    components = {name for r in runs for name in r["prewarm"]}
+    summary["prewarm"] = {name: _percentiles([r["prewarm"][name] for r in runs if name in r["prewarm"]]) for name in sorted(components)}
+    return summary
+
+
+def print_summary(summary: dict):
+    print(f"Spawn to ready-for-job: median {summary['ready']['median'] * 1000:.0f}ms | p95 {summary['ready']['p95'] * 1000:.0f}ms")
+    print(f"\n{'phase':<14}{'median ms':>12}{'p95 ms':>10}")
+    for phase, stats in summary["phases"].items():
+        print(f"{phase:<14}{stats['median'] * 1000:>12.1f}{stats['p95'] * 1000:>10.1f}")
+    print(f"\n{'prewarm':<14}{'median ms':>12}{'p95 ms':>10}")
+    for name, stats in summary["prewarm"].items():
+        print(f"{name:<14}{stats['median'] * 1000:>12.1f}{stats['p95'] * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", default="", help="Comma separated modules imported before main.py")
+    parser.add_argument("--output", help="Write per-run results and the summary as JSON")
+    args = parser.parse_args()
+
+    env = {**_BENCH_ENV, **os.environ}
+    runs = []
+    for i in range(args.runs):
+        runs.append(run_once(args.preload, env))
+        print(f"run {i + 1}/{args.runs}: {runs[-1]['since_spawn']['ready'] * 1000:.0f}ms", file=sys.stderr)
+
+    summary = summarize(runs)
+    print_summary(summary)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"preload": args.preload, "runs": runs, "summary": summary}, f, indent=2)
@@ -0,0 +1,482 @@
+"""
+Call store for outbound AI agent.
+Keeps every call's transcript turns and lifecycle events (dialing, answered, SIP
+failures, completion) and its pipeline metrics as structured records, appended
+while the call runs, so post-call analysis and cost reconciliation don't have to
+parse log lines.
+
+Layout under CALL_STORE_DIR, partitioned by UTC day:
+    <day>/<host>-<seq>.jsonl     segments: one record per line, shared by the host's job processes
+    <day>/<host>.index.jsonl     one line per finished call, in the day it started: its campaign,
+                                 status, usage and the byte spans of its records
+
+Job processes serve one call each, so they append to the host's files under a
+file lock rather than opening their own; a day holds a few segments and one
+index per host however many calls it had. Days older than
+CALL_STORE_RETENTION_DAYS are deleted as new days start.
+
+A record is {"call": room, "t": seconds since the call began, "kind": ...}, kind
+being `start`, `turn`, `event`, `metrics` or `end`. Records are buffered per
+process and written on one background thread, so the event loop never waits on
+the disk and a call's memory doesn't grow with its length. Index lines carry the
+usage fields `cost_engine.py recompute` reads.
+
+    python call_store.py calls --from 2026-10-01 --to 2026-10-07 --campaign spring-renewals
+    python call_store.py show call-3f9a1c2b7d4e
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import socket
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# What cost_engine reprices, summed from the metrics of each call
+_USAGE = {
+    "llm_metrics": {"prompt_tokens": "prompt_tokens", "completion_tokens": "completion_tokens", "prompt_cached_tokens": "cached_tokens"},
+    "tts_metrics": {"characters_count": "tts_characters"},
+    "stt_metrics": {"audio_duration": "stt_audio_seconds"},
+}
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "cached_tokens", "tts_characters", "stt_audio_seconds")
+
+
+def _day(epoch: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(epoch))
+
+
+def _dumps(data: dict) -> str:
+    return json.dumps(data, separators=(",", ":"), default=str)
+
+
+@dataclass
+class _Call:
+    call_id: str
+    meta: dict
+    started_at: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.monotonic)
+    answered: Optional[float] = None
+    status: str = "started"
+    duration: Optional[float] = None
+    turns: int = 0
+    records: int = 0
+    usage: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(USAGE_FIELDS, 0))
+
+
+class CallStore:
+    """
+    Appends the records of every call this process runs
+
+    Records of all calls go through one buffer, flushed to the writer thread
+    once it holds `flush_bytes` or is `flush_seconds` old. Each flush is one
+    locked append to the host's current segment; the writer thread tracks
+    where each call's records landed as (segment, offset, length) spans,
+    merged while they stay contiguous, and appends them to the host's index
+    when the call ends. Segments roll over at `segment_bytes` and at midnight UTC.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        segment_bytes: Optional[int] = None,
+        flush_bytes: int = 64 * 1024,
+        flush_seconds: Optional[float] = None,
+    ):
+        self.root = Path(root or settings.CALL_STORE_DIR)
+        self.segment_bytes = segment_bytes or int(settings.CALL_STORE_SEGMENT_MB * 1024 * 1024)
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.CALL_STORE_FLUSH_SECONDS
+        self.prefix = socket.gethostname()
+        self.retention_days = settings.CALL_STORE_RETENTION_DAYS
+
+        self._calls: Dict[str, _Call] = {}
+        self._buffer = bytearray()
+        # (call, bytes) for consecutive lines of the same call in the buffer
+        self._runs: List[list] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="call-store")
+
+        # Owned by the writer thread
+        self._segment: Optional[int] = None
+        self._segment_name = ""
+        self._segment_day = ""
+        self._seq = 0
+        self._spans: Dict[str, List[list]] = {}
+
+    # Calls
+
+    def begin(self, call_id: str, **meta):
+        """Start recording a call; meta (campaign, phone number, pipeline, ...) goes to its index line"""
+        call = self._calls[call_id] = _Call(call_id, meta)
+        self._append(call, "start", {"started_at": call.started_at, **meta})
+
+    def turn(self, call_id: str, role: str, text: str, **data):
+        call = self._calls.get(call_id)
+        if call is None:
+            return
+        call.turns += 1
+        self._append(call, "turn", {"role": role, "text": text, **data})
+
+    def event(self, call_id: str, status: str, **details):
+        """A lifecycle event; the last one is the call's status in the index"""
+        call = self._calls.get(call_id)
+        if call is None:
+            return
+        call.status = status
+        if status == "answered":
+            call.answered = time.monotonic()
+        if details.get("duration") is not None:
+            call.duration = float(details["duration"])
+        self._append(call, "event", {"status": status, **details})
+
+    def metrics(self, call_id: str, data: dict):
+        """A metrics dump (its own `type` says which); usage is summed for the index"""
+        call = self._calls.get(call_id)
+        if call is None:
+            return
+        for source, target in _USAGE.get(data.get("type"), {}).items():
+            call.usage[target] += data.get(source) or 0
+        self._append(call, "metrics", data)
+
+    def attach(self, call_id: str, session):
+        @session.on("conversation_item_added")
+        def on_conversation_item_added(ev):
+            text = getattr(ev.item, "text_content", None)
+            if text:
+                self.turn(call_id, ev.item.role, text, interrupted=getattr(ev.item, "interrupted", False))
+
+        @session.on("metrics_collected")
+        def on_metrics_collected(ev):
+            self.metrics(call_id, ev.metrics.model_dump(mode="json"))
+
+    async def end(self, call_id: str):
+        """Write the call's last records and its index line; returns once both are on disk"""
+        call = self._calls.pop(call_id, None)
+        if call is None:
+            return
+        ended = time.monotonic()
+        if call.duration is None:
+            # Billed time runs from the answer; calls that never connected cost no minutes
+            call.duration = ended - call.answered if call.answered is not None else 0.0
+        self._append(call, "end", {"status": call.status})
+        entry = {
+            "call_id": call_id,
+            **call.meta,
+            "status": call.status,
+            "started_at": round(call.started_at, 3),
+            "ended_at": round(call.started_at + ended - call.started, 3),
+            "duration_seconds": round(call.duration, 3),
+            "turns": call.turns,
+            "records": call.records,
+            **{k: round(v, 3) for k, v in call.usage.items()},
+        }
+        self._flush()
+        await asyncio.wrap_future(self._executor.submit(self._write_index, _day(call.started_at), entry))
+
+    def _append(self, call: _Call, kind: str, data: dict):
+        call.records += 1
+        line = _dumps({"call": call.call_id, "t": round(time.monotonic() - call.started, 3), "kind": kind, **data})
+        encoded = (line + "\n").encode("utf-8")
+        self._buffer += encoded
+        if self._runs and self._runs[-1][0] == call.call_id:
+            self._runs[-1][1] += len(encoded)
+        else:
+            self._runs.append([call.call_id, len(encoded)])
+
+        if len(self._buffer) >= self.flush_bytes:
+            self._flush()
+        elif self._flush_handle is None:
+            try:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_seconds, self._flush)
+            except RuntimeError:
+                self._flush()
+
+    def _flush(self) -> Optional[Future]:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buffer:
+            return None
+        data, runs = bytes(self._buffer), self._runs
+        self._buffer, self._runs = bytearray(), []
+        return self._executor.submit(self._write, data, runs)
+
+    async def flush(self):
+        future = self._flush()
+        if future is not None:
+            await asyncio.wrap_future(future)
+
+    def close(self):
+        """Flush and close the files; calls still open stay without an index line"""
+        self._flush()
+        self._executor.submit(self._close_files).result()
+        self._executor.shutdown()
+
+    # Writer thread
+
+    def _write(self, data: bytes, runs: List[list]):
+        try:
+            day = _day(time.time())
+            if self._segment is None or day != self._segment_day:
+                self._open_segment(day, self._latest_seq(day))
+            offset = self._append_segment(data)
+        except OSError as e:
+            logger.error(f"❌ Call store write failed, {len(data)} bytes lost: {e}")
+            return
+        for call_id, length in runs:
+            spans = self._spans.setdefault(call_id, [])
+            last = spans[-1] if spans else None
+            if last is not None and last[0] == self._segment_name and last[1] + last[2] == offset:
+                last[2] += length
+            else:
+                spans.append([self._segment_name, offset, length])
+            offset += length
+
+    def _append_segment(self, data: bytes) -> int:
+        """Append under the segment's lock, moving to the next segment once it's full; returns the offset"""
+        while True:
+            fcntl.flock(self._segment, fcntl.LOCK_EX)
+            offset = os.fstat(self._segment).st_size
+            if offset < self.segment_bytes:
+                break
+            # Another process (or this one) filled it; they all move on to the same next segment
+            fcntl.flock(self._segment, fcntl.LOCK_UN)
+            self._open_segment(self._segment_day, self._seq + 1)
+        try:
+            _write_all(self._segment, data)
+        finally:
+            fcntl.flock(self._segment, fcntl.LOCK_UN)
+        return offset
+
+    def _latest_seq(self, day: str) -> int:
+        pattern = re.compile(rf"{re.escape(self.prefix)}-(\d+)\.jsonl")
+        try:
+            names = os.listdir(self.root / day)
+        except FileNotFoundError:
+            return 1
+        return max((int(m.group(1)) for m in map(pattern.fullmatch, names) if m), default=1)
+
+    def _open_segment(self, day: str, seq: int):
+        if self._segment is not None:
+            os.close(self._segment)
+            self._segment = None
+        if day != self._segment_day:
+            self._prune()
+        self._seq = seq
+        self._segment_name = f"{day}/{self.prefix}-{seq:04d}.jsonl"
+        path = self.root / self._segment_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._segment = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._segment_day = day
+
+    def _prune(self):
+        if not self.retention_days:
+            return
+        oldest = _day(time.time() - self.retention_days * 86400)
+        for day in CallStoreReader(str(self.root)).days(end=oldest):
+            if day < oldest:
+                shutil.rmtree(self.root / day, ignore_errors=True)
+                logger.info(f"🗑️ Call store day {day} deleted (older than {self.retention_days} days)")
+
+    def _write_index(self, day: str, entry: dict):
+        entry["spans"] = self._spans.pop(entry["call_id"], [])
+        path = self.root / day / f"{self.prefix}.index.jsonl"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                _write_all(fd, (_dumps(entry) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logger.error(f"❌ Call store index write failed | Call: {entry['call_id']} | {e}")
+
+    def _close_files(self):
+        if self._segment is not None:
+            os.close(self._segment)
+            self._segment = None
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+_store: Optional[CallStore] = None
+
+
+def get_call_store() -> Optional[CallStore]:
+    """The process' call store, None when CALL_STORE_DIR is unset"""
+    global _store
+    if _store is None and settings.CALL_STORE_DIR:
+        _store = CallStore()
+    return _store
+
+
+class CallStoreReader:
+    """
+    Scans the store by day, then by campaign or status, reading only the spans of the calls selected
+
+    Filters are matched against the raw index line before it is parsed, so
+    skipping most of a day's calls costs little more than reading its index.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.CALL_STORE_DIR)
+
+    def days(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Days (YYYY-MM-DD) with data, from `start` to `end` inclusive"""
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            p.name for p in self.root.iterdir()
+            if p.is_dir() and (start is None or p.name >= start) and (end is None or p.name <= end)
+        )
+
+    def calls(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        campaign: Optional[str] = None,
+        status: Optional[str] = None,
+        unfinished: bool = False,
+    ) -> Iterator[dict]:
+        """
+        Index lines of the calls that started in [start, end]
+
+        With `unfinished`, calls whose process died before they ended are
+        included too, found from their `start` records; they have no spans.
+        """
+        needles = []
+        if campaign is not None:
+            needles.append(f'"campaign":{json.dumps(campaign)}')
+        if status is not None:
+            needles.append(f'"status":{json.dumps(status)}')
+        for day in self.days(start, end):
+            seen = set()
+            for path in sorted((self.root / day).glob("*.index.jsonl")):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        matches = all(needle in line for needle in needles)
+                        if not (matches or unfinished):
+                            continue
+                        entry = json.loads(line)
+                        seen.add(entry["call_id"])
+                        if matches:
+                            yield entry
+            if unfinished:
+                yield from self._unfinished(day, seen, needles)
+
+    def _unfinished(self, day: str, seen: set, needles: List[str]) -> Iterator[dict]:
+        for path in sorted((self.root / day).glob("*.jsonl")):
+            if path.name.endswith(".index.jsonl"):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if '"kind":"start"' not in line:
+                        continue
+                    record = json.loads(line)
+                    if record["call"] in seen:
+                        continue
+                    meta = {k: v for k, v in record.items() if k not in ("call", "t", "kind")}
+                    entry = {"call_id": record["call"], **meta, "status": "unfinished", "spans": None}
+                    if all(n in _dumps(entry) for n in needles):
+                        yield entry
+
+    def find(self, call_id: str, start: Optional[str] = None, end: Optional[str] = None) -> Optional[dict]:
+        """Index line of one call, searching the newest days first"""
+        needle = f'"call_id":{json.dumps(call_id)}'
+        for day in reversed(self.days(start, end)):
+            for path in (self.root / day).glob("*.index.jsonl"):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if needle in line:
+                            return json.loads(line)
+        return None
+
+    def records(self, call: dict) -> Iterator[dict]:
+        """The call's records in order, read from its spans (or its day's segments when unfinished)"""
+        if call.get("spans") is None:
+            yield from self._scan(call)
+            return
+        for segment, offset, length in call["spans"]:
+            with open(self.root / segment, "rb") as f:
+                f.seek(offset)
+                data = f.read(length)
+            for line in data.splitlines():
+                record = json.loads(line)
+                # Spans are contiguous runs of this call, but stay safe if they ever overlap another
+                if record["call"] == call["call_id"]:
+                    yield record
+
+    def _scan(self, call: dict) -> Iterator[dict]:
+        needle = f'"call":{json.dumps(call["call_id"])}'
+        day = _day(call["started_at"])
+        # A call running past midnight continues in the next day's segments
+        next_day = _day(call["started_at"] + 86400)
+        for d in (day, next_day):
+            for path in sorted((self.root / d).glob("*.jsonl")) if (self.root / d).is_dir() else []:
+                if path.name.endswith(".index.jsonl"):
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if needle in line:
+                            yield json.loads(line)
+
+    def transcript(self, call: dict) -> List[dict]:
+        return [{"role": r["role"], "text": r["text"]} for r in self.records(call) if r["kind"] == "turn"]
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from logger import setup_logging
+
+    setup_logging(stream=sys.stderr)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=settings.CALL_STORE_DIR, help="Store root (default: CALL_STORE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    listing = commands.add_parser("calls", help="Index lines of matching calls, as JSONL")
+    listing.add_argument("--from", dest="start", help="First day, YYYY-MM-DD")
+    listing.add_argument("--to", dest="end", help="Last day, YYYY-MM-DD")
+    listing.add_argument("--campaign")
+    listing.add_argument("--status")
+    listing.add_argument("--unfinished", action="store_true", help="Include calls whose process died mid-call")
+    listing.add_argument("--spans", action="store_true", help="Keep the record spans in the output")
+    show = commands.add_parser("show", help="Records of one call, as JSONL")
+    show.add_argument("call_id")
+    show.add_argument("--transcript", action="store_true", help="Only the turns, as role: text")
+    args = parser.parse_args()
+
+    if not args.dir:
+        parser.error("set CALL_STORE_DIR or pass --dir")
+    reader = CallStoreReader(args.dir)
+    if args.command == "calls":
+        for entry in reader.calls(args.start, args.end, campaign=args.campaign, status=args.status, unfinished=args.unfinished):
+            if not args.spans:
+                entry.pop("spans", None)
+            print(_dumps(entry))
+    else:
+        entry = reader.find(args.call_id)
+        if entry is None:
+            sys.exit(f"{args.call_id} is not in the index of {args.dir}")
+        if args.transcript:
+            for turn in reader.transcript(entry):
+                print(f"{turn['role']}: {turn['text']}")
+        else:
+            for record in reader.records(entry):
+                print(_dumps(record))
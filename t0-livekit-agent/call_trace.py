@@ -0,0 +1,410 @@
+"""
+Call traces for outbound AI agent.
+Records what one call's pipeline saw and produced (inbound audio, VAD state, STT
+events, LLM tokens, TTS chunk timings, SIP events, metrics) into a compact
+chunked binary file that can be seeked by time and replayed offline.
+
+File layout:
+    header   "<4sHHqI"  magic CTR1, version, flags, start time (epoch us), meta length
+    meta     JSON
+    chunks   "<4sIIqqI" magic CHNK, raw length, stored length, first ts, last ts, record count
+             followed by the (zlib-compressed when smaller) records
+    index    "<4sI" magic CIDX, entries, then "<Qqqi" per chunk: offset, first ts, last ts, count
+    footer   "<Q4s" index offset, magic CEND
+
+Each record is "<BqI" kind, microseconds since the call started, payload length,
+then the payload. A trace without an index (the process died) is still readable;
+the chunks are scanned instead.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import struct
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import AsyncIterable, Iterator, List, Optional
+
+from livekit import rtc
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+_HEADER = struct.Struct("<4sHHqI")
+_CHUNK = struct.Struct("<4sIIqqI")
+_RECORD = struct.Struct("<BqI")
+_INDEX = struct.Struct("<4sI")
+_INDEX_ENTRY = struct.Struct("<Qqqi")
+_FOOTER = struct.Struct("<Q4s")
+_AUDIO = struct.Struct("<IHI")
+
+_MAGIC = b"CTR1"
+_CHUNK_MAGIC = b"CHNK"
+_INDEX_MAGIC = b"CIDX"
+_FOOTER_MAGIC = b"CEND"
+VERSION = 1
+
+
+class RecordKind(IntEnum):
+    AUDIO_IN = 1
+    USER_STATE = 2
+    AGENT_STATE = 3
+    STT = 4
+    LLM_REQUEST = 5
+    LLM_TOKEN = 6
+    LLM_DONE = 7
+    TTS_START = 8
+    TTS_CHUNK = 9
+    TTS_DONE = 10
+    SIP = 11
+    METRICS = 12
+
+
+@dataclass
+class TraceRecord:
+    kind: RecordKind
+    ts: float
+    payload: bytes
+
+    def json(self) -> dict:
+        return json.loads(self.payload)
+
+    def audio_frame(self) -> rtc.AudioFrame:
+        sample_rate, num_channels, samples = _AUDIO.unpack_from(self.payload, 0)
+        return rtc.AudioFrame(
+            data=self.payload[_AUDIO.size:],
+            sample_rate=sample_rate,
+            num_channels=num_channels,
+            samples_per_channel=samples,
+        )
+
+
+@dataclass
+class ChunkInfo:
+    offset: int
+    first_ts: int
+    last_ts: int
+    count: int
+
+
+class TraceWriter:
+    """
+    Append-only trace file
+
+    Records are buffered into chunks of about `chunk_bytes`; full chunks are
+    compressed and written on a single background thread, in order, so the
+    event loop never waits on zlib or the disk.
+    """
+
+    def __init__(self, path: str, meta: dict, chunk_bytes: int = 256 * 1024, clock=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self._clock = clock or time.perf_counter
+        self._origin = self._clock()
+        self._file = open(path, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="call-trace")
+        self._buffer = bytearray()
+        self._first_ts: Optional[int] = None
+        self._last_ts = 0
+        self._count = 0
+        self._offset = 0
+        self._index: List[ChunkInfo] = []
+        self.records = 0
+        self.closed = False
+
+        meta_bytes = json.dumps(meta, default=str).encode("utf-8")
+        self._write(_HEADER.pack(_MAGIC, VERSION, 0, int(time.time() * 1_000_000), len(meta_bytes)) + meta_bytes)
+
+    def now(self) -> float:
+        """Seconds since the trace started"""
+        return self._clock() - self._origin
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._offset += len(data)
+
+    def write(self, kind: RecordKind, payload: bytes, ts: Optional[float] = None):
+        if self.closed:
+            return
+        ts_us = int((self.now() if ts is None else ts) * 1_000_000)
+        self._buffer += _RECORD.pack(kind, ts_us, len(payload))
+        self._buffer += payload
+        if self._first_ts is None:
+            self._first_ts = ts_us
+        self._last_ts = max(self._last_ts, ts_us)
+        self._count += 1
+        self.records += 1
+        if len(self._buffer) >= self.chunk_bytes:
+            self._flush_chunk()
+
+    def write_json(self, kind: RecordKind, data: dict, ts: Optional[float] = None):
+        self.write(kind, json.dumps(data, separators=(",", ":"), default=str).encode("utf-8"), ts)
+
+    def write_audio(self, frame: rtc.AudioFrame, ts: Optional[float] = None):
+        header = _AUDIO.pack(frame.sample_rate, frame.num_channels, frame.samples_per_channel)
+        self.write(RecordKind.AUDIO_IN, header + bytes(frame.data.cast("B")), ts)
+
+    def _flush_chunk(self):
+        if not self._count:
+            return
+        raw = bytes(self._buffer)
+        chunk = (self._first_ts, self._last_ts, self._count)
+        self._buffer = bytearray()
+        self._first_ts, self._count = None, 0
+        self._executor.submit(self._write_chunk, raw, *chunk)
+
+    def _write_chunk(self, raw: bytes, first_ts: int, last_ts: int, count: int):
+        compressed = zlib.compress(raw, 3)
+        stored = compressed if len(compressed) < len(raw) else raw
+        self._index.append(ChunkInfo(self._offset, first_ts, last_ts, count))
+        self._write(_CHUNK.pack(_CHUNK_MAGIC, len(raw), len(stored), first_ts, last_ts, count) + stored)
+
+    def _finish(self):
+        index_offset = self._offset
+        entries = b"".join(_INDEX_ENTRY.pack(c.offset, c.first_ts, c.last_ts, c.count) for c in self._index)
+        self._write(_INDEX.pack(_INDEX_MAGIC, len(self._index)) + entries)
+        self._write(_FOOTER.pack(index_offset, _FOOTER_MAGIC))
+        self._file.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self._flush_chunk()
+        self.closed = True
+        self._executor.submit(self._finish).result()
+        self._executor.shutdown()
+
+    async def aclose(self):
+        if self.closed:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class TraceReader:
+    """Random access to a trace: records are found by time through the chunk index"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        magic, self.version, self.flags, started_us, meta_len = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a call trace")
+        self.started_at = started_us / 1_000_000
+        self.meta = json.loads(self._file.read(meta_len))
+        self._data_offset = _HEADER.size + meta_len
+        self.chunks = self._read_index()
+        if self.chunks is None:
+            self.chunks = self._scan_chunks()
+        self._last_ts = [c.last_ts for c in self.chunks]
+
+    def _read_index(self) -> Optional[List[ChunkInfo]]:
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._data_offset + _FOOTER.size:
+            return None
+        self._file.seek(size - _FOOTER.size)
+        index_offset, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+        if magic != _FOOTER_MAGIC:
+            return None
+        self._file.seek(index_offset)
+        magic, count = _INDEX.unpack(self._file.read(_INDEX.size))
+        if magic != _INDEX_MAGIC:
+            return None
+        data = self._file.read(count * _INDEX_ENTRY.size)
+        return [ChunkInfo(*_INDEX_ENTRY.unpack_from(data, i * _INDEX_ENTRY.size)) for i in range(count)]
+
+    def _scan_chunks(self) -> List[ChunkInfo]:
+        chunks = []
+        offset = self._data_offset
+        while True:
+            self._file.seek(offset)
+            header = self._file.read(_CHUNK.size)
+            if len(header) < _CHUNK.size:
+                break
+            magic, _, stored_len, first_ts, last_ts, count = _CHUNK.unpack(header)
+            if magic != _CHUNK_MAGIC:
+                break
+            chunks.append(ChunkInfo(offset, first_ts, last_ts, count))
+            offset += _CHUNK.size + stored_len
+        logger.warning(f"⚠️ Trace {self.path} has no index (incomplete write); scanned {len(chunks)} chunks")
+        return chunks
+
+    @property
+    def duration(self) -> float:
+        return self._last_ts[-1] / 1_000_000 if self._last_ts else 0.0
+
+    def _read_chunk(self, chunk: ChunkInfo) -> Iterator[TraceRecord]:
+        self._file.seek(chunk.offset)
+        _, raw_len, stored_len, _, _, count = _CHUNK.unpack(self._file.read(_CHUNK.size))
+        data = self._file.read(stored_len)
+        if stored_len != raw_len:
+            data = zlib.decompress(data)
+        view = memoryview(data)
+        offset = 0
+        for _ in range(count):
+            kind, ts_us, length = _RECORD.unpack_from(view, offset)
+            offset += _RECORD.size
+            yield TraceRecord(RecordKind(kind), ts_us / 1_000_000, bytes(view[offset:offset + length]))
+            offset += length
+
+    def records(self, start: float = 0.0, end: Optional[float] = None, kinds=None) -> Iterator[TraceRecord]:
+        """Records with start <= ts < end, in time order, reading only the chunks that overlap"""
+        start_us = int(start * 1_000_000)
+        first = bisect.bisect_left(self._last_ts, start_us)
+        for chunk in self.chunks[first:]:
+            if end is not None and chunk.first_ts >= end * 1_000_000:
+                break
+            for record in self._read_chunk(chunk):
+                if record.ts < start or (kinds is not None and record.kind not in kinds):
+                    continue
+                if end is not None and record.ts >= end:
+                    return
+                yield record
+
+    def close(self):
+        self._file.close()
+
+
+def turn_latencies(reader: TraceReader) -> List[dict]:
+    """
+    Per user turn: end of the callee's speech to the agent starting to speak
+
+    Works the same on recorded and replayed traces, so the two can be compared
+    turn by turn.
+    """
+    turns = []
+    pending = None
+    for record in reader.records(kinds={RecordKind.STT, RecordKind.AGENT_STATE}):
+        data = record.json()
+        if record.kind == RecordKind.STT:
+            if data["type"] == "final_transcript" and data.get("text"):
+                pending = pending or {"text": "", "end_of_speech": None}
+                pending["text"] = f"{pending['text']} {data['text']}".strip()
+            elif data["type"] == "end_of_speech" and pending:
+                pending["end_of_speech"] = record.ts
+        elif data.get("state") == "speaking" and pending and pending["end_of_speech"] is not None:
+            turns.append({
+                "turn": len(turns) + 1,
+                "text": pending["text"],
+                "end_of_speech": round(pending["end_of_speech"], 4),
+                "response_latency": round(record.ts - pending["end_of_speech"], 4),
+            })
+            pending = None
+    return turns
+
+
+class CallTraceRecorder:
+    """
+    Taps one call's pipeline into a TraceWriter
+
+    Session events are recorded through `attach`; STT, LLM and TTS streams
+    through `tap_*`, which `Assistant` wraps around its pipeline nodes.
+    """
+
+    def __init__(self, writer: TraceWriter, record_audio: bool = True):
+        self.writer = writer
+        self.record_audio = record_audio
+
+    @classmethod
+    def for_call(cls, room_name: str, meta: dict) -> Optional["CallTraceRecorder"]:
+        """Recorder writing to CALL_TRACE_DIR, or None when tracing is disabled"""
+        if not settings.CALL_TRACE_DIR:
+            return None
+        path = os.path.join(settings.CALL_TRACE_DIR, f"{room_name}.ctr")
+        try:
+            writer = TraceWriter(path, {"room_name": room_name, **meta})
+        except OSError as e:
+            logger.warning(f"⚠️ Could not open call trace {path}: {e}")
+            return None
+        logger.info(f"🎞️ Recording call trace | Room: {room_name} | Path: {path}")
+        return cls(writer, record_audio=settings.CALL_TRACE_AUDIO)
+
+    def event(self, kind: RecordKind, **data):
+        self.writer.write_json(kind, data)
+
+    def attach(self, session):
+        @session.on("user_state_changed")
+        def on_user_state_changed(ev):
+            self.event(RecordKind.USER_STATE, state=ev.new_state)
+
+        @session.on("agent_state_changed")
+        def on_agent_state_changed(ev):
+            self.event(RecordKind.AGENT_STATE, state=ev.new_state)
+
+        @session.on("metrics_collected")
+        def on_metrics_collected(ev):
+            # The dump carries its own "type" (eou_metrics, llm_metrics, ...)
+            self.writer.write_json(RecordKind.METRICS, ev.metrics.model_dump(mode="json"))
+
+    async def tap_audio(self, audio: AsyncIterable[rtc.AudioFrame]) -> AsyncIterable[rtc.AudioFrame]:
+        async for frame in audio:
+            if self.record_audio:
+                self.writer.write_audio(frame)
+            yield frame
+
+    async def tap_stt(self, events: AsyncIterable) -> AsyncIterable:
+        async for ev in events:
+            if isinstance(ev, str):
+                self.event(RecordKind.STT, type="final_transcript", text=ev)
+            else:
+                alt = ev.alternatives[0] if ev.alternatives else None
+                self.event(
+                    RecordKind.STT,
+                    type=ev.type.value,
+                    request_id=ev.request_id,
+                    text=alt.text if alt else "",
+                    confidence=alt.confidence if alt else 0.0,
+                )
+            yield ev
+
+    async def tap_llm(self, chat_ctx, chunks: AsyncIterable) -> AsyncIterable:
+        request_id = uuid.uuid4().hex[:12]
+        user_text = next(
+            (item.text_content for item in reversed(chat_ctx.items) if getattr(item, "role", None) == "user"),
+            None,
+        )
+        self.event(RecordKind.LLM_REQUEST, id=request_id, user_text=user_text)
+        try:
+            async for chunk in chunks:
+                content = chunk if isinstance(chunk, str) else (chunk.delta.content if chunk.delta else None)
+                if content:
+                    self.event(RecordKind.LLM_TOKEN, id=request_id, content=content)
+                yield chunk
+        finally:
+            self.event(RecordKind.LLM_DONE, id=request_id)
+
+    async def tap_tts(self, text: AsyncIterable[str], synthesize) -> AsyncIterable[rtc.AudioFrame]:
+        """`synthesize` is called with the teed text stream and returns the audio frames"""
+        request_id = uuid.uuid4().hex[:12]
+        parts = []
+
+        async def tee_text():
+            async for delta in text:
+                if not parts:
+                    self.event(RecordKind.TTS_START, id=request_id)
+                parts.append(delta)
+                yield delta
+
+        try:
+            frames = synthesize(tee_text())
+            if asyncio.iscoroutine(frames):
+                frames = await frames
+            if frames is None:
+                return
+            async for frame in frames:
+                self.event(RecordKind.TTS_CHUNK, id=request_id, duration=round(frame.duration, 4))
+                yield frame
+        finally:
+            self.event(RecordKind.TTS_DONE, id=request_id, text="".join(parts))
+
+    async def aclose(self):
+        await self.writer.aclose()
+        logger.info(f"🎞️ Call trace saved | Records: {self.writer.records} | Path: {self.writer.path}")
+
@@ -0,0 +1,538 @@
+"""
+Capacity simulator for outbound AI agent.
+Plays campaign days through the dialer's limits (calls per second, concurrent
+calls, per-trunk caps) and its dialing window as a discrete-event simulation
+and reports what they take: worker hosts, peak concurrent calls, queueing
+before dial, calls held over to the next window and how long each trunk sits
+at its cap. Separately, it reports the hosts, lines, trunks and calls per
+second the demand itself needs to be dialed within each day's window. Random
+draws and every statistic are NumPy passes over whole arrays; only the
+dispatch queue walks the calls, one heap operation each, so a month of calls
+runs in seconds.
+
+Answer rate and talk time are drawn from a distribution or resampled from the
+call store; the CPU and memory a call costs from a load test report.
+
+    python capacity_sim.py --calls-per-day 20000 --days 30 --hours 9-18 --trunk ST_a:30,ST_b:30
+    python capacity_sim.py --calls-per-day 50000 --arrivals campaign --from-store --load-test results/main.json -o sim.json
+"""
+
+import heapq
+import json
+import math
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+DAY = 86400.0
+# Statuses of calls that reached the callee in the call store
+ANSWERED = {"answered", "completed"}
+
+
+def parse_spec(spec: str) -> Tuple[float, float]:
+    """`median[,p95]` in seconds"""
+    median, _, p95 = spec.partition(",")
+    return float(median), float(p95 or median)
+
+
+def lognormal(spec: Tuple[float, float], size: int, rng: np.random.Generator) -> np.ndarray:
+    """Log-normal draws with the given median and p95 (fixed when they're equal)"""
+    median, p95 = spec
+    if median <= 0:
+        return np.zeros(size)
+    sigma = math.log(p95 / median) / 1.645 if p95 > median else 0.0
+    return median * np.exp(sigma * rng.standard_normal(size))
+
+
+@dataclass
+class CallModel:
+    """
+    What one dial turns into: answered or not, and how long it holds a trunk and a job
+
+    Answered calls ring for `ring` then talk for `talk` (log-normal), or for a
+    duration resampled from `talk_samples` when measured ones are given.
+    Unanswered dials hold the trunk for `no_answer`.
+    """
+    answer_rate: float = 0.35
+    ring: Tuple[float, float] = (8.0, 20.0)
+    talk: Tuple[float, float] = (90.0, 300.0)
+    no_answer: Tuple[float, float] = (25.0, 40.0)
+    talk_samples: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_store(cls, start: Optional[str] = None, end: Optional[str] = None, **defaults) -> "CallModel":
+        """Answer rate and talk times of the calls in the call store between two days"""
+        from call_store import CallStoreReader
+
+        statuses, durations = [], []
+        for call in CallStoreReader().calls(start, end):
+            if call["status"] == "suppressed":
+                continue
+            statuses.append(call["status"] in ANSWERED)
+            if call["status"] in ANSWERED and call.get("duration_seconds"):
+                durations.append(call["duration_seconds"])
+        if not statuses or not durations:
+            raise ValueError("no finished calls in the call store for that range")
+        model = cls(answer_rate=sum(statuses) / len(statuses), talk_samples=np.array(durations), **defaults)
+        logger.info(
+            f"📞 Call model from {len(statuses)} stored calls | Answer rate: {model.answer_rate:.1%} | "
+            f"Talk median/p95: {np.median(model.talk_samples):.0f}/{np.percentile(model.talk_samples, 95):.0f}s"
+        )
+        return model
+
+    def draw(self, size: int, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(answered, seconds until answered or given up, talk seconds) for `size` dials"""
+        answered = rng.random(size) < self.answer_rate
+        if self.talk_samples is not None:
+            talk = rng.choice(self.talk_samples, size)
+        else:
+            talk = lognormal(self.talk, size, rng)
+        ring = np.where(answered, lognormal(self.ring, size, rng), lognormal(self.no_answer, size, rng))
+        return answered, ring, np.where(answered, talk, 0.0)
+
+
+@dataclass
+class HostModel:
+    """How many concurrent calls fit on one worker host"""
+    cores: float = 8.0
+    cpu_limit: float = 0.8
+    job_cores: float = 0.25
+    memory_gb: float = 16.0
+    rss_mb: float = 300.0
+    # Worker, inference process and idle prewarmed processes
+    base_mb: float = 2048.0
+
+    @classmethod
+    def from_load_test(cls, path: str, **overrides) -> "HostModel":
+        """Per-call CPU (calibrated `job_cores`) and peak RSS per job process from benchmarks/load_test.py"""
+        with open(path) as f:
+            report = json.load(f)
+        load = report.get("worker_load", {})
+        measured = {
+            "job_cores": load.get("job_cores") or None,
+            "rss_mb": report.get("rss_per_process_mb", {}).get("max") or None,
+        }
+        return cls(**{k: v for k, v in {**measured, **overrides}.items() if v is not None})
+
+    @property
+    def calls_per_host(self) -> int:
+        by_cpu = math.floor(self.cores * self.cpu_limit / self.job_cores) if self.job_cores > 0 else math.inf
+        by_memory = math.floor((self.memory_gb * 1024 - self.base_mb) / self.rss_mb) if self.rss_mb > 0 else math.inf
+        return max(1, int(min(by_cpu, by_memory, 1_000_000)))
+
+
+def daily_weights(hours: str = "9-18", profile: Optional[str] = None) -> np.ndarray:
+    """Share of a day's calls in each hour: a `start-end` dialing window, or 24 comma-separated weights"""
+    if profile:
+        weights = np.array([float(w) for w in profile.split(",")])
+        if weights.size != 24:
+            raise ValueError("an hourly profile needs 24 weights")
+    else:
+        start, _, end = hours.partition("-")
+        weights = np.zeros(24)
+        weights[int(start):int(end or 24)] = 1.0
+    if weights.sum() <= 0:
+        raise ValueError("the dialing window is empty")
+    return weights / weights.sum()
+
+
+def window_opens(weights: np.ndarray) -> np.ndarray:
+    """For each hour of the day, when dialing is next open, in seconds from that midnight (past 86400: the next day)"""
+    open_hours = weights > 0
+    opens = np.empty(24)
+    for hour in range(24):
+        following = next(k for k in range(hour, hour + 24) if open_hours[k % 24])
+        opens[hour] = following * 3600.0
+    return opens
+
+
+def arrivals(
+    calls_per_day: float,
+    days: int,
+    weights: np.ndarray,
+    rng: np.random.Generator,
+    mode: str = "poisson",
+) -> np.ndarray:
+    """
+    When each call becomes ready to dial, in seconds from the first midnight
+
+    `poisson` spreads a Poisson number of requests per day over the hours by
+    their weights; `campaign` releases the whole day's list when dialing
+    opens, as `dialer.py` does with a contact file.
+    """
+    if mode == "campaign":
+        opens = np.argmax(weights > 0) * 3600.0
+        per_day = int(round(calls_per_day))
+        return np.repeat(np.arange(days) * DAY + opens, per_day)
+    counts = rng.poisson(calls_per_day, days)
+    total = int(counts.sum())
+    day = np.repeat(np.arange(days), counts)
+    hour = rng.choice(24, total, p=weights)
+    return np.sort(day * DAY + (hour + rng.random(total)) * 3600.0)
+
+
+def paced(ready: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    The same calls spread over their day's dialing hours by the hourly weights
+
+    What the demand looks like to a dialer pacing each day's list to finish
+    within its window, rather than releasing it all when dialing opens.
+    """
+    day = ready // DAY
+    bounds = np.searchsorted(day, np.arange(day.max() + 2)) if len(day) else np.zeros(1, dtype=int)
+    share = np.empty(len(ready))
+    for d in range(len(bounds) - 1):
+        n = bounds[d + 1] - bounds[d]
+        share[bounds[d]:bounds[d + 1]] = (np.arange(n) + 0.5) / max(n, 1)
+    # Invert the day's cumulative weight, interpolating within each hour
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+    seconds = np.interp(share, cumulative, np.arange(25) * 3600.0)
+    return np.sort(day * DAY + seconds)
+
+
+def dispatch(
+    ready: np.ndarray,
+    hold: np.ndarray,
+    trunks: Dict[str, int],
+    max_concurrent: int,
+    cps: float,
+    opens: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dial start time and trunk of each call, first come first served
+
+    A call waits for a free line (the trunks' caps, bounded by `max_concurrent`)
+    and for a token from a bucket refilled at `cps` with a burst of max(1, cps),
+    the same limits CampaignDialer applies. Lines are spread over the trunks up
+    to their caps; a call takes the line that has been free the longest. With
+    `opens` (from `window_opens`), a call that would start outside the dialing
+    window is held until it next opens; calls already up run to their end.
+    """
+    # With fewer lines than the trunks carry, each trunk gets its share of them
+    shares = sorted((i / cap, k) for k, cap in enumerate(trunks.values()) for i in range(cap))
+    lines = [(0.0, k) for _, k in shares[:max_concurrent]]
+    heapq.heapify(lines)
+
+    burst = max(1.0, cps)
+    tokens, refilled = burst, 0.0
+    start = np.empty(len(ready))
+    trunk = np.empty(len(ready), dtype=np.int32)
+    heapreplace = heapq.heapreplace
+    opens = opens.tolist() if opens is not None else None
+    for i, (t, held) in enumerate(zip(ready.tolist(), hold.tolist())):
+        free_at, k = lines[0]
+        if free_at > t:
+            t = free_at
+        # Waiting for a token can run past the window's close, so check both until they agree
+        while True:
+            if opens is not None:
+                midnight = t - t % DAY
+                opening = midnight + opens[int((t - midnight) // 3600.0)]
+                if opening > t:
+                    t = opening
+            tokens = min(burst, tokens + (t - refilled) * cps)
+            refilled = t
+            if tokens >= 1.0 - 1e-9:
+                break
+            t += (1.0 - tokens) / cps
+        tokens -= 1.0
+        start[i] = t
+        trunk[i] = k
+        heapreplace(lines, (t + held, k))
+    return start, trunk
+
+
+def concurrency(start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(event times, calls in progress from each event to the next), ends before starts on ties"""
+    times = np.concatenate([start, end])
+    steps = np.concatenate([np.ones(len(start), dtype=np.int32), -np.ones(len(end), dtype=np.int32)])
+    order = np.lexsort((steps, times))
+    return times[order], np.cumsum(steps[order])
+
+
+def time_quantile(times: np.ndarray, level: np.ndarray, q: float) -> float:
+    """Concurrency exceeded only a `1 - q` share of the time calls were in progress"""
+    if len(times) < 2:
+        return 0.0
+    spans = np.diff(times)
+    levels = level[:-1]
+    busy = levels > 0
+    spans, levels = spans[busy], levels[busy]
+    if not spans.sum():
+        return float(level.max())
+    order = np.argsort(levels)
+    cumulative = np.cumsum(spans[order]) / spans.sum()
+    return float(levels[order][min(np.searchsorted(cumulative, q), len(order) - 1)])
+
+
+def _percentiles(values: np.ndarray, scale: float = 1.0) -> dict:
+    if not len(values):
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * scale
+    return {
+        "mean": round(float(values.mean() * scale), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max() * scale), 3),
+    }
+
+
+def simulate(
+    calls_per_day: float,
+    days: int,
+    model: CallModel,
+    host: HostModel,
+    trunks: Dict[str, int],
+    max_concurrent: int,
+    cps: float,
+    weights: np.ndarray,
+    mode: str = "poisson",
+    seed: int = 1,
+) -> dict:
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    ready = arrivals(calls_per_day, days, weights, rng, mode)
+    answered, ring, talk = model.draw(len(ready), rng)
+    hold = ring + talk
+    start, trunk = dispatch(ready, hold, trunks, max_concurrent, cps, window_opens(weights))
+    end = start + hold
+    simulated = time.perf_counter() - started
+
+    # What the calls need, whatever the limits: each day's calls dialed within its
+    # window, a campaign's list paced over the window rather than all at its opening
+    wanted = paced(ready, weights) if mode == "campaign" else ready
+    _, wanted_level = concurrency(wanted, wanted + hold)
+    wanted_times = np.sort(np.concatenate([wanted, wanted + hold]))
+    wanted_peak = int(wanted_level.max()) if len(wanted_level) else 0
+    wanted_p99 = time_quantile(wanted_times, wanted_level, 0.99)
+    wanted_cps = int(np.unique(np.floor(wanted), return_counts=True)[1].max()) if len(wanted) else 0
+
+    # A job process is held from dial to hang-up, so concurrent jobs are concurrent dials
+    times, level = concurrency(start, end)
+    peak = int(level.max()) if len(level) else 0
+    p99 = time_quantile(times, level, 0.99)
+    talk_times, talking = concurrency((start + ring)[answered], end[answered])
+    delay = start - ready
+
+    # Per day, by when the call became ready to dial; both arrays are in time order
+    midnights = np.arange(days + 1) * DAY
+    call_bounds = np.searchsorted(ready, midnights)
+    event_bounds = np.searchsorted(times, midnights)
+    carried = start // DAY > ready // DAY
+    days_table = []
+    for d in range(days):
+        calls = slice(call_bounds[d], call_bounds[d + 1])
+        if calls.start == calls.stop:
+            continue
+        events = level[event_bounds[d]:event_bounds[d + 1]]
+        last = (end[calls].max() - d * DAY) / 60
+        days_table.append({
+            "day": d + 1,
+            "calls": int(calls.stop - calls.start),
+            "answered": int(answered[calls].sum()),
+            "peak_concurrent": int(events.max()) if len(events) else 0,
+            "delay_p95_s": round(float(np.percentile(delay[calls], 95)), 1),
+            "carried_over": int(carried[calls].sum()),
+            # Past 24:00 when the day's calls ran into the next one
+            "last_hangup": f"{int(last // 60):02d}:{int(last % 60):02d}",
+        })
+
+    trunk_report = {}
+    # Including the days calls held over from the last one were dialed on
+    dialed_days = max(days, math.ceil(start.max() / DAY)) if len(start) else days
+    dialing_seconds = dialed_days * float((weights > 0).sum()) * 3600.0
+    for k, (trunk_id, cap) in enumerate(trunks.items()):
+        mask = trunk == k
+        if not mask.any():
+            trunk_report[trunk_id] = {"cap": cap, "calls": 0}
+            continue
+        t_times, t_level = concurrency(start[mask], end[mask])
+        at_cap = np.diff(t_times)[t_level[:-1] >= cap].sum()
+        trunk_report[trunk_id] = {
+            "cap": cap,
+            "calls": int(mask.sum()),
+            "peak": int(t_level.max()),
+            "at_cap_share": round(float(at_cap / dialing_seconds), 4),
+            "line_minutes": round(float(hold[mask].sum() / 60), 1),
+        }
+
+    per_host = host.calls_per_host
+    lines = min(max_concurrent, sum(trunks.values()))
+    mean_cap = sum(trunks.values()) / len(trunks)
+    waited = delay > 1e-6
+    report = {
+        "config": {
+            "calls_per_day": calls_per_day,
+            "days": days,
+            "arrivals": mode,
+            "cps": cps,
+            "max_concurrent": max_concurrent,
+            "trunks": trunks,
+            "answer_rate": round(model.answer_rate, 4),
+            "seed": seed,
+        },
+        "calls": {
+            "total": int(len(ready)),
+            "answered": int(answered.sum()),
+            "talk_minutes": round(float(talk.sum() / 60), 1),
+            # Held to a later day's window because the limits couldn't dial them in their own
+            "carried_over": int(carried.sum()),
+            "dialed_after_last_day": int((start >= days * DAY).sum()),
+        },
+        "demand": {
+            "peak": wanted_peak,
+            "p99": wanted_p99,
+            "cps": wanted_cps,
+            "lines": wanted_peak,
+            "trunks": math.ceil(wanted_peak / mean_cap),
+            "hosts_for_peak": math.ceil(wanted_peak / per_host),
+            "hosts_for_p99": math.ceil(wanted_p99 / per_host),
+        },
+        "concurrency": {
+            "peak": peak,
+            "p99": p99,
+            "peak_talking": int(talking.max()) if len(talking) else 0,
+        },
+        "queue_delay_s": {"waited_share": round(float(waited.mean()), 4), **_percentiles(delay)},
+        "hosts": {
+            "calls_per_host": per_host,
+            # Enough to run every line the limits allow, and what the simulated calls used
+            "for_limits": math.ceil(lines / per_host),
+            "for_peak": math.ceil(peak / per_host),
+            "for_p99": math.ceil(p99 / per_host),
+            "host": {k: v for k, v in vars(host).items()},
+        },
+        "trunks": trunk_report,
+        "days": days_table,
+        "sim_seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(f"🧮 Simulated {len(ready)} calls over {days} days in {report['sim_seconds']:.2f}s (dispatch {simulated:.2f}s)")
+    return report
+
+
+def log_summary(report: dict):
+    c, q, h, d = report["concurrency"], report["queue_delay_s"], report["hosts"], report["demand"]
+    config, calls = report["config"], report["calls"]
+    logger.info(
+        f"🧮 CAPACITY | Calls: {calls['total']} ({calls['answered']} answered) | "
+        f"Demand: peak {d['peak']} concurrent (p99 {d['p99']:.0f}), {d['cps']} calls/s | "
+        f"Needs {d['hosts_for_peak']} hosts at {h['calls_per_host']} calls/host (p99: {d['hosts_for_p99']}), "
+        f"{d['lines']} lines on {d['trunks']} trunks"
+    )
+    logger.info(
+        f"   ├─ Configured limits: {min(config['max_concurrent'], sum(config['trunks'].values()))} lines at {config['cps']:g} calls/s | "
+        f"Peak concurrent: {c['peak']} (p99 {c['p99']:.0f}, talking {c['peak_talking']}) | "
+        f"Hosts: {h['for_peak']} (all lines: {h['for_limits']})"
+    )
+    if calls["carried_over"]:
+        logger.warning(
+            f"   ├─ ⚠️ Limits too low for the demand | {calls['carried_over']} calls held to a later day's window | "
+            f"{calls['dialed_after_last_day']} dialed after day {config['days']}"
+        )
+    if q:
+        logger.info(f"   ├─ Queue before dial: {q['waited_share']:.1%} waited | p50 {q['p50']:.1f}s | p95 {q['p95']:.1f}s | max {q['max']:.1f}s")
+    for trunk_id, t in report["trunks"].items():
+        if t["calls"]:
+            logger.info(f"   ├─ Trunk {trunk_id}: peak {t['peak']}/{t['cap']} | at cap {t['at_cap_share']:.1%} of dialing hours | {t['line_minutes']:.0f} line-min")
+    if "cost" in report:
+        logger.info(f"   └─ {report['cost']['config']}: ${report['cost']['monthly_usd']:.2f}/month for the answered calls")
+
+
+def _cost(report: dict, config_name: str) -> dict:
+    from cost_config import CONFIGS, estimate_monthly_cost
+
+    calls, days = report["calls"], report["config"]["days"]
+    answered_per_day = calls["answered"] / days
+    minutes = calls["talk_minutes"] / calls["answered"] if calls["answered"] else 0.0
+    estimate = estimate_monthly_cost(answered_per_day, minutes, CONFIGS[config_name])
+    return {"config": config_name, "monthly_usd": round(estimate["costs"]["total"], 2), "per_call_usd": round(estimate["per_call_cost"], 4)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from core import settings
+    from cost_config import CONFIGS
+    from logger import setup_logging
+    from trunk_pool import parse_trunk_spec
+
+    setup_logging(stream=sys.stderr)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls-per-day", type=float, required=True)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--arrivals", choices=("poisson", "campaign"), default="poisson",
+                        help="Calls requested through the day, or the day's list released when dialing opens")
+    parser.add_argument("--hours", default="9-18", help="Dialing window, start-end hour (UTC)")
+    parser.add_argument("--profile", help="24 comma-separated hourly weights instead of a flat window")
+    parser.add_argument("--trunk", action="append", help="TRUNK_ID[:CAP], repeatable (default: the campaign settings)")
+    parser.add_argument("--max-concurrent", type=int, default=None, help="Default: CAMPAIGN_MAX_CONCURRENT_CALLS")
+    parser.add_argument("--cps", type=float, default=None, help="Default: CAMPAIGN_CALLS_PER_SECOND")
+    parser.add_argument("--answer-rate", type=float, default=0.35)
+    parser.add_argument("--ring", default="8,20", help="Dial to answer: median[,p95] seconds")
+    parser.add_argument("--no-answer", default="25,40", help="Dial to giving up on unanswered calls")
+    parser.add_argument("--talk", default="90,300", help="Answered call duration")
+    parser.add_argument("--from-store", action="store_true", help="Answer rate and durations from the call store")
+    parser.add_argument("--store-from", help="First day of stored calls, YYYY-MM-DD")
+    parser.add_argument("--store-to", help="Last day of stored calls, YYYY-MM-DD")
+    parser.add_argument("--load-test", help="load_test.py report to take per-call CPU and RSS from")
+    parser.add_argument("--host-cores", type=float, default=None)
+    parser.add_argument("--host-memory-gb", type=float, default=None)
+    parser.add_argument("--job-cores", type=float, default=None, help="CPU cores one call uses")
+    parser.add_argument("--rss-mb", type=float, default=None, help="Peak RSS of one job process")
+    parser.add_argument("--config", choices=sorted(CONFIGS), help="cost_config configuration to price the answered calls with")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        weights = daily_weights(args.hours, args.profile)
+        shape = {"ring": parse_spec(args.ring), "no_answer": parse_spec(args.no_answer), "talk": parse_spec(args.talk)}
+        if args.from_store:
+            model = CallModel.from_store(args.store_from, args.store_to, **shape)
+        else:
+            model = CallModel(answer_rate=args.answer_rate, **shape)
+    except ValueError as e:
+        parser.error(str(e))
+    overrides = {
+        "cores": args.host_cores,
+        "memory_gb": args.host_memory_gb,
+        "job_cores": args.job_cores,
+        "rss_mb": args.rss_mb,
+        "cpu_limit": settings.WORKER_CPU_LIMIT,
+    }
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    host = HostModel.from_load_test(args.load_test, **overrides) if args.load_test else HostModel(**overrides)
+    trunks = parse_trunk_spec(",".join(args.trunk) if args.trunk else settings.SIP_OUTBOUND_TRUNKS)
+
+    report = simulate(
+        args.calls_per_day,
+        args.days,
+        model,
+        host,
+        trunks,
+        max_concurrent=args.max_concurrent or settings.CAMPAIGN_MAX_CONCURRENT_CALLS,
+        cps=args.cps or settings.CAMPAIGN_CALLS_PER_SECOND,
+        weights=weights,
+        mode=args.arrivals,
+        seed=args.seed,
+    )
+    if args.config:
+        report["cost"] = _cost(report, args.config)
+    log_summary(report)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        logger.info(f"📄 Report written to {args.output}")
+    else:
+        print(output)
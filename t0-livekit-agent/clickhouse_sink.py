@@ -0,0 +1,451 @@
+"""
+ClickHouse write buffer for outbound AI agent.
+Every job process embeds its own TensorZero gateway, and each gateway writes
+every inference and feedback as its own small INSERT. One sink per host sits in
+front of ClickHouse instead: the gateways use it as their ClickHouse URL, their
+`INSERT ... FORMAT JSONEachRow` requests are acknowledged at once and coalesced
+per table into large inserts, flushed by size or age. Anything else (schema
+checks, migrations, reads) is passed straight through, after the pending rows
+are flushed so reads see them. When ClickHouse is slow or down, batches spill
+to disk and are replayed once it answers again.
+
+    python clickhouse_sink.py                 # sidecar on CLICKHOUSE_SINK_PORT
+    CLICKHOUSE_SINK_PORT=8124 uv run main.py start
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import aiohttp
+from aiohttp import web
+from yarl import URL
+
+from core import settings
+from latency_tracker import LatencyHistogram, register_metrics_source, start_metrics_server
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# The statement, optionally followed by the first rows on the same request body
+_INSERT = re.compile(r"\s*(INSERT\s+INTO\s+[^\n{]*?\bFORMAT\s+JSONEachRow)\b[ \t]*\n?", re.IGNORECASE)
+# ClickHouse answers these when overloaded or restarting; any other 4xx is a bad batch
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Not forwarded; the sink authenticates to ClickHouse with its own credentials
+_DROP_HEADERS = {
+    "host", "content-length", "transfer-encoding", "connection", "keep-alive", "content-encoding",
+    "authorization", "x-clickhouse-user", "x-clickhouse-key",
+}
+# Handlers ClickHouse serves on their own path; everything else is a query on /
+_PATHS = {"/ping", "/replicas_status"}
+
+
+@dataclass
+class _Batch:
+    statement: str
+    params: Tuple[Tuple[str, str], ...]
+    chunks: List[bytes] = field(default_factory=list)
+    rows: int = 0
+    size: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def add(self, rows: bytes, count: int):
+        self.chunks.append(rows)
+        self.rows += count
+        self.size += len(rows)
+
+    def body(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+def split_insert(query: Optional[str], body: bytes) -> Optional[Tuple[str, bytes]]:
+    """(statement, JSONEachRow rows) of an insert request, None for any other query"""
+    if query is not None:
+        match = _INSERT.fullmatch(query.rstrip() + "\n")
+        return (match.group(1), body) if match else None
+    head = body[:4096].decode("utf-8", "replace")
+    match = _INSERT.match(head)
+    if match is None:
+        return None
+    return match.group(1), body[len(match.group(0).encode()):]
+
+
+def _count_rows(rows: bytes) -> int:
+    return rows.count(b"\n") + (not rows.endswith(b"\n"))
+
+
+class ClickHouseSink:
+    """
+    Coalesces JSONEachRow inserts from many gateways into few large ones
+
+    A table's batch is handed to one of `max_inserts` insert workers once it
+    holds `batch_rows` rows or `batch_bytes`, or is `flush_seconds` old. Ready
+    batches beyond `max_buffer_bytes`, and batches ClickHouse didn't take (5xx,
+    timeouts), are written to `spill_dir`. While ClickHouse is failing, new
+    batches go straight to disk; spilled batches are replayed oldest first once
+    an insert succeeds again. Batches ClickHouse rejects as invalid are kept as
+    `.rejected` files rather than retried.
+    """
+
+    def __init__(
+        self,
+        upstream_url: Optional[str] = None,
+        batch_rows: Optional[int] = None,
+        batch_bytes: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+        max_buffer_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        insert_timeout: Optional[float] = None,
+        max_inserts: int = 2,
+    ):
+        upstream = URL(upstream_url or settings.CLICKHOUSE_URL)
+        self.upstream = upstream.with_user(None).with_path("/")
+        self.auth = aiohttp.BasicAuth(upstream.user or "default", upstream.password or "")
+        # The gateways' URLs carry the database as their path; the HTTP interface wants a parameter
+        self.database = upstream.path.strip("/") or None
+        self.batch_rows = batch_rows or settings.CLICKHOUSE_SINK_BATCH_ROWS
+        self.batch_bytes = batch_bytes or int(settings.CLICKHOUSE_SINK_BATCH_MB * 1024 * 1024)
+        self.flush_seconds = flush_seconds if flush_seconds is not None else settings.CLICKHOUSE_SINK_FLUSH_SECONDS
+        self.max_buffer_bytes = max_buffer_bytes or int(settings.CLICKHOUSE_SINK_MAX_BUFFER_MB * 1024 * 1024)
+        self.spill_dir = Path(spill_dir or settings.CLICKHOUSE_SINK_SPILL_DIR)
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.timeout = aiohttp.ClientTimeout(total=insert_timeout or settings.CLICKHOUSE_SINK_INSERT_TIMEOUT)
+        self.max_inserts = max_inserts
+
+        self._batches: Dict[Tuple, _Batch] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._buffered_bytes = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tasks: List[asyncio.Task] = []
+        self._spilling: Set[asyncio.Task] = set()
+        self._spill_seq = 0
+        self._failures = 0
+        self._retry_at = 0.0
+
+        self.insert_latency = LatencyHistogram(max_seconds=60.0)
+        self.counters = dict.fromkeys(
+            ("rows_accepted", "rows_inserted", "inserts", "rows_spilled", "rows_replayed", "rows_rejected", "insert_failures", "proxied"),
+            0,
+        )
+
+    # Lifecycle
+
+    async def start(self):
+        self._ready = asyncio.Queue()
+        connector = aiohttp.TCPConnector(limit=self.max_inserts + 8, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._tasks = [asyncio.create_task(self._insert_worker(), name=f"clickhouse-insert-{i}") for i in range(self.max_inserts)]
+        self._tasks.append(asyncio.create_task(self._flusher(), name="clickhouse-flusher"))
+        pending = len(self._spill_files())
+        logger.info(
+            f"🗄️ ClickHouse sink started | Upstream: {self.upstream} | Batch: {self.batch_rows} rows / "
+            f"{self.batch_bytes // 1024} KB / {self.flush_seconds}s | Spilled batches: {pending}"
+        )
+
+    async def aclose(self, timeout: float = 10.0):
+        """Insert what's buffered, spill whatever ClickHouse doesn't take in time"""
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("⚠️ ClickHouse sink flush timed out on shutdown; spilling the rest")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while self._ready is not None and not self._ready.empty():
+            await self._spill(self._ready.get_nowait())
+        for batch in list(self._batches.values()):
+            await self._spill(batch)
+        self._batches.clear()
+        await self._overflow_written()
+        if self._session is not None:
+            await self._session.close()
+        self.log_stats()
+
+    # Requests from the gateways
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        insert = split_insert(request.query.get("query"), body) if request.method == "POST" else None
+        if insert is None:
+            # Reads must see every row already acknowledged
+            await self.flush()
+            return await self._proxy(request, body)
+
+        statement, rows = insert
+        params = tuple(sorted(self._params(request)))
+        if rows.strip():
+            self.add(statement, params, rows)
+        return web.Response(status=200, text="")
+
+    def add(self, statement: str, params: Tuple, rows: bytes):
+        if not rows.endswith(b"\n"):
+            rows += b"\n"
+        key = (statement, params)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(statement, params)
+        count = _count_rows(rows)
+        batch.add(rows, count)
+        self._buffered_bytes += len(rows)
+        self.counters["rows_accepted"] += count
+        if batch.rows >= self.batch_rows or batch.size >= self.batch_bytes:
+            self._hand_off(key)
+
+    async def _proxy(self, request: web.Request, body: bytes) -> web.Response:
+        self.counters["proxied"] += 1
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in _DROP_HEADERS}
+        params = self._params(request)
+        if "query" in request.query:
+            params.append(("query", request.query["query"]))
+        url = self.upstream.with_path(request.path if request.path in _PATHS else "/")
+        try:
+            async with self._session.request(
+                request.method, url, params=params, data=body or None, headers=headers, auth=self.auth,
+                timeout=self.timeout,
+            ) as response:
+                payload = await response.read()
+                out_headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS}
+                return web.Response(status=response.status, body=payload, headers=out_headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"⚠️ ClickHouse unreachable for a proxied query: {type(e).__name__}: {e}")
+            return web.Response(status=502, text=f"ClickHouse sink: upstream unavailable ({type(e).__name__})")
+
+    def _params(self, request: web.Request) -> List[Tuple[str, str]]:
+        """The request's parameters but `query`, with the database of its URL path made explicit"""
+        params = [(k, v) for k, v in request.query.items() if k != "query"]
+        database = request.path.strip("/") if request.path not in _PATHS else ""
+        if not any(k == "database" for k, _ in params) and (database or self.database):
+            params.append(("database", database or self.database))
+        return params
+
+    # Batching
+
+    def _hand_off(self, key: Tuple):
+        self._ready.put_nowait(self._batches.pop(key))
+        # ClickHouse isn't keeping up: move the oldest ready batches out of memory, writing them in a thread
+        while self._buffered_bytes > self.max_buffer_bytes and not self._ready.empty():
+            oldest = self._ready.get_nowait()
+            self._ready.task_done()
+            self._buffered_bytes -= oldest.size
+            task = asyncio.create_task(self._spill_overflow(oldest))
+            self._spilling.add(task)
+            task.add_done_callback(self._spilling.discard)
+
+    async def _spill_overflow(self, batch: _Batch):
+        try:
+            await self._spill(batch)
+        except OSError as e:
+            logger.error(f"❌ Could not spill {batch.rows} rows, dropping them | {batch.statement} | {e}")
+
+    async def _overflow_written(self):
+        if self._spilling:
+            await asyncio.gather(*self._spilling)
+
+    async def flush(self):
+        """Hand every batch to the insert workers and wait until they're done"""
+        for key in list(self._batches):
+            self._hand_off(key)
+        await self._ready.join()
+        await self._overflow_written()
+
+    async def _flusher(self):
+        tick = max(0.05, self.flush_seconds / 4)
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(tick)
+            now = time.monotonic()
+            for key, batch in list(self._batches.items()):
+                if now - batch.started >= self.flush_seconds:
+                    self._hand_off(key)
+            if self._ready.empty() and now >= self._retry_at:
+                await self._replay_one()
+            if now - last_report >= 60:
+                self.log_stats()
+                last_report = now
+
+    async def _insert_worker(self):
+        while True:
+            batch = await self._ready.get()
+            try:
+                if time.monotonic() < self._retry_at:
+                    await self._spill(batch)
+                    continue
+                result = await self._insert(batch.statement, batch.params, batch.body(), batch.rows)
+                if result == "failed":
+                    await self._spill(batch)
+                elif result == "rejected":
+                    await self._spill(batch, rejected=True)
+            finally:
+                self._buffered_bytes -= batch.size
+                self._ready.task_done()
+
+    async def _insert(self, statement: str, params: Tuple, body: bytes, rows: int) -> str:
+        """`ok`, `failed` (worth retrying) or `rejected`"""
+        started = time.perf_counter()
+        try:
+            async with self._session.post(
+                self.upstream, params=[*params, ("query", statement)], data=body,
+                auth=self.auth, timeout=self.timeout,
+            ) as response:
+                status = response.status
+                error = "" if status == 200 else (await response.text())[:300]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+
+        if status == 200:
+            self.insert_latency.record(time.perf_counter() - started)
+            self.counters["inserts"] += 1
+            self.counters["rows_inserted"] += rows
+            self._failures = 0
+            self._retry_at = 0.0
+            logger.debug(f"🗄️ Inserted {rows} rows | {statement} | {(time.perf_counter() - started) * 1000:.0f}ms")
+            return "ok"
+
+        self.counters["insert_failures"] += 1
+        if status is None or status in _RETRYABLE_STATUS:
+            self._failures += 1
+            delay = min(30.0, 0.5 * 2 ** self._failures)
+            self._retry_at = time.monotonic() + delay
+            logger.warning(f"⚠️ ClickHouse insert failed; spilling and retrying in {delay:.1f}s | {statement} | {status or error}")
+            return "failed"
+        logger.error(f"❌ ClickHouse rejected {rows} rows | {statement} | HTTP {status}: {error}")
+        return "rejected"
+
+    # Spill files: a JSON header line, then the rows
+
+    def _spill_files(self) -> List[Path]:
+        return sorted(self.spill_dir.glob("*.spill"))
+
+    def _spill_now(self, batch: _Batch, rejected: bool = False):
+        self._spill_seq += 1
+        name = f"{time.time_ns():020d}-{os.getpid()}-{self._spill_seq:06d}"
+        path = self.spill_dir / f"{name}.{'rejected' if rejected else 'spill'}"
+        staging = path.with_suffix(".tmp")
+        header = {"statement": batch.statement, "params": batch.params, "rows": batch.rows}
+        with open(staging, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.writelines(batch.chunks)
+        os.replace(staging, path)
+        self.counters["rows_rejected" if rejected else "rows_spilled"] += batch.rows
+
+    async def _spill(self, batch: _Batch, rejected: bool = False):
+        await asyncio.to_thread(self._spill_now, batch, rejected)
+
+    async def _replay_one(self):
+        files = self._spill_files()
+        if not files:
+            return
+        path = files[0]
+        data = await asyncio.to_thread(path.read_bytes)
+        header_line, _, body = data.partition(b"\n")
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            logger.error(f"❌ Unreadable spill file, setting it aside: {path.name}")
+            path.rename(path.with_suffix(".rejected"))
+            return
+        result = await self._insert(header["statement"], tuple(tuple(p) for p in header["params"]), body, header["rows"])
+        if result == "ok":
+            path.unlink()
+            self.counters["rows_replayed"] += header["rows"]
+            logger.info(f"♻️ Replayed spilled batch | Rows: {header['rows']} | Left: {len(files) - 1}")
+        elif result == "rejected":
+            path.rename(path.with_suffix(".rejected"))
+
+    # Reporting
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "mean_batch_rows": round(self.counters["rows_inserted"] / self.counters["inserts"], 1) if self.counters["inserts"] else 0.0,
+            "buffered_bytes": self._buffered_bytes,
+            "spilled_batches": len(self._spill_files()),
+            "insert_ms_p50": round(self.insert_latency.percentile(0.5) * 1000, 1),
+            "insert_ms_p99": round(self.insert_latency.percentile(0.99) * 1000, 1),
+        }
+
+    def log_stats(self):
+        s = self.stats()
+        logger.info(
+            f"🗄️ CLICKHOUSE SINK | Rows: {s['rows_accepted']} in, {s['rows_inserted']} inserted | Inserts: {s['inserts']} "
+            f"(mean {s['mean_batch_rows']} rows) | Insert p50/p99: {s['insert_ms_p50']}/{s['insert_ms_p99']}ms | "
+            f"Spilled: {s['rows_spilled']} rows, {s['spilled_batches']} batches pending | Rejected: {s['rows_rejected']}"
+        )
+
+    def render_prometheus(self) -> str:
+        s = self.stats()
+        lines = []
+        for name in ("rows_accepted", "rows_inserted", "inserts", "rows_spilled", "rows_replayed", "rows_rejected", "insert_failures", "proxied"):
+            lines += [f"# TYPE agent_clickhouse_sink_{name}_total counter", f"agent_clickhouse_sink_{name}_total {s[name]}"]
+        lines += [
+            "# TYPE agent_clickhouse_sink_buffered_bytes gauge",
+            f"agent_clickhouse_sink_buffered_bytes {s['buffered_bytes']}",
+            "# TYPE agent_clickhouse_sink_spilled_batches gauge",
+            f"agent_clickhouse_sink_spilled_batches {s['spilled_batches']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def gateway_clickhouse_url() -> str:
+    """
+    ClickHouse URL for this process' TensorZero gateway
+
+    The host's sink when CLICKHOUSE_SINK_PORT is set and it's listening,
+    otherwise ClickHouse itself.
+    """
+    if not settings.CLICKHOUSE_SINK_PORT:
+        return settings.CLICKHOUSE_URL
+    try:
+        with socket.create_connection((settings.CLICKHOUSE_SINK_HOST, settings.CLICKHOUSE_SINK_PORT), timeout=0.5):
+            pass
+    except OSError as e:
+        logger.warning(f"⚠️ ClickHouse sink not reachable, gateway writes go to ClickHouse directly: {e}")
+        return settings.CLICKHOUSE_URL
+    return str(URL(settings.CLICKHOUSE_URL).with_host(settings.CLICKHOUSE_SINK_HOST).with_port(settings.CLICKHOUSE_SINK_PORT))
+
+
+async def serve(sink: ClickHouseSink, host: str, port: int):
+    app = web.Application(client_max_size=256 * 1024 * 1024)
+    app.router.add_route("*", "/{tail:.*}", sink.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await sink.start()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"🗄️ ClickHouse sink listening on {host}:{port}")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        await sink.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.CLICKHOUSE_SINK_HOST)
+    parser.add_argument("--port", type=int, default=settings.CLICKHOUSE_SINK_PORT)
+    parser.add_argument("--upstream", default=settings.CLICKHOUSE_URL, help="ClickHouse URL (default: CLICKHOUSE_URL)")
+    parser.add_argument("--batch-rows", type=int, default=settings.CLICKHOUSE_SINK_BATCH_ROWS)
+    parser.add_argument("--flush-seconds", type=float, default=settings.CLICKHOUSE_SINK_FLUSH_SECONDS)
+    parser.add_argument("--spill-dir", default=settings.CLICKHOUSE_SINK_SPILL_DIR)
+    args = parser.parse_args()
+
+    if not args.port:
+        parser.error("set CLICKHOUSE_SINK_PORT or pass --port")
+
+    sink = ClickHouseSink(args.upstream, batch_rows=args.batch_rows, flush_seconds=args.flush_seconds, spill_dir=args.spill_dir)
+    register_metrics_source(sink.render_prometheus)
+    start_metrics_server()
+    asyncio.run(serve(sink, args.host, args.port))
@@ -27,6 +27,122 @@ class Settings(BaseSettings):
     LIVEKIT_URL: str = config("LIVEKIT_URL", default="wss://livekit.outbound.im")
     LIVEKIT_API_KEY: str = config("LIVEKIT_API_KEY", default="APITpQ4nBVwiwZY")
     LIVEKIT_API_SECRET: str = config("LIVEKIT_API_SECRET", default="ZcmuXyVRzU31YABGDT9IixXaYjr5YsnOQZ4gKVlelZF")
+    SIP_OUTBOUND_TRUNK_ID: str = config("SIP_OUTBOUND_TRUNK_ID", default="ST_ckfvg2Zv5yp5")
+    # Comma separated `TRUNK_ID:MAX_CALLS` list; empty means just SIP_OUTBOUND_TRUNK_ID
+    SIP_OUTBOUND_TRUNKS: str = config("SIP_OUTBOUND_TRUNKS", default="")
+    SIP_TRUNK_EJECTION_SECONDS: float = config("SIP_TRUNK_EJECTION_SECONDS", default=60.0, cast=float)
+    SIP_TRUNK_HEALTH_WINDOW: int = config("SIP_TRUNK_HEALTH_WINDOW", default=50, cast=int)
+
+    # Pipeline providers; only the selected plugins are imported. Empty model/voice uses the plugin default
+    STT_PROVIDER: str = config("STT_PROVIDER", default="deepgram")
+    STT_MODEL: str = config("STT_MODEL", default="nova-3")
+    STT_LANGUAGE: str = config("STT_LANGUAGE", default="en")
+    LLM_PROVIDER: str = config("LLM_PROVIDER", default="openai")
+    LLM_MODEL: str = config("LLM_MODEL", default="gpt-4.1-mini")
+    TTS_PROVIDER: str = config("TTS_PROVIDER", default="elevenlabs")
+    TTS_MODEL: str = config("TTS_MODEL", default="eleven_flash_v2_5")
+    TTS_VOICE: str = config("TTS_VOICE", default="x86DtpnPPuq2BpEiKPRy")
+    # multilingual, english or none
+    TURN_DETECTOR: str = config("TURN_DETECTOR", default="multilingual")
+    # Named pipeline profiles (config/pipelines.toml); job metadata can pick another per campaign
+    PIPELINE_PROFILE: str = config("PIPELINE_PROFILE", default="default")
+    PIPELINES_PATH: str = config("PIPELINES_PATH", default=str(BASE_DIR / "config" / "pipelines.toml"))
+    # Provider routing between a profile's equivalent LLM/TTS candidates
+    ROUTER_WINDOW: int = config("ROUTER_WINDOW", default=30, cast=int)
+    ROUTER_WINDOW_SECONDS: float = config("ROUTER_WINDOW_SECONDS", default=300.0, cast=float)
+    ROUTER_EXPLORE_RATE: float = config("ROUTER_EXPLORE_RATE", default=0.05, cast=float)
+    # Share the routers' windows between the host's job processes (a file next to the metrics rings)
+    ROUTER_SHARED: bool = config("ROUTER_SHARED", default=True, cast=bool)
+    # The embedded TensorZero gateway is optional; disabling it skips its import
+    TENSORZERO_ENABLED: bool = config("TENSORZERO_ENABLED", default=True, cast=bool)
+
+    # Worker load reported to LiveKit dispatch; the worker is full when one more job would cross a limit
+    WORKER_LOAD_ENABLED: bool = config("WORKER_LOAD_ENABLED", default=True, cast=bool)
+    WORKER_LOAD_THRESHOLD: float = config("WORKER_LOAD_THRESHOLD", default=0.75, cast=float)
+    # Share of the worker's cores (cgroup quota aware) its process tree may use
+    WORKER_CPU_LIMIT: float = config("WORKER_CPU_LIMIT", default=0.8, cast=float)
+    WORKER_LOOP_LAG_LIMIT_MS: float = config("WORKER_LOOP_LAG_LIMIT_MS", default=50.0, cast=float)
+    # Hard cap on concurrent jobs (0 disables)
+    WORKER_MAX_JOBS: int = config("WORKER_MAX_JOBS", default=0, cast=int)
+    WORKER_LOAD_WINDOW: float = config("WORKER_LOAD_WINDOW", default=5.0, cast=float)
+    WORKER_LAG_TICK: float = config("WORKER_LAG_TICK", default=0.05, cast=float)
+    # Where job processes publish their loop lag (empty: /dev/shm, else the temp dir)
+    WORKER_LOAD_DIR: str = config("WORKER_LOAD_DIR", default="")
+
+    # Per-job resource reports ("basic": memory, FDs, threads, tasks; "full" adds tracemalloc and object counts; empty disables)
+    JOB_PROFILE: str = config("JOB_PROFILE", default="")
+    # Share of job processes traced in full mode
+    JOB_PROFILE_SAMPLE_RATE: float = config("JOB_PROFILE_SAMPLE_RATE", default=0.1, cast=float)
+    JOB_PROFILE_TRACE_FRAMES: int = config("JOB_PROFILE_TRACE_FRAMES", default=1, cast=int)
+    JOB_PROFILE_TOP: int = config("JOB_PROFILE_TOP", default=10, cast=int)
+    # A process is flagged once its idle memory grew after each of this many jobs, by this much per job on average
+    JOB_PROFILE_LEAK_JOBS: int = config("JOB_PROFILE_LEAK_JOBS", default=5, cast=int)
+    JOB_PROFILE_LEAK_MB: float = config("JOB_PROFILE_LEAK_MB", default=1.0, cast=float)
+    # Drain and exit the worker once one of its long-lived processes grew this much (0 disables; needs a supervisor)
+    WORKER_RECYCLE_GROWTH_MB: float = config("WORKER_RECYCLE_GROWTH_MB", default=0.0, cast=float)
+
+    # Suppression lists (DNC, opted out, recently called) checked before a call connects (empty dir disables)
+    SUPPRESSION_DIR: str = config("SUPPRESSION_DIR", default="")
+    SUPPRESSION_LISTS: str = config("SUPPRESSION_LISTS", default="dnc,opted_out,recent")
+    SUPPRESSION_RELOAD_SECONDS: float = config("SUPPRESSION_RELOAD_SECONDS", default=30.0, cast=float)
+    # Country code assumed when matching national numbers against the lists (empty: national numbers aren't dialed)
+    SUPPRESSION_DEFAULT_COUNTRY: str = config("SUPPRESSION_DEFAULT_COUNTRY", default="")
+
+    # Metric records from job processes go to shared memory rings, aggregated per minute by the worker
+    METRICS_RING_ENABLED: bool = config("METRICS_RING_ENABLED", default=True, cast=bool)
+    METRICS_RING_CAPACITY: int = config("METRICS_RING_CAPACITY", default=16384, cast=int)
+    METRICS_RING_MINUTES: int = config("METRICS_RING_MINUTES", default=60, cast=int)
+    # Empty: /dev/shm, else the temp dir
+    METRICS_RING_DIR: str = config("METRICS_RING_DIR", default="")
+
+    # Campaign dialer
+    CAMPAIGN_MAX_CONCURRENT_CALLS: int = config("CAMPAIGN_MAX_CONCURRENT_CALLS", default=20, cast=int)
+    CAMPAIGN_MAX_CALLS_PER_TRUNK: int = config("CAMPAIGN_MAX_CALLS_PER_TRUNK", default=10, cast=int)
+    CAMPAIGN_CALLS_PER_SECOND: float = config("CAMPAIGN_CALLS_PER_SECOND", default=2.0, cast=float)
+    CAMPAIGN_CHECKPOINT_INTERVAL: int = config("CAMPAIGN_CHECKPOINT_INTERVAL", default=25, cast=int)
+
+    # Prometheus /metrics of the worker (host aggregate from the metrics rings); 0 disables
+    LATENCY_METRICS_PORT: int = config("LATENCY_METRICS_PORT", default=9464, cast=int)
+    # Per-job-process /metrics for debugging, from the first free port here up; 0 (default) disables
+    JOB_METRICS_PORT: int = config("JOB_METRICS_PORT", default=0, cast=int)
+
+    # Outbound greeting: how long to wait for the callee to speak first
+    GREETING_MIN_TIMEOUT: float = config("GREETING_MIN_TIMEOUT", default=1.5, cast=float)
+    GREETING_MAX_TIMEOUT: float = config("GREETING_MAX_TIMEOUT", default=5.0, cast=float)
+    # Speak-first delays of recent calls, appended by every job process on the host; empty disables
+    GREETING_STATS_PATH: str = config("GREETING_STATS_PATH", default=str(BASE_DIR / ".cache" / "greeting_stats.jsonl"))
+
+    # TTS audio cache shared by all job processes on the host. Opt-in: only phrases synthesized whole
+    # are cached (non-streaming TTS, the greeting), and those can hold callee names
+    TTS_CACHE_DIR: str = config("TTS_CACHE_DIR", default="")
+    TTS_CACHE_MAX_MB: int = config("TTS_CACHE_MAX_MB", default=512, cast=int)
+
+    # Call status webhooks (empty URL disables)
+    WEBHOOK_URL: str = config("WEBHOOK_URL", default="")
+    WEBHOOK_OUTBOX_PATH: str = config("WEBHOOK_OUTBOX_PATH", default=str(BASE_DIR / ".cache" / "webhook_outbox.db"))
+    WEBHOOK_BATCH_SIZE: int = config("WEBHOOK_BATCH_SIZE", default=20, cast=int)
+    WEBHOOK_MAX_ATTEMPTS: int = config("WEBHOOK_MAX_ATTEMPTS", default=8, cast=int)
+
+    # Per-call traces for offline replay (empty dir disables)
+    CALL_TRACE_DIR: str = config("CALL_TRACE_DIR", default="")
+    CALL_TRACE_AUDIO: bool = config("CALL_TRACE_AUDIO", default=True, cast=bool)
+
+    # Structured per-call turns, events and metrics in day-partitioned segments. Opt-in: records hold
+    # phone numbers and transcripts. Days older than the retention are deleted (0 keeps everything)
+    CALL_STORE_DIR: str = config("CALL_STORE_DIR", default="")
+    CALL_STORE_RETENTION_DAYS: int = config("CALL_STORE_RETENTION_DAYS", default=30, cast=int)
+    CALL_STORE_SEGMENT_MB: int = config("CALL_STORE_SEGMENT_MB", default=64, cast=int)
+    CALL_STORE_FLUSH_SECONDS: float = config("CALL_STORE_FLUSH_SECONDS", default=1.0, cast=float)
+
+    # ONNX models re-exported with memory-mapped weights shared by all job processes (empty dir disables)
+    MODEL_CACHE_DIR: str = config("MODEL_CACHE_DIR", default=str(BASE_DIR / ".cache" / "models"))
+
+    # Host-wide batched VAD service (empty socket keeps VAD in each job process)
+    VAD_SERVICE_SOCKET: str = config("VAD_SERVICE_SOCKET", default="")
+    VAD_SERVICE_MAX_BATCH: int = config("VAD_SERVICE_MAX_BATCH", default=64, cast=int)
+    VAD_SERVICE_MAX_WAIT_MS: float = config("VAD_SERVICE_MAX_WAIT_MS", default=4.0, cast=float)
+    VAD_SERVICE_TIMEOUT_MS: float = config("VAD_SERVICE_TIMEOUT_MS", default=100.0, cast=float)
+    VAD_SERVICE_MAX_SLOTS: int = config("VAD_SERVICE_MAX_SLOTS", default=512, cast=int)
 
     # TensorZero
     CLICKHOUSE_USER: str = config("CLICKHOUSE_USER", default="chuser")
@@ -35,6 +151,24 @@ class Settings(BaseSettings):
     CLICKHOUSE_PORT: int = config("CLICKHOUSE_PORT", default=8123)
     CLICKHOUSE_DATABASE: str = config("CLICKHOUSE_DATABASE", default="tensorzero")
     TENSORZERO_GATEWAY_URL: str = config("TENSORZERO_GATEWAY_URL", default="http://localhost:3000")
+    # Host-wide buffer the gateways write to instead of ClickHouse (port 0: gateways insert directly)
+    CLICKHOUSE_SINK_HOST: str = config("CLICKHOUSE_SINK_HOST", default="127.0.0.1")
+    CLICKHOUSE_SINK_PORT: int = config("CLICKHOUSE_SINK_PORT", default=0, cast=int)
+    CLICKHOUSE_SINK_BATCH_ROWS: int = config("CLICKHOUSE_SINK_BATCH_ROWS", default=5000, cast=int)
+    CLICKHOUSE_SINK_BATCH_MB: float = config("CLICKHOUSE_SINK_BATCH_MB", default=8.0, cast=float)
+    CLICKHOUSE_SINK_FLUSH_SECONDS: float = config("CLICKHOUSE_SINK_FLUSH_SECONDS", default=2.0, cast=float)
+    # Batches waiting for ClickHouse above this spill to disk
+    CLICKHOUSE_SINK_MAX_BUFFER_MB: float = config("CLICKHOUSE_SINK_MAX_BUFFER_MB", default=64.0, cast=float)
+    CLICKHOUSE_SINK_INSERT_TIMEOUT: float = config("CLICKHOUSE_SINK_INSERT_TIMEOUT", default=10.0, cast=float)
+    CLICKHOUSE_SINK_SPILL_DIR: str = config("CLICKHOUSE_SINK_SPILL_DIR", default=str(BASE_DIR / ".cache" / "clickhouse_spill"))
+
+    # Post-call transcript analysis
+    ANALYSIS_BATCH_SIZE: int = config("ANALYSIS_BATCH_SIZE", default=8, cast=int)
+    ANALYSIS_CONCURRENCY: int = config("ANALYSIS_CONCURRENCY", default=4, cast=int)
+    # Results by transcript hash, shared by the host's job processes (each serves one call; empty dir disables)
+    ANALYSIS_CACHE_DIR: str = config("ANALYSIS_CACHE_DIR", default=str(BASE_DIR / ".cache" / "analysis"))
+    # How long a job's shutdown waits for its analysis; LiveKit kills the process after 60s
+    ANALYSIS_SHUTDOWN_TIMEOUT: float = config("ANALYSIS_SHUTDOWN_TIMEOUT", default=30.0, cast=float)
 
     @property
     def CLICKHOUSE_URL(self):
@@ -0,0 +1,228 @@
+# Deepgram STT, per minute
+DEEPGRAM_RATES = {
+    "nova_2_enterprise": 0.0047,
+    "nova_2_pay_as_you_go": 0.0064,
+    "nova_3_enterprise": 0.0059,
+    "nova_3_pay_as_you_go": 0.0079,
+}
+
+# OpenAI LLM, per token
+OPENAI_RATES = {
+    "gpt_4_1_mini": {
+        "cached_input": 0.10 / 1_000_000,
+        "regular_input": 0.40 / 1_000_000,
+        "output": 1.60 / 1_000_000,
+    },
+    "gpt_4_turbo": {
+        "cached_input": 5.00 / 1_000_000,
+        "regular_input": 10.00 / 1_000_000,
+        "output": 30.00 / 1_000_000,
+    },
+}
+
+# TTS, per minute of speech
+TTS_RATES = {
+    "elevenlabs": {
+        "starter": 0.18,
+        "creator": 0.16,
+        "pro": 0.12,
+        "business": 0.06,
+        "enterprise": 0.04,
+    },
+    "cartesia": {
+        "scale": 0.0299,
+        "enterprise": 0.0199,
+    },
+    "openai": {
+        "standard": 0.000015,
+    },
+}
+
+# LiveKit Cloud, per participant minute
+LIVEKIT_RATES = {
+    "scale_plan": {
+        "base_cost": 500,
+        "included_minutes": 45000,
+        "overage_rate": 0.003,
+    },
+    "enterprise": {
+        "base_cost": 0,
+        "overage_rate": 0.002,
+    },
+}
+
+# SIP trunking, per minute
+SIP_RATES = {
+    "twilio": {
+        "us_local": 0.0045,
+        "us_toll_free": 0.0085,
+        "international": 0.05,
+    },
+    "telnyx": {
+        "us_local": 0.0085,
+        "us_toll_free": 0.0115,
+        "international": 0.04,
+    },
+}
+
+CURRENT_CONFIG = {
+    "stt_rate": DEEPGRAM_RATES["nova_2_enterprise"],
+    "llm_rates": OPENAI_RATES["gpt_4_1_mini"],
+    "tts_rate": TTS_RATES["elevenlabs"]["business"],
+    "livekit_rate": LIVEKIT_RATES["scale_plan"]["overage_rate"],
+    "sip_rate": SIP_RATES["twilio"]["us_local"],
+}
+
+ECONOMY_CONFIG = {
+    "stt_rate": DEEPGRAM_RATES["nova_2_enterprise"],
+    "llm_rates": OPENAI_RATES["gpt_4_1_mini"],
+    "tts_rate": TTS_RATES["cartesia"]["scale"],
+    "livekit_rate": LIVEKIT_RATES["scale_plan"]["overage_rate"],
+    "sip_rate": SIP_RATES["twilio"]["us_local"],
+}
+
+PREMIUM_CONFIG = {
+    "stt_rate": DEEPGRAM_RATES["nova_3_enterprise"],
+    "llm_rates": OPENAI_RATES["gpt_4_1_mini"],
+    "tts_rate": TTS_RATES["elevenlabs"]["business"],
+    "livekit_rate": LIVEKIT_RATES["scale_plan"]["overage_rate"],
+    "sip_rate": SIP_RATES["telnyx"]["us_local"],
+}
+
+# Negotiated volume discounts
+ENTERPRISE_CONFIG = {
+    "stt_rate": DEEPGRAM_RATES["nova_2_enterprise"] * 0.7,
+    "llm_rates": {
+        "cached_input": OPENAI_RATES["gpt_4_1_mini"]["cached_input"] * 0.8,
+        "regular_input": OPENAI_RATES["gpt_4_1_mini"]["regular_input"] * 0.8,
+        "output": OPENAI_RATES["gpt_4_1_mini"]["output"] * 0.8,
+    },
+    "tts_rate": TTS_RATES["elevenlabs"]["enterprise"],
+    "livekit_rate": LIVEKIT_RATES["enterprise"]["overage_rate"],
+    "sip_rate": SIP_RATES["twilio"]["us_local"] * 0.8,
+}
+
+CONFIGS = {
+    "Economy": ECONOMY_CONFIG,
+    "Current": CURRENT_CONFIG,
+    "Premium": PREMIUM_CONFIG,
+    "Enterprise": ENTERPRISE_CONFIG,
+}
+
+# Usage assumptions behind the estimates
+DAYS_PER_MONTH = 30
+# Share of the call each side is speaking
+STT_SHARE = 0.5
+TTS_SHARE = 0.5
+# Per call: the system prompt is cached after the first turn
+AVG_CACHED_TOKENS_PER_CALL = 6000
+AVG_REGULAR_TOKENS_PER_CALL = 500
+AVG_OUTPUT_TOKENS_PER_CALL = 150
+
+# What a finished call is billed at (cost_engine.recompute_call_costs): SIP in naira per
+# minute, STT in USD per audio minute, LLM in USD per 1M tokens, TTS in USD per 1K characters
+CALL_RATES = {
+    "sip_ngn_per_minute": 3.0,
+    "usd_to_ngn": 1650.0,
+    "stt": {
+        "deepgram": 0.0077,
+    },
+    "llm": {
+        "openai": {"input": 2.0, "output": 8.0, "cached": 0.5},
+        "google": {"input": 0.075, "output": 0.3, "cached": 0.01875},
+    },
+    "tts": {
+        "elevenlabs": 0.11,
+        "cartesia": 0.025,
+    },
+}
+
+
+def estimate_monthly_cost(calls_per_day: int, avg_duration_minutes: float, config: dict = None) -> dict:
+    """
+    Estimate monthly costs based on usage patterns
+
+    Args:
+        calls_per_day: Average number of calls per day
+        avg_duration_minutes: Average call duration in minutes
+        config: Cost configuration to use (defaults to CURRENT_CONFIG)
+
+    Returns:
+        Dictionary with cost breakdown
+    """
+    if config is None:
+        config = CURRENT_CONFIG
+
+    calls_per_month = calls_per_day * DAYS_PER_MONTH
+    total_minutes = calls_per_month * avg_duration_minutes
+    stt_minutes = total_minutes * STT_SHARE
+    tts_minutes = total_minutes * TTS_SHARE
+
+    total_cached_tokens = calls_per_month * AVG_CACHED_TOKENS_PER_CALL
+    total_regular_tokens = calls_per_month * AVG_REGULAR_TOKENS_PER_CALL
+    total_output_tokens = calls_per_month * AVG_OUTPUT_TOKENS_PER_CALL
+
+    stt_cost = stt_minutes * config["stt_rate"]
+    llm_cost = (
+        total_cached_tokens * config["llm_rates"]["cached_input"]
+        + total_regular_tokens * config["llm_rates"]["regular_input"]
+        + total_output_tokens * config["llm_rates"]["output"]
+    )
+    tts_cost = tts_minutes * config["tts_rate"]
+    livekit_cost = total_minutes * config["livekit_rate"]
+    sip_cost = total_minutes * config["sip_rate"]
+    total_cost = stt_cost + llm_cost + tts_cost + livekit_cost + sip_cost
+
+    return {
+        "calls_per_month": calls_per_month,
+        "total_minutes": total_minutes,
+        "costs": {
+            "stt": stt_cost,
+            "llm": llm_cost,
+            "tts": tts_cost,
+            "livekit": livekit_cost,
+            "sip": sip_cost,
+            "total": total_cost,
+        },
+        "per_call_cost": total_cost / calls_per_month if calls_per_month > 0 else 0,
+        "per_minute_cost": total_cost / total_minutes if total_minutes > 0 else 0,
+    }
+
+
+def compare_configurations(calls_per_day: int, avg_duration_minutes: float) -> dict:
+    """Compare costs across different configurations"""
+    comparison = {}
+    for name, config in CONFIGS.items():
+        comparison[name] = estimate_monthly_cost(calls_per_day, avg_duration_minutes, config)
+    return comparison
+
+
+def print_cost_comparison(calls_per_day: int, avg_duration_minutes: float):
+    """Print a formatted cost comparison"""
+    comparison = compare_configurations(calls_per_day, avg_duration_minutes)
+
+    print("\n" + "=" * 80)
+    print(f"COST COMPARISON - {calls_per_day} calls/day, {avg_duration_minutes} min avg duration")
+    print("=" * 80)
+    print(f"{'Configuration':<12} {'Total/Month':<12} {'Per Call':<10} {'STT':<8} {'LLM':<8} {'TTS':<8} {'LiveKit':<8} {'SIP':<8}")
+    print("-" * 80)
+
+    for name, data in comparison.items():
+        costs = data["costs"]
+        print(
+            f"{name:<12} ${costs['total']:<11.2f} ${data['per_call_cost']:<9.4f} "
+            f"${costs['stt']:<7.2f} ${costs['llm']:<7.2f} ${costs['tts']:<7.2f} "
+            f"${costs['livekit']:<7.2f} ${costs['sip']:<7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    print("Voice AI Call Cost Estimation")
+    print_cost_comparison(calls_per_day=100, avg_duration_minutes=3.0)
+
+    print("\n" + "=" * 50)
+    print("Cost scaling with volume:")
+    volumes = [10, 50, 100, 500, 1000]
+    for volume in volumes:
+        economy_cost = estimate_monthly_cost(volume, 3.0, ECONOMY_CONFIG)
+        print(f"{volume:4d} calls/day: ${economy_cost['costs']['total']:8.2f}/month (${economy_cost['per_call_cost']:.4f}/call)")
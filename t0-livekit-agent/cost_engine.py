@@ -0,0 +1,385 @@
+"""
+Cost engine for outbound AI agent.
+Evaluates the cost_config model for whole grids of scenarios in one NumPy pass
+(calls per day × average duration × provider mix × exchange rate) and reprices
+finished calls in bulk from their stored usage. Results are column tables,
+written as CSV or, with pyarrow installed, Parquet.
+
+    python cost_engine.py sweep --calls 50:1000:50 --durations 1:6:0.5 --fx 1500,1650,1800 -o sweep.parquet
+    python cost_engine.py sweep --calls 500 --durations 3 --config Current --config Economy=0.7+Premium=0.3
+    python cost_engine.py recompute usage.csv traces/*.ctr --fx 1600 -o calls.csv
+    python cost_engine.py recompute $CALL_STORE_DIR/2026-10-*/*.index.jsonl -o october.parquet
+"""
+
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from cost_config import (
+    AVG_CACHED_TOKENS_PER_CALL,
+    AVG_OUTPUT_TOKENS_PER_CALL,
+    AVG_REGULAR_TOKENS_PER_CALL,
+    CALL_RATES,
+    CONFIGS,
+    DAYS_PER_MONTH,
+    STT_SHARE,
+    TTS_SHARE,
+)
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Column order of a configuration's rate vector
+RATE_FIELDS = ("stt_rate", "cached_input", "regular_input", "output", "tts_rate", "livekit_rate", "sip_rate")
+USAGE_FIELDS = ("duration_seconds", "prompt_tokens", "completion_tokens", "cached_tokens", "tts_characters", "stt_audio_seconds")
+PROVIDER_FIELDS = ("stt_provider", "llm_provider", "tts_provider")
+
+Table = Dict[str, np.ndarray]
+
+
+def rate_vector(config: dict) -> np.ndarray:
+    llm = config["llm_rates"]
+    return np.array([
+        config["stt_rate"],
+        llm["cached_input"],
+        llm["regular_input"],
+        llm["output"],
+        config["tts_rate"],
+        config["livekit_rate"],
+        config["sip_rate"],
+    ], dtype=np.float64)
+
+
+def mix(weights: Dict[str, float], configs: Optional[Dict[str, dict]] = None) -> dict:
+    """
+    Configuration for calls split between configurations by `weights`
+
+    Every cost is linear in its rate, so the weighted average of the rates
+    prices a mixed fleet exactly.
+    """
+    configs = configs or CONFIGS
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Mix weights must add up to more than 0")
+    rates = sum(rate_vector(configs[name]) * (weight / total) for name, weight in weights.items())
+    return _config(rates)
+
+
+def _config(rates: np.ndarray) -> dict:
+    values = dict(zip(RATE_FIELDS, rates.tolist()))
+    return {
+        "stt_rate": values["stt_rate"],
+        "llm_rates": {k: values[k] for k in ("cached_input", "regular_input", "output")},
+        "tts_rate": values["tts_rate"],
+        "livekit_rate": values["livekit_rate"],
+        "sip_rate": values["sip_rate"],
+    }
+
+
+def parse_mix(text: str, configs: Optional[Dict[str, dict]] = None) -> dict:
+    """`Current` or a weighted mix like `Economy=0.7+Premium=0.3`"""
+    configs = configs or CONFIGS
+    weights = {}
+    for part in text.split("+"):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in configs:
+            raise ValueError(f"Unknown configuration {name!r}; expected one of {', '.join(configs)}")
+        weights[name] = float(weight) if weight else 1.0
+    return configs[text] if text in configs else mix(weights, configs)
+
+
+def sweep(
+    calls_per_day: Sequence[float],
+    durations: Sequence[float],
+    configs: Optional[Dict[str, dict]] = None,
+    exchange_rates: Sequence[float] = (1.0,),
+) -> Table:
+    """
+    Monthly cost of every combination of the inputs, one row per scenario
+
+    Each row matches `estimate_monthly_cost(calls_per_day, duration, config)`;
+    `exchange_rate` converts the USD totals into the `*_local` columns.
+    """
+    configs = configs or CONFIGS
+    names = np.array(list(configs))
+    rates = np.stack([rate_vector(config) for config in configs.values()])
+
+    cpd, duration, config, fx = (
+        axis.ravel()
+        for axis in np.meshgrid(
+            np.asarray(calls_per_day, dtype=np.float64),
+            np.asarray(durations, dtype=np.float64),
+            np.arange(len(names)),
+            np.asarray(exchange_rates, dtype=np.float64),
+            indexing="ij",
+        )
+    )
+    r = rates[config].T
+
+    calls_per_month = cpd * DAYS_PER_MONTH
+    total_minutes = calls_per_month * duration
+    costs = {
+        "stt": total_minutes * STT_SHARE * r[0],
+        "llm": (
+            calls_per_month * AVG_CACHED_TOKENS_PER_CALL * r[1]
+            + calls_per_month * AVG_REGULAR_TOKENS_PER_CALL * r[2]
+            + calls_per_month * AVG_OUTPUT_TOKENS_PER_CALL * r[3]
+        ),
+        "tts": total_minutes * TTS_SHARE * r[4],
+        "livekit": total_minutes * r[5],
+        "sip": total_minutes * r[6],
+    }
+    total = costs["stt"] + costs["llm"] + costs["tts"] + costs["livekit"] + costs["sip"]
+    per_call = _divide(total, calls_per_month)
+
+    return {
+        "config": names[config],
+        "calls_per_day": cpd,
+        "avg_duration_minutes": duration,
+        "exchange_rate": fx,
+        "calls_per_month": calls_per_month,
+        "total_minutes": total_minutes,
+        **costs,
+        "total": total,
+        "per_call_cost": per_call,
+        "per_minute_cost": _divide(total, total_minutes),
+        "total_local": total * fx,
+        "per_call_local": per_call * fx,
+    }
+
+
+def _divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.divide(a, b, out=np.zeros_like(a), where=b > 0)
+
+
+def _lookup(names: np.ndarray, rates: dict, fields: Sequence[str] = ()) -> np.ndarray:
+    """
+    Rate of each row's provider, NaN (and a warning) for unpriced providers
+
+    With `fields` the provider's rates are dicts and the result has one row per field.
+    """
+    unique, inverse = np.unique(names, return_inverse=True)
+    values = np.full((len(fields) or 1, len(unique)), np.nan)
+    for i, name in enumerate(unique.tolist()):
+        rate = rates.get(name)
+        if rate is None:
+            logger.warning(f"⚠️ No rate for provider {name!r} | Calls: {int((inverse == i).sum()):,}")
+            continue
+        values[:, i] = [rate[field] for field in fields] if fields else rate
+    return values[:, inverse] if fields else values[0, inverse]
+
+
+def recompute_call_costs(usage: Table, rates: Optional[dict] = None, usd_to_ngn: Optional[float] = None) -> Table:
+    """
+    Cost of each finished call from its stored usage, at today's (or given) rates
+
+    SIP is billed in naira per minute of the call; STT per minute of audio sent,
+    LLM per token (cached prompt tokens at the cached rate) and TTS per
+    character. Calls on a provider without a rate get NaN costs.
+    """
+    rates = rates or CALL_RATES
+    fx = usd_to_ngn or rates["usd_to_ngn"]
+
+    sip_ngn = usage["duration_seconds"] / 60.0 * rates["sip_ngn_per_minute"]
+    stt = usage["stt_audio_seconds"] / 60.0 * _lookup(usage["stt_provider"], rates["stt"])
+
+    input_rate, cached_rate, output_rate = _lookup(usage["llm_provider"], rates["llm"], ("input", "cached", "output"))
+    cached = np.minimum(usage["cached_tokens"], usage["prompt_tokens"])
+    llm = (
+        (usage["prompt_tokens"] - cached) * input_rate
+        + cached * cached_rate
+        + usage["completion_tokens"] * output_rate
+    ) / 1_000_000
+    tts = usage["tts_characters"] / 1000.0 * _lookup(usage["tts_provider"], rates["tts"])
+
+    sip = sip_ngn / fx
+    total = sip + stt + llm + tts
+    return {
+        "call_id": usage["call_id"],
+        **{field: usage[field] for field in USAGE_FIELDS},
+        **{field: usage[field] for field in PROVIDER_FIELDS},
+        "sip_usd": sip,
+        "stt_usd": stt,
+        "llm_usd": llm,
+        "tts_usd": tts,
+        "total_usd": total,
+        "total_ngn": total * fx,
+        "usd_to_ngn": np.full(len(total), fx),
+    }
+
+
+def trace_usage(path: str) -> dict:
+    """Usage of one call from the metrics in its call trace"""
+    from call_trace import RecordKind, TraceReader
+
+    reader = TraceReader(path)
+    try:
+        usage = dict.fromkeys(USAGE_FIELDS, 0.0)
+        for record in reader.records(kinds={RecordKind.METRICS}):
+            data = record.json()
+            kind = data.get("type")
+            if kind == "llm_metrics":
+                usage["prompt_tokens"] += data.get("prompt_tokens", 0)
+                usage["completion_tokens"] += data.get("completion_tokens", 0)
+                usage["cached_tokens"] += data.get("prompt_cached_tokens", 0)
+            elif kind == "tts_metrics":
+                usage["tts_characters"] += data.get("characters_count", 0)
+            elif kind == "stt_metrics":
+                usage["stt_audio_seconds"] += data.get("audio_duration", 0.0)
+        usage["duration_seconds"] = reader.duration
+        return {"call_id": reader.meta.get("room_name", Path(path).stem), **usage, **_trace_providers(reader.meta)}
+    finally:
+        reader.close()
+
+
+def _trace_providers(meta: dict) -> dict:
+    import pipelines
+
+    try:
+        profile = pipelines.get_profile(meta.get("pipeline"))
+    except ValueError:
+        profile = pipelines.get_profile()
+    return {
+        "stt_provider": profile.stt.provider,
+        "llm_provider": profile.llm[0].provider,
+        "tts_provider": profile.tts[0].provider,
+    }
+
+
+def _usage_rows(path: str) -> Iterator[dict]:
+    suffix = Path(path).suffix
+    if suffix == ".ctr":
+        yield trace_usage(path)
+    elif suffix in (".jsonl", ".ndjson"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def load_usage(paths: Iterable[str]) -> Table:
+    """
+    Usage columns from CSV/JSONL rows or call traces (`.ctr`)
+
+    Rows need `call_id` and any of the usage fields (missing ones count as 0);
+    rows without providers get those of their `pipeline` profile (call store
+    index lines name only that), or else the ones from the settings.
+    """
+    from core import settings
+
+    defaults = {
+        "stt_provider": settings.STT_PROVIDER,
+        "llm_provider": settings.LLM_PROVIDER,
+        "tts_provider": settings.TTS_PROVIDER,
+    }
+    profiles: Dict[str, dict] = {}
+    columns: Dict[str, List] = {field: [] for field in ("call_id", *USAGE_FIELDS, *PROVIDER_FIELDS)}
+    for path in paths:
+        for row in _usage_rows(path):
+            providers = defaults
+            if row.get("pipeline"):
+                if row["pipeline"] not in profiles:
+                    profiles[row["pipeline"]] = _trace_providers(row)
+                providers = profiles[row["pipeline"]]
+            columns["call_id"].append(str(row.get("call_id") or row.get("room_name") or ""))
+            for field in USAGE_FIELDS:
+                columns[field].append(float(row.get(field) or 0.0))
+            for field in PROVIDER_FIELDS:
+                columns[field].append(row.get(field) or providers[field])
+
+    table: Table = {field: np.array(columns[field], dtype=np.float64) for field in USAGE_FIELDS}
+    for field in ("call_id", *PROVIDER_FIELDS):
+        table[field] = np.array(columns[field], dtype=str)
+    return table
+
+
+def write_table(table: Table, path: Optional[str] = None):
+    """CSV to `path` (stdout when None), Parquet when it ends in `.parquet`"""
+    if path and Path(path).suffix == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow); write a .csv instead") from None
+        pq.write_table(pa.table({name: pa.array(column) for name, column in table.items()}), path, compression="zstd")
+        return
+
+    def write(f):
+        writer = csv.writer(f)
+        writer.writerow(table)
+        writer.writerows(zip(*(column.tolist() for column in table.values())))
+
+    if path is None:
+        write(sys.stdout)
+    else:
+        with open(path, "w", newline="") as f:
+            write(f)
+
+
+def _values(text: str) -> np.ndarray:
+    """`10,50,100` or inclusive ranges `start:stop:step`, mixed"""
+    values = []
+    for part in text.split(","):
+        if ":" in part:
+            start, stop, step = (float(v) for v in part.split(":"))
+            values.append(np.arange(start, stop + step / 2, step))
+        else:
+            values.append(np.array([float(part)]))
+    return np.concatenate(values)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from logger import setup_logging
+
+    setup_logging(stream=sys.stderr)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    sweep_parser = commands.add_parser("sweep", help="Monthly cost over a grid of scenarios")
+    sweep_parser.add_argument("--calls", default="10,50,100,500,1000", help="Calls per day (list or start:stop:step)")
+    sweep_parser.add_argument("--durations", default="3", help="Average call minutes (list or start:stop:step)")
+    sweep_parser.add_argument(
+        "--config", action="append", default=[],
+        help=f"Configuration or weighted mix (Economy=0.7+Premium=0.3), repeatable; default: {', '.join(CONFIGS)}",
+    )
+    sweep_parser.add_argument("--fx", default="1", help="Exchange rates from USD for the *_local columns")
+    sweep_parser.add_argument("-o", "--output", help="Output .csv or .parquet (default: CSV to stdout)")
+    recompute_parser = commands.add_parser("recompute", help="Reprice finished calls from stored usage")
+    recompute_parser.add_argument("sources", nargs="+", help="Usage CSV/JSONL files or call traces (.ctr)")
+    recompute_parser.add_argument("--fx", type=float, help=f"USD to NGN rate (default: {CALL_RATES['usd_to_ngn']})")
+    recompute_parser.add_argument("-o", "--output", help="Output .csv or .parquet (default: CSV to stdout)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "sweep":
+        try:
+            configs = {name: parse_mix(name) for name in args.config} if args.config else CONFIGS
+        except ValueError as e:
+            sys.exit(str(e))
+        result = sweep(_values(args.calls), _values(args.durations), configs, _values(args.fx))
+        cheapest = int(np.argmin(result["per_call_cost"]))
+        logger.info(
+            f"💰 Swept {len(result['total']):,} scenarios in {(time.perf_counter() - started) * 1000:.1f}ms | "
+            f"Per call: ${result['per_call_cost'].min():.4f}-${result['per_call_cost'].max():.4f} | "
+            f"Cheapest: {result['config'][cheapest]}"
+        )
+    else:
+        result = recompute_call_costs(load_usage(args.sources), usd_to_ngn=args.fx)
+        logger.info(
+            f"💰 Repriced {len(result['total_usd']):,} calls in {(time.perf_counter() - started) * 1000:.1f}ms | "
+            f"Total: ${np.nansum(result['total_usd']):,.2f} (₦{np.nansum(result['total_ngn']):,.2f})"
+        )
+    try:
+        write_table(result, args.output)
+    except RuntimeError as e:
+        sys.exit(str(e))
@@ -0,0 +1,431 @@
+"""
+Campaign dialer for outbound AI agent.
+Streams numbers from a CSV/JSONL source and dispatches one agent job per call,
+bounded by global and per-trunk concurrency caps and a calls-per-second budget.
+"""
+
+import asyncio
+import csv
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterator, Optional, Set
+
+from core import settings
+from logger import get_logger
+from suppression import check_number, get_suppression, is_unavailable
+from trunk_pool import TrunkPool, parse_outcome, parse_trunk_spec
+
+logger = get_logger(__name__)
+
+DEFAULT_PROMPT = "you're a good outbound caller"
+
+# A dispatch function places one call and returns once that call is over.
+# It receives the job metadata (phone_number, prompt, sip_trunk_id, pipeline, campaign) and may
+# return the call outcome (`answered`, `latency`, `sip_status_code`, `fault`) so
+# the trunk pool can score the trunk.
+DispatchFn = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+@dataclass
+class Contact:
+    """A single number to dial, with its position in the campaign source"""
+    index: int
+    phone_number: str
+    prompt: str
+    # Pipeline profile (config/pipelines.toml); None uses the agent's default
+    pipeline: Optional[str] = None
+    # Recorded with the call in the call store
+    campaign: Optional[str] = None
+
+    def to_metadata(self, sip_trunk_id: Optional[str] = None) -> dict:
+        metadata = {"phone_number": self.phone_number, "prompt": self.prompt}
+        if self.pipeline:
+            metadata["pipeline"] = self.pipeline
+        if self.campaign:
+            metadata["campaign"] = self.campaign
+        if sip_trunk_id:
+            metadata["sip_trunk_id"] = sip_trunk_id
+        return metadata
+
+
+def iter_contacts(
+    path: str,
+    default_prompt: str = DEFAULT_PROMPT,
+    start: int = 0,
+    default_pipeline: Optional[str] = None,
+    default_campaign: Optional[str] = None,
+) -> Iterator[Contact]:
+    """
+    Stream contacts from a CSV (with a `phone_number` header) or JSONL file
+
+    Args:
+        path: Campaign source file, `.jsonl` or `.csv`
+        default_prompt: Prompt used when a row doesn't carry its own
+        start: Number of leading rows to skip (used when resuming)
+        default_pipeline: Pipeline profile used when a row doesn't name its own
+        default_campaign: Campaign name used when a row doesn't name its own
+
+    Yields:
+        Contact for every row with a phone number
+    """
+    with open(path, "r", newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) if line.strip() else {} for line in f)
+        else:
+            rows = csv.DictReader(f)
+
+        for index, row in enumerate(rows):
+            if index < start:
+                continue
+            phone_number = (row.get("phone_number") or "").strip()
+            if not phone_number:
+                logger.warning(f"⚠️ Skipping row {index}: no phone_number")
+                continue
+            yield Contact(
+                index=index,
+                phone_number=phone_number,
+                prompt=row.get("prompt") or default_prompt,
+                pipeline=row.get("pipeline") or default_pipeline,
+                campaign=row.get("campaign") or default_campaign,
+            )
+
+
+class TokenBucket:
+    """Async token bucket limiting how many calls start per second"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError(f"calls per second must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until one token is available and take it"""
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+@dataclass
+class CampaignCheckpoint:
+    """
+    Resumable campaign progress.
+
+    `next_index` is the lowest row not yet finished; `done_above` holds rows past
+    it that already finished out of order, so a resumed run never re-dials them.
+    """
+    path: str
+    next_index: int = 0
+    done_above: Set[int] = field(default_factory=set)
+    completed: int = 0
+    failed: int = 0
+
+    @classmethod
+    def load(cls, path: str) -> "CampaignCheckpoint":
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(
+            path=path,
+            next_index=data.get("next_index", 0),
+            done_above=set(data.get("done_above", [])),
+            completed=data.get("completed", 0),
+            failed=data.get("failed", 0),
+        )
+
+    def is_done(self, index: int) -> bool:
+        return index < self.next_index or index in self.done_above
+
+    def mark_done(self, index: int, in_flight: Set[int], frontier: int):
+        """
+        Record a finished row and advance the watermark
+
+        Rows are dispatched in order, so everything below the lowest in-flight
+        row (or below `frontier`, the next row to dispatch) is finished.
+        """
+        self.done_above.add(index)
+        self.next_index = max(self.next_index, min(in_flight) if in_flight else frontier)
+        self.done_above = {i for i in self.done_above if i >= self.next_index}
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "next_index": self.next_index,
+                "done_above": sorted(self.done_above),
+                "completed": self.completed,
+                "failed": self.failed,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+class CampaignDialer:
+    """
+    Dispatch a campaign's calls as fast as the trunks allow, and no faster.
+
+    Each call holds one global slot and one slot on its trunk until the dispatch
+    function returns, so `max_concurrent` and the trunk pool's caps bound live
+    calls, while the token bucket bounds how quickly new calls start.
+    """
+
+    def __init__(
+        self,
+        dispatch: DispatchFn,
+        trunk_pool: Optional[TrunkPool] = None,
+        max_concurrent: Optional[int] = None,
+        calls_per_second: Optional[float] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: Optional[int] = None,
+    ):
+        self.dispatch = dispatch
+        self.trunk_pool = trunk_pool or TrunkPool.from_settings()
+        self.max_concurrent = max_concurrent or settings.CAMPAIGN_MAX_CONCURRENT_CALLS
+        self.bucket = TokenBucket(calls_per_second or settings.CAMPAIGN_CALLS_PER_SECOND)
+        self.checkpoint = CampaignCheckpoint.load(checkpoint_path) if checkpoint_path else None
+        self.checkpoint_interval = checkpoint_interval or settings.CAMPAIGN_CHECKPOINT_INTERVAL
+
+        self.completed = self.checkpoint.completed if self.checkpoint else 0
+        self.failed = self.checkpoint.failed if self.checkpoint else 0
+        self.suppressed = 0
+        self._in_flight: Set[int] = set()
+        self._frontier = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._stopping = asyncio.Event()
+        self._since_checkpoint = 0
+
+    @property
+    def active_calls(self) -> int:
+        return sum(trunk.active for trunk in self.trunk_pool.trunks.values())
+
+    async def _place_call(self, contact: Contact, trunk_id: str):
+        try:
+            outcome = await self.dispatch(contact.to_metadata(trunk_id))
+            self.completed += 1
+            if outcome:
+                self.trunk_pool.record(
+                    trunk_id,
+                    answered=outcome.get("answered", False),
+                    latency=outcome.get("latency", 0.0),
+                    sip_status_code=outcome.get("sip_status_code"),
+                    fault=outcome.get("fault"),
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"📞 DISPATCH FAILED | Number: {contact.phone_number} | Trunk: {trunk_id} | Error: {e}")
+        finally:
+            self._in_flight.discard(contact.index)
+            await self.trunk_pool.release(trunk_id)
+            self._slots.release()
+            self._record_progress(contact.index)
+
+    async def _reserve(self) -> str:
+        """Take a global slot, a trunk slot and a start token; nothing stays held if a wait fails"""
+        await self._slots.acquire()
+        trunk_id = None
+        try:
+            trunk_id = await self.trunk_pool.acquire()
+            await self.bucket.acquire()
+            return trunk_id
+        except BaseException:
+            if trunk_id is not None:
+                await self.trunk_pool.release(trunk_id)
+            self._slots.release()
+            raise
+
+    def _record_progress(self, index: int):
+        if not self.checkpoint:
+            return
+        self.checkpoint.mark_done(index, self._in_flight, self._frontier)
+        self.checkpoint.completed = self.completed
+        self.checkpoint.failed = self.failed
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_interval:
+            self.checkpoint.save()
+            self._since_checkpoint = 0
+
+    def stop(self):
+        """Stop dialing new numbers; calls already in progress are allowed to finish"""
+        self._stopping.set()
+
+    async def run(self, contacts: Iterator[Contact]):
+        """Dial every contact, returning once the source is exhausted and all calls ended"""
+        suppression = get_suppression()
+        if suppression is not None and suppression.unavailable:
+            # The agent would refuse every call; don't burn through the campaign marking rows done
+            raise RuntimeError(f"Suppression lists unavailable: {', '.join(suppression.unavailable)}")
+        started_at = time.monotonic()
+        dialed = 0
+        halted = None
+        logger.info(
+            f"📣 Campaign started | Max concurrent: {self.max_concurrent} | "
+            f"Trunks: {list(self.trunk_pool.trunks)} | CPS: {self.bucket.rate}"
+        )
+
+        try:
+            for contact in contacts:
+                if self._stopping.is_set():
+                    break
+                if self.checkpoint and self.checkpoint.is_done(contact.index):
+                    continue
+                # Checked again by the agent; skipping here saves the dispatch and a job process
+                suppressed = check_number(contact.phone_number)
+                if is_unavailable(suppressed):
+                    # Every row would be refused; stop before it so a resume dials from here
+                    halted = suppressed
+                    logger.error(f"❌ Campaign paused at row {contact.index} | Suppression: {suppressed}")
+                    break
+                if suppressed:
+                    self.suppressed += 1
+                    logger.info(f"🚫 Skipping row {contact.index}: {contact.phone_number} | Reason: {suppressed}")
+                    self._frontier = contact.index + 1
+                    self._record_progress(contact.index)
+                    continue
+
+                trunk_id = await self._reserve()
+
+                self._in_flight.add(contact.index)
+                self._frontier = contact.index + 1
+                task = asyncio.create_task(self._place_call(contact, trunk_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                dialed += 1
+
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            if self.checkpoint:
+                self.checkpoint.save()
+
+        elapsed = time.monotonic() - started_at
+        logger.info(
+            f"📣 Campaign finished | Dialed: {dialed} | Completed: {self.completed} | "
+            f"Failed: {self.failed} | Suppressed: {self.suppressed} | Elapsed: {elapsed:.1f}s"
+        )
+        self.trunk_pool.log_stats()
+        if halted:
+            raise RuntimeError(f"Campaign paused, suppression list {halted}")
+
+    def stats(self) -> dict:
+        return {
+            "active_calls": self.active_calls,
+            "trunks": self.trunk_pool.stats(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "suppressed": self.suppressed,
+        }
+
+
+class LiveKitDispatcher:
+    """
+    Dispatch calls as explicit agent jobs and wait for each call's room to close
+
+    The agent leaves the SIP outcome in the room's metadata once the callee
+    answers or the call fails; the last one seen before the room closes is
+    returned for the trunk pool to score.
+    """
+
+    def __init__(
+        self,
+        agent_name: Optional[str] = None,
+        poll_interval: float = 5.0,
+        start_timeout: float = 60.0,
+        lkapi=None,
+    ):
+        from livekit import api
+
+        self._api = api
+        self.agent_name = agent_name or settings.LIVEKIT_AGENT
+        self.poll_interval = poll_interval
+        self.start_timeout = start_timeout
+        self.lkapi = lkapi or api.LiveKitAPI(
+            url=settings.LIVEKIT_URL.replace("wss://", "https://").replace("ws://", "http://"),
+            api_key=settings.LIVEKIT_API_KEY,
+            api_secret=settings.LIVEKIT_API_SECRET,
+        )
+
+    async def __call__(self, metadata: dict) -> Optional[dict]:
+        room_name = f"call-{uuid.uuid4().hex[:12]}"
+        await self.lkapi.agent_dispatch.create_dispatch(
+            self._api.CreateAgentDispatchRequest(
+                agent_name=self.agent_name,
+                room=room_name,
+                metadata=json.dumps(metadata),
+            )
+        )
+        dispatched = time.monotonic()
+
+        # The room lives for as long as the call does, but may not exist yet when first polled
+        seen = False
+        outcome = None
+        while True:
+            await asyncio.sleep(self.poll_interval if seen else min(self.poll_interval, 1.0))
+            response = await self.lkapi.room.list_rooms(self._api.ListRoomsRequest(names=[room_name]))
+            if response.rooms:
+                seen = True
+                outcome = parse_outcome(response.rooms[0].metadata) or outcome
+            elif seen:
+                return outcome
+            elif time.monotonic() - dispatched > self.start_timeout:
+                raise TimeoutError(f"room {room_name} not created {self.start_timeout:.0f}s after dispatch")
+
+    async def aclose(self):
+        await self.lkapi.aclose()
+
+
+async def _main(args):
+    dispatcher = LiveKitDispatcher(agent_name=args.agent_name)
+    dialer = CampaignDialer(
+        dispatch=dispatcher,
+        trunk_pool=TrunkPool(parse_trunk_spec(",".join(args.trunk))) if args.trunk else None,
+        max_concurrent=args.max_concurrent,
+        calls_per_second=args.cps,
+        checkpoint_path=args.checkpoint or f"{args.source}.checkpoint.json",
+    )
+    try:
+        start = dialer.checkpoint.next_index if dialer.checkpoint else 0
+        await dialer.run(iter_contacts(
+            args.source,
+            default_prompt=args.prompt,
+            start=start,
+            default_pipeline=args.pipeline,
+            default_campaign=args.campaign or os.path.splitext(os.path.basename(args.source))[0],
+        ))
+    finally:
+        await dispatcher.aclose()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from logger import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Run an outbound calling campaign")
+    parser.add_argument("source", help="CSV or JSONL file with a phone_number column/key")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT, help="Prompt for rows without their own")
+    parser.add_argument("--pipeline", default=None, help="Pipeline profile for rows without their own")
+    parser.add_argument("--campaign", default=None, help="Campaign name for rows without their own (default: source file name)")
+    parser.add_argument("--trunk", action="append", help="TRUNK_ID[:CAP], repeatable")
+    parser.add_argument("--max-concurrent", type=int, default=None)
+    parser.add_argument("--cps", type=float, default=None, help="Calls started per second")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <source>.checkpoint.json)")
+    parser.add_argument("--agent-name", default=None)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,248 @@
+"""
+Outbound greeting helpers for outbound AI agent.
+Generates the greeting text and audio speculatively while waiting for the callee
+to speak, and adapts how long to wait from who spoke first on previous calls.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, List, Optional
+
+from livekit import rtc
+from livekit.agents.llm import ChatContext
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+OUTBOUND_GREETING_INSTRUCTIONS = (
+    "greet the caller politely by saying hello, remember, you're an outbound caller. you are the one that called "
+    "them. greet them and wait for them to respond, this is your full script, if name is in the script, use it, "
+    "otherwise, just say hello"
+)
+
+
+class GreetingTimeout:
+    """
+    Adaptive "wait for the callee" timeout.
+
+    Every outbound call adds one line to a JSONL file shared by all job
+    processes on the host: how long the callee took to speak, or, when we
+    greeted first, how long we waited. The latter is right-censored (the callee
+    might have spoken a moment later), so the speak-first delay distribution is
+    a Kaplan-Meier estimate over the last `window` calls. The timeout is the
+    delay by which `quantile` of the callees who speak within `max_seconds`
+    have spoken, plus `margin`, clamped to [`min_seconds`, `max_seconds`].
+
+    It stays at `max_seconds` until `min_samples` callees have spoken first, and
+    `explore_rate` of calls still wait `max_seconds` so late speakers keep being
+    observed instead of the timeout drifting down to its minimum.
+    """
+
+    def __init__(
+        self,
+        min_seconds: Optional[float] = None,
+        max_seconds: Optional[float] = None,
+        quantile: float = 0.9,
+        margin: float = 0.5,
+        min_samples: int = 20,
+        window: int = 500,
+        explore_rate: float = 0.1,
+        path: Optional[str] = None,
+    ):
+        self.min_seconds = min_seconds or settings.GREETING_MIN_TIMEOUT
+        self.max_seconds = max_seconds or settings.GREETING_MAX_TIMEOUT
+        self.quantile = quantile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.window = window
+        self.explore_rate = explore_rate
+        self.path = path if path is not None else (settings.GREETING_STATS_PATH or None)
+        # (seconds, spoke): when the callee spoke, or how long we waited before greeting first
+        self.samples: deque = deque(maxlen=window)
+
+    def _load(self):
+        """Last `window` samples from the shared file; other processes append to it all the time"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                # Lines are ~40 bytes; read enough of the tail for a full window
+                f.seek(max(0, f.tell() - self.window * 80))
+                lines = f.read().splitlines()[-self.window:]
+        except OSError as e:
+            logger.warning(f"⚠️ Could not load greeting stats from {self.path}: {e}")
+            return
+        self.samples.clear()
+        for line in lines:
+            try:
+                sample = json.loads(line)
+                self.samples.append((float(sample["seconds"]), bool(sample["spoke"])))
+            except (ValueError, KeyError, TypeError):
+                # A partial first line from the seek, or a torn write
+                continue
+
+    def _append(self, seconds: float, spoke: bool):
+        if not self.path:
+            return
+        line = json.dumps({"t": round(time.time(), 1), "seconds": round(seconds, 3), "spoke": spoke}) + "\n"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # One O_APPEND write per sample, so concurrent job processes never overwrite each other
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.window * 80 * 20:
+            self._compact()
+
+    def _compact(self):
+        """Keep the file's tail; the lock stops two processes compacting at once"""
+        with open(f"{self.path}.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - self.window * 80 * 2))
+                tail = f.read().split(b"\n", 1)[-1]
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(tail)
+            # Samples appended between the read and the rename are lost; a few out of thousands
+            os.replace(tmp_path, self.path)
+
+    def _speak_first_curve(self) -> List[tuple]:
+        """Kaplan-Meier (seconds, share of callees who have spoken by then) at each speak-first delay"""
+        at_risk = len(self.samples)
+        surviving = 1.0
+        curve = []
+        # Events before censorings at the same time, as the estimator requires
+        for seconds, spoke in sorted(self.samples, key=lambda s: (s[0], not s[1])):
+            if spoke:
+                surviving *= 1 - 1 / at_risk
+                curve.append((seconds, 1 - surviving))
+            at_risk -= 1
+        return curve
+
+    def current(self) -> float:
+        """Seconds to wait for the callee before greeting"""
+        self._load()
+        curve = self._speak_first_curve()
+        if len(curve) < self.min_samples or random.random() < self.explore_rate:
+            return self.max_seconds
+
+        # Share of callees who speak first at all within the longest wait we observe
+        target = self.quantile * curve[-1][1]
+        seconds = next(seconds for seconds, spoken in curve if spoken >= target)
+        return max(self.min_seconds, min(self.max_seconds, seconds + self.margin))
+
+    @property
+    def speak_first_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, spoke in self.samples if spoke) / len(self.samples)
+
+    def record(self, spoke_after: Optional[float], waited: float):
+        """Record one call: seconds until the callee spoke, or None if we greeted first after `waited`"""
+        sample = (spoke_after, True) if spoke_after is not None else (waited, False)
+        self.samples.append(sample)
+        try:
+            self._append(*sample)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save greeting stats to {self.path}: {e}")
+
+
+class SpeculativeGreeting:
+    """
+    Greeting text and TTS audio prepared in the background.
+
+    `start` kicks off LLM generation followed by synthesis. `play` says the
+    greeting using whatever is ready: pre-rendered audio, just the text, or a
+    normal `generate_reply` if nothing finished in time. `cancel` throws the
+    work away when the callee speaks first.
+    """
+
+    def __init__(self, llm, tts, instructions: str, greeting_instructions: str = OUTBOUND_GREETING_INSTRUCTIONS):
+        self.llm = llm
+        self.tts = tts
+        self.instructions = instructions
+        self.greeting_instructions = greeting_instructions
+        self.text: Optional[str] = None
+        self.frames: List[rtc.AudioFrame] = []
+        self.audio_ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._prepare(), name="speculative-greeting")
+
+    async def _generate_text(self) -> str:
+        chat_ctx = ChatContext.empty()
+        chat_ctx.add_message(role="system", content=self.instructions)
+        chat_ctx.add_message(role="system", content=self.greeting_instructions)
+
+        parts = []
+        async with self.llm.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        return "".join(parts).strip()
+
+    async def _prepare(self):
+        try:
+            self.text = await self._generate_text()
+            if not self.text:
+                return
+            async with self.tts.synthesize(self.text) as stream:
+                async for audio in stream:
+                    self.frames.append(audio.frame)
+            self.audio_ready = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Speculative greeting failed: {e}")
+
+    def cancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self.frames = []
+        logger.debug("👤 Callee spoke first, discarding speculative greeting")
+
+    async def _audio(self) -> AsyncIterator[rtc.AudioFrame]:
+        for frame in self.frames:
+            yield frame
+
+    async def play(self, session, grace: float = 0.0):
+        """
+        Say the greeting now
+
+        Args:
+            session: AgentSession to speak on
+            grace: Extra seconds to let an almost finished speculation complete
+        """
+        if self._task and not self._task.done() and grace > 0:
+            await asyncio.wait({self._task}, timeout=grace)
+
+        if self.audio_ready:
+            logger.info("🤖 Playing pre-rendered greeting")
+            handle = session.say(self.text, audio=self._audio(), add_to_chat_ctx=True)
+        else:
+            if self._task and not self._task.done():
+                self._task.cancel()
+            if self.text:
+                logger.info("🤖 Greeting text ready, synthesizing live")
+                handle = session.say(self.text, add_to_chat_ctx=True)
+            else:
+                logger.info("🤖 Speculative greeting not ready, generating reply")
+                handle = session.generate_reply(instructions=self.greeting_instructions)
+
+        await handle
@@ -0,0 +1,85 @@
+"""
+Import-time profiling for outbound AI agent.
+Runs a fresh interpreter with `-X importtime` over the agent's startup imports
+(main.py plus the configured provider plugins) and reports cumulative
+milliseconds per module, so slow imports are caught before every worker
+restart and job process spawn pays for them.
+
+    python main.py --import-profile
+"""
+
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from core import BASE_DIR
+
+# What a job process imports before it can take a job
+STARTUP_CODE = "import main; main.providers.import_plugins()"
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    """Parse `-X importtime` lines (`import time: self [us] | cumulative | module`)"""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        timings.append(ImportTiming(
+            module=stripped,
+            self_ms=int(parts[0]) / 1000,
+            cumulative_ms=int(parts[1]) / 1000,
+            depth=(len(name) - len(stripped) - 1) // 2,
+        ))
+    return timings
+
+
+def profile_imports(code: str = STARTUP_CODE, env: Optional[dict] = None) -> List[ImportTiming]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import profile run failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def total_ms(timings: List[ImportTiming]) -> float:
+    return sum(t.cumulative_ms for t in timings if t.depth == 0)
+
+
+def by_package(timings: List[ImportTiming]) -> Dict[str, float]:
+    """Cumulative milliseconds per top-level import, e.g. `livekit.plugins.openai` or `torch`"""
+    packages: Dict[str, float] = {}
+    for t in timings:
+        if t.depth == 0:
+            packages[t.module] = packages.get(t.module, 0.0) + t.cumulative_ms
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def format_report(timings: List[ImportTiming], top: int = 30) -> str:
+    lines = [f"Startup imports: {total_ms(timings):.1f}ms across {len(timings)} modules", ""]
+    lines.append(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for t in sorted(timings, key=lambda t: t.cumulative_ms, reverse=True)[:top]:
+        lines.append(f"{t.cumulative_ms:>14.1f}{t.self_ms:>10.1f}  {t.module}")
+    return "\n".join(lines)
+
+
+def print_import_profile(top: int = 30):
+    print(format_report(profile_imports(), top=top))
@@ -0,0 +1,338 @@
+"""
+Resource profiling for outbound AI agent.
+Compares each job's process before and after the call (RSS/USS, open file
+descriptors, threads, asyncio tasks, allocated blocks and, in `full` mode,
+tracemalloc's top allocation sites and live objects by type) and logs what the
+job left behind. A job process serves one call, so leaks across calls live in
+the long-lived processes: the worker samples its own memory and its inference
+process' as jobs finish, flags one whose baseline keeps growing and, past
+WORKER_RECYCLE_GROWTH_MB, stops taking jobs, drains and exits for its
+supervisor to restart it.
+
+Job-side work on the call path is a few /proc reads; the expensive parts (gc,
+tracemalloc, object counts) run before the job while the process is idle, and
+in the shutdown callbacks after it.
+"""
+
+import asyncio
+import gc
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+import psutil
+
+from core import settings
+from logger import get_logger
+from model_store import process_memory
+
+logger = get_logger(__name__)
+
+_MB = 1024 * 1024
+
+
+@dataclass
+class ResourceSnapshot:
+    rss: int
+    unique: int
+    fds: int
+    threads: int
+    blocks: int
+    tasks: Counter = field(default_factory=Counter)
+    taken: float = field(default_factory=time.monotonic)
+    types: Optional[Counter] = None
+    allocations: Optional[tracemalloc.Snapshot] = None
+
+
+def _task_names() -> Counter:
+    try:
+        tasks = asyncio.all_tasks()
+    except RuntimeError:
+        return Counter()
+    current = asyncio.current_task()
+    # Task names are numbered ("Task-12"); the coroutine says what it is
+    return Counter(
+        getattr(task.get_coro(), "__qualname__", task.get_name())
+        for task in tasks
+        if task is not current and not task.done()
+    )
+
+
+def take_snapshot(detail: bool = False) -> ResourceSnapshot:
+    """Cheap counters; with `detail`, also live objects by type and tracemalloc's heap (when tracing)"""
+    memory = process_memory()
+    if not memory:
+        info = psutil.Process().memory_info()
+        memory = {"rss": info.rss, "unique": info.rss}
+    try:
+        fds = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        fds = psutil.Process().num_fds() if hasattr(psutil.Process, "num_fds") else 0
+    snapshot = ResourceSnapshot(
+        rss=memory["rss"],
+        unique=memory["unique"],
+        fds=fds,
+        threads=threading.active_count(),
+        blocks=sys.getallocatedblocks(),
+        tasks=_task_names(),
+    )
+    if detail:
+        snapshot.types = Counter(type(obj).__name__ for obj in gc.get_objects())
+        if tracemalloc.is_tracing():
+            snapshot.allocations = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+    return snapshot
+
+
+class BaselineTracker:
+    """
+    Idle memory of one long-lived process, sampled as jobs finish
+
+    The process is flagged once its baseline grew at every one of the last
+    `jobs` samples, by at least `min_growth_mb` per sample on average. Python
+    rarely returns memory to the OS, so a single step up is normal; steady
+    growth job after job is what a leak looks like.
+    """
+
+    def __init__(self, name: str, jobs: Optional[int] = None, min_growth_mb: Optional[float] = None):
+        self.name = name
+        self.jobs = jobs or settings.JOB_PROFILE_LEAK_JOBS
+        self.min_growth = (min_growth_mb if min_growth_mb is not None else settings.JOB_PROFILE_LEAK_MB) * _MB
+        self.first: Optional[int] = None
+        self.samples: Deque[int] = deque(maxlen=self.jobs + 1)
+        self.count = 0
+        self.flagged = False
+
+    def record(self, rss: int) -> bool:
+        """Add a baseline; True when this sample makes the process look like it's leaking"""
+        if self.first is None:
+            self.first = rss
+        self.samples.append(rss)
+        self.count += 1
+        if len(self.samples) <= self.jobs:
+            return False
+        values = list(self.samples)
+        growing = all(b > a for a, b in zip(values, values[1:])) and values[-1] - values[0] >= self.min_growth * self.jobs
+        newly = growing and not self.flagged
+        self.flagged = growing
+        return newly
+
+    @property
+    def growth(self) -> int:
+        return self.samples[-1] - self.first if self.samples else 0
+
+    def describe(self) -> str:
+        return " → ".join(f"{rss / _MB:.1f}" for rss in self.samples) + "MB"
+
+
+def _diff_counter(before: Counter, after: Counter, top: int) -> List[tuple]:
+    growth = Counter({key: after[key] - before.get(key, 0) for key in after})
+    return [(key, count) for key, count in growth.most_common(top) if count > 0]
+
+
+class JobProfiler:
+    """
+    What one job changed in its process
+
+    The baseline is the idle process before the job, taken at the end of
+    prewarm. The process exits after its job, so growth across jobs is the
+    worker's to track (`WorkerRecycler`).
+    """
+
+    _baseline: Optional[ResourceSnapshot] = None
+
+    def __init__(self, room_name: str, top: Optional[int] = None):
+        self.room_name = room_name
+        self.top = top or settings.JOB_PROFILE_TOP
+        self.detail = JobProfiler._baseline is not None and JobProfiler._baseline.types is not None
+        self.started = take_snapshot()
+
+    @classmethod
+    def prepare(cls):
+        """Start tracing (full mode, sampled) and take the idle baseline; called at the end of prewarm"""
+        mode = settings.JOB_PROFILE
+        if not mode:
+            return
+        full = mode == "full" and random.random() < settings.JOB_PROFILE_SAMPLE_RATE
+        if full and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.JOB_PROFILE_TRACE_FRAMES)
+        gc.collect()
+        cls._baseline = take_snapshot(detail=full)
+
+    @classmethod
+    def for_job(cls, room_name: str) -> Optional["JobProfiler"]:
+        if not settings.JOB_PROFILE:
+            return None
+        if cls._baseline is None:
+            # Prewarm didn't run here (dev harnesses); the job start is the baseline
+            cls.prepare()
+        return cls(room_name)
+
+    async def finish(self):
+        """Shutdown callback: let the other callbacks run, collect, then compare with the baseline"""
+        await asyncio.sleep(0.5)
+        gc.collect()
+        ended = take_snapshot(detail=self.detail)
+        return self._report(JobProfiler._baseline, ended)
+
+    def _report(self, baseline: ResourceSnapshot, ended: ResourceSnapshot) -> dict:
+        # Prewarm runs before the process' event loop; tasks are compared with the job's start
+        tasks_left = sum(ended.tasks.values())
+        fields = {
+            "event": "job_resources",
+            "room": self.room_name,
+            "rss_mb": round(ended.rss / _MB, 1),
+            "rss_delta_mb": round((ended.rss - baseline.rss) / _MB, 2),
+            "unique_delta_mb": round((ended.unique - baseline.unique) / _MB, 2),
+            "fds_delta": ended.fds - baseline.fds,
+            "threads_delta": ended.threads - baseline.threads,
+            "tasks_left": tasks_left,
+            "tasks_delta": tasks_left - sum(self.started.tasks.values()),
+            "blocks_delta": ended.blocks - baseline.blocks,
+            "job_seconds": round(ended.taken - self.started.taken, 1),
+        }
+        new_tasks = _diff_counter(self.started.tasks, ended.tasks, self.top)
+        if new_tasks:
+            fields["tasks"] = dict(new_tasks)
+        if baseline.types is not None and ended.types is not None:
+            fields["object_growth"] = dict(_diff_counter(baseline.types, ended.types, self.top))
+        if baseline.allocations is not None and ended.allocations is not None:
+            stats = ended.allocations.compare_to(baseline.allocations, "lineno")
+            fields["allocation_growth_kb"] = {
+                str(stat.traceback[0]): round(stat.size_diff / 1024, 1)
+                for stat in stats[: self.top]
+                if stat.size_diff > 0
+            }
+
+        logger.info(
+            f"🧪 JOB RESOURCES | Room: {self.room_name} | RSS: {fields['rss_mb']}MB ({fields['rss_delta_mb']:+}MB) | "
+            f"Unique: {fields['unique_delta_mb']:+}MB | FDs: {fields['fds_delta']:+} | Threads: {fields['threads_delta']:+} | "
+            f"Tasks left: {fields['tasks_left']} ({fields['tasks_delta']:+}) | Blocks: {fields['blocks_delta']:+}",
+            extra={"fields": fields},
+        )
+        for key, label in (("tasks", "Tasks"), ("object_growth", "Objects"), ("allocation_growth_kb", "Allocations (KB)")):
+            if fields.get(key):
+                logger.info(f"   └─ {label}: " + ", ".join(f"{name} {value:+}" for name, value in fields[key].items()))
+        return fields
+
+
+class WorkerRecycler:
+    """
+    Baselines of the worker and its inference process, and recycling the worker
+
+    Sampled from the load function each time jobs finish. Job processes are
+    left out: prewarmed ones haven't run a job and each exits after its one
+    call, so their memory says nothing about growth across calls. Once the
+    worker or the inference process has grown `recycle_mb` over its first
+    sample, the worker reports itself full and, when its last job has ended,
+    sends itself SIGTERM; LiveKit's CLI drains and exits, and the supervisor
+    (systemd, a container restart policy) starts a fresh one.
+    """
+
+    def __init__(self, recycle_mb: Optional[float] = None, root_pid: Optional[int] = None):
+        self.recycle_bytes = (recycle_mb if recycle_mb is not None else settings.WORKER_RECYCLE_GROWTH_MB) * _MB
+        self.root = psutil.Process(root_pid or os.getpid())
+        self.trackers: Dict[int, BaselineTracker] = {}
+        self.completed = 0
+        self.recycling = False
+        self._active = 0
+        self._signalled = False
+        self._lock = threading.Lock()
+
+    def check(self, active_jobs: int, load: float, inference_pid: Optional[int] = None) -> float:
+        """Record baselines if jobs finished since the last call; the load to report"""
+        with self._lock:
+            finished = max(0, self._active - active_jobs)
+            self._active = active_jobs
+            if finished:
+                self.completed += finished
+                self._sample(inference_pid)
+            if not self.recycling:
+                return load
+            if active_jobs == 0 and not self._signalled:
+                self._signalled = True
+                logger.warning(f"♻️ RECYCLING WORKER | PID: {self.root.pid} | Jobs served: {self.completed}")
+                os.kill(self.root.pid, signal.SIGTERM)
+            return 1.0
+
+    def _sample(self, inference_pid: Optional[int] = None):
+        processes = {self.root.pid: ("worker", self.root)}
+        if inference_pid:
+            try:
+                processes[inference_pid] = ("inference process", psutil.Process(inference_pid))
+            except psutil.NoSuchProcess:
+                pass
+        alive = set()
+        for pid, (name, process) in processes.items():
+            try:
+                rss = process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            alive.add(pid)
+            tracker = self.trackers.get(pid)
+            if tracker is None:
+                tracker = self.trackers[pid] = BaselineTracker(name)
+            if tracker.record(rss):
+                logger.warning(
+                    f"⚠️ LEAK SUSPECTED | {tracker.name} {pid} | Baseline over the last "
+                    f"{tracker.jobs + 1} samples: {tracker.describe()}"
+                )
+            if self.recycle_bytes and tracker.count > 1 and tracker.growth >= self.recycle_bytes and not self.recycling:
+                self.recycling = True
+                logger.warning(
+                    f"♻️ Worker will recycle once its jobs end | {tracker.name} {pid} grew "
+                    f"{tracker.growth / _MB:.1f}MB over {tracker.count} samples (limit {self.recycle_bytes / _MB:.0f}MB)"
+                )
+        # A restarted inference process starts a new series
+        for pid in set(self.trackers) - alive:
+            del self.trackers[pid]
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE agent_worker_jobs_completed_total counter",
+            f"agent_worker_jobs_completed_total {self.completed}",
+            "# TYPE agent_worker_recycling gauge",
+            f"agent_worker_recycling {int(self.recycling)}",
+            "# TYPE agent_process_baseline_growth_bytes gauge",
+        ]
+        for pid, tracker in list(self.trackers.items()):
+            if tracker.count > 1:
+                lines.append(f'agent_process_baseline_growth_bytes{{pid="{pid}"}} {tracker.growth}')
+        return "\n".join(lines) + "\n"
+
+
+_recycler: Optional[WorkerRecycler] = None
+
+
+def get_recycler() -> WorkerRecycler:
+    global _recycler
+    if _recycler is None:
+        _recycler = WorkerRecycler()
+    return _recycler
+
+
+def get_load(worker) -> float:
+    """
+    `load_fnc` for the worker when tracking baselines: the usual load (worker_load's,
+    or LiveKit's default), reported as full while the worker is being recycled
+    """
+    if settings.WORKER_LOAD_ENABLED:
+        import worker_load
+
+        load = worker_load.get_load(worker)
+    else:
+        from livekit.agents.worker import _DefaultLoadCalc
+
+        load = _DefaultLoadCalc.get_load(worker)
+    # The inference process runs the turn detector for every job; LiveKit doesn't expose its pid publicly
+    inference = getattr(worker, "_inference_executor", None)
+    return get_recycler().check(len(worker.active_jobs), load, inference_pid=getattr(inference, "pid", None))
@@ -0,0 +1,301 @@
+"""
+Latency tracking for outbound AI agent.
+Tracks per-turn EOU/STT/LLM/TTS latencies from LiveKit metrics in fixed-memory
+streaming histograms, per call and per process. Job processes hand every turn
+to the metrics ring; the worker folds all of them into one set of histograms
+and serves it, with the other registered sources, on /metrics.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from livekit.agents import MetricsCollectedEvent, metrics
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+STAGES = ("eou", "transcription", "llm_ttft", "tts_ttfb", "e2e")
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram over microsecond values
+
+    Each power-of-two range is split into 2**sub_bucket_bits linear buckets, so
+    memory is fixed and relative error stays under ~3% (at 5 bits) from 1us to
+    `max_seconds`. Values above the range are clamped into the top bucket.
+    """
+
+    def __init__(self, max_seconds: float = 120.0, sub_bucket_bits: int = 5):
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value = int(max_seconds * 1_000_000)
+        self.counts = [0] * (self._index(self.max_value) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.sub_bucket_bits - 1)
+        return self.sub_buckets * shift + (value >> shift)
+
+    def _value_at(self, index: int) -> float:
+        """Midpoint of the bucket at `index`"""
+        shift = max(0, index // self.sub_buckets - 1)
+        return ((index - self.sub_buckets * shift) << shift) + ((1 << shift) - 1) / 2
+
+    def record(self, seconds: float):
+        if seconds is None or seconds < 0:
+            return
+        value = min(int(seconds * 1_000_000), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, quantile: float) -> float:
+        """Value in seconds at the given quantile (0-1), 0.0 when empty"""
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(quantile * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self._value_at(index) / 1_000_000, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> dict:
+        result = {f"p{int(q * 100)}": round(self.percentile(q), 4) for q in QUANTILES}
+        result.update(count=self.count, mean=round(self.mean, 4), max=round(self.max, 4))
+        return result
+
+
+class LatencyStats:
+    """One histogram per pipeline stage"""
+
+    def __init__(self):
+        self.histograms: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in STAGES}
+
+    def record(self, stage: str, seconds: Optional[float]):
+        if seconds is not None:
+            self.histograms[stage].record(seconds)
+
+    def summary(self) -> Dict[str, dict]:
+        return {stage: h.summary() for stage, h in self.histograms.items() if h.count}
+
+
+# Aggregate across every call handled by this process
+worker_stats = LatencyStats()
+
+
+@dataclass
+class ConversationTurn:
+    speech_id: str
+    started_at: float
+    eou_delay: Optional[float] = None
+    transcription_delay: Optional[float] = None
+    llm_ttft: Optional[float] = None
+    tts_ttfb: Optional[float] = None
+
+    def total_latency(self) -> Optional[float]:
+        """Calculate total conversation latency"""
+        if not self.is_complete():
+            return None
+        return self.eou_delay + self.llm_ttft + self.tts_ttfb
+
+    def is_complete(self) -> bool:
+        """Check if turn has all required metrics for latency calculation"""
+        return None not in (self.eou_delay, self.llm_ttft, self.tts_ttfb)
+
+
+class LatencyTracker:
+    """
+    Per-call latency tracking.
+
+    Metrics for one user turn share a `speech_id`; a turn is complete once its
+    EOU, LLM and TTS metrics have all arrived. Every stage is recorded into the
+    call's histograms and the worker-wide ones.
+    """
+
+    def __init__(self, room_name: str, max_pending_turns: int = 32, on_record: Optional[Callable[[str, Optional[float]], None]] = None):
+        self.room_name = room_name
+        self.on_record = on_record
+        self.stats = LatencyStats()
+        self.max_pending_turns = max_pending_turns
+        self._turns: Dict[str, ConversationTurn] = {}
+        self.completed_turns = 0
+
+    def _record(self, stage: str, seconds: Optional[float]):
+        self.stats.record(stage, seconds)
+        worker_stats.record(stage, seconds)
+        if self.on_record is not None:
+            self.on_record(stage, seconds)
+
+    def _turn(self, speech_id: Optional[str]) -> Optional[ConversationTurn]:
+        if not speech_id:
+            return None
+        turn = self._turns.get(speech_id)
+        if turn is None:
+            # Turns that never complete (interrupted replies) are evicted oldest first
+            if len(self._turns) >= self.max_pending_turns:
+                self._turns.pop(next(iter(self._turns)))
+            turn = self._turns[speech_id] = ConversationTurn(speech_id=speech_id, started_at=time.monotonic())
+        return turn
+
+    def collect_metrics(self, ev: MetricsCollectedEvent):
+        """Process metrics from LiveKit agents"""
+        m = ev.metrics
+        if isinstance(m, metrics.EOUMetrics):
+            self._record("eou", m.end_of_utterance_delay)
+            self._record("transcription", m.transcription_delay)
+            turn = self._turn(m.speech_id)
+            if turn:
+                turn.eou_delay = m.end_of_utterance_delay
+                turn.transcription_delay = m.transcription_delay
+        elif isinstance(m, metrics.LLMMetrics):
+            self._record("llm_ttft", m.ttft)
+            turn = self._turn(m.speech_id)
+            if turn:
+                turn.llm_ttft = m.ttft
+        elif isinstance(m, metrics.TTSMetrics):
+            self._record("tts_ttfb", m.ttfb)
+            turn = self._turn(m.speech_id)
+            if turn:
+                turn.tts_ttfb = m.ttfb
+        else:
+            return
+
+        if turn and turn.is_complete():
+            self._complete_turn(turn)
+
+    def _complete_turn(self, turn: ConversationTurn):
+        """Mark turn as complete and record end-to-end latency"""
+        self._turns.pop(turn.speech_id, None)
+        self.completed_turns += 1
+        self._record("e2e", turn.total_latency())
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug(
+            f"⏱️ Turn latency | Room: {self.room_name} | E2E: {turn.total_latency():.3f}s | "
+            f"EOU: {turn.eou_delay:.3f}s | LLM TTFT: {turn.llm_ttft:.3f}s | TTS TTFB: {turn.tts_ttfb:.3f}s"
+        )
+
+    def get_latency_stats(self) -> Dict[str, dict]:
+        """Get aggregated latency statistics for this call"""
+        return self.stats.summary()
+
+    def log_call_summary(self):
+        """Log latency summary for the entire call"""
+        summary = self.get_latency_stats()
+        if not summary:
+            logger.info(f"⏱️ LATENCY SUMMARY | Room: {self.room_name} | No turns measured")
+            return
+        parts = [f"⏱️ LATENCY SUMMARY | Room: {self.room_name} | Turns: {self.completed_turns}"]
+        for stage, s in summary.items():
+            parts.append(f"{stage} p50/p95/p99: {s['p50']:.3f}/{s['p95']:.3f}/{s['p99']:.3f}s")
+        logger.info(" | ".join(parts))
+
+
+# Other modules can add their own Prometheus text to /metrics
+_metrics_sources: List[Callable[[], str]] = []
+
+
+def register_metrics_source(render: Callable[[], str]):
+    """Append the output of `render` to every /metrics response"""
+    _metrics_sources.append(render)
+
+
+def render_prometheus(histograms: Optional[Dict[str, LatencyHistogram]] = None) -> str:
+    """Render latency histograms (this process' by default) as Prometheus summaries"""
+    histograms = worker_stats.histograms if histograms is None else histograms
+    lines = [
+        "# HELP agent_turn_latency_seconds Per-turn voice pipeline latency by stage",
+        "# TYPE agent_turn_latency_seconds summary",
+    ]
+    for stage, h in histograms.items():
+        for q in QUANTILES:
+            lines.append(f'agent_turn_latency_seconds{{stage="{stage}",quantile="{q}"}} {h.percentile(q):.6f}')
+        lines.append(f'agent_turn_latency_seconds_sum{{stage="{stage}"}} {h.total:.6f}')
+        lines.append(f'agent_turn_latency_seconds_count{{stage="{stage}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics() -> str:
+    """Body of a /metrics response: every registered source"""
+    body = ""
+    for render in _metrics_sources:
+        try:
+            body += render()
+        except Exception as e:
+            logger.warning(f"⚠️ Metrics source failed: {e}")
+    return body
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: Optional[int] = None, attempts: int = 8) -> Optional[int]:
+    """
+    Serve /metrics from a daemon thread in this process
+
+    The worker and the host sidecars serve one each. Starting from `port` the
+    first free port is taken, so sidecars sharing a default don't collide.
+    Returns the bound port, or None when disabled/unavailable.
+    """
+    global _server
+    if _server is not None:
+        return _server.server_address[1]
+
+    port = settings.LATENCY_METRICS_PORT if port is None else port
+    if not port:
+        return None
+
+    for candidate in range(port, port + attempts):
+        try:
+            _server = ThreadingHTTPServer(("0.0.0.0", candidate), _MetricsHandler)
+            break
+        except OSError:
+            continue
+    else:
+        logger.warning(f"⚠️ No free port for latency metrics in {port}-{port + attempts - 1}")
+        return None
+
+    threading.Thread(target=_server.serve_forever, name="latency-metrics", daemon=True).start()
+    logger.info(f"📈 Latency metrics at http://0.0.0.0:{candidate}/metrics")
+    return candidate
@@ -1,13 +1,25 @@
 """
 Logging configuration for outbound AI agent.
 Provides structured, environment-aware logging with configurable levels.
+
+Records can be handed to a background thread through a queue (LOG_QUEUE=true),
+so formatting and I/O never run on the event loop that drives realtime audio.
 """
 
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import sys
 import os
+import threading
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional, TextIO
+
+# Background listener for queue mode, stopped (and flushed) at exit
+_listener: Optional[logging.handlers.QueueListener] = None
 
 
 class ColoredFormatter(logging.Formatter):
@@ -31,10 +43,92 @@ class ColoredFormatter(logging.Formatter):
         return super().format(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """Compact JSON-lines formatter for production log shipping"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Per-logger rate limiting and sampling for noisy low-level records
+
+    Records at or below `max_level` are first sampled (1 in `sample_every`) and then
+    limited to `rate` records/second per logger name; higher levels always pass.
+    """
+
+    def __init__(self, rate: float = 20.0, burst: Optional[float] = None, sample_every: int = 1,
+                 max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.sample_every = max(1, sample_every)
+        self.max_level = max_level
+        self.dropped = 0
+        self._buckets: Dict[str, list] = {}
+        self._seen: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+
+        with self._lock:
+            seen = self._seen.get(record.name, 0) + 1
+            self._seen[record.name] = seen
+            if seen % self.sample_every:
+                self.dropped += 1
+                return False
+
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(record.name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now)
+                self.dropped += 1
+                return False
+            self._buckets[record.name] = (tokens - 1, now)
+            return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers all formatting to the listener thread
+
+    The stock handler merges `msg % args` on the calling thread; here the record
+    is enqueued untouched, so the event loop only pays for a queue put.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logging(
     level: Optional[str] = None,
     log_file: Optional[str] = None,
-    environment: Optional[str] = None
+    environment: Optional[str] = None,
+    use_queue: Optional[bool] = None,
+    log_format: Optional[str] = None,
+    stream: Optional[TextIO] = None,
 ) -> logging.Logger:
     """
     Setup logging configuration based on environment
@@ -43,6 +137,9 @@ def setup_logging(
         level: Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
         log_file: Optional file path for file logging
         environment: Environment name (development, staging, production)
+        use_queue: Format and write records on a background thread (LOG_QUEUE)
+        log_format: "text" or "json" (LOG_FORMAT); json is compact JSON lines
+        stream: Console stream, defaults to stdout
     
     Returns:
         Configured logger instance
@@ -51,6 +148,9 @@ def setup_logging(
     level = level or os.getenv("LOG_LEVEL", "INFO")
     environment = environment or os.getenv("ENVIRONMENT", "development")
     log_file = log_file or os.getenv("LOG_FILE")
+    if use_queue is None:
+        use_queue = os.getenv("LOG_QUEUE", "true" if environment != "development" else "false").lower() == "true"
+    log_format = (log_format or os.getenv("LOG_FORMAT", "text")).lower()
     
     # Convert string level to logging constant
     numeric_level = getattr(logging, level.upper(), logging.INFO)
@@ -60,14 +160,28 @@ def setup_logging(
     logger.setLevel(numeric_level)
     
     # Clear any existing handlers and prevent propagation
+    _stop_listener()
     logger.handlers.clear()
     logger.propagate = False
+
+    # Noisy DEBUG sources are sampled and rate limited before they cost anything.
+    # Filters on a logger don't see records from its children, so this goes on the
+    # handlers attached below.
+    def rate_limit():
+        return RateLimitFilter(
+            rate=float(os.getenv("LOG_DEBUG_RATE_LIMIT", "20")),
+            sample_every=int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", "1")),
+        )
+
+    handlers = []
     
     # Console handler with colors (for development)
-    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler = logging.StreamHandler(stream or sys.stdout)
     console_handler.setLevel(numeric_level)
     
-    if environment == "development":
+    if log_format == "json":
+        console_formatter = JsonFormatter()
+    elif environment == "development":
         # Colored, detailed format for development
         console_formatter = ColoredFormatter(
             '%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d | %(message)s',
@@ -81,7 +195,7 @@ def setup_logging(
         )
     
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # File handler (if specified)
     if log_file:
@@ -93,26 +207,45 @@ def setup_logging(
             file_handler.setLevel(numeric_level)
             
             # Structured format for file logging
-            file_formatter = logging.Formatter(
-                '%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d | %(funcName)s | %(message)s',
-                datefmt='%Y-%m-%d %H:%M:%S'
-            )
+            if log_format == "json":
+                file_formatter = JsonFormatter()
+            else:
+                file_formatter = logging.Formatter(
+                    '%(asctime)s | %(levelname)-8s | %(name)s:%(lineno)d | %(funcName)s | %(message)s',
+                    datefmt='%Y-%m-%d %H:%M:%S'
+                )
             
             file_handler.setFormatter(file_formatter)
-            logger.addHandler(file_handler)
+            handlers.append(file_handler)
             
         except Exception as e:
             logger.warning(f"Failed to setup file logging to {log_file}: {e}")
+
+    if use_queue:
+        global _listener
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(rate_limit())
+        logger.addHandler(queue_handler)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_stop_listener)
+    else:
+        for handler in handlers:
+            handler.addFilter(rate_limit())
+            logger.addHandler(handler)
     
     # Set specific logger levels for noisy libraries
     logging.getLogger("urllib3").setLevel(logging.INFO)
     logging.getLogger("aiohttp").setLevel(logging.INFO)
-    logging.getLogger("livekit").setLevel(logging.DEBUG)
+    livekit_level = os.getenv("LIVEKIT_LOG_LEVEL", "DEBUG" if environment == "development" else "INFO")
+    logging.getLogger("livekit").setLevel(getattr(logging, livekit_level.upper(), logging.INFO))
     # Temporarily disable verbose Whispey logging
     logging.getLogger("whispey-sdk").setLevel(logging.WARNING)
     
     # Log startup information
-    logger.info(f"🚀 Logging initialized - Level: {level.upper()}, Environment: {environment}")
+    logger.info(f"🚀 Logging initialized - Level: {level.upper()}, Environment: {environment}, "
+                f"Format: {log_format}, Queue: {use_queue}")
     if log_file:
         logger.info(f"📁 File logging enabled: {log_file}")
     
@@ -138,51 +271,92 @@ def get_logger(name: str = None) -> logging.Logger:
 logger = get_logger()
 
 
+class _EventMessage:
+    """
+    Log message built only when a handler actually formats the record
+
+    In queue mode that happens on the listener thread, so the event loop never
+    pays for string building.
+    """
+
+    __slots__ = ("prefix", "parts")
+
+    def __init__(self, prefix: str, parts: list):
+        self.prefix = prefix
+        self.parts = parts
+
+    def __str__(self):
+        return " | ".join([self.prefix] + [f"{label}: {value}" for label, value in self.parts])
+
+
 # Convenience functions for common logging patterns
 def log_call_event(event: str, phone_number: str = None, duration: int = None, room_name: str = None):
     """Log call lifecycle events with consistent formatting"""
-    parts = [f"📞 {event}"]
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    parts = []
     if phone_number:
-        parts.append(f"Number: {phone_number}")
+        parts.append(("Number", phone_number))
     if duration is not None:
-        parts.append(f"Duration: {duration}s")
+        parts.append(("Duration", f"{duration}s"))
     if room_name:
-        parts.append(f"Room: {room_name}")
-    
-    logger.info(" | ".join(parts))
+        parts.append(("Room", room_name))
+
+    fields = {"event": event, "phone_number": phone_number, "duration": duration, "room": room_name}
+    logger.info(_EventMessage(f"📞 {event}", parts), extra={"fields": fields})
 
 
 def log_webhook_event(event: str, url: str, status: int = None, room_name: str = None):
     """Log webhook events with consistent formatting"""
-    parts = [f"📡 {event}"]
+    ok = bool(status and 200 <= status < 300)
+    level = logging.INFO if ok else logging.ERROR
+    if not logger.isEnabledFor(level):
+        return
+    parts = []
     if room_name:
-        parts.append(f"Room: {room_name}")
-    parts.append(f"URL: {url}")
+        parts.append(("Room", room_name))
+    parts.append(("URL", url))
     if status is not None:
-        parts.append(f"Status: {status}")
-    
-    if status and 200 <= status < 300:
-        logger.info(" | ".join(parts))
-    else:
-        logger.error(" | ".join(parts))
+        parts.append(("Status", status))
+
+    fields = {"event": event, "url": url, "status": status, "room": room_name}
+    logger.log(level, _EventMessage(f"📡 {event}", parts), extra={"fields": fields})
+
+
+class _CostMessage(_EventMessage):
+    __slots__ = ()
+
+    def __str__(self):
+        parts = [(label, f"{value[0]}{value[1]:.2f}" if label == "Total" else value) for label, value in self.parts]
+        return " | ".join([self.prefix] + [f"{label}: {value}" for label, value in parts])
 
 
 def log_cost_event(event: str, total_cost: float = None, currency: str = "NGN", room_name: str = None):
     """Log cost-related events with consistent formatting"""
-    parts = [f"💰 {event}"]
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    parts = []
     if room_name:
-        parts.append(f"Room: {room_name}")
+        parts.append(("Room", room_name))
     if total_cost is not None:
-        parts.append(f"Total: {currency}{total_cost:.2f}")
-    
-    logger.info(" | ".join(parts))
+        parts.append(("Total", (currency, total_cost)))
+
+    fields = {"event": event, "total_cost": total_cost, "currency": currency, "room": room_name}
+    logger.info(_CostMessage(f"💰 {event}", parts), extra={"fields": fields})
+
+
+class _ProviderMessage(_EventMessage):
+    __slots__ = ()
+
+    def __str__(self):
+        providers = self.parts
+        if not providers:
+            return self.prefix
+        return " | ".join([self.prefix] + [f"{k.upper()}={v}" for k, v in providers.items()])
 
 
 def log_provider_event(event: str, providers: dict = None):
     """Log provider detection events with consistent formatting"""
-    parts = [f"🔧 {event}"]
-    if providers:
-        provider_list = [f"{k.upper()}={v}" for k, v in providers.items()]
-        parts.append(" | ".join(provider_list))
-    
-    logger.info(" | ".join(parts)) 
\ No newline at end of file
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info(_ProviderMessage(f"🔧 {event}", providers or {}), extra={"fields": {"event": event, **(providers or {})}})
@@ -1,4 +1,5 @@
 import datetime
+import logging
 from dotenv import load_dotenv
 
 from livekit import api
@@ -6,18 +7,30 @@ import json
 from livekit import agents
 from livekit.agents import AgentSession, Agent, metrics, MetricsCollectedEvent
 from livekit.agents import RoomInputOptions
-from livekit.plugins import (
-    deepgram,
-    silero,
-    openai,
-    elevenlabs,
-)
-from livekit.plugins.turn_detector.multilingual import MultilingualModel
 import os
+import sys
+import time
 import asyncio
 from core import settings 
 from logger import setup_logging, get_logger, log_call_event
-from tensorzero import AsyncTensorZeroGateway
+from latency_tracker import LatencyTracker, register_metrics_source, render_prometheus, start_metrics_server
+from trunk_pool import classify_sip_failure, fallback_trunk, outcome_metadata
+from post_call_analysis import TranscriptCollector, get_analyzer
+from prompts import PromptCacheTracker, build_instructions
+from greeting import GreetingTimeout, SpeculativeGreeting
+from tts_cache import CachedTTS, get_audio_cache
+from webhook_service import get_webhook_service, send_webhook_notification
+from warmup import load_concurrently, log_timings, warm_connections
+from call_trace import CallTraceRecorder, RecordKind
+from call_store import get_call_store
+from vad_service import load_shared_vad
+from suppression import check_number, get_suppression
+import job_profiler
+import metrics_ring
+import model_store
+import worker_load
+import pipelines
+import providers
 
 load_dotenv()
 
@@ -28,64 +41,257 @@ logger = get_logger(__name__)
 logger.info(f"🔗 Attempting to connect to LiveKit URL: {settings.LIVEKIT_URL}")
 logger.info(f"🔐 Using LiveKit API Key: {'✓' if settings.LIVEKIT_API_KEY else '✗'}")
 
+# Turn-taking options; recorded in call traces so replays can start from the same settings
+SESSION_OPTIONS = {
+    "preemptive_generation": True,
+    "use_tts_aligned_transcript": True,
+    "max_endpointing_delay": 3,
+    "min_endpointing_delay": 0.2,
+}
 
-def prewarm(proc: agents.JobProcess):
-    """Prewarm function to load all heavy models before job execution"""
-    logger.info("🔥 Prewarming all AI models...")
-    start_time = datetime.datetime.now()
+# Greeting stats are shared through a file; every job process appends its call and reads the others'
+greeting_timeout = GreetingTimeout()
 
-    # Load all models and store them in the process' userdata
-    proc.userdata["vad"] = silero.VAD.load(
-        min_speech_duration=0.03,
-        min_silence_duration=0.2,
-        prefix_padding_duration=0.3,
-    )
-    proc.userdata["stt"] = deepgram.STT(model="nova-3", language="en")
-    proc.userdata["llm"] = openai.LLM(model="gpt-4.1-mini")
-    proc.userdata["tts"] = elevenlabs.TTS(
-        voice_id="x86DtpnPPuq2BpEiKPRy",
-        model="eleven_flash_v2_5",
+
+def _build_vad():
+    options = {"min_speech_duration": 0.03, "min_silence_duration": 0.2, "prefix_padding_duration": 0.3}
+    # With the host VAD service running, windows from every call are batched there instead
+    if settings.VAD_SERVICE_SOCKET:
+        return load_shared_vad(settings.VAD_SERVICE_SOCKET, **options)
+    return model_store.load_mapped_vad(**options)
+
+
+def _build_t0_gateway():
+    from tensorzero import AsyncTensorZeroGateway
+
+    val = settings.OPENAI_API_KEY
+    if val:
+        os.environ["OPENAI_API_KEY"] = val
+
+    from clickhouse_sink import gateway_clickhouse_url
+
+    return AsyncTensorZeroGateway.build_embedded(
+        config_file="config/tensorzero.toml",
+        # The host's write buffer when it runs, so inserts from all job processes are batched
+        clickhouse_url=gateway_clickhouse_url(),
+        async_setup=False,
     )
 
-    # Initialize TensorZero gateway and store in the process userdata
-    try:
-        val = settings.OPENAI_API_KEY
-        if val:
-            os.environ["OPENAI_API_KEY"] = val
-
-        proc.userdata["t0_gateway"] = AsyncTensorZeroGateway.build_embedded(
-            config_file="config/tensorzero.toml",
-            clickhouse_url=settings.CLICKHOUSE_URL,
-            async_setup=False,
-        )
+
+def _cache_tts(tts, spec: providers.ProviderSpec):
+    # Serve repeated phrases from the shared on-disk cache when it's enabled
+    audio_cache = get_audio_cache()
+    if audio_cache is None:
+        return tts
+    voice = spec.options.get("voice_id") or spec.options.get("voice") or ""
+    return CachedTTS(tts, audio_cache, voice=voice, voice_settings=spec.options.get("voice_settings"))
+
+
+def prewarm(proc: agents.JobProcess):
+    """Prewarm function to load all heavy models before job execution"""
+    logger.info("🔥 Prewarming all AI models...")
+    start_time = time.perf_counter()
+
+    profile = pipelines.get_profile()
+    logger.info(f"🧩 Pipeline profile {profile.name} | {profile.describe()}")
+
+    # Plugins must register on the main thread, before the loader threads build anything. The
+    # other profiles' plugins too, so a campaign's profile can be built off the main thread later
+    providers.import_plugins(profile.specs())
+    for other in pipelines.all_profiles().values():
+        providers.import_plugins(other.specs())
+
+    loaders = {"vad": _build_vad, **pipelines.loaders(profile, wrap_tts=_cache_tts)}
+    if settings.TENSORZERO_ENABLED:
+        loaders["t0_gateway"] = _build_t0_gateway
+
+    # Components are independent, so load them all at once and store them in the process' userdata
+    components, timings, errors = load_concurrently(loaders)
+
+    # The TensorZero gateway is optional; everything else is required for a call
+    t0_error = errors.pop("t0_gateway", None)
+    if t0_error is not None:
+        logger.warning(f"⚠️ TensorZero gateway initialization failed: {t0_error}")
+    if errors:
+        name, error = next(iter(errors.items()))
+        raise RuntimeError(f"Failed to prewarm {name}") from error
+
+    proc.userdata.update(components)
+    proc.userdata["pipeline"] = profile.name
+    if "t0_gateway" in components:
         logger.info("🧠 TensorZero gateway initialized in prewarm")
-    except Exception as e:
-        logger.warning(f"⚠️ TensorZero gateway initialization failed: {e}")
 
-    prewarm_time = (datetime.datetime.now() - start_time).total_seconds()
-    logger.info(f"🔥 All models prewarmed in {prewarm_time:.3f}s")
+    prewarm_time = time.perf_counter() - start_time
+    log_timings(timings, prewarm_time)
     proc.userdata["prewarm_time"] = prewarm_time
+    proc.userdata["prewarm_timings"] = timings
+    model_store.log_memory_report("prewarmed")
+
+    # Map the suppression lists now rather than on the first call
+    get_suppression()
+    if settings.WEBHOOK_URL:
+        # Opening the outbox may wait on other processes' locks; do it before the call
+        get_webhook_service()
+
+    # The worker serves the host's aggregate; a job process only serves its own numbers when debugging
+    if settings.JOB_METRICS_PORT:
+        register_metrics_source(render_prometheus)
+        register_metrics_source(model_store.render_prometheus)
+        start_metrics_server(settings.JOB_METRICS_PORT, attempts=256)
+
+    # Idle baseline the first job is compared with (JOB_PROFILE)
+    job_profiler.JobProfiler.prepare()
 
 
 class Assistant(Agent):
-    def __init__(self, main_prompt=None) -> None:
-        prompt_path = os.path.join(os.path.dirname(__file__), "general_prompt.md")
-        with open(prompt_path, "r") as f:
-            instructions = f.read()
-        
-        if main_prompt:
-            instructions = f"{instructions}\n\nMain instructions:\n{main_prompt}"
-        
-        super().__init__(instructions=instructions)
+    def __init__(self, main_prompt=None, call_context=None, trace: CallTraceRecorder = None) -> None:
+        # Base + campaign prompt is assembled once per campaign and shared byte-for-byte
+        # by all its calls, so the provider's prompt cache hits
+        prompt = build_instructions(main_prompt, call_context)
+        logger.debug(f"📝 Instructions | Campaign: {prompt.campaign_hash} | Tokens: {prompt.total_tokens}")
+
+        super().__init__(instructions=prompt.text)
+        self.trace = trace
+
+    # When the call is traced, the pipeline nodes are teed into the trace unchanged
+    async def stt_node(self, audio, model_settings):
+        if self.trace is None:
+            return Agent.default.stt_node(self, audio, model_settings)
+        return self.trace.tap_stt(Agent.default.stt_node(self, self.trace.tap_audio(audio), model_settings))
+
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        if self.trace is None:
+            return Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+        return self.trace.tap_llm(chat_ctx, Agent.default.llm_node(self, chat_ctx, tools, model_settings))
+
+    async def tts_node(self, text, model_settings):
+        if self.trace is None:
+            return Agent.default.tts_node(self, text, model_settings)
+        return self.trace.tap_tts(text, lambda teed: Agent.default.tts_node(self, teed, model_settings))
 
 
 def get_t0_gateway(ctx: agents.JobContext):
     return ctx.proc.userdata.get("t0_gateway")
 
 
+async def get_pipeline(ctx: agents.JobContext, name: str = None) -> dict:
+    """
+    STT/LLM/TTS for the campaign's pipeline profile
+
+    The process' own profile was built in prewarm. Others are built in loader
+    threads on their first call in this process, before the room is joined,
+    and kept for the next ones; an unknown name falls back to the prewarmed
+    profile.
+    """
+    userdata = ctx.proc.userdata
+    if not name or name == userdata.get("pipeline"):
+        return userdata
+
+    built = userdata.setdefault("pipelines", {})
+    if name not in built:
+        try:
+            profile = pipelines.get_profile(name)
+        except ValueError as e:
+            logger.warning(f"⚠️ {e}; using {userdata.get('pipeline')}")
+            return userdata
+        started = time.perf_counter()
+        # Plugins were imported in prewarm, so nothing here needs the main thread
+        loaders = pipelines.loaders(profile, wrap_tts=_cache_tts)
+        components, _, errors = await asyncio.to_thread(load_concurrently, loaders)
+        if errors:
+            component, error = next(iter(errors.items()))
+            raise RuntimeError(f"Failed to build {component} for pipeline profile {name}") from error
+        built[name] = components
+        logger.info(f"🧩 Built pipeline profile {name} in {time.perf_counter() - started:.3f}s | {profile.describe()}")
+    return built[name]
+
+
+def notify_call_status(status: str, phone_number: str, room_name: str, **details):
+    """Queue a call status webhook; delivery happens in the background"""
+    metrics_ring.record_call(status, details.get("duration"), details.get("sip_status_code"))
+    call_store = get_call_store()
+    if call_store is not None:
+        call_store.event(room_name, status, **details)
+    if not settings.WEBHOOK_URL:
+        return
+    send_webhook_notification(
+        settings.WEBHOOK_URL,
+        {
+            "status": status,
+            "phone_number": phone_number,
+            "timestamp": datetime.datetime.now().isoformat(),
+            **details,
+        },
+        room_name=room_name,
+    )
+
+
+async def report_sip_outcome(ctx: agents.JobContext, **outcome):
+    """Leave the SIP outcome in the room's metadata, where the campaign dialer scores the trunk with it"""
+    try:
+        await ctx.api.room.update_room_metadata(
+            api.UpdateRoomMetadataRequest(room=ctx.room.name, metadata=outcome_metadata(**outcome))
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Could not report the call outcome | Room: {ctx.room.name} | Error: {e}")
+
+
 async def entrypoint(ctx: agents.JobContext):
     call_timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
 
+    async def close_metrics_ring():
+        metrics_ring.close_ring()
+
+    ctx.add_shutdown_callback(close_metrics_ring)
+
+    profiler = job_profiler.JobProfiler.for_job(ctx.room.name)
+    if profiler is not None:
+        ctx.add_shutdown_callback(profiler.finish)
+
+    if settings.WEBHOOK_URL:
+        # Pick up events a previous job or process left in the outbox
+        webhook_service = get_webhook_service()
+        webhook_service.start()
+
+        async def flush_webhooks():
+            await webhook_service.flush()
+            await webhook_service.aclose()
+
+        ctx.add_shutdown_callback(flush_webhooks)
+
+    dial_info = json.loads(ctx.job.metadata)
+    phone_number = dial_info["phone_number"]
+
+    # The call's turns, lifecycle events and metrics, kept for analysis and cost reconciliation
+    call_store = get_call_store()
+    if call_store is not None:
+        call_store.begin(
+            ctx.room.name,
+            campaign=dial_info.get("campaign"),
+            phone_number=phone_number,
+            pipeline=dial_info.get("pipeline") or ctx.proc.userdata.get("pipeline"),
+        )
+
+        async def close_call_record():
+            await call_store.end(ctx.room.name)
+
+        ctx.add_shutdown_callback(close_call_record)
+    if phone_number is not None:
+        # Suppressed numbers are dropped before they cost a room, a trunk or provider connections
+        suppressed = check_number(phone_number)
+        if suppressed:
+            logger.warning(f"🚫 CALL SUPPRESSED | Number: {phone_number} | Reason: {suppressed}")
+            notify_call_status("suppressed", phone_number, ctx.room.name, reason=suppressed)
+            ctx.shutdown(reason=f"suppressed: {suppressed}")
+            return
+
+    # Campaigns can pick another pipeline profile than the one this process prewarmed
+    pipeline = await get_pipeline(ctx, dial_info.get("pipeline"))
+    pipelines.begin_call(pipeline["tts"])
+
+    # Open provider connections now so the handshakes overlap with connect and ringing
+    warm_connections(stt=pipeline.get("stt"), llm=pipeline.get("llm"), tts=pipeline.get("tts"))
+
     await ctx.connect()
 
     # event handlers for call lifecycle
@@ -103,20 +309,44 @@ async def entrypoint(ctx: agents.JobContext):
                 log_call_event("CALL COMPLETED", phone_number=phone_number, duration=actual_call_duration, room_name=ctx.room.name)
             else:
                 log_call_event("CALL COMPLETED", phone_number=phone_number, room_name=ctx.room.name)
+            notify_call_status("completed", phone_number, ctx.room.name, duration=actual_call_duration)
 
-    dial_info = json.loads(ctx.job.metadata)
-    phone_number = dial_info["phone_number"]
     prompt = dial_info.get("prompt", "you're a good outbound caller")
+    call_context = dial_info.get("call_context")
+
+    async def log_router_stats():
+        pipelines.log_router_stats(pipeline["llm"], pipeline["tts"])
+
+    ctx.add_shutdown_callback(log_router_stats)
+
+    # Loop lag feeds the worker's load function
+    lag_monitor = worker_load.start_loop_monitor()
+    ctx.add_shutdown_callback(lag_monitor.aclose)
+    trace = CallTraceRecorder.for_call(ctx.room.name, {
+        "phone_number": phone_number,
+        "prompt": prompt,
+        "call_context": call_context,
+        "pipeline": dial_info.get("pipeline") or ctx.proc.userdata.get("pipeline"),
+        "session_options": SESSION_OPTIONS,
+    })
+    if trace is not None:
+        ctx.add_shutdown_callback(trace.aclose)
 
     sip_participant_identity = phone_number
     if phone_number is not None:
+        # Trunk selection, health and caps live in the campaign dialer; this process only serves one call
+        sip_trunk_id = dial_info.get("sip_trunk_id") or fallback_trunk()
+        dial_started = datetime.datetime.now()
+
         # The outbound call will be placed after this method is executed
         try:
             log_call_event("CALL DIALING", phone_number=phone_number, room_name=ctx.room.name)
+            if trace is not None:
+                trace.event(RecordKind.SIP, status="dialing", sip_trunk_id=sip_trunk_id)
             await ctx.api.sip.create_sip_participant(
                 api.CreateSIPParticipantRequest(
                     room_name=ctx.room.name,
-                    sip_trunk_id="ST_ckfvg2Zv5yp5",
+                    sip_trunk_id=sip_trunk_id,
                     sip_call_to=phone_number,
                     participant_identity=sip_participant_identity,
                     wait_until_answered=True,
@@ -124,7 +354,19 @@ async def entrypoint(ctx: agents.JobContext):
             )
 
             log_call_event("CALL ANSWERED", phone_number=phone_number, room_name=ctx.room.name)
+            notify_call_status("answered", phone_number, ctx.room.name, sip_trunk_id=sip_trunk_id)
             call_start_time = datetime.datetime.now()
+            if trace is not None:
+                trace.event(RecordKind.SIP, status="answered", sip_trunk_id=sip_trunk_id)
+            # Reported in the background; the session shouldn't wait on the room API
+            outcome_report = asyncio.create_task(report_sip_outcome(
+                ctx, answered=True, latency=(call_start_time - dial_started).total_seconds()
+            ))
+
+            async def finish_outcome_report():
+                await outcome_report
+
+            ctx.add_shutdown_callback(finish_outcome_report)
 
         except api.TwirpError as e:
             error_details = {
@@ -137,80 +379,126 @@ async def entrypoint(ctx: agents.JobContext):
             logger.error(f"   ├─ SIP Status Code: {error_details['sip_status_code']}")
             logger.error(f"   └─ SIP Status: {error_details['sip_status']}")
 
-            webhook_status = "failed"  
-            if error_details['sip_status_code']:
-                if error_details['sip_status_code'] == '486':
-                    logger.warning("📞 REASON: Number is busy")
-                    webhook_status = "rejected"
-                elif error_details['sip_status_code'] in ['480', '404']:
-                    logger.warning("📞 REASON: Number not reachable/not found")
-                elif error_details['sip_status_code'] == '603':
-                    logger.warning("📞 REASON: Call declined")
-                    webhook_status = "rejected"  
-                elif error_details['sip_status_code'] in ['408', '487']:
-                    logger.warning("📞 REASON: Call timeout/cancelled")
+            webhook_status, reason = classify_sip_failure(error_details['sip_status_code'])
+            if trace is not None:
+                trace.event(RecordKind.SIP, status=webhook_status, **error_details)
+            if reason:
+                logger.warning(f"📞 REASON: {reason}")
+            await report_sip_outcome(
+                ctx,
+                answered=False,
+                latency=(datetime.datetime.now() - dial_started).total_seconds(),
+                sip_status_code=error_details['sip_status_code'],
+            )
+            notify_call_status(
+                webhook_status,
+                phone_number,
+                ctx.room.name,
+                sip_status_code=error_details['sip_status_code'],
+                sip_status=error_details['sip_status'],
+                error=error_details['message'],
+            )
 
             call_failed = True
             ctx.shutdown()
         except Exception as e:
             logger.error(f"📞 UNEXPECTED ERROR | Phone: {phone_number} | Room: {ctx.room.name} | Error: {str(e)}")
+            if trace is not None:
+                trace.event(RecordKind.SIP, status="failed", error=str(e))
+            await report_sip_outcome(
+                ctx,
+                answered=False,
+                latency=(datetime.datetime.now() - dial_started).total_seconds(),
+                fault=True,
+            )
+            notify_call_status("failed", phone_number, ctx.room.name, error=str(e))
             call_failed = True
             ctx.shutdown()    
 
+        if call_failed:
+            # shutdown() doesn't cancel the entrypoint; stop before the session and the paid greeting
+            return
+
     # Use prewarmed VAD model from userdata
     logger.info(f"✅ Using prewarmed VAD model (saved {ctx.proc.userdata.get('prewarm_time', 0):.3f}s)")
 
-    t0_gateway = get_t0_gateway(ctx)
-    if t0_gateway is not None:
-        try:
-            t0_response = await t0_gateway.inference(
-                function_name="analyze_transcript",
-                input={
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": "tell me a dad joke",
-                        }
-                    ],
-                },
-            )
-            logger.info(f"🔍 TensorZero response: {t0_response}")
-        except Exception as e:
-            logger.warning(f"⚠️ TensorZero inference failed: {e}")
-    else:
-        logger.warning("⚠️ TensorZero gateway is not available; skipping test inference")
-
     session = AgentSession(
         vad=ctx.proc.userdata["vad"],
-        stt=ctx.proc.userdata["stt"],
-        llm=ctx.proc.userdata["llm"],
-        tts=ctx.proc.userdata["tts"],
-        turn_detection=MultilingualModel(),  # This is lightweight, fine to init here
-        preemptive_generation=True,
-        use_tts_aligned_transcript=True,
-        max_endpointing_delay=3,
-        min_endpointing_delay=0.2,
+        stt=pipeline["stt"],
+        llm=pipeline["llm"],
+        tts=pipeline["tts"],
+        # The turn detector binds to this job's inference executor, so it's built per call
+        # (its plugin and model are already loaded); offline harnesses inject their own
+        turn_detection=ctx.proc.userdata.get("turn_detection") or providers.build_turn_detector(),
+        **SESSION_OPTIONS,
     )
+    if trace is not None:
+        trace.attach(session)
+
+    # Transcript analysis runs after the call, off the critical path. The gateway
+    # belongs to the process, so it is not closed per job.
+    transcript = TranscriptCollector(room_name=ctx.room.name, phone_number=phone_number)
+    transcript.attach(session)
+    if call_store is not None:
+        call_store.attach(ctx.room.name, session)
 
-    # Register TensorZero shutdown callback if available
     t0_gateway = get_t0_gateway(ctx)
     if t0_gateway is not None:
-        async def t0_shutdown():
-            try:
-                await t0_gateway.close()
-            except Exception as e:
-                logger.warning(f"⚠️ TensorZero gateway close error: {e}")
+        analyzer = get_analyzer(t0_gateway)
+
+        async def run_analysis():
+            # The process exits after the shutdown callbacks, so the analysis has to finish in here
+            if analyzer.submit(transcript):
+                await analyzer.drain(timeout=settings.ANALYSIS_SHUTDOWN_TIMEOUT)
 
-        ctx.add_shutdown_callback(t0_shutdown)
+        ctx.add_shutdown_callback(run_analysis)
+    else:
+        logger.warning("⚠️ TensorZero gateway is not available; skipping post-call analysis")
+
+    latency_tracker = LatencyTracker(room_name=ctx.room.name, on_record=metrics_ring.record_turn)
+    prompt_cache = PromptCacheTracker(room_name=ctx.room.name)
+
+    async def log_latency_summary():
+        latency_tracker.log_call_summary()
+        prompt_cache.log_summary()
+
+    ctx.add_shutdown_callback(log_latency_summary)
 
     @session.on("metrics_collected")
     def on_metrics_collected(ev: MetricsCollectedEvent):
-        metrics.log_metrics(ev.metrics, logger=logger)
+        # Per-event lines are for debugging; host numbers come from the metrics ring
+        if logger.isEnabledFor(logging.DEBUG):
+            metrics.log_metrics(ev.metrics, logger=logger)
+        latency_tracker.collect_metrics(ev)
+        m = ev.metrics
+        if isinstance(m, metrics.LLMMetrics):
+            prompt_cache.collect(m)
+            metrics_ring.record_usage(
+                prompt_tokens=m.prompt_tokens,
+                completion_tokens=m.completion_tokens,
+                cached_tokens=m.prompt_cached_tokens,
+            )
+        elif isinstance(m, metrics.TTSMetrics):
+            metrics_ring.record_usage(tts_characters=m.characters_count)
+        elif isinstance(m, metrics.STTMetrics):
+            metrics_ring.record_usage(stt_audio_seconds=m.audio_duration)
+
+    assistant = Assistant(main_prompt=prompt, call_context=call_context, trace=trace)
+
+    # Outbound: prepare the greeting while the session starts and the callee gets a chance to speak
+    greeting = None
+    if phone_number is not None:
+        greeting = SpeculativeGreeting(
+            llm=pipeline["llm"],
+            tts=pipeline["tts"],
+            instructions=assistant.instructions,
+        )
+        greeting.start()
 
     # Start session immediately, warmup runs in background
     await session.start(
         room=ctx.room,
-        agent=Assistant(main_prompt=prompt),
+        agent=assistant,
         room_input_options=RoomInputOptions(
             pre_connect_audio=True,
             pre_connect_audio_timeout=10.0
@@ -224,8 +512,9 @@ async def entrypoint(ctx: agents.JobContext):
         )
     else:
         # Auto-greeting logic for outbound calls
-        timeout_seconds = 5.0
+        timeout_seconds = greeting_timeout.current()
         user_spoke_event = asyncio.Event()
+        listen_started = time.monotonic()
 
         def on_user_state_changed(event):
             if event.new_state == "speaking":
@@ -236,21 +525,45 @@ async def entrypoint(ctx: agents.JobContext):
         try:
             await asyncio.wait_for(user_spoke_event.wait(), timeout=timeout_seconds)
             logger.info("👤 User spoke first, agent will respond naturally")
+            greeting_timeout.record(time.monotonic() - listen_started, waited=timeout_seconds)
+            greeting.cancel()
         except asyncio.TimeoutError:
-            logger.info("🤖 User silence detected, agent will greet first")
-            await session.generate_reply(
-                instructions=f"greet the caller politely by saying hello, remember, you're an outbound caller. you are the one that called them. greet them and wait for them to respond, this is your full script, if name is in the script, use it, otherwise, just say hello"
-            )
+            logger.info(f"🤖 User silence detected after {timeout_seconds:.1f}s, agent will greet first")
+            greeting_timeout.record(None, waited=timeout_seconds)
+            await greeting.play(session)
         finally:
             session.off("user_state_changed", on_user_state_changed)
 
 
 if __name__ == "__main__":
+    if "--import-profile" in sys.argv:
+        from import_profile import print_import_profile
+
+        print_import_profile()
+        sys.exit(0)
+
+    # Registers the default profile's plugins (and the turn detector's inference runner) in the worker
+    providers.import_plugins(pipelines.get_profile().specs())
+
+    if sys.argv[1:2] in (["start"], ["dev"]) and settings.METRICS_RING_ENABLED:
+        # Host-wide per-minute summaries of what the job processes record; /metrics gets the first port
+        aggregator = metrics_ring.start_aggregator()
+        register_metrics_source(aggregator.render_prometheus)
+        start_metrics_server()
+
+    load_options = {}
+    if settings.WORKER_LOAD_ENABLED:
+        load_options = {"load_fnc": worker_load.get_load, "load_threshold": settings.WORKER_LOAD_THRESHOLD}
+    if settings.JOB_PROFILE or settings.WORKER_RECYCLE_GROWTH_MB:
+        # The same load, reported full while the worker recycles; process baselines are sampled as jobs finish
+        load_options["load_fnc"] = job_profiler.get_load
+        register_metrics_source(job_profiler.get_recycler().render_prometheus)
     agents.cli.run_app(
         agents.WorkerOptions(
             entrypoint_fnc=entrypoint,
             prewarm_fnc=prewarm, 
             # agent_name is required for explicit dispatch
             agent_name=settings.LIVEKIT_AGENT,
+            **load_options,
         )
     )
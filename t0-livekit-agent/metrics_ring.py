@@ -0,0 +1,460 @@
+"""
+Host metrics for outbound AI agent.
+Job processes write fixed-size metric records (turn latencies, token and
+character usage, call outcomes with their SIP status) into a ring buffer in
+shared memory instead of logging each event. One aggregator, in the worker or
+standalone, reads every ring on the host and folds the records into rolling
+per-minute summaries that it logs once a minute and serves on /metrics.
+
+    python metrics_ring.py              # follow the host's rings, log each minute
+    python metrics_ring.py --once 5     # print the last five minutes and exit
+"""
+
+import fcntl
+import glob
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from core import settings
+from latency_tracker import QUANTILES, STAGES, LatencyHistogram, render_prometheus as render_latency
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Record kinds and their labels; a record stores both as indices into these
+CALL_STATUSES = ("answered", "completed", "failed", "rejected", "suppressed", "other")
+USAGE = ("prompt_tokens", "completion_tokens", "cached_tokens", "tts_characters", "stt_audio_seconds")
+KINDS: Dict[str, Tuple[str, ...]] = {
+    "turn": STAGES,
+    "usage": USAGE,
+    "call": CALL_STATUSES,
+}
+_KIND_IDS = {kind: i for i, kind in enumerate(KINDS)}
+_LABEL_IDS = {kind: {label: i for i, label in enumerate(labels)} for kind, labels in KINDS.items()}
+_KIND_NAMES = list(KINDS)
+
+# magic, record size, capacity, writer pid, head (records ever written)
+_HEADER = struct.Struct("<8sIIIxxxxQ")
+_HEADER_SIZE = 64
+_HEAD = struct.Struct("<Q")
+_HEAD_OFFSET = 24
+# wall time, kind, label, code (SIP status), value
+_RECORD = struct.Struct("<dHHId")
+_MAGIC = b"AGMRING1"
+_PREFIX = "agent-metrics-"
+# Aggregators hold a shared lock on this file while they run
+_AGGREGATOR_LOCK = "agent-metrics.lock"
+
+
+def ring_dir() -> str:
+    """Where the host's shared memory files live"""
+    if settings.METRICS_RING_DIR:
+        return settings.METRICS_RING_DIR
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class MetricsRing:
+    """
+    Single-writer ring of metric records in a shared memory file
+
+    Only the owning process writes: it fills the slot at `head % capacity` and
+    then publishes it by storing the new head, so readers never take a lock and
+    the writer never waits for them. A reader that falls a full ring behind
+    loses the oldest records and counts them as dropped.
+    """
+
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, _HEADER_SIZE + capacity * _RECORD.size)
+            self._mmap = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        self.head = 0
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, _RECORD.size, capacity, os.getpid(), 0)
+
+    def write(self, kind: int, label: int, value: float, code: int = 0):
+        head = self.head
+        _RECORD.pack_into(self._mmap, _HEADER_SIZE + (head % self.capacity) * _RECORD.size, time.time(), kind, label, code, value)
+        self.head = head + 1
+        _HEAD.pack_into(self._mmap, _HEAD_OFFSET, self.head)
+
+    def close(self):
+        """Unmap; the file is left for a running aggregator to read and remove"""
+        self._mmap.close()
+        if not _aggregator_running(os.path.dirname(self.path)):
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def _aggregator_running(directory: str) -> bool:
+    try:
+        fd = os.open(os.path.join(directory, _AGGREGATOR_LOCK), os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+_ring: Optional[MetricsRing] = None
+_ring_closed = False
+_ring_lock = threading.Lock()
+
+
+def _get_ring() -> Optional[MetricsRing]:
+    global _ring
+    if _ring is None and settings.METRICS_RING_ENABLED and not _ring_closed:
+        with _ring_lock:
+            if _ring is None:
+                path = os.path.join(ring_dir(), f"{_PREFIX}{os.getpid()}")
+                _ring = MetricsRing(path, settings.METRICS_RING_CAPACITY)
+    return _ring
+
+
+def record(kind: str, label: str, value: Optional[float], code: int = 0):
+    """Write one record for this process; unknown labels and missing values are ignored"""
+    ring = _get_ring()
+    label_id = _LABEL_IDS[kind].get(label)
+    if ring is None or label_id is None or value is None:
+        return
+    ring.write(_KIND_IDS[kind], label_id, value, code)
+
+
+def record_turn(stage: str, seconds: Optional[float]):
+    record("turn", stage, seconds)
+
+
+def record_usage(**amounts):
+    for name, amount in amounts.items():
+        if amount:
+            record("usage", name, amount)
+
+
+def record_call(status: str, duration: Optional[float] = None, sip_status_code=None):
+    """A call status change; `duration` for completed calls, NaN otherwise"""
+    try:
+        code = int(sip_status_code) if sip_status_code else 0
+    except (TypeError, ValueError):
+        code = 0
+    status = status if status in _LABEL_IDS["call"] else "other"
+    record("call", status, math.nan if duration is None else float(duration), code)
+
+
+def close_ring():
+    """Close this process' ring at the end of its job; later records are dropped"""
+    global _ring, _ring_closed
+    _ring_closed = True
+    if _ring is not None:
+        _ring.close()
+        _ring = None
+
+
+class MinuteSummary:
+    """Everything the host's job processes recorded in one wall-clock minute"""
+
+    def __init__(self, minute: int):
+        self.minute = minute
+        self.turns = {stage: LatencyHistogram() for stage in STAGES}
+        self.usage = dict.fromkeys(USAGE, 0.0)
+        self.calls = Counter()
+        self.sip_codes = Counter()
+        self.call_duration = LatencyHistogram(max_seconds=7200.0)
+
+    def add(self, kind: str, label: str, value: float, code: int):
+        if kind == "turn":
+            self.turns[label].record(value)
+        elif kind == "usage":
+            self.usage[label] += value
+        else:
+            self.calls[label] += 1
+            if code:
+                self.sip_codes[str(code)] += 1
+            if label == "completed" and not math.isnan(value):
+                self.call_duration.record(value)
+
+    def merge(self, other: "MinuteSummary"):
+        for stage, h in other.turns.items():
+            self.turns[stage].merge(h)
+        for name, amount in other.usage.items():
+            self.usage[name] += amount
+        self.calls.update(other.calls)
+        self.sip_codes.update(other.sip_codes)
+        self.call_duration.merge(other.call_duration)
+
+    def to_dict(self) -> dict:
+        return {
+            "minute": time.strftime("%Y-%m-%dT%H:%M", time.localtime(self.minute * 60)),
+            "turns": {stage: h.summary() for stage, h in self.turns.items() if h.count},
+            "usage": {name: round(amount, 3) for name, amount in self.usage.items() if amount},
+            "calls": dict(self.calls),
+            "sip_codes": dict(self.sip_codes),
+            "call_duration": self.call_duration.summary() if self.call_duration.count else {},
+        }
+
+    def describe(self) -> str:
+        e2e = self.turns["e2e"]
+        parts = [
+            f"📊 MINUTE {time.strftime('%H:%M', time.localtime(self.minute * 60))}",
+            f"Calls: {', '.join(f'{k}={v}' for k, v in sorted(self.calls.items())) or 0}",
+            f"Turns: {e2e.count}",
+        ]
+        if e2e.count:
+            parts.append(f"E2E p50/p95: {e2e.percentile(0.5):.3f}/{e2e.percentile(0.95):.3f}s")
+        if self.usage["prompt_tokens"] or self.usage["completion_tokens"]:
+            parts.append(
+                f"Tokens: {self.usage['prompt_tokens']:.0f} in ({self.usage['cached_tokens']:.0f} cached) / "
+                f"{self.usage['completion_tokens']:.0f} out"
+            )
+        if self.sip_codes:
+            parts.append(f"SIP: {', '.join(f'{k}x{v}' for k, v in self.sip_codes.most_common())}")
+        return " | ".join(parts)
+
+
+class _RingReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "r+b") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size, self.capacity, self.pid, head = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or record_size != _RECORD.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a metrics ring")
+        # Read what the ring still holds; the aggregator buckets records by their own timestamps
+        self.cursor = max(0, head - self.capacity)
+
+    def head(self) -> int:
+        return _HEAD.unpack_from(self._mmap, _HEAD_OFFSET)[0]
+
+    def read(self) -> Tuple[List[tuple], int]:
+        """New records since the last read, and how many were overwritten before they could be read"""
+        head = self.head()
+        if head < self.cursor:
+            # Torn read of the head or a ring recreated under the same name; start over
+            self.cursor = max(0, head - self.capacity)
+            return [], 0
+        dropped = max(0, head - self.cursor - self.capacity)
+        start = self.cursor + dropped
+        records = []
+        for index in range(start, head):
+            offset = _HEADER_SIZE + (index % self.capacity) * _RECORD.size
+            records.append(_RECORD.unpack_from(self._mmap, offset))
+        # Slots the writer lapped while they were being copied may hold newer records
+        overwritten = max(0, self.head() - self.capacity - start)
+        if overwritten:
+            records = records[overwritten:]
+            dropped += overwritten
+        self.cursor = head
+        return records, dropped
+
+    def close(self):
+        self._mmap.close()
+
+
+class MetricsAggregator:
+    """
+    Folds every metrics ring on the host into per-minute summaries
+
+    Readers keep their own cursors and never write to a ring, so a standalone
+    aggregator can run next to the worker's. A minute is closed and logged
+    `grace` seconds after it ends, once late records from slow readers are in.
+    """
+
+    def __init__(self, directory: Optional[str] = None, interval: float = 1.0, minutes: Optional[int] = None, grace: float = 5.0):
+        self.directory = directory or ring_dir()
+        self.interval = interval
+        self.retention = minutes or settings.METRICS_RING_MINUTES
+        self.grace = grace
+        self.minutes: Dict[int, MinuteSummary] = {}
+        self.totals = MinuteSummary(0)
+        self.records = 0
+        self.dropped = 0
+        self._readers: Dict[str, _RingReader] = {}
+        self._closed_minute = int(time.time() // 60) - 1
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _scan(self):
+        for path in glob.glob(os.path.join(self.directory, f"{_PREFIX}*")):
+            if path in self._readers:
+                continue
+            try:
+                self._readers[path] = _RingReader(path)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Skipping metrics ring {path}: {e}")
+
+    def poll(self):
+        """Read every ring once and fold the new records in"""
+        self._scan()
+        oldest = int(time.time() // 60) - self.retention
+        with self._lock:
+            for path, reader in list(self._readers.items()):
+                # Checked before reading, so a ring is only removed after its writer's last records are in
+                alive = _pid_alive(reader.pid)
+                try:
+                    records, dropped = reader.read()
+                except ValueError:
+                    records, dropped = [], 0
+                self.dropped += dropped
+                for t, kind, label, code, value in records:
+                    kind_name = _KIND_NAMES[kind]
+                    label_name = KINDS[kind_name][label]
+                    minute = int(t // 60)
+                    if minute >= oldest:
+                        summary = self.minutes.get(minute)
+                        if summary is None:
+                            summary = self.minutes[minute] = MinuteSummary(minute)
+                        summary.add(kind_name, label_name, value, code)
+                    self.totals.add(kind_name, label_name, value, code)
+                self.records += len(records)
+                # A ring whose process exited is removed once it has been read
+                if not alive:
+                    reader.close()
+                    del self._readers[path]
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+            for minute in [m for m in self.minutes if m < oldest]:
+                del self.minutes[minute]
+        self._close_minutes()
+
+    def _close_minutes(self):
+        closable = int((time.time() - self.grace) // 60) - 1
+        while self._closed_minute < closable:
+            self._closed_minute += 1
+            summary = self.minutes.get(self._closed_minute)
+            if summary is not None:
+                logger.info(summary.describe())
+
+    def window(self, minutes: int = 5) -> MinuteSummary:
+        """The last `minutes` complete and current minutes merged into one summary"""
+        now = int(time.time() // 60)
+        merged = MinuteSummary(now - minutes + 1)
+        with self._lock:
+            for minute, summary in self.minutes.items():
+                if minute > now - minutes:
+                    merged.merge(summary)
+        return merged
+
+    def start(self):
+        if self._thread is None:
+            # Tells exiting job processes to leave their rings for this aggregator
+            self._lock_fd = os.open(os.path.join(self.directory, _AGGREGATOR_LOCK), os.O_RDONLY | os.O_CREAT, 0o644)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_SH)
+            self._thread = threading.Thread(target=self._run, daemon=True, name="metrics_aggregator")
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"⚠️ Metrics aggregation failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+            os.close(self._lock_fd)
+
+    def render_prometheus(self) -> str:
+        """
+        Host-wide counters and turn latency since the aggregator started, and 5-minute latency quantiles
+
+        `agent_turn_latency_seconds` is what each job process used to export
+        for itself, merged over every call the host served.
+        """
+        window = self.window(5)
+        with self._lock:
+            latency = render_latency(self.totals.turns)
+        lines = [
+            "# HELP agent_host_calls_total Call status changes across the host's job processes",
+            "# TYPE agent_host_calls_total counter",
+        ]
+        for status, count in sorted(self.totals.calls.items()):
+            lines.append(f'agent_host_calls_total{{status="{status}"}} {count}')
+        lines += ["# HELP agent_host_sip_status_total SIP status codes of failed calls", "# TYPE agent_host_sip_status_total counter"]
+        for code, count in sorted(self.totals.sip_codes.items()):
+            lines.append(f'agent_host_sip_status_total{{code="{code}"}} {count}')
+        lines += ["# HELP agent_host_usage_total Tokens, TTS characters and STT audio seconds", "# TYPE agent_host_usage_total counter"]
+        for name, amount in self.totals.usage.items():
+            lines.append(f'agent_host_usage_total{{kind="{name}"}} {amount:.3f}')
+        lines += [
+            "# HELP agent_host_turn_latency_seconds Turn latency over the last 5 minutes, all job processes",
+            "# TYPE agent_host_turn_latency_seconds summary",
+        ]
+        for stage, h in window.turns.items():
+            for q in QUANTILES:
+                lines.append(f'agent_host_turn_latency_seconds{{stage="{stage}",quantile="{q}"}} {h.percentile(q):.6f}')
+            lines.append(f'agent_host_turn_latency_seconds_count{{stage="{stage}"}} {h.count}')
+        lines += [
+            "# HELP agent_host_metric_records_dropped_total Records overwritten before the aggregator read them",
+            "# TYPE agent_host_metric_records_dropped_total counter",
+            f"agent_host_metric_records_dropped_total {self.dropped}",
+        ]
+        return latency + "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_aggregator: Optional[MetricsAggregator] = None
+
+
+def start_aggregator() -> MetricsAggregator:
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = MetricsAggregator().start()
+    return _aggregator
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from logger import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=None, help="Ring directory (default: METRICS_RING_DIR or /dev/shm)")
+    parser.add_argument("--once", type=int, metavar="MINUTES", help="Print the last MINUTES minutes as JSON and exit")
+    args = parser.parse_args()
+
+    aggregator = MetricsAggregator(directory=args.dir)
+    if args.once:
+        aggregator.poll()
+        now = int(time.time() // 60)
+        print(json.dumps([aggregator.minutes[m].to_dict() for m in sorted(aggregator.minutes) if m > now - args.once], indent=2))
+    else:
+        aggregator.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            aggregator.stop()
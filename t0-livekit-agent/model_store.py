@@ -0,0 +1,198 @@
+"""
+Shared model weights for outbound AI agent.
+Re-exports ONNX models once per host with their weights in a separate,
+read-only data file that ONNX Runtime memory-maps instead of copying, so every
+prewarmed job process shares one copy of the weights through the page cache.
+Also reports how much of a process' memory is unique to it vs shared.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Optional
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Initializers smaller than this stay inline in the graph file
+_EXTERNAL_MIN_BYTES = 1024
+
+
+def _source_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def export_mapped_model(source: str, name: str, cache_dir: Optional[str] = None) -> Path:
+    """
+    Write `source` as `<name>.onnx` + `<name>.onnx.data` under the model cache
+
+    The export is keyed on the source's content hash and published with an
+    atomic directory rename under a file lock, so job processes on a host
+    agree on one copy and never load a half-written one.
+
+    Returns:
+        Path to the graph file to load
+    """
+    import onnxruntime
+
+    source = Path(source)
+    target = Path(cache_dir or settings.MODEL_CACHE_DIR) / f"{name}-{_source_digest(source)}"
+    model_path = target / f"{name}.onnx"
+    if model_path.exists():
+        return model_path
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Job processes prewarm at the same time on a cold host; one exports, the rest wait
+    # and map its result instead of each paying for an export session
+    with open(target.parent / f"{name}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if model_path.exists():
+            return model_path
+
+        staging = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+
+        # Only basic (graph-preserving) optimizations; the exported file must load with any options
+        opts = onnxruntime.SessionOptions()
+        opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC
+        opts.optimized_model_filepath = str(staging / model_path.name)
+        opts.add_session_config_entry("session.optimized_model_external_initializers_file_name", f"{name}.onnx.data")
+        opts.add_session_config_entry("session.optimized_model_external_initializers_min_size_in_bytes", str(_EXTERNAL_MIN_BYTES))
+        onnxruntime.InferenceSession(str(source), sess_options=opts, providers=["CPUExecutionProvider"])
+
+        for path in staging.iterdir():
+            path.chmod(0o444)
+        staging.rename(target)
+        logger.info(f"🗺️ Exported memory-mapped model | {name} | {target}")
+    return model_path
+
+
+def mapped_session(source: str, name: str, threads: int = 1):
+    """
+    ONNX Runtime session whose weights are memory-mapped from the model cache
+
+    Weight prepacking is disabled: it copies weights into per-process buffers,
+    which would undo the sharing. Falls back to a regular session if the cache
+    is disabled or the export fails.
+    """
+    import onnxruntime
+
+    opts = onnxruntime.SessionOptions()
+    opts.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    opts.add_session_config_entry("session.inter_op.allow_spinning", "0")
+    opts.inter_op_num_threads = 1
+    opts.intra_op_num_threads = threads
+    opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+
+    path = source
+    if settings.MODEL_CACHE_DIR:
+        try:
+            path = str(export_mapped_model(source, name))
+            opts.add_session_config_entry("session.disable_prepacking", "1")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not export {name} for memory mapping, loading it privately: {e}")
+    return onnxruntime.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def silero_model_path() -> str:
+    import importlib.resources
+
+    from livekit.plugins.silero import onnx_model
+
+    resource = importlib.resources.files("livekit.plugins.silero.resources") / "silero_vad.onnx"
+    return str(onnx_model._resource_files.enter_context(importlib.resources.as_file(resource)))
+
+
+def silero_options(**options):
+    from livekit.plugins.silero import vad
+
+    return vad._VADOptions(
+        min_speech_duration=options.get("min_speech_duration", 0.05),
+        min_silence_duration=options.get("min_silence_duration", 0.4),
+        prefix_padding_duration=options.get("prefix_padding_duration", 0.5),
+        max_buffered_speech=options.get("max_buffered_speech", 60.0),
+        activation_threshold=options.get("activation_threshold", 0.5),
+        sample_rate=options.get("sample_rate", 16000),
+    )
+
+
+def load_mapped_vad(**options):
+    """Silero VAD backed by the host-shared, memory-mapped weights; takes `silero.VAD.load` options"""
+    from livekit.plugins import silero
+
+    return silero.VAD(session=mapped_session(silero_model_path(), "silero_vad"), opts=silero_options(**options))
+
+
+def process_memory(pid: str = "self") -> Dict[str, int]:
+    """
+    Memory of one process in bytes, from /proc/<pid>/smaps_rollup
+
+    `unique` (USS) is what exiting the process would free; `shared` is resident
+    pages also mapped by other processes; `proportional` (PSS) splits shared
+    pages evenly between the processes mapping them, so it sums correctly.
+    """
+    fields: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0),
+        "proportional": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "swap": fields.get("Swap", 0),
+    }
+
+
+def mapped_model_memory(pid: str = "self") -> Dict[str, int]:
+    """Resident bytes of model cache files mapped by a process, by file"""
+    root = str(Path(settings.MODEL_CACHE_DIR).resolve()) if settings.MODEL_CACHE_DIR else None
+    if root is None:
+        return {}
+    resident: Dict[str, int] = {}
+    current = None
+    try:
+        with open(f"/proc/{pid}/smaps") as f:
+            for line in f:
+                parts = line.split()
+                if "-" in parts[0] and len(parts) >= 5 and ":" in parts[3]:
+                    current = parts[5] if len(parts) > 5 and parts[5].startswith(root) else None
+                elif current is not None and parts[0] == "Rss:":
+                    resident[current] = resident.get(current, 0) + int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return resident
+
+
+def log_memory_report(label: str = "process"):
+    memory = process_memory()
+    if not memory:
+        return
+    mb = {k: v / 1024 / 1024 for k, v in memory.items()}
+    mapped = sum(mapped_model_memory().values()) / 1024 / 1024
+    logger.info(
+        f"🧠 MEMORY | {label} | RSS: {mb['rss']:.1f}MB | Unique: {mb['unique']:.1f}MB | "
+        f"Shared: {mb['shared']:.1f}MB | PSS: {mb['proportional']:.1f}MB | Mapped weights: {mapped:.1f}MB"
+    )
+
+
+def render_prometheus() -> str:
+    memory = process_memory()
+    lines = ["# TYPE agent_process_memory_bytes gauge"]
+    for kind in ("rss", "unique", "shared", "proportional"):
+        lines.append(f'agent_process_memory_bytes{{kind="{kind}"}} {memory.get(kind, 0)}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,173 @@
+"""
+Pipeline profiles for outbound AI agent.
+Named STT/LLM/TTS combinations from config/pipelines.toml, selected per
+campaign with the `pipeline` key in the job metadata. A profile can list
+several equivalent LLM or TTS candidates; those are wrapped in a router that
+prefers the fastest healthy one and fails over between them.
+"""
+
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import providers
+from core import settings
+from logger import get_logger
+from providers import ProviderSpec
+
+logger = get_logger(__name__)
+
+DEFAULT_PROFILE = "default"
+
+
+@dataclass
+class PipelineProfile:
+    name: str
+    stt: ProviderSpec
+    llm: List[ProviderSpec]
+    tts: List[ProviderSpec]
+
+    def specs(self) -> List[ProviderSpec]:
+        return [self.stt, *self.llm, *self.tts]
+
+    def describe(self) -> str:
+        return (
+            f"STT: {self.stt.label} | LLM: {', '.join(s.label for s in self.llm)} | "
+            f"TTS: {', '.join(s.label for s in self.tts)}"
+        )
+
+
+def _spec(value: dict) -> ProviderSpec:
+    options = dict(value)
+    return ProviderSpec(provider=options.pop("provider"), options=options)
+
+
+def _specs(value) -> List[ProviderSpec]:
+    return [_spec(v) for v in (value if isinstance(value, list) else [value])]
+
+
+def settings_profile() -> PipelineProfile:
+    """The profile described by the STT_/LLM_/TTS_ settings"""
+    return PipelineProfile(
+        name=DEFAULT_PROFILE,
+        stt=providers.settings_spec("stt"),
+        llm=[providers.settings_spec("llm")],
+        tts=[providers.settings_spec("tts")],
+    )
+
+
+def load_profiles(path: Optional[str] = None) -> Dict[str, PipelineProfile]:
+    """
+    Read the profiles file; stages a profile leaves out come from `default`
+
+    `default` is the settings-based profile unless the file defines its own.
+    Every provider is checked against the known builders here, so a typo fails
+    at startup rather than on the first call of a campaign.
+    """
+    path = Path(path or settings.PIPELINES_PATH)
+    raw: Dict[str, dict] = {}
+    if path.exists():
+        with open(path, "rb") as f:
+            raw = tomllib.load(f).get("profiles", {})
+
+    base = settings_profile()
+    if DEFAULT_PROFILE in raw:
+        base = _profile(DEFAULT_PROFILE, raw[DEFAULT_PROFILE], base)
+    profiles = {DEFAULT_PROFILE: base}
+    for name, value in raw.items():
+        if name != DEFAULT_PROFILE:
+            profiles[name] = _profile(name, value, base)
+    return profiles
+
+
+def _profile(name: str, value: dict, base: PipelineProfile) -> PipelineProfile:
+    profile = PipelineProfile(
+        name=name,
+        stt=_spec(value["stt"]) if "stt" in value else base.stt,
+        llm=_specs(value["llm"]) if "llm" in value else base.llm,
+        tts=_specs(value["tts"]) if "tts" in value else base.tts,
+    )
+    providers.check_spec("stt", profile.stt)
+    for spec in profile.llm:
+        providers.check_spec("llm", spec)
+    for spec in profile.tts:
+        providers.check_spec("tts", spec)
+    return profile
+
+
+_profiles: Optional[Dict[str, PipelineProfile]] = None
+
+
+def get_profile(name: Optional[str] = None) -> PipelineProfile:
+    global _profiles
+    if _profiles is None:
+        _profiles = load_profiles()
+    name = name or settings.PIPELINE_PROFILE
+    if name not in _profiles:
+        raise ValueError(f"Unknown pipeline profile {name!r}; expected one of {', '.join(sorted(_profiles))}")
+    return _profiles[name]
+
+
+def all_profiles() -> Dict[str, PipelineProfile]:
+    """Every profile by name, `default` included"""
+    get_profile(DEFAULT_PROFILE)
+    return dict(_profiles)
+
+
+def build_llm(profile: PipelineProfile):
+    candidates = [providers.build("llm", spec) for spec in profile.llm]
+    if len(candidates) == 1:
+        return candidates[0]
+
+    from provider_router import RoutedLLM
+
+    return RoutedLLM(candidates, [spec.label for spec in profile.llm])
+
+
+def build_tts(profile: PipelineProfile):
+    candidates = [providers.build("tts", spec) for spec in profile.tts]
+    if len(candidates) == 1:
+        return candidates[0]
+
+    from provider_router import RoutedTTS
+
+    voices = [{k: v for k, v in spec.options.items() if k != "model"} for spec in profile.tts]
+    return RoutedTTS(candidates, [spec.label for spec in profile.tts], voices)
+
+
+def loaders(profile: PipelineProfile, wrap_tts: Optional[Callable] = None) -> Dict[str, Callable]:
+    """
+    Zero-argument builders for the profile's components, for `load_concurrently`
+
+    `wrap_tts(tts, spec)` can wrap the built TTS, e.g. in the audio cache; `spec`
+    is the profile's preferred TTS candidate.
+    """
+    def tts():
+        built = build_tts(profile)
+        return wrap_tts(built, profile.tts[0]) if wrap_tts else built
+
+    return {
+        "stt": lambda: providers.build("stt", profile.stt),
+        "llm": lambda: build_llm(profile),
+        "tts": tts,
+    }
+
+
+def begin_call(tts):
+    """Let a routed TTS (possibly behind the cache) pick its candidate for this call"""
+    while tts is not None:
+        if hasattr(tts, "begin_call"):
+            tts.begin_call()
+            return
+        tts = getattr(tts, "wrapped", None)
+
+
+def log_router_stats(*components):
+    for component in components:
+        while component is not None:
+            router = getattr(component, "router", None)
+            if router is not None:
+                router.log_stats()
+                break
+            component = getattr(component, "wrapped", None)
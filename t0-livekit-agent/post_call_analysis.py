@@ -0,0 +1,257 @@
+"""
+Post-call transcript analysis for outbound AI agent.
+Collects each call's transcript and runs TensorZero `analyze_transcript` after
+the call, in batches with bounded concurrency, so it never delays a call. The
+job process exits once its shutdown callbacks return, so the job's shutdown
+waits for its analysis (up to ANALYSIS_SHUTDOWN_TIMEOUT) after the callee has
+hung up.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class TranscriptCollector:
+    """Accumulate a call's conversation turns from AgentSession events"""
+    room_name: str
+    phone_number: Optional[str] = None
+    turns: List[dict] = field(default_factory=list)
+
+    def attach(self, session):
+        @session.on("conversation_item_added")
+        def on_conversation_item_added(ev):
+            text = getattr(ev.item, "text_content", None)
+            if text:
+                self.turns.append({"role": ev.item.role, "text": text})
+
+    def render(self) -> str:
+        return "\n".join(f"{turn['role']}: {turn['text']}" for turn in self.turns)
+
+
+def transcript_hash(transcript: str) -> str:
+    """Cache key for a transcript; whitespace differences don't change it"""
+    normalized = " ".join(transcript.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class AnalysisJob:
+    room_name: str
+    transcript: str
+    key: str
+    phone_number: Optional[str] = None
+
+
+class AnalysisCache:
+    """
+    In-memory LRU of analysis results, optionally backed by one JSON file per transcript hash
+
+    A job process analyzes one call and exits, so repeats are only found on
+    disk; files are written then renamed, so other processes never read half of one.
+    """
+
+    def __init__(self, max_entries: int = 1000, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        if self.cache_dir:
+            try:
+                with open(self._path(key), "r") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(key, value)
+            return value
+        return None
+
+    def _remember(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, value: Any):
+        self._remember(key, value)
+        if self.cache_dir:
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"⚠️ Analysis cache write failed: {e}")
+
+
+def _response_text(response) -> str:
+    """Pull the text out of a TensorZero chat inference response"""
+    content = getattr(response, "content", None)
+    if not content:
+        return str(response)
+    return "".join(getattr(block, "text", "") or "" for block in content)
+
+
+class PostCallAnalyzer:
+    """
+    Background worker that analyzes finished calls.
+
+    `submit` only enqueues; `drain` waits for what is queued and is what keeps
+    the process alive until the analysis is done. The worker pulls up to
+    `batch_size` jobs (waiting at most `batch_wait` seconds to fill a batch,
+    unless draining) and runs them with at most `concurrency` inferences in flight.
+    """
+
+    def __init__(
+        self,
+        gateway,
+        batch_size: Optional[int] = None,
+        batch_wait: float = 2.0,
+        concurrency: Optional[int] = None,
+        max_queue: int = 1000,
+        cache: Optional[AnalysisCache] = None,
+        on_result: Optional[Callable[[AnalysisJob, str], None]] = None,
+    ):
+        self.gateway = gateway
+        self.batch_size = batch_size or settings.ANALYSIS_BATCH_SIZE
+        self.batch_wait = batch_wait
+        self.concurrency = asyncio.Semaphore(concurrency or settings.ANALYSIS_CONCURRENCY)
+        self.cache = cache or AnalysisCache(cache_dir=settings.ANALYSIS_CACHE_DIR or None)
+        self.on_result = on_result
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._worker: Optional[asyncio.Task] = None
+        self._draining = False
+        self.analyzed = 0
+        self.cache_hits = 0
+        self.failed = 0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="post-call-analysis")
+
+    def submit(self, collector: TranscriptCollector) -> bool:
+        """Queue a finished call for analysis; never blocks"""
+        transcript = collector.render()
+        if not transcript:
+            return False
+
+        self.start()
+        job = AnalysisJob(
+            room_name=collector.room_name,
+            transcript=transcript,
+            key=transcript_hash(transcript),
+            phone_number=collector.phone_number,
+        )
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"⚠️ Analysis queue full, dropping transcript | Room: {collector.room_name}")
+            return False
+
+    async def _next_batch(self) -> List[AnalysisJob]:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            # Nothing more is coming once the process is shutting down
+            if self._draining and self.queue.empty():
+                break
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            await asyncio.gather(*(self._analyze(job) for job in batch))
+            for _ in batch:
+                self.queue.task_done()
+
+    async def _analyze(self, job: AnalysisJob):
+        # The cache is on disk; keep its reads and writes off the loop
+        cached = await asyncio.to_thread(self.cache.get, job.key)
+        if cached is not None:
+            self.cache_hits += 1
+            self._deliver(job, cached)
+            return
+
+        async with self.concurrency:
+            try:
+                response = await self.gateway.inference(
+                    function_name="analyze_transcript",
+                    input={"messages": [{"role": "user", "content": job.transcript}]},
+                )
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"⚠️ TensorZero analysis failed | Room: {job.room_name} | Error: {e}")
+                return
+
+        result = _response_text(response)
+        await asyncio.to_thread(self.cache.put, job.key, result)
+        self.analyzed += 1
+        self._deliver(job, result)
+
+    def _deliver(self, job: AnalysisJob, result: str):
+        logger.info(f"🔍 Call analysis | Room: {job.room_name} | {result}")
+        if self.on_result:
+            try:
+                self.on_result(job, result)
+            except Exception as e:
+                logger.warning(f"⚠️ Analysis result handler failed: {e}")
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait for queued analyses to finish before the process exits; False if some didn't in time"""
+        self._draining = True
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Post-call analysis unfinished after {timeout:g}s | Still queued: {self.queue.qsize()}")
+            return False
+        finally:
+            self._draining = False
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "analyzed": self.analyzed,
+            "cache_hits": self.cache_hits,
+            "failed": self.failed,
+        }
+
+
+_analyzer: Optional[PostCallAnalyzer] = None
+
+
+def get_analyzer(gateway) -> PostCallAnalyzer:
+    """Process-wide analyzer, shared by every call the process serves"""
+    global _analyzer
+    if _analyzer is None or _analyzer.gateway is not gateway:
+        _analyzer = PostCallAnalyzer(gateway)
+    return _analyzer
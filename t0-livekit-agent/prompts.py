@@ -0,0 +1,144 @@
+"""
+Prompt assembly for outbound AI agent.
+Loads the base prompt once per process, memoizes assembled instructions per
+campaign prompt, and keeps a byte-identical prefix across a campaign's calls so
+provider-side prompt caching can hit.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from core import BASE_DIR
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+BASE_PROMPT_PATH = os.path.join(BASE_DIR, "general_prompt.md")
+CAMPAIGN_SEPARATOR = "\n\nMain instructions:\n"
+CALL_CONTEXT_SEPARATOR = "\n\nCall details:\n"
+
+# OpenAI only caches prompts of at least this many tokens
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+except ImportError:
+    def count_tokens(text: str) -> int:
+        # ~4 characters per token for English when tiktoken isn't installed
+        return (len(text) + 3) // 4
+
+
+def _normalize(text: str) -> str:
+    """Make equivalent prompts byte-identical: LF line endings, no trailing whitespace"""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+_base_prompt: Optional[Tuple[int, str]] = None
+
+
+def load_base_prompt(path: str = BASE_PROMPT_PATH) -> str:
+    """Read the base prompt, only touching the file again when its mtime changes"""
+    global _base_prompt
+    mtime = os.stat(path).st_mtime_ns
+    if _base_prompt is None or _base_prompt[0] != mtime:
+        with open(path, "r") as f:
+            _base_prompt = (mtime, _normalize(f.read()))
+        logger.info(f"📝 Base prompt loaded | Tokens: {count_tokens(_base_prompt[1])}")
+    return _base_prompt[1]
+
+
+@dataclass(frozen=True)
+class AssembledPrompt:
+    """Instructions for one campaign plus token counts of the shared prefix"""
+    text: str
+    campaign_hash: str
+    prefix_tokens: int
+    total_tokens: int
+
+
+_assembled: "OrderedDict[Tuple[str, str], AssembledPrompt]" = OrderedDict()
+_MAX_ASSEMBLED = 256
+
+
+def _assemble_campaign(main_prompt: Optional[str]) -> AssembledPrompt:
+    base = load_base_prompt()
+    campaign = _normalize(main_prompt) if main_prompt else ""
+    campaign_hash = hashlib.sha256(campaign.encode("utf-8")).hexdigest()[:16]
+    key = (base, campaign_hash)
+
+    cached = _assembled.get(key)
+    if cached is not None:
+        _assembled.move_to_end(key)
+        return cached
+
+    text = f"{base}{CAMPAIGN_SEPARATOR}{campaign}" if campaign else base
+    tokens = count_tokens(text)
+    assembled = AssembledPrompt(text=text, campaign_hash=campaign_hash, prefix_tokens=tokens, total_tokens=tokens)
+    _assembled[key] = assembled
+    if len(_assembled) > _MAX_ASSEMBLED:
+        _assembled.popitem(last=False)
+
+    logger.info(f"📝 Campaign prompt assembled | Campaign: {campaign_hash} | Prefix tokens: {tokens}")
+    if tokens < PROVIDER_CACHE_MIN_TOKENS:
+        logger.info(
+            f"📝 Shared prefix is below {PROVIDER_CACHE_MIN_TOKENS} tokens; "
+            "the provider will not cache it"
+        )
+    return assembled
+
+
+def build_instructions(main_prompt: Optional[str] = None, call_context: Optional[str] = None) -> AssembledPrompt:
+    """
+    Assemble agent instructions as base prompt, then campaign prompt, then call details
+
+    Everything up to and including the campaign prompt is identical for every
+    call of a campaign, so per-call data (names, account details) belongs in
+    `call_context`, which is appended last and never breaks the shared prefix.
+    """
+    assembled = _assemble_campaign(main_prompt)
+    if not call_context:
+        return assembled
+
+    suffix = f"{CALL_CONTEXT_SEPARATOR}{_normalize(call_context)}"
+    return AssembledPrompt(
+        text=assembled.text + suffix,
+        campaign_hash=assembled.campaign_hash,
+        prefix_tokens=assembled.prefix_tokens,
+        total_tokens=assembled.prefix_tokens + count_tokens(suffix),
+    )
+
+
+class PromptCacheTracker:
+    """Per-call provider prompt cache hit rate, from LLM metrics' cached token counts"""
+
+    def __init__(self, room_name: str):
+        self.room_name = room_name
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.requests = 0
+
+    def collect(self, llm_metrics):
+        self.requests += 1
+        self.prompt_tokens += getattr(llm_metrics, "prompt_tokens", 0) or 0
+        self.cached_tokens += getattr(llm_metrics, "prompt_cached_tokens", 0) or 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def log_summary(self):
+        if not self.requests:
+            return
+        logger.info(
+            f"🗄️ PROMPT CACHE | Room: {self.room_name} | Requests: {self.requests} | "
+            f"Prompt tokens: {self.prompt_tokens} | Cached: {self.cached_tokens} | Hit rate: {self.hit_rate:.0%}"
+        )
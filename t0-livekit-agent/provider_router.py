@@ -0,0 +1,542 @@
+"""
+Provider routing for outbound AI agent.
+Picks among equivalent LLM or TTS providers by their time to first token/byte
+and error rate over a moving window, and fails over to the next candidate when
+a request fails before producing output.
+"""
+
+import dataclasses
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import random
+import statistics
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from livekit import rtc
+from livekit.agents import APIConnectionError, APIConnectOptions, llm, tts, utils
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, NotGivenOr
+
+from core import settings
+from latency_tracker import LatencyHistogram, register_metrics_source
+from logger import get_logger
+from metrics_ring import ring_dir
+
+logger = get_logger(__name__)
+
+Sample = Tuple[float, Optional[float]]
+
+# magic, capacity, candidates, head (samples ever written)
+_HEADER = struct.Struct("<8sIIQ")
+_HEAD = struct.Struct("<Q")
+_HEAD_OFFSET = 16
+# Per candidate: ejected at, ejected until, ejections
+_SLOT = struct.Struct("<ddI4x")
+# wall time, candidate, TTFB (NaN for a failed request)
+_SAMPLE = struct.Struct("<dH6xd")
+_MAGIC = b"AGROUTE1"
+_PREFIX = "agent-router-"
+
+
+class ProviderWindows:
+    """
+    TTFB samples and ejections of a router's candidates, shared by the host
+
+    Job processes serve one call each, so a window kept in the process would
+    start empty on every call. Samples go into a ring in a shared memory file
+    next to the metrics rings, named after the router's kind and candidates;
+    every process routing between the same candidates appends to it under a
+    file lock and reads the whole ring back when ranking. Without a path the
+    ring is anonymous memory, private to the process.
+    """
+
+    def __init__(self, candidates: int, capacity: int = 4096, path: Optional[str] = None):
+        self.candidates = candidates
+        self.capacity = capacity
+        self.path = path
+        self._records = _HEADER.size + candidates * _SLOT.size
+        size = self._records + capacity * _SAMPLE.size
+        if path is None:
+            self._fd = None
+            self._mmap = mmap.mmap(-1, size)
+            _HEADER.pack_into(self._mmap, 0, _MAGIC, capacity, candidates, 0)
+            return
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            # The first process to open the file sizes and stamps it
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+            if _HEADER.unpack_from(self._mmap)[:3] != (_MAGIC, capacity, candidates):
+                self._mmap[:] = bytes(size)
+                _HEADER.pack_into(self._mmap, 0, _MAGIC, capacity, candidates, 0)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    @classmethod
+    def for_router(cls, kind: str, labels: List[str]) -> "ProviderWindows":
+        """The host's windows for these candidates, or process-local ones when they can't be shared"""
+        if settings.ROUTER_SHARED:
+            digest = hashlib.sha1("\n".join(labels).encode()).hexdigest()[:12]
+            path = os.path.join(ring_dir(), f"{_PREFIX}{kind}-{digest}")
+            try:
+                return cls(len(labels), path=path)
+            except OSError as e:
+                logger.warning(f"⚠️ Router windows for {kind} can't be shared ({e}); keeping them per process")
+        return cls(len(labels))
+
+    def _lock(self, op: int):
+        if self._fd is not None:
+            fcntl.flock(self._fd, op)
+
+    def add(self, index: int, now: float, ttfb: Optional[float]):
+        self._lock(fcntl.LOCK_EX)
+        try:
+            head = _HEAD.unpack_from(self._mmap, _HEAD_OFFSET)[0]
+            offset = self._records + (head % self.capacity) * _SAMPLE.size
+            _SAMPLE.pack_into(self._mmap, offset, now, index, math.nan if ttfb is None else ttfb)
+            _HEAD.pack_into(self._mmap, _HEAD_OFFSET, head + 1)
+        finally:
+            self._lock(fcntl.LOCK_UN)
+
+    def samples(self, now: float, window: int, max_age: float) -> List[List[Sample]]:
+        """Each candidate's last `window` samples younger than `max_age`, oldest first"""
+        self._lock(fcntl.LOCK_SH)
+        try:
+            head = _HEAD.unpack_from(self._mmap, _HEAD_OFFSET)[0]
+            data = self._mmap[self._records:]
+        finally:
+            self._lock(fcntl.LOCK_UN)
+        count = min(head, self.capacity)
+        ordered = [(head - count + i) % self.capacity for i in range(count)]
+        records = list(_SAMPLE.iter_unpack(data))
+        per_candidate: List[List[Sample]] = [[] for _ in range(self.candidates)]
+        for slot in ordered:
+            t, index, ttfb = records[slot]
+            if now - t <= max_age and index < self.candidates:
+                per_candidate[index].append((t, None if math.isnan(ttfb) else ttfb))
+        return [samples[-window:] for samples in per_candidate]
+
+    def ejection(self, index: int) -> Tuple[float, float, int]:
+        """(ejected at, ejected until, ejections) of a candidate"""
+        return _SLOT.unpack_from(self._mmap, _HEADER.size + index * _SLOT.size)
+
+    def eject(self, index: int, now: float, duration_for) -> Optional[float]:
+        """
+        Eject a candidate unless another process just did; returns the duration
+
+        `duration_for(ejections)` gives the backoff for the candidate's n-th ejection.
+        """
+        self._lock(fcntl.LOCK_EX)
+        try:
+            _, until, ejections = self.ejection(index)
+            if now < until:
+                return None
+            duration = duration_for(ejections + 1)
+            _SLOT.pack_into(self._mmap, _HEADER.size + index * _SLOT.size, now, now + duration, ejections + 1)
+            return duration
+        finally:
+            self._lock(fcntl.LOCK_UN)
+
+
+@dataclass
+class ProviderState:
+    """This process' counters for one candidate; the moving window is in `ProviderWindows`"""
+    label: str
+    selected: int = 0
+    requests: int = 0
+    errors: int = 0
+    failovers: int = 0
+    ttfb: LatencyHistogram = field(default_factory=lambda: LatencyHistogram(max_seconds=60.0))
+
+    def record(self, ttfb: Optional[float]):
+        """`ttfb` of a successful request, or None for a failed one"""
+        self.requests += 1
+        if ttfb is None:
+            self.errors += 1
+        else:
+            self.ttfb.record(ttfb)
+
+
+def recent_ttfb(samples: List[Sample], min_samples: int) -> Optional[float]:
+    values = [ttfb for _, ttfb in samples if ttfb is not None]
+    return statistics.median(values) if len(values) >= min_samples else None
+
+
+def error_rate(samples: List[Sample]) -> float:
+    if not samples:
+        return 0.0
+    return sum(1 for _, ttfb in samples if ttfb is None) / len(samples)
+
+
+class ProviderRouter:
+    """
+    Latency-aware choice between equivalent providers
+
+    Candidates are listed in preference order and the first one leads. Another
+    candidate takes the lead once its median TTFB, inflated by its error rate,
+    beats the leader's by `switch_margin`, or when the leader is ejected; the
+    margin keeps two similar providers from flapping. `explore_rate` of the
+    requests go to a random other candidate so their windows stay current.
+    Ejection follows the trunk pool: `eject_after` consecutive errors or an
+    error rate above `eject_error_rate`, with exponential backoff. Windows and
+    ejections are the host's, so each call ranks on what every process saw.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        labels: List[str],
+        window: Optional[int] = None,
+        max_age: Optional[float] = None,
+        min_samples: int = 3,
+        switch_margin: float = 0.2,
+        explore_rate: Optional[float] = None,
+        error_penalty: float = 2.0,
+        eject_after: int = 3,
+        eject_error_rate: float = 0.5,
+        eject_min_samples: int = 5,
+        eject_seconds: float = 30.0,
+        max_eject_seconds: float = 600.0,
+        windows: Optional[ProviderWindows] = None,
+    ):
+        if not labels:
+            raise ValueError("ProviderRouter needs at least one candidate")
+        self.kind = kind
+        self.window = window or settings.ROUTER_WINDOW
+        self.max_age = max_age or settings.ROUTER_WINDOW_SECONDS
+        self.states = [ProviderState(label=label) for label in labels]
+        self.windows = windows or ProviderWindows.for_router(kind, labels)
+        self.min_samples = min_samples
+        self.switch_margin = switch_margin
+        self.explore_rate = settings.ROUTER_EXPLORE_RATE if explore_rate is None else explore_rate
+        self.error_penalty = error_penalty
+        self.eject_after = eject_after
+        self.eject_error_rate = eject_error_rate
+        self.eject_min_samples = eject_min_samples
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.leader = 0
+        self.switches = 0
+
+    def _samples(self, now: float) -> List[List[Sample]]:
+        return self.windows.samples(now, self.window, self.max_age)
+
+    def is_ejected(self, index: int, now: float) -> bool:
+        return now < self.windows.ejection(index)[1]
+
+    def cost(self, samples: List[Sample]) -> Optional[float]:
+        ttfb = recent_ttfb(samples, self.min_samples)
+        if ttfb is None:
+            return None
+        return ttfb * (1.0 + self.error_penalty * error_rate(samples))
+
+    def _switch(self, index: int, reason: str, cost: Optional[float]):
+        previous = self.states[self.leader]
+        self.leader = index
+        self.switches += 1
+        logger.warning(
+            f"🔀 ROUTER | {self.kind} | {previous.label} -> {self.states[index].label} | Reason: {reason} | "
+            f"Cost: {cost if cost is None else round(cost, 3)}s"
+        )
+
+    def ranked(self, explore: bool = True) -> List[int]:
+        """Candidate indices to try, best first; ejected ones come last as a final resort"""
+        now = time.time()
+        samples = self._samples(now)
+        indices = range(len(self.states))
+        healthy = [i for i in indices if not self.is_ejected(i, now)]
+        ejected = sorted((i for i in indices if i not in healthy), key=lambda i: self.windows.ejection(i)[1])
+        costs = {i: self.cost(samples[i]) for i in healthy}
+
+        def key(i: int):
+            return (costs[i] is None, costs[i] or 0.0, i)
+
+        if healthy:
+            best = min(healthy, key=key)
+            if self.leader not in healthy:
+                self._switch(best, "ejected", costs[best])
+            elif best != self.leader and costs[best] is not None:
+                leader_cost = costs[self.leader]
+                if leader_cost is None or costs[best] < leader_cost * (1.0 - self.switch_margin):
+                    self._switch(best, "faster", costs[best])
+
+        order = ([self.leader] if self.leader in healthy else []) + sorted((i for i in healthy if i != self.leader), key=key)
+        if explore and len(order) > 1 and random.random() < self.explore_rate:
+            probe = random.choice(order[1:])
+            order.remove(probe)
+            order.insert(0, probe)
+        return order + ejected
+
+    def record(self, index: int, ttfb: Optional[float], failover: bool = False):
+        """Record a request's TTFB, or None if it failed; `failover` marks requests served after another candidate failed"""
+        now = time.time()
+        state = self.states[index]
+        state.record(ttfb)
+        self.windows.add(index, now, ttfb)
+        if failover and ttfb is not None:
+            state.failovers += 1
+        if ttfb is None and not self.is_ejected(index, now) and self._should_eject(index, now):
+            duration = self.windows.eject(
+                index, now, lambda ejections: min(self.eject_seconds * 2 ** (ejections - 1), self.max_eject_seconds)
+            )
+            if duration is not None:
+                logger.warning(
+                    f"🚫 Provider ejected | {self.kind} | {state.label} | For: {duration:.0f}s | "
+                    f"Error rate: {error_rate(self._samples(now)[index]):.0%}"
+                )
+
+    def _should_eject(self, index: int, now: float) -> bool:
+        # Only errors since the candidate's last ejection count, wherever on the host they happened
+        ejected_at = self.windows.ejection(index)[0]
+        samples = [s for s in self._samples(now)[index] if s[0] > ejected_at]
+        consecutive = 0
+        for _, ttfb in reversed(samples):
+            if ttfb is not None:
+                break
+            consecutive += 1
+        if consecutive >= self.eject_after:
+            return True
+        return len(samples) >= self.eject_min_samples and error_rate(samples) >= self.eject_error_rate
+
+    def stats(self) -> dict:
+        """This process' request counters, with the host's windows and ejections"""
+        now = time.time()
+        samples = self._samples(now)
+        return {
+            state.label: {
+                "leader": i == self.leader,
+                "selected": state.selected,
+                "requests": state.requests,
+                "errors": state.errors,
+                "failovers": state.failovers,
+                "recent_ttfb": recent_ttfb(samples[i], 1),
+                "error_rate": round(error_rate(samples[i]), 4),
+                "ttfb_p50": round(state.ttfb.percentile(0.5), 4),
+                "ttfb_p95": round(state.ttfb.percentile(0.95), 4),
+                "ejected": self.is_ejected(i, now),
+                "ejections": self.windows.ejection(i)[2],
+            }
+            for i, state in enumerate(self.states)
+        }
+
+    def log_stats(self):
+        for label, s in self.stats().items():
+            recent = f"{s['recent_ttfb']:.3f}s" if s["recent_ttfb"] is not None else "n/a"
+            logger.info(
+                f"🔀 {self.kind.upper()} {label} | Leader: {s['leader']} | Selected: {s['selected']} | "
+                f"Errors: {s['errors']}/{s['requests']} | Recent TTFB: {recent} | p95: {s['ttfb_p95']:.3f}s | "
+                f"Ejected: {s['ejected']}"
+            )
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for label, s in self.stats().items():
+            tags = f'kind="{self.kind}",provider="{label}"'
+            lines.append(f"agent_provider_requests_total{{{tags}}} {s['requests']}")
+            lines.append(f"agent_provider_errors_total{{{tags}}} {s['errors']}")
+            lines.append(f"agent_provider_selected_total{{{tags}}} {s['selected']}")
+            lines.append(f'agent_provider_ttfb_seconds{{{tags},quantile="0.5"}} {s["ttfb_p50"]}')
+            lines.append(f'agent_provider_ttfb_seconds{{{tags},quantile="0.95"}} {s["ttfb_p95"]}')
+            lines.append(f"agent_provider_leader{{{tags}}} {int(s['leader'])}")
+            lines.append(f"agent_provider_ejected{{{tags}}} {int(s['ejected'])}")
+        lines.append(f'agent_provider_switches_total{{kind="{self.kind}"}} {self.switches}')
+        return "\n".join(lines) + "\n"
+
+
+def _attempt_options(conn_options: APIConnectOptions) -> APIConnectOptions:
+    # Failing over to another candidate beats retrying a degraded one
+    return dataclasses.replace(conn_options, max_retry=0)
+
+
+class RoutedLLM(llm.LLM):
+    """LLM that sends each request to the router's best candidate, failing over before the first token"""
+
+    def __init__(self, candidates: List[llm.LLM], labels: List[str]):
+        super().__init__()
+        self.candidates = candidates
+        self.router = ProviderRouter("llm", labels)
+        register_metrics_source(self.router.render_prometheus)
+
+    @property
+    def model(self) -> str:
+        return self.candidates[self.router.leader].model
+
+    @property
+    def provider(self) -> str:
+        return self.router.states[self.router.leader].label
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools: Optional[List[Any]] = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls: NotGivenOr[bool] = NOT_GIVEN,
+        tool_choice: NotGivenOr[Any] = NOT_GIVEN,
+        extra_kwargs: NotGivenOr[dict] = NOT_GIVEN,
+    ) -> "RoutedLLMStream":
+        return RoutedLLMStream(
+            self,
+            chat_ctx=chat_ctx,
+            tools=tools or [],
+            conn_options=conn_options,
+            parallel_tool_calls=parallel_tool_calls,
+            tool_choice=tool_choice,
+            extra_kwargs=extra_kwargs,
+        )
+
+    async def aclose(self):
+        for candidate in self.candidates:
+            await candidate.aclose()
+
+
+class RoutedLLMStream(llm.LLMStream):
+    def __init__(self, routed: RoutedLLM, *, chat_ctx, tools, conn_options, parallel_tool_calls, tool_choice, extra_kwargs):
+        super().__init__(routed, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        self._routed = routed
+        self._parallel_tool_calls = parallel_tool_calls
+        self._tool_choice = tool_choice
+        self._extra_kwargs = extra_kwargs
+
+    async def _run(self):
+        router = self._routed.router
+        order = router.ranked()
+        for attempt, index in enumerate(order):
+            router.states[index].selected += 1
+            started = time.perf_counter()
+            ttfb = None
+            try:
+                async with self._routed.candidates[index].chat(
+                    chat_ctx=self._chat_ctx,
+                    tools=self._tools,
+                    conn_options=_attempt_options(self._conn_options),
+                    parallel_tool_calls=self._parallel_tool_calls,
+                    tool_choice=self._tool_choice,
+                    extra_kwargs=self._extra_kwargs,
+                ) as stream:
+                    async for chunk in stream:
+                        if ttfb is None and chunk.delta and (chunk.delta.content or chunk.delta.tool_calls):
+                            ttfb = time.perf_counter() - started
+                        self._event_ch.send_nowait(chunk)
+            except Exception as e:
+                router.record(index, None)
+                if ttfb is not None:
+                    # Part of the reply is already out; another provider can't continue it
+                    raise
+                logger.warning(f"⚠️ LLM {router.states[index].label} failed, trying next candidate: {e}")
+                continue
+            router.record(index, ttfb if ttfb is not None else time.perf_counter() - started, failover=attempt > 0)
+            return
+        raise APIConnectionError(f"all LLM candidates failed ({', '.join(router.states[i].label for i in order)})")
+
+
+class RoutedTTS(tts.TTS):
+    """
+    TTS that keeps one candidate per call and fails over between sentences
+
+    The voice shouldn't change mid-call while things work, so the router is
+    consulted once per call (`begin_call`); a sentence that fails before any
+    audio is retried on the next candidate, which then serves the rest of the
+    call. Audio from candidates with another sample rate is resampled.
+    """
+
+    def __init__(self, candidates: List[tts.TTS], labels: List[str], voices: List[dict]):
+        if len({t.num_channels for t in candidates}) != 1:
+            raise ValueError("All TTS candidates must have the same number of channels")
+        super().__init__(
+            capabilities=tts.TTSCapabilities(streaming=False),
+            sample_rate=max(t.sample_rate for t in candidates),
+            num_channels=candidates[0].num_channels,
+        )
+        self.candidates = candidates
+        self.voices = voices
+        self.router = ProviderRouter("tts", labels)
+        self.current = 0
+        register_metrics_source(self.router.render_prometheus)
+
+    def begin_call(self):
+        self.current = self.router.ranked()[0]
+
+    @property
+    def model(self) -> str:
+        return getattr(self.candidates[self.current], "model", "unknown")
+
+    @property
+    def provider(self) -> str:
+        return self.router.states[self.current].label
+
+    @property
+    def cache_voice(self) -> str:
+        # Voice and voice settings of the serving candidate, for the TTS cache key
+        return json.dumps(self.voices[self.current], sort_keys=True, default=str)
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "RoutedChunkedStream":
+        return RoutedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def prewarm(self):
+        self.candidates[self.current].prewarm()
+
+    async def aclose(self):
+        for candidate in self.candidates:
+            await candidate.aclose()
+
+
+class RoutedChunkedStream(tts.ChunkedStream):
+    def __init__(self, *, tts: RoutedTTS, input_text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._routed = tts
+
+    async def _run(self, output_emitter: tts.AudioEmitter):
+        routed = self._routed
+        router = routed.router
+        order = [routed.current] + [i for i in router.ranked(explore=False) if i != routed.current]
+        output_emitter.initialize(
+            request_id=utils.shortuuid(),
+            sample_rate=routed.sample_rate,
+            num_channels=routed.num_channels,
+            mime_type="audio/pcm",
+        )
+        for attempt, index in enumerate(order):
+            candidate = routed.candidates[index]
+            router.states[index].selected += 1
+            resampler = None
+            if candidate.sample_rate != routed.sample_rate:
+                resampler = rtc.AudioResampler(input_rate=candidate.sample_rate, output_rate=routed.sample_rate)
+            started = time.perf_counter()
+            ttfb = None
+            try:
+                async with candidate.synthesize(self.input_text, conn_options=_attempt_options(self._conn_options)) as stream:
+                    async for audio in stream:
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - started
+                        frames = resampler.push(audio.frame) if resampler is not None else [audio.frame]
+                        for frame in frames:
+                            output_emitter.push(frame.data.tobytes())
+                if resampler is not None:
+                    for frame in resampler.flush():
+                        output_emitter.push(frame.data.tobytes())
+            except Exception as e:
+                router.record(index, None)
+                if ttfb is not None:
+                    raise
+                logger.warning(f"⚠️ TTS {router.states[index].label} failed, trying next candidate: {e}")
+                continue
+            router.record(index, ttfb if ttfb is not None else time.perf_counter() - started, failover=attempt > 0)
+            if index != routed.current:
+                logger.warning(f"🔀 ROUTER | tts | Call moved to {router.states[index].label} after a failure")
+                routed.current = index
+            output_emitter.flush()
+            return
+        raise APIConnectionError(f"all TTS candidates failed ({', '.join(router.states[i].label for i in order)})")
@@ -0,0 +1,149 @@
+"""
+Pipeline providers for outbound AI agent.
+STT, LLM, TTS and turn detection are picked by name from settings or a
+pipeline profile, and a provider's plugin is only imported once it is
+selected, so worker restarts and job process spawns don't pay for SDKs the
+deployment never uses.
+"""
+
+import importlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Provider name -> plugin module
+PLUGINS = {
+    "deepgram": "livekit.plugins.deepgram",
+    "openai": "livekit.plugins.openai",
+    "elevenlabs": "livekit.plugins.elevenlabs",
+    "google": "livekit.plugins.google",
+    "cartesia": "livekit.plugins.cartesia",
+}
+
+# Turn detector name -> (module, model class)
+TURN_DETECTORS = {
+    "multilingual": ("livekit.plugins.turn_detector.multilingual", "MultilingualModel"),
+    "english": ("livekit.plugins.turn_detector.english", "EnglishModel"),
+}
+
+
+@dataclass
+class ProviderSpec:
+    """One provider and the keyword arguments for its plugin class"""
+    provider: str
+    options: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def label(self) -> str:
+        model = self.options.get("model")
+        return f"{self.provider}:{model}" if model else self.provider
+
+
+def _plugin(name: str):
+    return importlib.import_module(PLUGINS[name])
+
+
+def _options(**options) -> dict:
+    # Unset (empty) settings leave the plugin's own default in place
+    return {key: value for key, value in options.items() if value}
+
+
+def _elevenlabs_tts(voice_settings: Optional[dict] = None, **options):
+    plugin = _plugin("elevenlabs")
+    if voice_settings is not None:
+        options["voice_settings"] = plugin.VoiceSettings(**voice_settings)
+    return plugin.TTS(**options)
+
+
+BUILDERS: Dict[str, Dict[str, Callable]] = {
+    "stt": {
+        "deepgram": lambda **options: _plugin("deepgram").STT(**options),
+        "openai": lambda **options: _plugin("openai").STT(**options),
+        "google": lambda **options: _plugin("google").STT(**options),
+    },
+    "llm": {
+        "openai": lambda **options: _plugin("openai").LLM(**options),
+        "google": lambda **options: _plugin("google").LLM(**options),
+    },
+    "tts": {
+        "elevenlabs": _elevenlabs_tts,
+        "cartesia": lambda **options: _plugin("cartesia").TTS(**options),
+        "openai": lambda **options: _plugin("openai").TTS(**options),
+    },
+}
+
+
+def check_spec(kind: str, spec: ProviderSpec):
+    if spec.provider not in BUILDERS[kind]:
+        raise ValueError(
+            f"Unknown {kind.upper()} provider {spec.provider!r}; expected one of {', '.join(sorted(BUILDERS[kind]))}"
+        )
+
+
+def build(kind: str, spec: ProviderSpec):
+    check_spec(kind, spec)
+    return BUILDERS[kind][spec.provider](**spec.options)
+
+
+def settings_spec(kind: str) -> ProviderSpec:
+    """The provider configured by the STT_/LLM_/TTS_ settings"""
+    if kind == "stt":
+        # google takes `languages`, the others `language`
+        language_key = "languages" if settings.STT_PROVIDER == "google" else "language"
+        return ProviderSpec(settings.STT_PROVIDER, _options(model=settings.STT_MODEL, **{language_key: settings.STT_LANGUAGE}))
+    if kind == "llm":
+        return ProviderSpec(settings.LLM_PROVIDER, _options(model=settings.LLM_MODEL))
+    voice_key = "voice_id" if settings.TTS_PROVIDER == "elevenlabs" else "voice"
+    return ProviderSpec(settings.TTS_PROVIDER, _options(model=settings.TTS_MODEL, **{voice_key: settings.TTS_VOICE}))
+
+
+def build_stt():
+    return build("stt", settings_spec("stt"))
+
+
+def build_llm():
+    return build("llm", settings_spec("llm"))
+
+
+def build_tts():
+    return build("tts", settings_spec("tts"))
+
+
+def build_turn_detector():
+    if settings.TURN_DETECTOR in ("", "none"):
+        return None
+    module, cls = TURN_DETECTORS[settings.TURN_DETECTOR]
+    return getattr(importlib.import_module(module), cls)()
+
+
+def import_plugins(specs: Optional[Iterable[ProviderSpec]] = None) -> List[str]:
+    """
+    Import the plugins of the given providers (default: the configured ones)
+
+    livekit plugins register themselves on import and refuse to do so off the
+    main thread, so this runs on the main thread before anything is built in
+    prewarm's loader threads. The worker process needs it too: it registers
+    the turn detector's inference runner and the files for `download-files`.
+    """
+    if specs is None:
+        specs = [settings_spec(kind) for kind in BUILDERS]
+    modules = []
+    for spec in specs:
+        if spec.provider not in PLUGINS:
+            raise ValueError(f"Unknown provider {spec.provider!r}; expected one of {', '.join(sorted(PLUGINS))}")
+        modules.append(PLUGINS[spec.provider])
+    if settings.TURN_DETECTOR not in ("", "none"):
+        if settings.TURN_DETECTOR not in TURN_DETECTORS:
+            raise ValueError(f"Unknown turn detector {settings.TURN_DETECTOR!r}; expected one of {', '.join(TURN_DETECTORS)} or none")
+        modules.append(TURN_DETECTORS[settings.TURN_DETECTOR][0])
+    modules.append("livekit.plugins.silero")
+
+    imported = list(dict.fromkeys(modules))
+    for module in imported:
+        importlib.import_module(module)
+    logger.debug(f"🔌 Imported provider plugins | {', '.join(imported)}")
+    return imported
@@ -0,0 +1,386 @@
+"""
+Call suppression for outbound AI agent.
+Do-not-call, opted-out and recently-called numbers are kept as one index file
+per list: E.164 numbers as sorted unsigned 64-bit integers, memory-mapped by
+every job process (8 bytes per number, one copy in the page cache per host)
+and searched in place, so a check is a binary search of a few microseconds and
+runs before the job connects to its room.
+
+    python suppression.py build dnc dnc_export.csv          # merge into the list
+    python suppression.py build recent calls.csv --replace  # rebuild from scratch
+    python suppression.py build opted_out --remove resubscribed.csv
+    python suppression.py check +1 (555) 010-0199
+    python suppression.py info
+"""
+
+import bisect
+import csv
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# magic, number count; the sorted numbers follow in native byte order
+_HEADER = struct.Struct("=8sQ")
+_MAGIC = b"SUPIDX1\0"
+_BUILD_CHUNK = 1 << 20
+
+_NON_DIGITS = re.compile(r"[^\d]")
+_URI_SCHEMES = ("sip:", "sips:", "tel:")
+# Reason given for every number while a configured list can't be read
+_UNAVAILABLE = " unavailable"
+# Reason given for a national number when there's no country to match it with
+NO_COUNTRY = "no country code"
+
+
+def _digits(raw: str):
+    """(digits, written internationally) of a number or the user part of a `sip:`/`tel:` URI"""
+    raw = str(raw).strip()
+    if raw.lower().startswith(_URI_SCHEMES):
+        raw = re.split(r"[@;]", raw.split(":", 1)[1], 1)[0]
+    international = raw.startswith("+")
+    digits = _NON_DIGITS.sub("", raw)
+    if not international and digits.startswith("00"):
+        digits, international = digits[2:], True
+    return digits, international
+
+
+def is_national(raw: str) -> bool:
+    """A number without `+` or `00` that starts with `0` or has 7 to 10 digits; shorter ones are short codes"""
+    if raw is None:
+        return False
+    digits, international = _digits(raw)
+    return not international and len(digits) >= 7 and (len(digits) <= 10 or digits.startswith("0"))
+
+
+def is_unavailable(reason: Optional[str]) -> bool:
+    """Whether a suppression reason means a list couldn't be read, rather than the number is on one"""
+    return bool(reason) and reason.endswith(_UNAVAILABLE)
+
+
+def normalize_number(raw: str, default_country: Optional[str] = None) -> Optional[int]:
+    """
+    E.164 digits of a number as an integer, for list lookups; None if it can't be one
+
+    Formatting is dropped and the user part of a `sip:`/`tel:` URI is used; a
+    `00` international prefix is read as `+`. National numbers (`is_national`)
+    get a `default_country`: the trunk prefix `0` is dropped and the code
+    added; without one they stay unmatched. Short codes and names never match.
+    """
+    if raw is None:
+        return None
+    raw = str(raw).strip()
+    if raw[1:].isdigit() and raw[0] == "+" and 8 <= len(raw) - 1 <= 15 and raw[1] != "0":
+        # Already E.164, the usual case for bulk lists
+        return int(raw[1:])
+    digits, _ = _digits(raw)
+    if is_national(raw):
+        country = settings.SUPPRESSION_DEFAULT_COUNTRY if default_country is None else default_country
+        if not country:
+            return None
+        digits = f"{country}{digits[1:] if digits.startswith('0') else digits}"
+    # E.164 allows at most 15 digits; real numbers have at least 8
+    if not 8 <= len(digits) <= 15 or digits[0] == "0":
+        return None
+    return int(digits)
+
+
+def format_e164(number: int) -> str:
+    return f"+{number}"
+
+
+class SuppressionIndex:
+    """
+    One memory-mapped suppression list
+
+    The file is replaced (not rewritten) on rebuild, so a reader keeps a
+    consistent mapping of the old file until it notices the new inode and remaps.
+    """
+
+    def __init__(self, path: str, reload_seconds: Optional[float] = None):
+        self.path = Path(path)
+        self.name = self.path.stem
+        self.reload_seconds = settings.SUPPRESSION_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        self._lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+        self._numbers = None
+        self._inode = None
+        self._checked = 0.0
+        self._open()
+
+    def _open(self):
+        stat = self.path.stat()
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else None
+        if mapped is None or len(mapped) < _HEADER.size:
+            raise ValueError(f"Suppression index {self.path} is truncated")
+        magic, count = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC or len(mapped) != _HEADER.size + 8 * count:
+            mapped.close()
+            raise ValueError(f"Suppression index {self.path} is corrupt")
+        numbers = memoryview(mapped)[_HEADER.size:].cast("Q")
+
+        previous, self._numbers, self._mmap = (self._numbers, self._mmap), numbers, mapped
+        self._inode = (stat.st_ino, stat.st_mtime_ns)
+        if previous[0] is not None:
+            previous[0].release()
+            previous[1].close()
+        logger.debug(f"🚫 Suppression list {self.name} mapped | Numbers: {count:,}")
+
+    def refresh(self):
+        """Remap if the file was rebuilt; checked at most every `reload_seconds`"""
+        now = time.monotonic()
+        if now - self._checked < self.reload_seconds:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                stat = self.path.stat()
+            except FileNotFoundError:
+                return
+            if (stat.st_ino, stat.st_mtime_ns) != self._inode:
+                self._open()
+                logger.info(f"🚫 Suppression list {self.name} reloaded | Numbers: {len(self):,}")
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    def __contains__(self, number: int) -> bool:
+        numbers = self._numbers
+        i = bisect.bisect_left(numbers, number)
+        return i < len(numbers) and numbers[i] == number
+
+    def close(self):
+        if self._numbers is not None:
+            self._numbers.release()
+            self._mmap.close()
+            self._numbers = self._mmap = None
+
+
+def _read_numbers(path: str) -> Iterator[str]:
+    """Raw numbers from a CSV with a `phone_number` column or a one-per-line file"""
+    with open(path, "r", newline="") as f:
+        first = f.readline()
+        f.seek(0)
+        if "phone_number" in first:
+            for row in csv.DictReader(f):
+                yield row.get("phone_number") or ""
+        else:
+            for line in f:
+                yield line.split(",", 1)[0]
+
+
+def _normalized(paths: Iterable[str]):
+    """Sorted, unique uint64 array of every valid number in `paths`"""
+    import numpy as np
+
+    chunks, chunk, invalid = [], [], 0
+    for path in paths:
+        for raw in _read_numbers(path):
+            number = normalize_number(raw)
+            if number is None:
+                invalid += raw.strip() != ""
+                continue
+            chunk.append(number)
+            if len(chunk) >= _BUILD_CHUNK:
+                chunks.append(np.unique(np.array(chunk, dtype=np.uint64)))
+                chunk = []
+    if chunk:
+        chunks.append(np.unique(np.array(chunk, dtype=np.uint64)))
+    if invalid:
+        logger.warning(f"⚠️ Skipped {invalid:,} invalid numbers")
+    return np.unique(np.concatenate(chunks)) if chunks else np.empty(0, dtype=np.uint64)
+
+
+def _map_existing(path: Path):
+    import numpy as np
+
+    if not path.exists():
+        return np.empty(0, dtype=np.uint64)
+    with open(path, "rb") as f:
+        _, count = _HEADER.unpack(f.read(_HEADER.size))
+    return np.memmap(path, dtype=np.uint64, mode="r", offset=_HEADER.size, shape=(count,)) if count else np.empty(0, dtype=np.uint64)
+
+
+def build_index(
+    name: str,
+    sources: Iterable[str] = (),
+    remove: Iterable[str] = (),
+    replace: bool = False,
+    directory: Optional[str] = None,
+) -> dict:
+    """
+    Merge the numbers in `sources` into list `name`, minus those in `remove`
+
+    The existing index is streamed in chunks and merged with the (sorted) new
+    numbers, so an incremental update of a large list only holds the delta in
+    memory. The result is written next to the old file and renamed over it.
+    """
+    import numpy as np
+
+    path = Path(directory or settings.SUPPRESSION_DIR) / f"{name}.idx"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    added = _normalized(sources)
+    removed = _normalized(remove)
+    existing = np.empty(0, dtype=np.uint64) if replace else _map_existing(path)
+
+    staging = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    count = 0
+    with open(staging, "wb") as out:
+        out.write(_HEADER.pack(_MAGIC, 0))
+        low = 0
+        # Walk the existing list in chunks; each takes the new numbers below its upper bound
+        for start in range(0, len(existing), _BUILD_CHUNK):
+            block = np.asarray(existing[start:start + _BUILD_CHUNK])
+            last = start + _BUILD_CHUNK >= len(existing)
+            high = len(added) if last else int(np.searchsorted(added, block[-1], side="right"))
+            merged = np.union1d(block, added[low:high])
+            low = high
+            count += _write_block(out, merged, removed)
+        if low < len(added):
+            count += _write_block(out, added[low:], removed)
+        out.seek(0)
+        out.write(_HEADER.pack(_MAGIC, count))
+        out.flush()
+        os.fsync(out.fileno())
+    del existing
+    os.chmod(staging, 0o444)
+    os.replace(staging, path)
+
+    stats = {
+        "list": name,
+        "numbers": count,
+        "added": int(len(added)),
+        "removed": int(len(removed)),
+        "bytes": path.stat().st_size,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(
+        f"🚫 Suppression list {name} built | Numbers: {count:,} | Added: {stats['added']:,} | "
+        f"Removed: {stats['removed']:,} | Time: {stats['seconds']}s"
+    )
+    return stats
+
+
+def _write_block(out, block, removed) -> int:
+    import numpy as np
+
+    if len(removed):
+        block = block[~np.isin(block, removed, assume_unique=True)]
+    out.write(np.ascontiguousarray(block, dtype=np.uint64).tobytes())
+    return len(block)
+
+
+class Suppression:
+    """
+    The configured suppression lists
+
+    A list that is configured but missing or unreadable suppresses every call
+    (fail closed): dialing a number on a do-not-call list costs more than a
+    paused campaign.
+    """
+
+    def __init__(self, directory: Optional[str] = None, lists: Optional[List[str]] = None):
+        self.directory = Path(directory or settings.SUPPRESSION_DIR)
+        names = lists if lists is not None else [n.strip() for n in settings.SUPPRESSION_LISTS.split(",") if n.strip()]
+        self.indexes: Dict[str, SuppressionIndex] = {}
+        self.unavailable: Dict[str, str] = {}
+        for name in names:
+            try:
+                self.indexes[name] = SuppressionIndex(str(self.directory / f"{name}.idx"))
+            except (OSError, ValueError) as e:
+                self.unavailable[name] = str(e)
+                logger.error(f"❌ Suppression list {name} unavailable; its calls will be suppressed | {e}")
+
+    def check(self, number: Optional[int]) -> Optional[str]:
+        """Why the number must not be dialed (a list name, `<list> unavailable`), None if it may"""
+        if self.unavailable:
+            return f"{next(iter(self.unavailable))}{_UNAVAILABLE}"
+        if number is None:
+            # Nothing that isn't E.164 is on a list
+            return None
+        for name, index in self.indexes.items():
+            index.refresh()
+            if number in index:
+                return name
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "lists": {name: len(index) for name, index in self.indexes.items()},
+            "unavailable": list(self.unavailable),
+        }
+
+
+_suppression: Optional[Suppression] = None
+
+
+def get_suppression() -> Optional[Suppression]:
+    """The process' suppression lists, None when SUPPRESSION_DIR is unset"""
+    global _suppression
+    if _suppression is None and settings.SUPPRESSION_DIR:
+        _suppression = Suppression()
+        if not settings.SUPPRESSION_DEFAULT_COUNTRY:
+            logger.warning("⚠️ SUPPRESSION_DEFAULT_COUNTRY is unset; numbers without a country code will not be dialed")
+    return _suppression
+
+
+def check_number(raw: str) -> Optional[str]:
+    """
+    Why a number must not be dialed, None if it may or no lists are configured
+
+    The number is normalized only to look it up; callers dial it as given. A
+    national number can't be looked up without SUPPRESSION_DEFAULT_COUNTRY, so
+    it is refused rather than dialed unchecked.
+    """
+    suppression = get_suppression()
+    if suppression is None:
+        return None
+    number = normalize_number(raw)
+    reason = suppression.check(number)
+    if reason is None and number is None and is_national(raw):
+        logger.warning(f"⚠️ {raw} has no country code to check it against the lists with; set SUPPRESSION_DEFAULT_COUNTRY")
+        return NO_COUNTRY
+    return reason
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from logger import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Merge numbers into a list")
+    build.add_argument("list")
+    build.add_argument("sources", nargs="*", help="CSV (phone_number column) or one number per line")
+    build.add_argument("--remove", action="append", default=[], help="Numbers to take out of the list, repeatable")
+    build.add_argument("--replace", action="store_true", help="Start from an empty list instead of merging")
+    check = commands.add_parser("check", help="Check a number against the configured lists")
+    check.add_argument("number", nargs="+")
+    commands.add_parser("info", help="Show the configured lists")
+    args = parser.parse_args()
+
+    if not settings.SUPPRESSION_DIR:
+        sys.exit("SUPPRESSION_DIR is not set")
+    if args.command == "build":
+        print(json.dumps(build_index(args.list, args.sources, remove=args.remove, replace=args.replace), indent=2))
+    elif args.command == "check":
+        raw = " ".join(args.number)
+        number, reason = normalize_number(raw), check_number(raw)
+        print(f"{format_e164(number) if number is not None else raw}: {'suppressed (' + reason + ')' if reason else 'ok'}")
+    else:
+        print(json.dumps(get_suppression().stats(), indent=2))
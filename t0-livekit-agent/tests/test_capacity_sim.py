@@ -0,0 +1,26 @@
+import numpy as np
+
+from capacity_sim import DAY, CallModel, HostModel, arrivals, daily_weights, dispatch, simulate, window_opens
+
+
+def test_calls_are_only_dialed_inside_the_window():
+    rng = np.random.default_rng(1)
+    weights = daily_weights("22-24")
+    ready = arrivals(2000, 3, weights, rng, "campaign")
+    answered, ring, talk = CallModel().draw(len(ready), rng)
+    start, _ = dispatch(ready, ring + talk, {"a": 10}, 10, 2.0, window_opens(weights))
+    hours = ((start % DAY) // 3600).astype(int)
+    assert (weights[hours] > 0).all()
+    assert (start >= ready).all()
+    # 10 lines can't dial 2000 calls in two hours; the rest wait for the following nights
+    assert (start // DAY > ready // DAY).any()
+
+
+def test_demand_is_reported_apart_from_the_limits():
+    report = simulate(
+        20000, 2, CallModel(), HostModel(), {"a": 10}, max_concurrent=10, cps=2.0,
+        weights=daily_weights("9-18"), mode="campaign",
+    )
+    assert report["concurrency"]["peak"] == 10 and report["hosts"]["for_peak"] == 1
+    assert report["demand"]["peak"] > 10 and report["demand"]["hosts_for_peak"] > 1
+    assert report["calls"]["carried_over"] > 0
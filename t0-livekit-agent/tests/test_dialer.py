@@ -0,0 +1,195 @@
+import asyncio
+import csv
+from types import SimpleNamespace
+
+import pytest
+
+import dialer as dialer_module
+from dialer import CampaignDialer, LiveKitDispatcher, TokenBucket, iter_contacts
+from trunk_pool import TrunkPool, outcome_metadata
+
+
+class FakeDispatch:
+    """Places every call for `hold` seconds and tracks how many are live, overall and per trunk"""
+
+    def __init__(self, hold: float = 0.01, outcomes: dict = None):
+        self.hold = hold
+        self.outcomes = outcomes or {}
+        self.dialed = []
+        self.live = 0
+        self.peak = 0
+        self.live_per_trunk = {}
+        self.peak_per_trunk = {}
+        self.gate = None
+
+    async def __call__(self, metadata: dict):
+        trunk = metadata["sip_trunk_id"]
+        self.dialed.append(metadata["phone_number"])
+        self.live += 1
+        self.live_per_trunk[trunk] = self.live_per_trunk.get(trunk, 0) + 1
+        self.peak = max(self.peak, self.live)
+        self.peak_per_trunk[trunk] = max(self.peak_per_trunk.get(trunk, 0), self.live_per_trunk[trunk])
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            await asyncio.sleep(self.hold)
+        finally:
+            self.live -= 1
+            self.live_per_trunk[trunk] -= 1
+        return self.outcomes.get(trunk, {"answered": True, "latency": 1.0})
+
+
+def write_contacts(path, count: int):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["phone_number"])
+        for i in range(count):
+            writer.writerow([f"+1555000{i:04d}"])
+    return str(path)
+
+
+def test_concurrency_caps_and_trunk_scoring(tmp_path):
+    source = write_contacts(tmp_path / "contacts.csv", 60)
+    dispatch = FakeDispatch(outcomes={"ST_bad": {"answered": False, "latency": 0.2, "sip_status_code": "503"}})
+    pool = TrunkPool({"ST_good": 4, "ST_bad": 2}, eject_seconds=60)
+    dialer = CampaignDialer(dispatch, trunk_pool=pool, max_concurrent=5, calls_per_second=1000)
+
+    asyncio.run(dialer.run(iter_contacts(source)))
+
+    assert sorted(dispatch.dialed) == sorted(c.phone_number for c in iter_contacts(source))
+    assert dialer.completed == 60 and dialer.failed == 0
+    assert dispatch.peak <= 5
+    assert dispatch.peak_per_trunk["ST_good"] <= 4 and dispatch.peak_per_trunk.get("ST_bad", 0) <= 2
+    # 503s are trunk faults: the bad trunk gets ejected and the good one carries the campaign
+    stats = pool.stats()
+    assert stats["ST_bad"]["ejections"] >= 1
+    assert stats["ST_good"]["selected"] > stats["ST_bad"]["selected"]
+    assert dialer.active_calls == 0
+
+
+def test_resume_from_checkpoint_dials_each_row_once(tmp_path):
+    source = write_contacts(tmp_path / "contacts.csv", 30)
+    checkpoint = str(tmp_path / "contacts.checkpoint.json")
+    dispatch = FakeDispatch()
+
+    async def run_until_stopped():
+        dialer = CampaignDialer(
+            dispatch, trunk_pool=TrunkPool({"ST_a": 3}), max_concurrent=3,
+            calls_per_second=1000, checkpoint_path=checkpoint, checkpoint_interval=1,
+        )
+        contacts = iter_contacts(source)
+
+        def stopping():
+            for contact in contacts:
+                if contact.index == 12:
+                    dialer.stop()
+                yield contact
+
+        await dialer.run(stopping())
+
+    asyncio.run(run_until_stopped())
+    assert 0 < len(dispatch.dialed) < 30
+
+    resumed = CampaignDialer(
+        dispatch, trunk_pool=TrunkPool({"ST_a": 3}), max_concurrent=3,
+        calls_per_second=1000, checkpoint_path=checkpoint,
+    )
+    asyncio.run(resumed.run(iter_contacts(source, start=resumed.checkpoint.next_index)))
+    assert sorted(dispatch.dialed) == sorted(c.phone_number for c in iter_contacts(source))
+
+
+def test_unavailable_suppression_list_pauses_without_using_up_the_campaign(tmp_path, monkeypatch):
+    source = write_contacts(tmp_path / "contacts.csv", 20)
+    checkpoint = str(tmp_path / "contacts.checkpoint.json")
+    dispatch = FakeDispatch()
+    lost = {"at": 10}
+
+    def check_number(raw):
+        # Row 3 is on the list; from row 10 the list can't be read
+        if raw == "+15550000003":
+            return "dnc"
+        return "dnc unavailable" if int(raw[-4:]) >= lost["at"] else None
+
+    monkeypatch.setattr(dialer_module, "check_number", check_number)
+
+    def campaign():
+        return CampaignDialer(
+            dispatch, trunk_pool=TrunkPool({"ST_a": 3}), max_concurrent=3,
+            calls_per_second=1000, checkpoint_path=checkpoint, checkpoint_interval=1,
+        )
+
+    paused = campaign()
+    with pytest.raises(RuntimeError, match="dnc unavailable"):
+        asyncio.run(paused.run(iter_contacts(source)))
+    assert len(dispatch.dialed) == 9 and paused.suppressed == 1
+    assert paused.checkpoint.next_index == 10 and not paused.checkpoint.done_above
+
+    lost["at"] = 10_000
+    resumed = campaign()
+    asyncio.run(resumed.run(iter_contacts(source, start=resumed.checkpoint.next_index)))
+    assert sorted(dispatch.dialed) == sorted(c.phone_number for c in iter_contacts(source) if c.index != 3)
+
+
+def test_slots_are_released_when_dialing_is_cancelled(tmp_path):
+    source = write_contacts(tmp_path / "contacts.csv", 3)
+    dispatch = FakeDispatch()
+
+    async def scenario():
+        dispatch.gate = asyncio.Event()
+        dialer = CampaignDialer(dispatch, trunk_pool=TrunkPool({"ST_a": 1}), max_concurrent=5, calls_per_second=1000)
+        run = asyncio.create_task(dialer.run(iter_contacts(source)))
+        # The first call holds the only trunk slot; the second waits for it with a global slot taken
+        while not dispatch.dialed:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        assert dialer._slots._value == 4
+        dispatch.gate.set()
+        await asyncio.gather(*dialer._tasks)
+        assert dialer._slots._value == 5
+        assert dialer.trunk_pool.trunks["ST_a"].active == 0
+
+    asyncio.run(scenario())
+
+
+def test_token_bucket_needs_a_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+class FakeLiveKitAPI:
+    """Rooms that appear some polls after dispatch and carry the agent's outcome in their metadata"""
+
+    def __init__(self, polls):
+        self.polls = list(polls)
+        self.dispatched = []
+        self.agent_dispatch = SimpleNamespace(create_dispatch=self._create_dispatch)
+        self.room = SimpleNamespace(list_rooms=self._list_rooms)
+
+    async def _create_dispatch(self, request):
+        self.dispatched.append(request)
+
+    async def _list_rooms(self, request):
+        metadata = self.polls.pop(0) if self.polls else None
+        rooms = [] if metadata is None else [SimpleNamespace(metadata=metadata)]
+        return SimpleNamespace(rooms=rooms)
+
+
+def test_livekit_dispatcher_waits_for_the_room_and_returns_its_outcome():
+    outcome = outcome_metadata(answered=False, latency=2.5, sip_status_code="486")
+    # Not created yet, ringing, then the agent's outcome, then closed
+    lkapi = FakeLiveKitAPI([None, None, "", outcome, outcome, None])
+    dispatcher = LiveKitDispatcher(agent_name="agent", poll_interval=0.001, lkapi=lkapi)
+
+    result = asyncio.run(dispatcher({"phone_number": "+15550000000"}))
+
+    assert result == {"answered": False, "latency": 2.5, "sip_status_code": "486"}
+    assert len(lkapi.dispatched) == 1 and not lkapi.polls
+
+
+def test_livekit_dispatcher_gives_up_on_a_room_that_never_starts():
+    dispatcher = LiveKitDispatcher(agent_name="agent", poll_interval=0.001, start_timeout=0.01, lkapi=FakeLiveKitAPI([]))
+    with pytest.raises(TimeoutError):
+        asyncio.run(dispatcher({"phone_number": "+15550000000"}))
@@ -0,0 +1,106 @@
+import asyncio
+import socket
+
+from aiohttp import web
+
+from webhook_service import WebhookOutbox, WebhookService
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeReceiver:
+    """Webhook endpoint that records every delivery; `statuses` are answered in turn, then 200"""
+
+    def __init__(self, statuses=(), delay: float = 0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.received = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.received.append(await request.json())
+        await asyncio.sleep(self.delay)
+        return web.Response(status=self.statuses.pop(0) if self.statuses else 200)
+
+
+async def _with_service(tmp_path, receiver, scenario, **options):
+    port = _free_port()
+    app = web.Application()
+    app.router.add_post("/hook", receiver.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    service = WebhookService(outbox=WebhookOutbox(str(tmp_path / "outbox.db")), base_delay=0.01, **options)
+    try:
+        await scenario(service, f"http://127.0.0.1:{port}/hook")
+    finally:
+        await service.aclose()
+        await runner.cleanup()
+    return service
+
+
+async def _until(condition, timeout: float = 5.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def test_retries_after_server_error(tmp_path):
+    receiver = FakeReceiver(statuses=[503])
+
+    async def scenario(service, url):
+        service.send_notification(url, {"status": "answered"}, room_name="call-1")
+        await _until(lambda: service.sent)
+
+    service = asyncio.run(_with_service(tmp_path, receiver, scenario, max_attempts=5))
+    assert len(receiver.received) == 2 and receiver.received[0] == receiver.received[1]
+    assert receiver.received[0]["room_name"] == "call-1"
+    assert service.retried == 1 and service.dead == 0
+    assert service.stats()["pending"] == 0
+
+
+def test_dead_letter_after_max_attempts(tmp_path):
+    receiver = FakeReceiver(statuses=[503] * 10)
+
+    async def scenario(service, url):
+        service.send_notification(url, {"status": "failed"})
+        await _until(lambda: service.dead)
+
+    service = asyncio.run(_with_service(tmp_path, receiver, scenario, max_attempts=3))
+    assert len(receiver.received) == 3
+    assert service.sent == 0 and service.retried == 2
+    assert service.stats()["dead"] == 1 and service.stats()["pending"] == 0
+
+
+def test_new_service_delivers_events_left_in_the_outbox(tmp_path):
+    receiver = FakeReceiver()
+
+    async def scenario(service, url):
+        # Written by a process that exited before delivering it
+        left = WebhookOutbox(str(tmp_path / "outbox.db"))
+        left.add(url, {"status": "completed", "event_id": "left-over"})
+        left.close()
+        service.start()
+        await _until(lambda: service.sent)
+
+    asyncio.run(_with_service(tmp_path, receiver, scenario))
+    assert [event["event_id"] for event in receiver.received] == ["left-over"]
+
+
+def test_flush_waits_for_deliveries_in_flight(tmp_path):
+    receiver = FakeReceiver(delay=0.3)
+
+    async def scenario(service, url):
+        service.send_notification(url, {"status": "completed"})
+        await _until(lambda: receiver.received)
+        assert service.sent == 0
+        await service.flush(timeout=5.0)
+        assert service.sent == 1
+
+    service = asyncio.run(_with_service(tmp_path, receiver, scenario))
+    assert service.stats()["pending"] == 0
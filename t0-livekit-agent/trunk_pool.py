@@ -0,0 +1,290 @@
+"""
+SIP trunk pool for outbound AI agent.
+Selects a trunk per call, weighted by each trunk's recent answer rate, call setup
+latency and SIP failures, and ejects trunks that keep failing for a while.
+The pool lives in the campaign dialer; the agent only reports each call's
+outcome back to it.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# SIP status code -> (webhook status, reason). These are callee outcomes: the
+# trunk delivered the call, so they lower the answer rate but aren't trunk faults.
+SIP_FAILURE_REASONS: Dict[str, Tuple[str, str]] = {
+    "486": ("rejected", "Number is busy"),
+    "480": ("failed", "Number not reachable/not found"),
+    "404": ("failed", "Number not reachable/not found"),
+    "603": ("rejected", "Call declined"),
+    "408": ("failed", "Call timeout/cancelled"),
+    "487": ("failed", "Call timeout/cancelled"),
+}
+
+
+def classify_sip_failure(sip_status_code: Optional[str]) -> Tuple[str, Optional[str]]:
+    """Map a SIP status code to the webhook status and a human readable reason"""
+    return SIP_FAILURE_REASONS.get(str(sip_status_code), ("failed", None))
+
+
+def is_trunk_fault(sip_status_code: Optional[str]) -> bool:
+    """Any SIP status that isn't a known callee outcome (503s, auth errors) counts against the trunk"""
+    return bool(sip_status_code) and str(sip_status_code) not in SIP_FAILURE_REASONS
+
+
+# Room metadata key where the agent leaves the SIP outcome for the campaign dialer
+OUTCOME_KEY = "call_outcome"
+
+
+def outcome_metadata(answered: bool, latency: float, sip_status_code: Optional[str] = None,
+                     fault: Optional[bool] = None) -> str:
+    """Room metadata carrying one `create_sip_participant` outcome"""
+    outcome = {"answered": answered, "latency": round(latency, 3), "sip_status_code": sip_status_code}
+    if fault is not None:
+        outcome["fault"] = fault
+    return json.dumps({OUTCOME_KEY: outcome})
+
+
+def parse_outcome(metadata: str) -> Optional[dict]:
+    """The outcome in a room's metadata, if the agent left one"""
+    try:
+        outcome = json.loads(metadata or "{}").get(OUTCOME_KEY)
+    except (ValueError, AttributeError):
+        return None
+    return outcome if isinstance(outcome, dict) else None
+
+
+@dataclass
+class CallAttempt:
+    answered: bool
+    latency: float
+    fault: bool
+    sip_status_code: Optional[str] = None
+
+
+@dataclass
+class TrunkState:
+    """Rolling health stats and live load for one trunk"""
+    trunk_id: str
+    max_calls: int
+    window: int
+    active: int = 0
+    attempts: Deque[CallAttempt] = field(default_factory=deque)
+    consecutive_faults: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    selected: int = 0
+    status_codes: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, attempt: CallAttempt):
+        self.attempts.append(attempt)
+        if len(self.attempts) > self.window:
+            self.attempts.popleft()
+        self.consecutive_faults = self.consecutive_faults + 1 if attempt.fault else 0
+        if attempt.sip_status_code:
+            self.status_codes[attempt.sip_status_code] = self.status_codes.get(attempt.sip_status_code, 0) + 1
+
+    @property
+    def answer_rate(self) -> float:
+        # Laplace smoothing keeps new trunks in rotation until they have history
+        answered = sum(1 for a in self.attempts if a.answered)
+        return (answered + 1) / (len(self.attempts) + 2)
+
+    @property
+    def fault_rate(self) -> float:
+        if not self.attempts:
+            return 0.0
+        return sum(1 for a in self.attempts if a.fault) / len(self.attempts)
+
+    @property
+    def avg_latency(self) -> float:
+        if not self.attempts:
+            return 0.0
+        return sum(a.latency for a in self.attempts) / len(self.attempts)
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def has_capacity(self) -> bool:
+        return self.active < self.max_calls
+
+
+class TrunkPool:
+    """
+    Health-scored trunk selection with per-trunk concurrency caps.
+
+    Score is answer rate x latency factor x (1 - fault rate); trunks are picked at
+    random in proportion to their score so a degraded trunk still gets probed.
+    A trunk with `eject_after` consecutive faults, or a fault rate above
+    `eject_fault_rate` over the window, is ejected with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        trunk_caps: Dict[str, int],
+        window: int = 50,
+        latency_reference: float = 5.0,
+        eject_after: int = 3,
+        eject_fault_rate: float = 0.5,
+        eject_min_samples: int = 10,
+        eject_seconds: Optional[float] = None,
+        max_eject_seconds: float = 600.0,
+    ):
+        if not trunk_caps:
+            raise ValueError("TrunkPool needs at least one trunk")
+        self.trunks: Dict[str, TrunkState] = {
+            trunk_id: TrunkState(trunk_id=trunk_id, max_calls=cap, window=window)
+            for trunk_id, cap in trunk_caps.items()
+        }
+        self.latency_reference = latency_reference
+        self.eject_after = eject_after
+        self.eject_fault_rate = eject_fault_rate
+        self.eject_min_samples = eject_min_samples
+        self.eject_seconds = eject_seconds or settings.SIP_TRUNK_EJECTION_SECONDS
+        self.max_eject_seconds = max_eject_seconds
+        self._slots = asyncio.Condition()
+
+    @classmethod
+    def from_settings(cls) -> "TrunkPool":
+        """Build a pool from SIP_OUTBOUND_TRUNKS (`ID:CAP,ID:CAP`), or the single SIP_OUTBOUND_TRUNK_ID"""
+        return cls(parse_trunk_spec(settings.SIP_OUTBOUND_TRUNKS), window=settings.SIP_TRUNK_HEALTH_WINDOW)
+
+    def score(self, trunk: TrunkState) -> float:
+        latency_factor = 1.0 / (1.0 + trunk.avg_latency / self.latency_reference)
+        return max(trunk.answer_rate * latency_factor * (1.0 - trunk.fault_rate), 1e-3)
+
+    def _choose(self, preferred: Optional[str] = None) -> Optional[TrunkState]:
+        if preferred and preferred in self.trunks:
+            trunk = self.trunks[preferred]
+            return trunk if trunk.has_capacity() else None
+
+        now = time.monotonic()
+        available = [t for t in self.trunks.values() if t.has_capacity()]
+        if not available:
+            return None
+
+        healthy = [t for t in available if not t.is_ejected(now)]
+        if not healthy:
+            # Every trunk with room is ejected; probe the one closest to coming back
+            # rather than stalling all calls
+            return min(available, key=lambda t: t.ejected_until)
+
+        weights = [self.score(t) for t in healthy]
+        return random.choices(healthy, weights=weights, k=1)[0]
+
+    async def acquire(self, preferred: Optional[str] = None) -> str:
+        """Reserve a call slot, waiting for capacity if every trunk is full, and return the trunk ID"""
+        if preferred and preferred not in self.trunks:
+            self.trunks[preferred] = TrunkState(
+                trunk_id=preferred,
+                max_calls=settings.CAMPAIGN_MAX_CALLS_PER_TRUNK,
+                window=next(iter(self.trunks.values())).window,
+            )
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._choose(preferred) is not None)
+            trunk = self._choose(preferred)
+            trunk.active += 1
+            trunk.selected += 1
+            return trunk.trunk_id
+
+    async def release(self, trunk_id: str):
+        async with self._slots:
+            trunk = self.trunks[trunk_id]
+            trunk.active = max(0, trunk.active - 1)
+            self._slots.notify_all()
+
+    def record(self, trunk_id: str, answered: bool, latency: float, sip_status_code: Optional[str] = None,
+               fault: Optional[bool] = None):
+        """
+        Record the outcome of a `create_sip_participant` attempt
+
+        Args:
+            trunk_id: Trunk the call was placed on
+            answered: Whether the callee picked up
+            latency: Seconds spent in `create_sip_participant`
+            sip_status_code: SIP status of a failed call, if any
+            fault: Override whether the failure is the trunk's fault
+        """
+        trunk = self.trunks.get(trunk_id)
+        if trunk is None:
+            return
+        if fault is None:
+            fault = not answered and is_trunk_fault(sip_status_code)
+        trunk.record(CallAttempt(answered=answered, latency=latency, fault=fault, sip_status_code=sip_status_code))
+
+        if fault and self._should_eject(trunk):
+            self._eject(trunk)
+
+    def _should_eject(self, trunk: TrunkState) -> bool:
+        if trunk.is_ejected(time.monotonic()):
+            return False
+        if trunk.consecutive_faults >= self.eject_after:
+            return True
+        return len(trunk.attempts) >= self.eject_min_samples and trunk.fault_rate >= self.eject_fault_rate
+
+    def _eject(self, trunk: TrunkState):
+        trunk.ejections += 1
+        duration = min(self.eject_seconds * 2 ** (trunk.ejections - 1), self.max_eject_seconds)
+        trunk.ejected_until = time.monotonic() + duration
+        trunk.consecutive_faults = 0
+        logger.warning(
+            f"🚫 Trunk ejected | Trunk: {trunk.trunk_id} | For: {duration:.0f}s | "
+            f"Fault rate: {trunk.fault_rate:.0%} | Codes: {trunk.status_codes}"
+        )
+
+    def stats(self) -> Dict[str, dict]:
+        """Selection and health stats per trunk"""
+        now = time.monotonic()
+        return {
+            trunk_id: {
+                "active": trunk.active,
+                "max_calls": trunk.max_calls,
+                "selected": trunk.selected,
+                "score": round(self.score(trunk), 4),
+                "answer_rate": round(trunk.answer_rate, 4),
+                "fault_rate": round(trunk.fault_rate, 4),
+                "avg_latency": round(trunk.avg_latency, 3),
+                "ejected": trunk.is_ejected(now),
+                "ejections": trunk.ejections,
+                "status_codes": dict(trunk.status_codes),
+            }
+            for trunk_id, trunk in self.trunks.items()
+        }
+
+    def log_stats(self):
+        for trunk_id, s in self.stats().items():
+            logger.info(
+                f"☎️ Trunk {trunk_id} | Active: {s['active']}/{s['max_calls']} | Selected: {s['selected']} | "
+                f"Score: {s['score']:.3f} | Answer: {s['answer_rate']:.0%} | Faults: {s['fault_rate']:.0%} | "
+                f"Latency: {s['avg_latency']:.2f}s | Ejected: {s['ejected']}"
+            )
+
+
+def fallback_trunk() -> str:
+    """
+    Trunk for a call dispatched without one (not through the campaign dialer)
+
+    Job processes run one call each, so the agent keeps no health or caps of
+    its own: it picks one of the configured trunks at random and reports the
+    outcome for the dialer's pool.
+    """
+    return random.choice(list(parse_trunk_spec(settings.SIP_OUTBOUND_TRUNKS)))
+
+
+def parse_trunk_spec(spec: str) -> Dict[str, int]:
+    """Parse `ID[:CAP],ID[:CAP]` into a trunk -> concurrency cap mapping"""
+    caps = {}
+    for item in spec.split(","):
+        trunk_id, _, cap = item.strip().partition(":")
+        if trunk_id:
+            caps[trunk_id] = int(cap) if cap else settings.CAMPAIGN_MAX_CALLS_PER_TRUNK
+    return caps or {settings.SIP_OUTBOUND_TRUNK_ID: settings.CAMPAIGN_MAX_CALLS_PER_TRUNK}
@@ -0,0 +1,314 @@
+"""
+TTS audio cache for outbound AI agent.
+Wraps a TTS so phrases synthesized whole (the pre-rendered greeting, or every
+sentence with a non-streaming provider) are served from a size-bounded,
+memory-mapped PCM cache on disk instead of re-synthesized. Streamed replies
+still go straight to the provider's streaming API.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+from livekit.agents import APIConnectOptions, tts
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+from core import settings
+from latency_tracker import register_metrics_source
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# magic, sample rate, channels
+_HEADER = struct.Struct("<4sIH")
+_MAGIC = b"TTS1"
+# Push cached audio in ~100ms slices so playback starts immediately
+_CHUNK_MS = 100
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace; case and punctuation are kept because they change prosody"""
+    return " ".join(text.split())
+
+
+class DiskAudioCache:
+    """
+    Size-bounded LRU of PCM clips on disk, shared by every process on the host
+
+    Each process keeps its own recency index, seeded from file mtimes; hits
+    touch the file so other processes see them as recent. When a write takes
+    the cache over `max_bytes`, the directory is rescanned first, so eviction
+    sees every process' clips and the bound holds for the shared directory.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_written = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".pcm"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        self._index.clear()
+        self.total_bytes = 0
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+
+    def get(self, key: str):
+        """Return (sample_rate, num_channels, mmap) for a cached clip, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.misses += 1
+                if key in self._index:
+                    self.total_bytes -= self._index.pop(key)
+            return None
+
+        magic, sample_rate, num_channels = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC:
+            mapped.close()
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+        return sample_rate, num_channels, mapped
+
+    def put(self, key: str, sample_rate: int, num_channels: int, pcm: bytes):
+        path = self._path(key)
+        # Write then rename so readers in other processes never map a partial clip
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, sample_rate, num_channels))
+            f.write(pcm)
+        os.replace(tmp_path, path)
+
+        size = _HEADER.size + len(pcm)
+        with self._lock:
+            if key in self._index:
+                self.total_bytes -= self._index.pop(key)
+            self._index[key] = size
+            self.total_bytes += size
+            self.bytes_written += size
+            if self.total_bytes > self.max_bytes:
+                # Other processes have been writing too; evict from the directory as it is now
+                self._scan()
+                self._evict()
+
+    def served(self, size: int):
+        with self._lock:
+            self.bytes_served += size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_served": self.bytes_served,
+            "bytes_written": self.bytes_written,
+            "bytes_on_disk": self.total_bytes,
+            "entries": len(self._index),
+            "evictions": self.evictions,
+        }
+
+    def render_prometheus(self) -> str:
+        s = self.stats()
+        lines = [
+            "# TYPE agent_tts_cache_hits_total counter",
+            f"agent_tts_cache_hits_total {s['hits']}",
+            "# TYPE agent_tts_cache_misses_total counter",
+            f"agent_tts_cache_misses_total {s['misses']}",
+            "# TYPE agent_tts_cache_served_bytes_total counter",
+            f"agent_tts_cache_served_bytes_total {s['bytes_served']}",
+            "# TYPE agent_tts_cache_written_bytes_total counter",
+            f"agent_tts_cache_written_bytes_total {s['bytes_written']}",
+            "# TYPE agent_tts_cache_disk_bytes gauge",
+            f"agent_tts_cache_disk_bytes {s['bytes_on_disk']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class CachedTTS(tts.TTS):
+    """
+    TTS wrapper that serves repeated phrases from a DiskAudioCache.
+
+    `synthesize` is a cache lookup keyed by (provider, model, voice, settings,
+    normalized text); misses stream from the wrapped TTS while being recorded
+    for next time. `stream` is the wrapped TTS' own, so with a streaming
+    provider LLM replies keep their latency and only phrases synthesized whole
+    hit the cache. With a non-streaming provider AgentSession splits replies
+    into sentences and each one is looked up.
+    """
+
+    def __init__(
+        self,
+        wrapped: tts.TTS,
+        cache: DiskAudioCache,
+        voice: str = "",
+        voice_settings: Optional[dict] = None,
+        max_text_chars: int = 200,
+    ):
+        super().__init__(
+            capabilities=tts.TTSCapabilities(
+                streaming=wrapped.capabilities.streaming,
+                aligned_transcript=wrapped.capabilities.aligned_transcript,
+            ),
+            sample_rate=wrapped.sample_rate,
+            num_channels=wrapped.num_channels,
+        )
+        self.wrapped = wrapped
+        self.cache = cache
+        self.voice = voice
+        self.voice_settings = voice_settings or {}
+        self.max_text_chars = max_text_chars
+
+        # Streams and misses are the wrapped TTS' requests; cache hits cost nothing and report nothing
+        @wrapped.on("metrics_collected")
+        def _forward_metrics(*args: Any, **kwargs: Any):
+            self.emit("metrics_collected", *args, **kwargs)
+
+    @property
+    def model(self) -> str:
+        return getattr(self.wrapped, "model", "unknown")
+
+    @property
+    def provider(self) -> str:
+        return getattr(self.wrapped, "provider", type(self.wrapped).__module__)
+
+    def cache_key(self, text: str) -> str:
+        # A routed TTS reports the voice of whichever candidate is serving the call
+        voice = getattr(self.wrapped, "cache_voice", None) or self.voice
+        key = json.dumps(
+            [self.provider, self.model, voice, self.voice_settings, self.sample_rate, normalize_text(text)],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "CachedChunkedStream":
+        return CachedChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+    def stream(self, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> tts.SynthesizeStream:
+        return self.wrapped.stream(conn_options=conn_options)
+
+    def prewarm(self):
+        self.wrapped.prewarm()
+
+    async def aclose(self):
+        await self.wrapped.aclose()
+
+
+class CachedChunkedStream(tts.ChunkedStream):
+    def __init__(self, *, tts: CachedTTS, input_text: str, conn_options: APIConnectOptions):
+        super().__init__(tts=tts, input_text=input_text, conn_options=conn_options)
+        self._cached_tts = tts
+
+    async def _metrics_monitor_task(self, event_aiter):
+        pass  # misses are reported by the wrapped stream
+
+    async def _run(self, output_emitter: tts.AudioEmitter):
+        cached_tts = self._cached_tts
+        cache = cached_tts.cache
+        text = self.input_text
+        cacheable = 0 < len(text) <= cached_tts.max_text_chars
+        key = cached_tts.cache_key(text) if cacheable else None
+
+        hit = cache.get(key) if key else None
+        if hit is not None:
+            sample_rate, num_channels, mapped = hit
+            output_emitter.initialize(
+                request_id=key[:16],
+                sample_rate=sample_rate,
+                num_channels=num_channels,
+                mime_type="audio/pcm",
+            )
+            chunk = sample_rate * num_channels * 2 * _CHUNK_MS // 1000
+            view = memoryview(mapped)
+            try:
+                for offset in range(_HEADER.size, len(mapped), chunk):
+                    output_emitter.push(view[offset:offset + chunk].tobytes())
+                cache.served(len(mapped) - _HEADER.size)
+            finally:
+                view.release()
+                mapped.close()
+            output_emitter.flush()
+            return
+
+        pcm = bytearray() if cacheable else None
+        frame = None
+        async with cached_tts.wrapped.synthesize(text, conn_options=self._conn_options) as stream:
+            async for audio in stream:
+                if frame is None:
+                    output_emitter.initialize(
+                        request_id=audio.request_id,
+                        sample_rate=audio.frame.sample_rate,
+                        num_channels=audio.frame.num_channels,
+                        mime_type="audio/pcm",
+                    )
+                frame = audio.frame
+                data = bytes(frame.data)
+                output_emitter.push(data)
+                if pcm is not None:
+                    pcm.extend(data)
+
+        if frame is not None:
+            output_emitter.flush()
+            if pcm:
+                try:
+                    cache.put(key, frame.sample_rate, frame.num_channels, bytes(pcm))
+                except OSError as e:
+                    logger.warning(f"⚠️ TTS cache write failed: {e}")
+
+
+_cache: Optional[DiskAudioCache] = None
+
+
+def get_audio_cache() -> Optional[DiskAudioCache]:
+    """Process-wide disk cache from settings, or None when TTS_CACHE_DIR is empty"""
+    global _cache
+    if _cache is None and settings.TTS_CACHE_DIR:
+        _cache = DiskAudioCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_MB * 1024 * 1024)
+        register_metrics_source(_cache.render_prometheus)
+    return _cache
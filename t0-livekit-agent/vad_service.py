@@ -0,0 +1,415 @@
+"""
+Shared VAD inference for outbound AI agent.
+One process per host runs the Silero VAD model for every active call, in
+micro-batches. Job processes exchange audio windows and speech probabilities
+with it through shared memory and only send tiny wake-up datagrams over a Unix
+socket, so per-window inference overhead is paid once per batch, not per call.
+
+    python vad_service.py                    # sidecar, socket from VAD_SERVICE_SOCKET
+
+The end-of-turn model is not served here: livekit-agents already runs the
+multilingual turn detector in the worker's single inference process, shared by
+all of that worker's jobs.
+"""
+
+import argparse
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core import settings
+from latency_tracker import LatencyHistogram, register_metrics_source
+from logger import get_logger
+from model_store import mapped_session, silero_model_path, silero_options
+
+logger = get_logger(__name__)
+
+SAMPLE_RATE = 16000
+WINDOW_SAMPLES = 512
+CONTEXT_SAMPLES = 64
+INPUT_SAMPLES = CONTEXT_SAMPLES + WINDOW_SAMPLES
+
+# Per slot: request seq, response seq, speech probability, then the float32 input
+_SLOT_HEADER = struct.Struct("<IIf4x")
+SLOT_BYTES = _SLOT_HEADER.size + INPUT_SAMPLES * 4
+
+# Datagrams: kind + slot. O(pen), S(lot assigned, followed by the shm name), R(un), D(one), C(lose)
+_MESSAGE = struct.Struct("<cI")
+
+
+def _new_onnx_session(threads: int = 1):
+    from livekit.plugins.silero import onnx_model
+
+    if threads <= 1:
+        return onnx_model.new_inference_session(force_cpu=True)
+
+    import importlib.resources
+
+    import onnxruntime
+
+    opts = onnxruntime.SessionOptions()
+    opts.intra_op_num_threads = threads
+    opts.inter_op_num_threads = 1
+    model = importlib.resources.files("livekit.plugins.silero.resources") / "silero_vad.onnx"
+    return onnxruntime.InferenceSession(model.read_bytes(), sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+class VADInferenceServer:
+    """
+    Batches VAD windows from every job process on the host
+
+    A batch runs as soon as `max_batch` windows are waiting, or `max_wait`
+    seconds after the first one arrived, whichever comes first; `max_wait`
+    bounds the latency the service adds to each 32ms window.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        max_slots: Optional[int] = None,
+        max_batch: Optional[int] = None,
+        max_wait: Optional[float] = None,
+        threads: int = 1,
+    ):
+        self.socket_path = socket_path
+        self.max_slots = max_slots or settings.VAD_SERVICE_MAX_SLOTS
+        self.max_batch = max_batch or settings.VAD_SERVICE_MAX_BATCH
+        self.max_wait = max_wait if max_wait is not None else settings.VAD_SERVICE_MAX_WAIT_MS / 1000
+        self.session = _new_onnx_session(threads)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.max_slots * SLOT_BYTES)
+        self._free: List[int] = list(range(self.max_slots - 1, -1, -1))
+        self._clients: Dict[int, str] = {}
+        self._sr = np.array(SAMPLE_RATE, dtype=np.int64)
+        self._state = np.zeros((2, self.max_batch, 128), dtype=np.float32)
+        self._inputs = np.zeros((self.max_batch, INPUT_SAMPLES), dtype=np.float32)
+        self._running = False
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(socket_path)
+
+        self.batches = 0
+        self.windows = 0
+        self.queue_wait = LatencyHistogram(max_seconds=1.0)
+        self.inference = LatencyHistogram(max_seconds=1.0)
+
+    def _slot_view(self, slot: int) -> np.ndarray:
+        offset = slot * SLOT_BYTES + _SLOT_HEADER.size
+        return np.ndarray((INPUT_SAMPLES,), dtype=np.float32, buffer=self.shm.buf, offset=offset)
+
+    def _send(self, kind: bytes, slot: int, address: str, extra: bytes = b"") -> bool:
+        try:
+            self.sock.sendto(_MESSAGE.pack(kind, slot) + extra, address)
+            return True
+        except OSError:
+            # The job process is gone; give its slot back
+            self._release(slot)
+            return False
+
+    def _release(self, slot: int):
+        if self._clients.pop(slot, None) is not None:
+            self._free.append(slot)
+
+    def _handle(self, data: bytes, address: str, batch: List[int]):
+        kind, slot = _MESSAGE.unpack_from(data)
+        if kind == b"R":
+            if self._clients.get(slot) == address:
+                batch.append(slot)
+        elif kind == b"O":
+            if not self._free:
+                logger.warning(f"⚠️ VAD service is full ({self.max_slots} slots); client falls back to local VAD")
+                self._send(b"S", 0xFFFFFFFF, address)
+                return
+            slot = self._free.pop()
+            self._clients[slot] = address
+            _SLOT_HEADER.pack_into(self.shm.buf, slot * SLOT_BYTES, 0, 0, 0.0)
+            self._send(b"S", slot, address, self.shm.name.encode("utf-8"))
+        elif kind == b"C":
+            if self._clients.get(slot) == address:
+                self._release(slot)
+
+    def _run_batch(self, slots: List[int], first_at: float):
+        started = time.perf_counter()
+        self.queue_wait.record(started - first_at)
+        for start in range(0, len(slots), self.max_batch):
+            chunk = slots[start:start + self.max_batch]
+            n = len(chunk)
+            for i, slot in enumerate(chunk):
+                self._inputs[i] = self._slot_view(slot)
+            # Silero's OnnxModel never feeds stateN back, so every window starts from a
+            # zero state; do the same so shared and per-process VADs agree
+            self._state[:, :n].fill(0.0)
+            out, _ = self.session.run(
+                None, {"input": self._inputs[:n], "state": self._state[:, :n], "sr": self._sr}
+            )
+            for i, slot in enumerate(chunk):
+                offset = slot * SLOT_BYTES
+                seq, _, _ = _SLOT_HEADER.unpack_from(self.shm.buf, offset)
+                _SLOT_HEADER.pack_into(self.shm.buf, offset, seq, seq, float(out[i, 0]))
+                address = self._clients.get(slot)
+                if address is not None:
+                    self._send(b"D", slot, address)
+        self.inference.record(time.perf_counter() - started)
+        self.batches += 1
+        self.windows += len(slots)
+
+    def serve_forever(self, stats_interval: float = 60.0):
+        self._running = True
+        next_stats = time.monotonic() + stats_interval
+        logger.info(
+            f"🎙️ VAD service listening | Socket: {self.socket_path} | Slots: {self.max_slots} | "
+            f"Max batch: {self.max_batch} | Max wait: {self.max_wait * 1000:.1f}ms"
+        )
+        while self._running:
+            batch: List[int] = []
+            self.sock.settimeout(1.0)
+            try:
+                data, address = self.sock.recvfrom(256)
+            except socket.timeout:
+                continue
+            first_at = time.perf_counter()
+            self._handle(data, address, batch)
+
+            deadline = first_at + self.max_wait
+            while batch and len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.sock.settimeout(remaining)
+                try:
+                    data, address = self.sock.recvfrom(256)
+                except socket.timeout:
+                    break
+                self._handle(data, address, batch)
+
+            if batch:
+                self._run_batch(batch, first_at)
+
+            if time.monotonic() >= next_stats:
+                self.log_stats()
+                next_stats = time.monotonic() + stats_interval
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.shm.close()
+        self.shm.unlink()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "batches": self.batches,
+            "windows": self.windows,
+            "mean_batch": round(self.windows / self.batches, 2) if self.batches else 0.0,
+            "queue_wait_ms_p99": round(self.queue_wait.percentile(0.99) * 1000, 3),
+            "inference_ms_p50": round(self.inference.percentile(0.5) * 1000, 3),
+            "inference_ms_p99": round(self.inference.percentile(0.99) * 1000, 3),
+        }
+
+    def log_stats(self):
+        s = self.stats()
+        logger.info(
+            f"🎙️ VAD SERVICE | Clients: {s['clients']} | Batches: {s['batches']} | Mean batch: {s['mean_batch']} | "
+            f"Queue wait p99: {s['queue_wait_ms_p99']}ms | Inference p50/p99: {s['inference_ms_p50']}/{s['inference_ms_p99']}ms"
+        )
+
+    def render_prometheus(self) -> str:
+        s = self.stats()
+        return "\n".join([
+            "# TYPE agent_vad_service_windows_total counter",
+            f"agent_vad_service_windows_total {s['windows']}",
+            "# TYPE agent_vad_service_batches_total counter",
+            f"agent_vad_service_batches_total {s['batches']}",
+            "# TYPE agent_vad_service_clients gauge",
+            f"agent_vad_service_clients {s['clients']}",
+        ]) + "\n"
+
+
+# Round trips from job processes to the service, per process
+client_roundtrip = LatencyHistogram(max_seconds=1.0)
+_local_session = None
+_local_lock = threading.Lock()
+
+
+def _get_local_session():
+    global _local_session
+    with _local_lock:
+        if _local_session is None:
+            _local_session = mapped_session(silero_model_path(), "silero_vad")
+        return _local_session
+
+
+class SharedVADModel:
+    """
+    Drop-in for silero's OnnxModel that runs inference in the VAD service
+
+    Called from the VAD stream's executor thread, so blocking on the reply is
+    fine. If the service is unreachable or slower than `timeout`, this stream
+    switches to a local model for the rest of the call.
+    """
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._context = np.zeros(CONTEXT_SAMPLES, dtype=np.float32)
+        self._sock: Optional[socket.socket] = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._slot: Optional[int] = None
+        self._seq = 0
+        self._local = None
+        self._connect()
+
+    @property
+    def sample_rate(self) -> int:
+        return SAMPLE_RATE
+
+    @property
+    def window_size_samples(self) -> int:
+        return WINDOW_SAMPLES
+
+    @property
+    def context_size(self) -> int:
+        return CONTEXT_SAMPLES
+
+    def _connect(self):
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            # Abstract address: nothing to clean up if the process dies
+            sock.bind(f"\0vad-client-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            sock.settimeout(max(self.timeout, 1.0))
+            sock.sendto(_MESSAGE.pack(b"O", 0), self.socket_path)
+            data = sock.recv(256)
+            _, slot = _MESSAGE.unpack_from(data)
+            if slot == 0xFFFFFFFF:
+                raise OSError("VAD service has no free slots")
+            shm = shared_memory.SharedMemory(name=data[_MESSAGE.size:].decode("utf-8"))
+            # Attaching registers the block with this process' resource tracker, which
+            # would unlink it at exit; the service owns it
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except OSError as e:
+            logger.warning(f"⚠️ VAD service unavailable ({e}); using local VAD")
+            self._fallback()
+            return
+        sock.settimeout(self.timeout)
+        self._sock, self._shm, self._slot = sock, shm, slot
+        offset = slot * SLOT_BYTES
+        self._input = np.ndarray((INPUT_SAMPLES,), dtype=np.float32, buffer=shm.buf, offset=offset + _SLOT_HEADER.size)
+
+    def _fallback(self):
+        from livekit.plugins.silero import onnx_model
+
+        self.close()
+        self._local = onnx_model.OnnxModel(onnx_session=_get_local_session(), sample_rate=SAMPLE_RATE)
+
+    def __call__(self, x: np.ndarray) -> float:
+        if self._local is not None:
+            return self._local(x)
+
+        self._input[:CONTEXT_SAMPLES] = self._context
+        self._input[CONTEXT_SAMPLES:] = x
+        self._context = np.array(x[-CONTEXT_SAMPLES:], dtype=np.float32)
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        offset = self._slot * SLOT_BYTES
+        struct.pack_into("<I", self._shm.buf, offset, self._seq)
+
+        started = time.perf_counter()
+        try:
+            self._sock.sendto(_MESSAGE.pack(b"R", self._slot), self.socket_path)
+            while True:
+                self._sock.recv(256)
+                _, done_seq, prob = _SLOT_HEADER.unpack_from(self._shm.buf, offset)
+                # Replies to earlier, timed-out windows are skipped
+                if done_seq == self._seq:
+                    break
+        except OSError as e:
+            logger.warning(f"⚠️ VAD service round trip failed ({e}); switching this call to local VAD")
+            self._fallback()
+            return self._local(x)
+        client_roundtrip.record(time.perf_counter() - started)
+        return prob
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.sendto(_MESSAGE.pack(b"C", self._slot), self.socket_path)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+        if self._shm is not None:
+            self._input = None
+            self._shm.close()
+            self._shm = None
+
+    def __del__(self):
+        self.close()
+
+
+def _render_client_metrics() -> str:
+    lines = ["# TYPE agent_vad_service_roundtrip_seconds summary"]
+    for q in (0.5, 0.99):
+        lines.append(f'agent_vad_service_roundtrip_seconds{{quantile="{q}"}} {client_roundtrip.percentile(q):.6f}')
+    lines.append(f"agent_vad_service_roundtrip_seconds_count {client_roundtrip.count}")
+    return "\n".join(lines) + "\n"
+
+
+def load_shared_vad(socket_path: Optional[str] = None, **options):
+    """
+    Silero VAD whose streams run inference in the host's VAD service
+
+    Takes the same options as `silero.VAD.load`. No ONNX session is created in
+    the job process unless it has to fall back to local inference.
+    """
+    from livekit.plugins import silero
+
+    class SharedVAD(silero.VAD):
+        def stream(self):
+            stream = silero.vad.VADStream(self, self._opts, SharedVADModel(self._socket_path, self._timeout))
+            self._streams.add(stream)
+            return stream
+
+    vad = SharedVAD(session=None, opts=silero_options(**options))
+    vad._socket_path = socket_path or settings.VAD_SERVICE_SOCKET
+    vad._timeout = settings.VAD_SERVICE_TIMEOUT_MS / 1000
+    register_metrics_source(_render_client_metrics)
+    return vad
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared, batched Silero VAD inference for all job processes on this host")
+    parser.add_argument("--socket", default=settings.VAD_SERVICE_SOCKET)
+    parser.add_argument("--max-batch", type=int, default=settings.VAD_SERVICE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.VAD_SERVICE_MAX_WAIT_MS)
+    parser.add_argument("--slots", type=int, default=settings.VAD_SERVICE_MAX_SLOTS)
+    parser.add_argument("--threads", type=int, default=1, help="ONNX intra-op threads")
+    args = parser.parse_args()
+
+    if not args.socket:
+        parser.error("set VAD_SERVICE_SOCKET or pass --socket")
+
+    server = VADInferenceServer(
+        args.socket,
+        max_slots=args.slots,
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000,
+        threads=args.threads,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.log_stats()
+        server.close()
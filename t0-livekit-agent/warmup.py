@@ -0,0 +1,84 @@
+"""
+Warmup utilities to reduce cold start latency for AI services.
+Loads independent components concurrently and pre-opens provider connections.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _timed(loader: Callable[[], Any]) -> Tuple[Any, float, Optional[Exception]]:
+    start = time.perf_counter()
+    try:
+        return loader(), time.perf_counter() - start, None
+    except Exception as e:
+        return None, time.perf_counter() - start, e
+
+
+def load_concurrently(loaders: Dict[str, Callable[[], Any]]) -> Tuple[Dict[str, Any], Dict[str, float], Dict[str, Exception]]:
+    """
+    Run independent component loaders in parallel threads
+
+    Model loading (ONNX sessions, tokenizers, the embedded gateway) spends most
+    of its time in native code that releases the GIL, so threads overlap well.
+
+    Args:
+        loaders: Component name -> zero-argument loader
+
+    Returns:
+        (loaded components, per-component seconds, per-component errors)
+    """
+    results: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    errors: Dict[str, Exception] = {}
+
+    with ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="prewarm") as pool:
+        futures = {name: pool.submit(_timed, loader) for name, loader in loaders.items()}
+        for name, future in futures.items():
+            result, elapsed, error = future.result()
+            timings[name] = elapsed
+            if error is not None:
+                errors[name] = error
+            else:
+                results[name] = result
+
+    return results, timings, errors
+
+
+def log_timings(timings: Dict[str, float], total: float):
+    """Log the per-component breakdown, slowest first"""
+    breakdown = " | ".join(f"{name}={elapsed:.3f}s" for name, elapsed in sorted(timings.items(), key=lambda kv: -kv[1]))
+    logger.info(f"🔥 All models prewarmed in {total:.3f}s | {breakdown}")
+
+
+def warm_connections(**services) -> Dict[str, float]:
+    """
+    Start connection setup for STT/LLM/TTS services using their built-in prewarm
+
+    Provider connections belong to the job's event loop and HTTP session, so this
+    has to run inside the entrypoint. Called before dialing, the HTTP/TLS/WebSocket
+    handshakes overlap with the ring time instead of the first turn.
+
+    Returns:
+        Seconds spent scheduling each service's prewarm
+    """
+    timings = {}
+    for name, service in services.items():
+        prewarm_fnc = getattr(service, "prewarm", None)
+        if service is None or prewarm_fnc is None:
+            continue
+        start = time.perf_counter()
+        try:
+            prewarm_fnc()
+        except Exception as e:
+            logger.warning(f"⚠️ {name.upper()} connection warmup failed: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+
+    logger.debug(f"🔌 Warming connections: {', '.join(timings) or 'none'}")
+    return timings
@@ -0,0 +1,328 @@
+"""
+Webhook delivery for outbound AI agent.
+Events are written to a local SQLite outbox first and delivered by a background
+worker over one pooled keep-alive HTTP session, with jittered exponential
+backoff, so slow receivers and worker restarts don't lose events. Outbox
+queries run in threads, so a busy database never stalls the call's event loop.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional, Set, Tuple
+
+import aiohttp
+
+from core import settings
+from logger import get_logger, log_webhook_event
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt);
+"""
+
+# Status codes worth retrying; any other non-2xx is a permanent failure
+_RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# UPDATE ... RETURNING claims rows in one statement from SQLite 3.35 on
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class WebhookOutbox:
+    """
+    SQLite-backed outbox shared by every process on the host
+
+    Rows are claimed with a lease before delivery, so several job processes can
+    drain the same file without sending an event twice, and rows claimed by a
+    process that died become due again once the lease expires. Calls block (up
+    to the 10s busy timeout), so async code runs them in a thread.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 30.0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def add(self, url: str, payload: dict):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outbox (url, payload, next_attempt, created_at) VALUES (?, ?, ?, ?)",
+                (url, json.dumps(payload, default=str), now, now),
+            )
+
+    def claim(self, limit: int) -> List[Tuple[int, str, str, int]]:
+        """Lease up to `limit` due events: (id, url, payload, attempts)"""
+        now = time.time()
+        due = "SELECT id FROM outbox WHERE dead = 0 AND next_attempt <= ? AND claimed_until <= ? ORDER BY id LIMIT ?"
+        with self._lock:
+            if _HAS_RETURNING:
+                return self._db.execute(
+                    f"UPDATE outbox SET claimed_until = ? WHERE id IN ({due}) RETURNING id, url, payload, attempts",
+                    (now + self.lease_seconds, now, now, limit),
+                ).fetchall()
+            # Older SQLite: select and lease under one write lock
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    f"SELECT id, url, payload, attempts FROM outbox WHERE id IN ({due})", (now, now, limit)
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return rows
+
+    def delivered(self, ids: List[int]):
+        with self._lock:
+            self._db.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, event_id: int, attempts: int, delay: float, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ?, claimed_until = 0, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, event_id),
+            )
+
+    def dead_letter(self, event_id: int, attempts: int, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET attempts = ?, dead = 1, claimed_until = 0, last_error = ? WHERE id = ?",
+                (attempts, error, event_id),
+            )
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next pending event is due, None if the outbox is empty"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(MAX(next_attempt, claimed_until)) FROM outbox WHERE dead = 0"
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def counts(self) -> dict:
+        with self._lock:
+            pending, dead = self._db.execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM outbox"
+            ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class WebhookService:
+    """
+    Durable, batched webhook delivery.
+
+    `send_notification` hands the write to a thread and wakes the worker, so it's
+    safe to call from event handlers. The worker claims up to `batch_size` due
+    events and posts them concurrently over a single pooled session. Failed
+    deliveries are retried with exponential backoff and full jitter, up to
+    `max_attempts`, then kept in the outbox as dead letters.
+    """
+
+    def __init__(
+        self,
+        outbox: Optional[WebhookOutbox] = None,
+        batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        base_delay: float = 1.0,
+        max_delay: float = 300.0,
+        timeout: float = 10.0,
+        max_connections: int = 20,
+    ):
+        self.outbox = outbox or WebhookOutbox(settings.WEBHOOK_OUTBOX_PATH)
+        self.batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.WEBHOOK_MAX_ATTEMPTS
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        # Outbox writes still in their thread, and whether the worker holds claimed rows
+        self._adding: Set[asyncio.Task] = set()
+        self._busy = False
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wake = asyncio.Event()
+            self._worker = asyncio.create_task(self._run(), name="webhook-outbox")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def send_notification(self, url: str, payload: dict, room_name: Optional[str] = None):
+        """Send webhook notification (non-blocking)"""
+        if not url:
+            return
+        payload = dict(payload)
+        if room_name is not None:
+            payload["room_name"] = room_name
+        payload.setdefault("event_id", uuid.uuid4().hex)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No running loop; the event stays in the outbox for the next worker
+            self.outbox.add(url, payload)
+            return
+        self._ensure_worker()
+        task = asyncio.create_task(self._add(url, payload))
+        self._adding.add(task)
+        task.add_done_callback(self._adding.discard)
+
+    async def _add(self, url: str, payload: dict):
+        try:
+            await asyncio.to_thread(self.outbox.add, url, payload)
+        except sqlite3.Error as e:
+            logger.error(f"📡 Webhook outbox write failed | URL: {url} | Event: {payload.get('event_id')} | {e}")
+            return
+        self._wake.set()
+
+    def start(self):
+        """Start draining events left over from a previous run"""
+        self._ensure_worker()
+
+    async def _run(self):
+        while True:
+            # Clear before claiming so an event added mid-claim still wakes us
+            self._wake.clear()
+            self._busy = True
+            try:
+                batch = await asyncio.to_thread(self.outbox.claim, self.batch_size)
+                if batch:
+                    await asyncio.gather(*(self._deliver(*event) for event in batch))
+                    continue
+            except sqlite3.Error as e:
+                logger.warning(f"📡 Webhook outbox unavailable: {e}")
+                batch = None
+            finally:
+                self._busy = False
+
+            wait = 1.0 if batch is None else await asyncio.to_thread(self.outbox.next_due_in)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=wait if wait is not None else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def _backoff(self, attempts: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempts))
+
+    async def _deliver(self, event_id: int, url: str, payload: str, attempts: int):
+        """Internal method to send webhook notifications"""
+        room_name = json.loads(payload).get("room_name")
+        attempts += 1
+        try:
+            async with self._get_session().post(
+                url, data=payload, headers={"Content-Type": "application/json"}
+            ) as response:
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+        else:
+            error = f"HTTP {status}"
+
+        if status is not None and 200 <= status < 300:
+            await asyncio.to_thread(self.outbox.delivered, [event_id])
+            self.sent += 1
+            log_webhook_event("WEBHOOK DELIVERED", url, status=status, room_name=room_name)
+            return
+
+        if (status is None or status in _RETRYABLE_STATUS) and attempts < self.max_attempts:
+            delay = self._backoff(attempts)
+            await asyncio.to_thread(self.outbox.retry, event_id, attempts, delay, error)
+            self.retried += 1
+            logger.warning(f"📡 Webhook retry {attempts}/{self.max_attempts} in {delay:.1f}s | URL: {url} | {error}")
+            return
+
+        await asyncio.to_thread(self.outbox.dead_letter, event_id, attempts, error)
+        self.dead += 1
+        log_webhook_event("WEBHOOK FAILED", url, status=status, room_name=room_name)
+
+    async def flush(self, timeout: float = 5.0):
+        """
+        Give due events a chance to go out, e.g. before the process exits
+
+        Returns once this process' writes are in the outbox, its deliveries in
+        flight have finished and nothing is due; rows leased by other
+        processes are theirs to finish.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._adding:
+                await asyncio.wait(set(self._adding), timeout=max(0.0, deadline - time.monotonic()))
+                continue
+            if not self._busy:
+                due = await asyncio.to_thread(self.outbox.next_due_in)
+                if due is None or due > 0:
+                    return
+            if self._wake:
+                self._wake.set()
+            await asyncio.sleep(0.05)
+        logger.warning(f"📡 Webhook flush timed out after {timeout:g}s; pending events stay in the outbox")
+
+    async def aclose(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def stats(self) -> dict:
+        """Delivery counters and outbox counts (queries the database; run it in a thread from async code)"""
+        return {"sent": self.sent, "retried": self.retried, "dead": self.dead, **self.outbox.counts()}
+
+
+_service: Optional[WebhookService] = None
+
+
+def get_webhook_service() -> WebhookService:
+    """Process-wide service: one outbox connection and one pooled HTTP session"""
+    global _service
+    if _service is None:
+        _service = WebhookService()
+    return _service
+
+
+def send_webhook_notification(url: str, payload: dict, room_name: Optional[str] = None):
+    """Convenience function to send webhook notification using default service"""
+    get_webhook_service().send_notification(url, payload, room_name=room_name)
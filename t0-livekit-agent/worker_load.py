@@ -0,0 +1,318 @@
+"""
+Worker load for outbound AI agent.
+Replaces LiveKit's host CPU average with a load measured from the worker's own
+process tree: the CPU its job processes, inference process (turn detector) and
+local VAD actually use, a per-job CPU cost calibrated from that, and the event
+loop lag each job process reports. The load is scaled so the worker marks
+itself full as soon as one more job would cross an admission limit.
+"""
+
+import asyncio
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import psutil
+
+from core import settings
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# updated (CLOCK_MONOTONIC, shared by all processes), lag p95, lag max, ticks
+_LAG_RECORD = struct.Struct("<dddQ")
+_LAG_PREFIX = "agent-loop-"
+
+
+def _lag_dir() -> str:
+    if settings.WORKER_LOAD_DIR:
+        return settings.WORKER_LOAD_DIR
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _lag_path(pid: int, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or _lag_dir(), f"{_LAG_PREFIX}{pid}")
+
+
+class LoopLagMonitor:
+    """
+    Event loop lag of a job process, published for the worker's load function
+
+    A probe sleeps `tick` seconds and records how late it woke up. Anything that
+    holds the loop (VAD or turn detection on the loop thread, GIL contention from
+    the executor, a slow callback) shows up here before it shows up as late
+    turns. Every `publish_interval` the p95/max over the last `window` seconds is
+    written to a small file in shared memory that the worker reads.
+    """
+
+    def __init__(self, tick: float = 0.05, window: float = 5.0, publish_interval: float = 1.0, directory: Optional[str] = None):
+        self.tick = tick
+        self.publish_interval = publish_interval
+        self.path = _lag_path(os.getpid(), directory)
+        self.lags: deque = deque(maxlen=max(1, int(window / tick)))
+        self.ticks = 0
+        self._fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._task = asyncio.create_task(self._run(), name="loop_lag_monitor")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_publish = loop.time()
+        while True:
+            expected = loop.time() + self.tick
+            await asyncio.sleep(self.tick)
+            now = loop.time()
+            self.lags.append(max(0.0, now - expected))
+            self.ticks += 1
+            if now - last_publish >= self.publish_interval:
+                self.publish()
+                last_publish = now
+
+    def percentile(self, quantile: float) -> float:
+        if not self.lags:
+            return 0.0
+        ordered = sorted(self.lags)
+        return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+    def publish(self):
+        record = _LAG_RECORD.pack(time.monotonic(), self.percentile(0.95), max(self.lags, default=0.0), self.ticks)
+        os.pwrite(self._fd, record, 0)
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def start_loop_monitor() -> LoopLagMonitor:
+    """Start this job process' loop lag monitor (once; later calls return it)"""
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor(tick=settings.WORKER_LAG_TICK)
+    _monitor.start()
+    return _monitor
+
+
+def running_job(pid: int, directory: Optional[str] = None) -> bool:
+    """Whether a job process is in a job: its loop lag monitor runs from the entrypoint to its shutdown"""
+    return os.path.exists(_lag_path(pid, directory))
+
+
+def read_loop_lag(pid: int, directory: Optional[str] = None, stale_after: float = 3.0) -> Optional[float]:
+    """
+    p95 loop lag last published by a job process, None if it has no monitor
+
+    A record that stopped updating means the loop hasn't run the probe since, so
+    its age (less the publish interval) is a lower bound of the current lag.
+    """
+    try:
+        with open(_lag_path(pid, directory), "rb") as f:
+            data = f.read(_LAG_RECORD.size)
+    except FileNotFoundError:
+        return None
+    if len(data) < _LAG_RECORD.size:
+        return None
+    updated, p95, _, _ = _LAG_RECORD.unpack(data)
+    age = time.monotonic() - updated
+    if age > stale_after:
+        return max(p95, age - 1.0)
+    return p95
+
+
+class WorkerLoad:
+    """
+    Load function for `WorkerOptions(load_fnc=...)`
+
+    Every sample takes the CPU time of the worker's process tree over the last
+    interval as a share of the cores it may use (cgroup quota aware). The CPU
+    one job costs is calibrated continuously: tree CPU above the idle baseline
+    divided by the active jobs. Three ratios are compared with their limits:
+
+      - cpu: (current share + one more job) / `cpu_limit`
+      - loop lag: worst job process p95 / `lag_limit`
+      - jobs: active jobs / `max_jobs` (when set)
+
+    The reported load is the largest ratio times `threshold`, so the worker's
+    load reaches LiveKit's `load_threshold` exactly when a limit would be crossed.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        cpu_limit: Optional[float] = None,
+        lag_limit: Optional[float] = None,
+        max_jobs: Optional[int] = None,
+        window: Optional[float] = None,
+        root_pid: Optional[int] = None,
+        cores: Optional[float] = None,
+    ):
+        self.threshold = threshold if threshold is not None else settings.WORKER_LOAD_THRESHOLD
+        self.cpu_limit = cpu_limit if cpu_limit is not None else settings.WORKER_CPU_LIMIT
+        self.lag_limit = lag_limit if lag_limit is not None else settings.WORKER_LOOP_LAG_LIMIT_MS / 1000
+        self.max_jobs = max_jobs if max_jobs is not None else settings.WORKER_MAX_JOBS
+        self.window = window if window is not None else settings.WORKER_LOAD_WINDOW
+        self.root = psutil.Process(root_pid or os.getpid())
+        if cores is None:
+            from livekit.agents.utils.hw import get_cpu_monitor
+
+            cores = get_cpu_monitor().cpu_count()
+        self.cores = max(cores, 0.01)
+        self.lag_dir = _lag_dir()
+
+        self._lock = threading.Lock()
+        self._cpu_times: Dict[int, float] = {}
+        self._last_sample: Optional[float] = None
+        # (time, cpu cores used, active jobs)
+        self._samples: deque = deque()
+        self.idle_cores = 0.0
+        self.job_cores = 0.0
+        self.load = 0.0
+        self.ratios = {"cpu": 0.0, "loop_lag": 0.0, "jobs": 0.0}
+        self.loop_lag = 0.0
+        self.active_jobs = 0
+        self._full = False
+
+    def get_load(self, worker) -> float:
+        return self.sample(len(worker.active_jobs))
+
+    def _tree(self) -> List[psutil.Process]:
+        try:
+            return [self.root, *self.root.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return []
+
+    def _tree_cpu(self, processes: Iterable[psutil.Process]) -> float:
+        """CPU seconds the tree used since the last sample; exited processes drop out"""
+        used = 0.0
+        seen = {}
+        for process in processes:
+            try:
+                times = process.cpu_times()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            total = times.user + times.system
+            seen[process.pid] = total
+            # A process new since the last sample only counts from now on
+            used += max(0.0, total - self._cpu_times.get(process.pid, total))
+        self._cpu_times = seen
+        return used
+
+    def sample(self, active_jobs: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            processes = self._tree()
+            used = self._tree_cpu(processes)
+            if self._last_sample is not None and now > self._last_sample:
+                rate = used / (now - self._last_sample)
+                self._samples.append((now, rate, active_jobs))
+                self._calibrate(rate, active_jobs)
+            self._last_sample = now
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+            cores_used = sum(s[1] for s in self._samples) / len(self._samples) if self._samples else 0.0
+
+            lags = [read_loop_lag(p.pid, self.lag_dir) for p in processes[1:]]
+            self.loop_lag = max((lag for lag in lags if lag is not None), default=0.0)
+            self.active_jobs = active_jobs
+
+            # Admitting a job adds its calibrated cost; nothing is running yet until one was measured
+            projected = (cores_used + self.job_cores) / self.cores
+            self.ratios = {
+                "cpu": projected / self.cpu_limit if self.cpu_limit > 0 else 0.0,
+                "loop_lag": self.loop_lag / self.lag_limit if self.lag_limit > 0 else 0.0,
+                "jobs": active_jobs / self.max_jobs if self.max_jobs > 0 else 0.0,
+            }
+            self.load = min(1.0, max(self.ratios.values()) * self.threshold)
+            self._log_transition()
+            return self.load
+
+    def _calibrate(self, cores_used: float, active_jobs: int, alpha: float = 0.05):
+        # Exponential averages over samples (~10s at LiveKit's 0.5s load interval)
+        if active_jobs == 0:
+            self.idle_cores += alpha * (cores_used - self.idle_cores)
+            return
+        per_job = max(0.0, cores_used - self.idle_cores) / active_jobs
+        self.job_cores = per_job if self.job_cores == 0.0 else self.job_cores + alpha * (per_job - self.job_cores)
+
+    def _log_transition(self):
+        full = self.load >= self.threshold
+        if full == self._full:
+            return
+        self._full = full
+        limit = max(self.ratios, key=self.ratios.get)
+        if full:
+            logger.warning(f"🚦 WORKER FULL | Limit: {limit} | {self._describe()}")
+        else:
+            logger.info(f"🟢 Worker accepting jobs | {self._describe()}")
+
+    def _describe(self) -> str:
+        return (
+            f"Load: {self.load:.2f} | Jobs: {self.active_jobs} | CPU: {self.ratios['cpu'] * self.cpu_limit:.0%} "
+            f"of {self.cores:g} cores | Per job: {self.job_cores:.3f} cores | Loop lag p95: {self.loop_lag * 1000:.1f}ms"
+        )
+
+    def capacity(self) -> Optional[int]:
+        """Jobs this worker can run within its CPU limit at the calibrated per-job cost"""
+        if self.job_cores <= 0:
+            return None
+        jobs = math.floor((self.cpu_limit * self.cores - self.idle_cores) / self.job_cores)
+        return min(jobs, self.max_jobs) if self.max_jobs > 0 else jobs
+
+    def stats(self) -> dict:
+        return {
+            "load": round(self.load, 4),
+            "threshold": self.threshold,
+            "active_jobs": self.active_jobs,
+            "cores": self.cores,
+            "idle_cores": round(self.idle_cores, 4),
+            "job_cores": round(self.job_cores, 4),
+            "capacity": self.capacity(),
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+            "ratios": {name: round(value, 4) for name, value in self.ratios.items()},
+        }
+
+
+_worker_load: Optional[WorkerLoad] = None
+
+
+def get_worker_load() -> WorkerLoad:
+    global _worker_load
+    if _worker_load is None:
+        _worker_load = WorkerLoad()
+    return _worker_load
+
+
+def get_load(worker) -> float:
+    """
+    `load_fnc` for the worker
+
+    A module function rather than a bound method: in dev mode the worker options
+    are pickled into the reloadable worker process, where the load state is
+    created on first use.
+    """
+    return get_worker_load().get_load(worker)